@@ -0,0 +1,226 @@
+"""
+Admission control: per-endpoint concurrency limits with bounded queues.
+
+A burst of attribution requests would otherwise take every pool connection and threadpool
+thread, and cheap lookups such as /fx_rate/ and /holdings_available_dates/ would wait behind them
+until they time out. With @limit on an endpoint, a request takes permits from the endpoint's
+Limiter before it runs and gives them back when it ends:
+
+- an endpoint has a number of permits (ADMISSION_LIMITS); a request takes one per
+  ADMISSION_COST_UNIT account-days it covers (accounts x days of its range), at least one and at
+  most all of them, so a five-year household report counts for several one-month ones
+- a request that finds too few permits free waits in the endpoint's FIFO queue, on the event loop
+  without holding a thread; after ADMISSION_QUEUE_TIMEOUT seconds it gets a 503
+- a request that finds the queue full gets a 429 right away
+
+Both refusals carry Retry-After, estimated from how long the endpoint's requests have recently
+held their permits. A streamed response (NDJSON, exports) keeps its permits until its body is
+sent. Endpoints without @limit, the cheap ones, are never queued. On a report endpoint @limit
+goes below @http_cache.conditional, so a 304 or a precomputed report is answered without
+taking permits.
+
+Limits are per worker process. Time spent queued is the "queue" phase of Server-Timing and the
+admission_queue_seconds histogram at /metrics.
+"""
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from . import instrumentation, metrics, settings
+from .cache import to_date
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class Limiter:
+    """
+    Weighted FIFO semaphore with a bounded queue. State is guarded by a lock and waiters are
+    concurrent.futures.Future objects, so it can be used from any thread or event loop.
+    """
+
+    def __init__(self, name: str, permits: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.permits = permits
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_use = 0
+        # (weight, Future) in arrival order; only the head is admitted, so heavy requests are not starved
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        # Running mean of the seconds a request holds its permits
+        self.mean_hold = 1.0
+        self._stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def weight(self, cost: float) -> int:
+        return min(max(1, math.ceil(cost)), self.permits)
+
+    def _retry_after(self, weight: int) -> int:
+        """Seconds until the queue ahead and weight more permits are likely free; call with the lock held"""
+        ahead = sum(waiting for waiting, _ in self._waiters) + weight
+        return min(60, max(1, math.ceil(self.mean_hold * ahead / self.permits)))
+
+    def _enqueue(self, weight: int) -> Optional[Future]:
+        """None when the permits were taken, else the Future granting them"""
+        with self._lock:
+            if not self._waiters and self.in_use + weight <= self.permits:
+                self.in_use += weight
+                self._stats["admitted"] += 1
+                return None
+            if len(self._waiters) >= self.queue_size:
+                self._stats["rejected_full"] += 1
+                raise Rejected(429, self._retry_after(weight), f"Too many {self.name} requests queued, retry later")
+            future = Future()
+            self._waiters.append((weight, future))
+            self._stats["queued"] += 1
+            return future
+
+    async def acquire(self, weight: int) -> float:
+        """Take weight permits, waiting up to queue_timeout; returns the seconds spent queued"""
+        future = self._enqueue(weight)
+        if future is None:
+            return 0.0
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as error:
+            with self._lock:
+                granted = future.done() and not future.cancelled()
+                if not granted:
+                    try:
+                        self._waiters.remove((weight, future))
+                    except ValueError:
+                        pass  # skipped by release() once cancelled
+                    # Requests behind it may fit now
+                    self._grant()
+                    if isinstance(error, asyncio.TimeoutError):
+                        self._stats["rejected_timeout"] += 1
+                        raise Rejected(
+                            503, self._retry_after(weight), f"{self.name} requests are queued for longer than {self.queue_timeout:g} s"
+                        )
+            if not isinstance(error, asyncio.TimeoutError):
+                # The client went away; permits granted meanwhile go to the next waiter
+                if granted:
+                    self.release(weight)
+                raise
+            # Granted as the wait timed out: run
+        return time.monotonic() - started
+
+    def _grant(self):
+        """Admit waiters from the head of the queue while they fit; call with the lock held"""
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.permits:
+            waiting, future = self._waiters.popleft()
+            # False when the waiter timed out or went away
+            if future.set_running_or_notify_cancel():
+                self.in_use += waiting
+                self._stats["admitted"] += 1
+                future.set_result(None)
+
+    def release(self, weight: int, held_seconds: Optional[float] = None):
+        with self._lock:
+            self.in_use -= weight
+            if held_seconds is not None:
+                self.mean_hold = 0.8 * self.mean_hold + 0.2 * held_seconds
+            self._grant()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, in_use=self.in_use, permits=self.permits, queued_now=len(self._waiters))
+
+
+# {path: Limiter} of every @limit endpoint of this worker
+limiters: Dict[str, Limiter] = {}
+
+
+def account_days(request) -> int:
+    """Estimated cost of a report request: its accounts times the days of its range (or one day)"""
+    accounts = len(set(getattr(request, "account_codes", None) or ())) or 1
+    end = getattr(request, "end_date", None) or getattr(request, "as_of_date", None)
+    start = getattr(request, "start_date", None) or end
+    try:
+        days = (to_date(end) - to_date(start)).days + 1 if end is not None else 1
+    except ValueError:
+        days = 1
+    return accounts * max(days, 1)
+
+
+async def _releasing(body, limiter: Limiter, weight: int, started: float):
+    """A streamed body that gives its request's permits back once sent"""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        limiter.release(weight, time.monotonic() - started)
+
+
+def limit(
+    path: str,
+    cost: Callable = account_days,
+    request_arg: str = "request",
+    admission_settings: settings.AdmissionSettings = None,
+):
+    """
+    Endpoint decorator admitting requests through path's Limiter (ADMISSION_LIMITS). A sync
+    endpoint becomes async and runs in the threadpool once admitted, so queued requests hold
+    no thread.
+    """
+    config = admission_settings or settings.admission
+    permits, queue_size = config.limits.get(path, (0, 0))
+    limiter = None
+    if config.enabled and permits > 0:
+        limiter = limiters[path] = Limiter(path, permits, queue_size, config.queue_timeout)
+
+    def decorator(endpoint):
+        is_async = asyncio.iscoroutinefunction(endpoint)
+
+        async def call(args, kwargs):
+            if is_async:
+                return await endpoint(*args, **kwargs)
+            return await run_in_threadpool(endpoint, *args, **kwargs)
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            if limiter is None:
+                return await call(args, kwargs)
+            weight = limiter.weight(cost(kwargs[request_arg]) / config.cost_unit)
+            labels = (("endpoint", path),)
+            try:
+                queued = await limiter.acquire(weight)
+            except Rejected as error:
+                metrics.registry.inc("admission_rejected_total", labels + (("status", str(error.status_code)),))
+                raise HTTPException(status_code=error.status_code, detail=error.detail, headers={"Retry-After": str(error.retry_after)})
+            metrics.registry.observe("admission_queue_seconds", labels, queued)
+            stats = instrumentation.current_stats()
+            if stats is not None:
+                stats.queue_seconds = queued
+
+            started = time.monotonic()
+            streamed = False
+            try:
+                result = await call(args, kwargs)
+                if isinstance(result, StreamingResponse):
+                    result.body_iterator = _releasing(result.body_iterator, limiter, weight, started)
+                    streamed = True
+                return result
+            finally:
+                if not streamed:
+                    limiter.release(weight, time.monotonic() - started)
+
+        return wrapper
+
+    return decorator
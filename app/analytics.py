@@ -0,0 +1,135 @@
+"""
+Embedded analytic engine: DuckDB over Parquet snapshots of phw_dev_gold (tools/export_parquet.py).
+
+With ANALYTICS_ENGINE=duckdb the heavy report endpoints (holdings Sankey, performance
+attribution, benchmark) get a DuckDB session instead of a database one (main.get_report_db).
+Every DuckDB connection creates the phw_dev_gold schema with one view per exported table over
+its Parquet files, so the services' SQL (app/queries.py) and ORM queries run unchanged.
+Partitioned tables are read with hive partitioning, so a filter on AsofDate / TradeDate only
+opens the files of those days. tools/benchmark_engines.py runs both paths side by side and
+checks that they agree.
+
+The snapshot is the one LATEST names under PARQUET_SNAPSHOT_DIR, looked up again at most every
+ANALYTICS_SNAPSHOT_CHECK_INTERVAL seconds; a new snapshot gets a new engine, and sessions
+already open finish on the old one. Reports from DuckDB are as of their snapshot (their ETags
+follow the snapshot's load times), and the rollups are not exported, so the services read the
+facts there.
+
+duckdb and duckdb_engine are imported when the first engine is made.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from . import instrumentation, metrics, settings
+from .database import GOLD_SCHEMA
+
+LATEST = "LATEST"
+MANIFEST = "manifest.json"
+
+
+class SnapshotUnavailable(RuntimeError):
+    """ANALYTICS_ENGINE=duckdb, but PARQUET_SNAPSHOT_DIR holds no snapshot"""
+
+
+def latest_snapshot(root: str) -> Optional[str]:
+    """Path of the snapshot LATEST points at, or None"""
+    try:
+        with open(os.path.join(root, LATEST)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(root, name) if name else None
+
+
+def snapshot_of(db) -> Optional[str]:
+    """The snapshot a session reads, None for a database session"""
+    return getattr(db.get_bind(), "snapshot", None)
+
+
+def read_manifest(snapshot: str) -> Dict:
+    with open(os.path.join(snapshot, MANIFEST)) as f:
+        return json.load(f)
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def snapshot_views(snapshot: str) -> List[str]:
+    """Statements creating phw_dev_gold and a view per table of snapshot"""
+    statements = [f"CREATE SCHEMA IF NOT EXISTS {GOLD_SCHEMA}"]
+    for table, info in read_manifest(snapshot)["tables"].items():
+        directory = os.path.abspath(os.path.join(snapshot, table))
+        partition = info.get("partition")
+        if partition:
+            source = (
+                f"read_parquet({_literal(os.path.join(directory, '*', '*.parquet'))}, "
+                f"hive_partitioning = true, hive_types = {{{_literal(partition)}: DATE}})"
+            )
+        else:
+            source = f"read_parquet({_literal(os.path.join(directory, 'data.parquet'))})"
+        statements.append(f"CREATE OR REPLACE VIEW {GOLD_SCHEMA}.{table} AS SELECT * FROM {source}")
+    return statements
+
+
+def make_engine(snapshot: str, threads: int = 0):
+    """In-memory DuckDB engine whose connections see snapshot as phw_dev_gold"""
+    statements = snapshot_views(snapshot)
+    connect_args = {"config": {"threads": threads}} if threads else {}
+    engine = create_engine("duckdb:///:memory:", connect_args=connect_args)
+
+    @event.listens_for(engine, "connect")
+    def create_views(dbapi_connection, connection_record):
+        for statement in statements:
+            dbapi_connection.execute(statement)
+
+    instrumentation.instrument_engine(engine)
+    metrics.instrument_engine(engine)
+    engine.snapshot = snapshot
+    return engine
+
+
+class SnapshotEngines:
+    """The engine over the current snapshot, replaced when LATEST moves"""
+
+    def __init__(self, analytics_settings: settings.AnalyticsSettings = None):
+        self.analytics_settings = analytics_settings
+        self._engine = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        config = self.analytics_settings or settings.analytics
+        with self._lock:
+            now = time.monotonic()
+            if self._engine is not None and now - self._checked_at < config.snapshot_check_interval:
+                return self._engine
+            snapshot = latest_snapshot(config.snapshot_dir)
+            if snapshot is None:
+                raise SnapshotUnavailable(f"No Parquet snapshot in {config.snapshot_dir}; run python -m tools.export_parquet")
+            self._checked_at = now
+            if self._engine is None or self._engine.snapshot != snapshot:
+                previous, self._engine = self._engine, make_engine(snapshot, config.duckdb_threads)
+                if previous is not None:
+                    # Connections still checked out close when their sessions return them
+                    previous.dispose()
+            return self._engine
+
+    def session(self) -> Session:
+        return Session(self.current())
+
+    def dispose(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self._engine = None
+
+
+engines = SnapshotEngines()
@@ -1,8 +1,65 @@
-
-import yfinance as yf
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
-from . import models, schemas
+from . import models, schemas, queries, rollups
+from .cache import DateRangeCache, TTLCache, to_date
+
+# Process-wide caches for the benchmark chart. Each piece has its own lifetime:
+# - prices only change for the current trading day, so they live for hours
+# - cash flows and holdings change when the gold layer is reloaded, so they are short lived
+#   and can be dropped explicitly with invalidate_benchmark_caches()
+# - replayed value histories depend on both and share the shorter lifetime
+PRICE_CACHE = DateRangeCache("benchmark_prices", maxsize=128, ttl_seconds=6 * 3600)
+CASH_FLOW_CACHE = DateRangeCache("benchmark_cash_flows", maxsize=512, ttl_seconds=15 * 60)
+PORTFOLIO_VALUE_CACHE = DateRangeCache("benchmark_portfolio_values", maxsize=512, ttl_seconds=15 * 60)
+VALUE_HISTORY_CACHE = TTLCache("benchmark_value_history", maxsize=1024, ttl_seconds=15 * 60)
+
+
+def _account_key(account_codes) -> tuple:
+    return tuple(sorted(set(account_codes)))
+
+
+def invalidate_benchmark_caches(account_codes=None, symbols=None):
+    """
+    Drop cached benchmark pieces.
+
+    - account_codes: drop cash flows, portfolio values and value histories touching any of these accounts
+    - symbols: drop prices and value histories for these benchmark symbols
+    - neither: drop everything that is derived from the gold layer (prices are kept)
+    """
+    if account_codes is None and symbols is None:
+        CASH_FLOW_CACHE.clear()
+        PORTFOLIO_VALUE_CACHE.clear()
+        VALUE_HISTORY_CACHE.clear()
+        return
+
+    if account_codes is not None:
+        accounts = set(account_codes)
+        CASH_FLOW_CACHE.invalidate(lambda key: bool(accounts.intersection(key)))
+        PORTFOLIO_VALUE_CACHE.invalidate(lambda key: bool(accounts.intersection(key)))
+        VALUE_HISTORY_CACHE.invalidate(lambda key: bool(accounts.intersection(key[0])))
+
+    if symbols is not None:
+        symbol_set = set(symbols)
+        PRICE_CACHE.invalidate(lambda key: key in symbol_set)
+        VALUE_HISTORY_CACHE.invalidate(lambda key: key[1] in symbol_set)
+
+
+def _cacheable_end(end: date) -> date:
+    """Prices, flows and holdings for today can still change, so never mark today (or later) as loaded"""
+    return min(end, date.today() - timedelta(days=1))
+
+
+def _put_settled(cache: DateRangeCache, key, start: date, end: date, values: dict):
+    """put_range for the part of start..end before today"""
+    settled = _cacheable_end(end)
+    if settled >= start:
+        settled_str = settled.strftime("%Y-%m-%d")
+        cache.put_range(key, start, settled, {day: value for day, value in values.items() if day <= settled_str})
+
+
+def _no_progress(fraction, stage):
+    pass
+
 
 class BenchmarkService:
     def __init__(self, db: Session):
@@ -14,28 +71,191 @@ class BenchmarkService:
         benchmark_symbols: list[str],
         start_date: str,
         end_date: str,
+        include_metrics: bool = False,
+        frequency: str = "daily",
+        max_points: int = None,
+        layout: str = "dict",
+        progress=None,
     ):
+        """progress, when given, is called as progress(fraction done, stage) before each stage"""
+        progress = progress or _no_progress
         # 1. Get portfolio cash flows
+        progress(0.0, "cash_flows")
         cash_flows = self._get_portfolio_cash_flows(account_codes, start_date, end_date)
 
         # 2. Get portfolio daily values
+        progress(0.2, "portfolio_values")
         portfolio_values = self._get_portfolio_daily_values(account_codes, start_date, end_date)
 
         # 3. Calculate benchmark performance for each benchmark
         benchmark_performance_data = {}
+        benchmark_applied_flows = {}
+        for index, symbol in enumerate(benchmark_symbols):
+            progress(0.4 + 0.4 * index / len(benchmark_symbols), f"benchmark {symbol}")
+            value_history, applied_flows = self._get_benchmark_value_history(
+                account_codes, symbol, cash_flows, start_date, end_date
+            )
+            if value_history is not None:
+                benchmark_performance_data[symbol] = value_history
+                benchmark_applied_flows[symbol] = applied_flows
+
+        # 4. Resample / downsample for display (metrics below always use the full-resolution series)
+        progress(0.8, "shape")
+        result = self._shape_output(portfolio_values, benchmark_performance_data, frequency, max_points, layout)
+
+        # 5. Optionally compute return metrics server-side
+        if include_metrics:
+            progress(0.9, "metrics")
+            result["metrics"] = self._calculate_return_metrics(
+                account_codes, benchmark_performance_data, benchmark_applied_flows, start_date, end_date
+            )
+
+        return result
+
+    def iter_benchmark_performance(
+        self,
+        account_codes: list[str],
+        benchmark_symbols: list[str],
+        start_date: str,
+        end_date: str,
+        include_metrics: bool = False,
+        frequency: str = "daily",
+        max_points: int = None,
+    ):
+        """
+        get_benchmark_performance as NDJSON items (app/ndjson.py): {"type": "portfolio", "date",
+        "value"} points, then {"type": "benchmark", "symbol", "date", "value"} points for each
+        benchmark, then one {"type": "metrics", ...} item per series. Daily points go out as each
+        series is ready; with frequency or max_points the series are shaped together once the last
+        benchmark is in. The portfolio queries run here, before the first item.
+        """
+        cash_flows = self._get_portfolio_cash_flows(account_codes, start_date, end_date)
+        portfolio_values = self._get_portfolio_daily_values(account_codes, start_date, end_date)
+        return self._benchmark_items(
+            account_codes, benchmark_symbols, start_date, end_date, cash_flows, portfolio_values,
+            include_metrics, frequency, max_points,
+        )
+
+    def _benchmark_items(
+        self, account_codes, benchmark_symbols, start_date, end_date, cash_flows, portfolio_values,
+        include_metrics, frequency, max_points,
+    ):
+        as_produced = frequency == "daily" and not max_points
+        if as_produced:
+            for day, value in portfolio_values.items():
+                yield {"type": "portfolio", "date": day, "value": value}
+
+        benchmark_performance_data = {}
+        benchmark_applied_flows = {}
         for symbol in benchmark_symbols:
-            benchmark_data = self._get_benchmark_data(symbol, start_date, end_date)
-            if benchmark_data:
-                benchmark_performance_data[symbol] = self._calculate_benchmark_value(
-                    cash_flows, benchmark_data, start_date, end_date
-                )
-
-        return {
-            "portfolio_values": portfolio_values,
-            "benchmark_performance": benchmark_performance_data,
-        }
+            # Send the points so far before a price download
+            yield None
+            value_history, applied_flows = self._get_benchmark_value_history(
+                account_codes, symbol, cash_flows, start_date, end_date
+            )
+            if value_history is None:
+                continue
+            benchmark_performance_data[symbol] = value_history
+            benchmark_applied_flows[symbol] = applied_flows
+            if as_produced:
+                for day, value in value_history.items():
+                    yield {"type": "benchmark", "symbol": symbol, "date": day, "value": value}
+
+        if not as_produced:
+            shaped = self._shape_output(portfolio_values, benchmark_performance_data, frequency, max_points, "dict")
+            for day, value in shaped["portfolio_values"].items():
+                yield {"type": "portfolio", "date": day, "value": value}
+            for symbol, history in shaped["benchmark_performance"].items():
+                for day, value in history.items():
+                    yield {"type": "benchmark", "symbol": symbol, "date": day, "value": value}
+
+        if include_metrics:
+            yield None
+            for record in self._calculate_return_metrics(
+                account_codes, benchmark_performance_data, benchmark_applied_flows, start_date, end_date
+            ):
+                yield {"type": "metrics", **record}
+
+    def _shape_output(self, portfolio_values: dict, benchmark_performance: dict, frequency: str, max_points, layout: str) -> dict:
+        """
+        Build the response body. 'columnar' returns one shared date array with one aligned value
+        array per series; 'dict' keeps the per-day {date: value} maps. Both honour frequency and max_points.
+        """
+        if layout == "dict" and frequency == "daily" and not max_points:
+            return {"portfolio_values": portfolio_values, "benchmark_performance": benchmark_performance}
+
+        from . import downsampling
+
+        portfolio_key = ("portfolio",)  # cannot collide with a benchmark symbol
+        shaped = downsampling.shape_series(
+            {portfolio_key: portfolio_values, **benchmark_performance}, frequency=frequency, max_points=max_points
+        )
+        columns = shaped["columns"]
+
+        if layout == "columnar":
+            return {
+                "series": {
+                    "dates": shaped["dates"],
+                    "portfolio": columns.pop(portfolio_key),
+                    "benchmarks": columns,
+                }
+            }
+
+        as_dicts = downsampling.columns_to_dicts(shaped["dates"], columns)
+        return {"portfolio_values": as_dicts.pop(portfolio_key), "benchmark_performance": as_dicts}
+
+    def _calculate_return_metrics(
+        self, account_codes: list[str], benchmark_histories: dict, benchmark_flows: dict, start_date: str, end_date: str
+    ) -> list:
+        """
+        Return metrics for every account, the combined portfolio and every benchmark, computed in one
+        vectorized pass. Account values and cash flows come from fact_daily_aggregate_values; benchmark
+        rows use the replayed histories and the flows that the replay actually invested.
+        """
+        import numpy as np
+        from . import performance_metrics
+
+        params = {"start_date": start_date, "end_date": end_date, "account_codes": tuple(account_codes)}
+        rows = self.db.execute(queries.GET_DAILY_AGGREGATE_SERIES, params).fetchall()
+
+        accounts = sorted(set(account_codes))
+        account_values = {code: {} for code in accounts}
+        account_flows = {code: {} for code in accounts}
+        for row in rows:
+            if row.account_code not in account_values:
+                continue
+            account_values[row.account_code][row.as_of_date] = row.market_value_accrued
+            account_flows[row.account_code][row.as_of_date] = row.net_cashflow
+
+        start, end = to_date(start_date), to_date(end_date)
+        dates = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        symbols = list(benchmark_histories.keys())
+
+        values = performance_metrics.build_matrix(dates, [account_values[code] for code in accounts])
+        flows = np.nan_to_num(performance_metrics.build_matrix(dates, [account_flows[code] for code in accounts]))
+        total_values, total_flows = performance_metrics.total_row(values, flows)
+        bench_values = performance_metrics.build_matrix(dates, [benchmark_histories[s] for s in symbols])
+        bench_flows = np.nan_to_num(performance_metrics.build_matrix(dates, [benchmark_flows[s] for s in symbols]))
+
+        all_values = np.vstack([values, total_values[None, :], bench_values])
+        all_flows = np.vstack([flows, total_flows[None, :], bench_flows])
+        labels = accounts + ["Portfolio"] + symbols
+        kinds = ["account"] * len(accounts) + ["portfolio"] + ["benchmark"] * len(symbols)
+        benchmark_rows = list(range(len(accounts) + 1, len(labels)))
+
+        metrics = performance_metrics.compute_return_metrics(dates, all_values, all_flows, benchmark_rows)
+        return performance_metrics.metrics_to_records(labels, kinds, metrics, symbols)
 
     def _get_portfolio_cash_flows(self, account_codes: list[str], start_date: str, end_date: str) -> dict:
+        key = _account_key(account_codes)
+        cash_flows, missing = CASH_FLOW_CACHE.get_range(key, start_date, end_date)
+        for range_start, range_end in missing:
+            loaded = self._query_portfolio_cash_flows(account_codes, range_start, range_end)
+            _put_settled(CASH_FLOW_CACHE, key, range_start, range_end, loaded)
+            cash_flows.update(loaded)
+        return cash_flows
+
+    def _query_portfolio_cash_flows(self, account_codes: list[str], start_date, end_date) -> dict:
         cash_flow_transactions = (
             self.db.query(models.FactTransaction)
             .filter(
@@ -61,6 +281,22 @@ class BenchmarkService:
         return cash_flows
 
     def _get_portfolio_daily_values(self, account_codes: list[str], start_date: str, end_date: str) -> dict:
+        key = _account_key(account_codes)
+        portfolio_values, missing = PORTFOLIO_VALUE_CACHE.get_range(key, start_date, end_date)
+        for range_start, range_end in missing:
+            loaded = self._query_portfolio_daily_values(account_codes, range_start, range_end)
+            _put_settled(PORTFOLIO_VALUE_CACHE, key, range_start, range_end, loaded)
+            portfolio_values.update(loaded)
+        return dict(sorted(portfolio_values.items()))
+
+    def _query_portfolio_daily_values(self, account_codes: list[str], start_date, end_date) -> dict:
+        if rollups.coverage(self.db).covers(start_date, end_date):
+            rows = self.db.execute(
+                queries.GET_ROLLUP_PORTFOLIO_DAILY_VALUES,
+                {"account_codes": tuple(account_codes), "start_date": to_date(start_date), "end_date": to_date(end_date)},
+            )
+            return {to_date(row.as_of_date).strftime("%Y-%m-%d"): float(row.total_mva) for row in rows}
+
         from sqlalchemy import func
 
         daily_values_query = (
@@ -85,14 +321,73 @@ class BenchmarkService:
 
         return portfolio_values
 
+    def _get_benchmark_value_history(self, account_codes, symbol: str, cash_flows: dict, start_date: str, end_date: str):
+        """
+        Replayed benchmark value history, reusing a cached replay for the same accounts, symbol and start date.
+
+        The replay is causal, so a cached run that ends later can simply be truncated and one that
+        ends earlier can be continued from its final share count instead of replaying from scratch.
+        Returns (history, applied_flows), where applied_flows are the cash flows that were actually
+        invested (flows on days without a price are skipped by the replay); history is None when no
+        price data is available.
+        """
+        key = (_account_key(account_codes), symbol, to_date(start_date))
+        end = to_date(end_date)
+        cached = VALUE_HISTORY_CACHE.get(key)
+
+        if cached is not None and cached["end"] >= end:
+            end_str = end.strftime("%Y-%m-%d")
+            history = {day: value for day, value in cached["history"].items() if day <= end_str}
+            applied_flows = {day: flow for day, flow in cached["applied_flows"].items() if day <= end_str}
+            return history or None, applied_flows
+
+        if cached is not None:
+            resume_from = cached["end"] + timedelta(days=1)
+            history, shares = dict(cached["history"]), cached["shares"]
+            applied_flows = dict(cached["applied_flows"])
+        else:
+            resume_from = to_date(start_date)
+            history, shares, applied_flows = {}, 0.0, {}
+
+        benchmark_data = self._get_benchmark_data(
+            symbol, resume_from.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+        )
+        history, shares = self._replay_benchmark_value(
+            cash_flows, benchmark_data, resume_from, end, history, shares, applied_flows
+        )
+
+        # Ranges reaching today still have a moving price, so only settled replays are kept. The
+        # cache keeps its own copies: history and applied_flows go on to the caller
+        if end == _cacheable_end(end):
+            VALUE_HISTORY_CACHE.set(
+                key, {"end": end, "history": dict(history), "shares": shares, "applied_flows": dict(applied_flows)}
+            )
+
+        return history or None, applied_flows
 
     def _get_benchmark_data(self, benchmark_symbol: str, start_date: str, end_date: str) -> dict:
+        prices, missing = PRICE_CACHE.get_range(benchmark_symbol, start_date, end_date)
+        for range_start, range_end in missing:
+            loaded = self._download_benchmark_data(
+                benchmark_symbol, range_start.strftime("%Y-%m-%d"), range_end.strftime("%Y-%m-%d")
+            )
+            if loaded is None:
+                continue
+            _put_settled(PRICE_CACHE, benchmark_symbol, range_start, range_end, loaded)
+            prices.update(loaded)
+        return prices
+
+    def _download_benchmark_data(self, benchmark_symbol: str, start_date: str, end_date: str):
+        """Download adjusted close prices; returns None when the download failed (so nothing is cached)"""
         proxy_map = {
             "XEQT.TO": "VTI"
         }
 
         end_date_plus_one = (datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
-        
+
+        # yfinance pulls in pandas (most of a second); only price downloads pay for it
+        import yfinance as yf
+
         try:
             data = yf.download(benchmark_symbol, start=start_date, end=end_date_plus_one)
             if data.empty and benchmark_symbol in proxy_map:
@@ -100,39 +395,53 @@ class BenchmarkService:
                 data = yf.download(proxy_symbol, start=start_date, end=end_date_plus_one)
         except Exception as e:
             print(f"Error fetching benchmark data for {benchmark_symbol}: {e}")
-            return {}
+            return None
         print(data.columns)
         adj_close_prices = data["Adj Close"].to_dict()
         
-        return {date.strftime("%Y-%m-%d"): price for date, price in adj_close_prices.items()}
+        return {day.strftime("%Y-%m-%d"): price for day, price in adj_close_prices.items()}
 
     def _calculate_benchmark_value(self, cash_flows: dict, benchmark_prices: dict, start_date_str: str, end_date_str: str) -> dict:
-        benchmark_value_history = {}
-        benchmark_shares = 0.0
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
-
-        # Find the first date with a valid price
-        first_valid_price_date = None
-        for date in (start_date + timedelta(n) for n in range((end_date - start_date).days + 1)):
-             if date.strftime("%Y-%m-%d") in benchmark_prices:
-                 first_valid_price_date = date
-                 break
-        
-        if not first_valid_price_date:
-            return {} # No price data available for the whole period
+        history, _ = self._replay_benchmark_value(
+            cash_flows, benchmark_prices, to_date(start_date_str), to_date(end_date_str), {}, 0.0
+        )
+        return history
+
+    def _replay_benchmark_value(
+        self, cash_flows: dict, benchmark_prices: dict, start_date, end_date, history: dict, shares: float, applied_flows=None
+    ):
+        """
+        Replay portfolio cash flows into benchmark shares from start_date to end_date.
+
+        `history` and `shares` carry the state of an earlier replay that ended the day before
+        start_date; pass ({}, 0.0) to start fresh. Returns the extended (history, shares).
+        Flows that were invested are recorded into `applied_flows` when it is given.
+        """
+        benchmark_value_history = history
+        benchmark_shares = shares
+
+        if not benchmark_value_history:
+            # Find the first date with a valid price
+            first_valid_price_date = None
+            for day in (start_date + timedelta(n) for n in range((end_date - start_date).days + 1)):
+                 if day.strftime("%Y-%m-%d") in benchmark_prices:
+                     first_valid_price_date = day
+                     break
+
+            if not first_valid_price_date:
+                return benchmark_value_history, benchmark_shares  # No price data available for the whole period
 
-        # Start calculation from the first day a price is available
-        start_date = first_valid_price_date
+            # Start calculation from the first day a price is available
+            start_date = first_valid_price_date
 
-        for date in (start_date + timedelta(n) for n in range((end_date - start_date).days + 1)):
-            current_date_str = date.strftime("%Y-%m-%d")
+        for day in (start_date + timedelta(n) for n in range((end_date - start_date).days + 1)):
+            current_date_str = day.strftime("%Y-%m-%d")
             
             price_today = benchmark_prices.get(current_date_str)
             
             if price_today is None:
                 if benchmark_value_history:
-                    last_date = (date - timedelta(days=1)).strftime("%Y-%m-%d")
+                    last_date = (day - timedelta(days=1)).strftime("%Y-%m-%d")
                     benchmark_value_history[current_date_str] = benchmark_value_history.get(last_date)
                 continue
 
@@ -140,8 +449,10 @@ class BenchmarkService:
             if cash_flow != 0:
                 shares_to_add = cash_flow / price_today
                 benchmark_shares += shares_to_add
+                if applied_flows is not None:
+                    applied_flows[current_date_str] = cash_flow
             
             current_benchmark_value = benchmark_shares * price_today
             benchmark_value_history[current_date_str] = current_benchmark_value
 
-        return benchmark_value_history
+        return benchmark_value_history, benchmark_shares
@@ -0,0 +1,208 @@
+"""
+In-process caches shared by the service layer.
+
+Every cache registers itself by name so its hit ratio can be reported next to the
+other service statistics. Caches are per worker process and thread-safe.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_registry: Dict[str, "TTLCache"] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name: str) -> Optional["TTLCache"]:
+    return _registry.get(name)
+
+
+def all_caches() -> List["TTLCache"]:
+    with _registry_lock:
+        return list(_registry.values())
+
+
+def to_date(value) -> date:
+    """Accept a date, datetime or 'YYYY-MM-DD' string and return a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with an optional per-entry time to live.
+
+    Entries are evicted least-recently-used first once `maxsize` is reached, and
+    dropped lazily on access once older than `ttl_seconds`.
+    """
+
+    def __init__(self, name: str, maxsize: int = 256, ttl_seconds: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with _registry_lock:
+            _registry[name] = self
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+
+    def _lookup(self, key):
+        """Return the live value for key (refreshing LRU order) or None, without touching stats"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self._expired(stored_at):
+            del self._data[key]
+            self.evictions += 1
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def invalidate(self, predicate: Optional[Callable[[Any], bool]] = None) -> int:
+        """Drop every entry whose key matches predicate (all entries if no predicate). Returns the count."""
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            doomed = [key for key in self._data if predicate(key)]
+            for key in doomed:
+                del self._data[key]
+            return len(doomed)
+
+    def clear(self):
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+class DateRangeCache(TTLCache):
+    """
+    Cache of per-day values that remembers which date ranges have already been loaded.
+
+    Each entry holds a list of disjoint covered intervals plus a {'YYYY-MM-DD': value}
+    dict. A lookup returns the cached values inside the requested range together with
+    the sub-ranges that still need loading, so overlapping requests only fetch the gaps.
+    """
+
+    def __init__(self, name: str, maxsize: int = 256, ttl_seconds: Optional[float] = None):
+        super().__init__(name, maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self.partial_hits = 0
+
+    def get_range(self, key, start, end) -> Tuple[dict, List[Tuple[date, date]]]:
+        start, end = to_date(start), to_date(end)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return {}, [(start, end)]
+
+            missing = _subtract_intervals((start, end), entry["intervals"])
+            if not missing:
+                self.hits += 1
+            elif missing != [(start, end)]:
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+
+            start_str, end_str = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+            values = {day: value for day, value in entry["values"].items() if start_str <= day <= end_str}
+            return values, missing
+
+    def put_range(self, key, start, end, values: dict):
+        """Record that [start, end] is loaded and merge its values into the entry"""
+        start, end = to_date(start), to_date(end)
+        if end < start:
+            return
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                entry = {"intervals": [], "values": {}}
+            entry["values"].update(values)
+            entry["intervals"] = _merge_intervals(entry["intervals"] + [(start, end)])
+            # Re-store so the entry's age and LRU position reflect the newest load
+            self.set(key, entry)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["partial_hits"] = self.partial_hits
+        lookups = self.hits + self.partial_hits + self.misses
+        stats["hit_ratio"] = ((self.hits + self.partial_hits) / lookups) if lookups else 0.0
+        return stats
+
+
+def _merge_intervals(intervals: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    merged: List[Tuple[date, date]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract_intervals(wanted: Tuple[date, date], covered: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """Return the parts of `wanted` not covered by the (sorted, disjoint) `covered` intervals"""
+    start, end = wanted
+    missing = []
+    cursor = start
+    for cov_start, cov_end in covered:
+        if cov_end < cursor:
+            continue
+        if cov_start > end:
+            break
+        if cov_start > cursor:
+            missing.append((cursor, cov_start - timedelta(days=1)))
+        cursor = max(cursor, cov_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
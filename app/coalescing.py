@@ -0,0 +1,134 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When a dashboard loads, the same holdings or attribution request often arrives several times
+at once. With @coalesce on an endpoint, the first request (the leader) runs it; identical
+requests arriving while it runs (followers) wait for it and share its result, or its exception.
+Nothing is kept once the leader finishes, so this is not a cache: a request arriving afterwards
+runs again.
+
+Requests are identical when their body models are equal after normalization: defaults filled
+in, dates as ISO strings, keys sorted. List order is kept because responses echo it.
+
+The shared state is a concurrent.futures.Future, so sync endpoints (threadpool threads) and
+async endpoints (the event loop) can lead or follow each other: threads block on the future,
+coroutines await it without blocking the loop. Coalescing is per worker process.
+"""
+
+import asyncio
+import functools
+import json
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, Dict, Hashable
+
+from pydantic import BaseModel
+
+
+def request_key(name: str, request: BaseModel) -> tuple:
+    return name, json.dumps(request.model_dump(mode="json"), sort_keys=True)
+
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers with the key share its outcome"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _join(self, key: Hashable):
+        """(future, is_leader) for key; the leader must call _finish"""
+        with self._lock:
+            stats = self._stats.setdefault(key[0] if isinstance(key, tuple) else str(key), {"leaders": 0, "followers": 0})
+            future = self._calls.get(key)
+            if future is not None:
+                stats["followers"] += 1
+                return future, False
+            future = self._calls[key] = Future()
+            stats["leaders"] += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            del self._calls[key]
+        if isinstance(error, asyncio.CancelledError):
+            # The leader's client went away; its followers did not, so one of them runs it again
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except CancelledError:
+                continue
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Like do, for a coroutine function fn"""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this request itself was cancelled
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """{name: {"leaders": n, "followers": n}}; followers are the requests that did not run"""
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+
+flights = SingleFlight()
+
+
+def coalesce(name: str, request_arg: str = "request", flight: SingleFlight = flights):
+    """
+    Endpoint decorator: concurrent calls whose `request_arg` body model is identical share one
+    run. Other arguments (the db session, ...) come from the leader's call.
+    """
+
+    def decorator(endpoint):
+        if asyncio.iscoroutinefunction(endpoint):
+
+            @functools.wraps(endpoint)
+            async def async_wrapper(*args, **kwargs):
+                key = request_key(name, kwargs[request_arg])
+                return await flight.do_async(key, lambda: endpoint(*args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            key = request_key(name, kwargs[request_arg])
+            return flight.do(key, lambda: endpoint(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,80 @@
+"""
+Arrow record batches from query results, for Parquet snapshots (tools/export_parquet.py).
+
+Rows are read through a streaming result in batches of batch_size and converted column by
+column, so memory holds one batch whatever the result size. Arrow types follow the model
+column types in app/models.py; Numeric columns become float64, as the services read them.
+
+pyarrow is imported on first use; the API imports this module without paying for it.
+"""
+
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, String
+
+
+def arrow_type(column_type):
+    import pyarrow as pa
+
+    # Float subclasses Numeric, so it comes first
+    for sql_type, arrow in (
+        (Boolean, pa.bool_()),
+        (Integer, pa.int64()),
+        (Float, pa.float64()),
+        (Numeric, pa.float64()),
+        (DateTime, pa.timestamp("us")),
+        (Date, pa.date32()),
+        (String, pa.string()),
+    ):
+        if isinstance(column_type, sql_type):
+            return arrow
+    return pa.string()
+
+
+def arrow_schema(columns: Iterable[Tuple[str, object]]):
+    """Arrow schema for (name, SQLAlchemy type) pairs"""
+    import pyarrow as pa
+
+    return pa.schema([(name, arrow_type(column_type)) for name, column_type in columns])
+
+
+def table_schema(table):
+    return arrow_schema((column.name, column.type) for column in table.columns)
+
+
+def _to_float(values: Sequence) -> List:
+    return [float(value) if isinstance(value, Decimal) else value for value in values]
+
+
+def column_array(values: Sequence, arrow_type):
+    """Arrow array of one column; values are only converted one by one when pyarrow cannot take them"""
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    if pa.types.is_floating(arrow_type):
+        # Decimals (Postgres NUMERIC) convert as a decimal column, then cast in one go
+        try:
+            return pa.array(values).cast(arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            values = _to_float(values)
+    elif pa.types.is_string(arrow_type):
+        values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+    return pa.array(values, type=arrow_type)
+
+
+def record_batch(rows: Sequence[Sequence], schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = [column_array(values, arrow_field.type) for values, arrow_field in zip(columns, schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def record_batches(result, schema, batch_size: int = 50_000) -> Iterator:
+    """Record batches of a (streaming) result whose columns are those of schema, in order"""
+    for rows in result.partitions(batch_size):
+        yield record_batch(rows, schema)
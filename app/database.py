@@ -1,14 +1,321 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+import itertools
+import logging
 import os
+import sqlite3
+import threading
+import time
 from dotenv import load_dotenv
 
+from . import settings
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Every table lives in this schema; on SQLite it is an attached database file
+GOLD_SCHEMA = "phw_dev_gold"
+
+# Postgres SQLSTATE query_canceled, raised when statement_timeout expires
+QUERY_CANCELED = "57014"
+
+# SQLite has no statement_timeout; a progress handler checks the deadline every N VM steps
+SQLITE_PROGRESS_STEPS = 10_000
+
+
+def sqlite_schema_path(database_path: str) -> str:
+    """File holding the gold schema next to a SQLite database ('perf.db' -> 'perf.phw_dev_gold.db')"""
+    if not database_path or database_path == ":memory:":
+        return ":memory:"
+    root, ext = os.path.splitext(database_path)
+    return f"{root}.{GOLD_SCHEMA}{ext or '.db'}"
+
+
+class PoolMonitor:
+    """
+    Tracks how close an engine's pool gets to its capacity (pool size + max overflow).
+
+    Checkouts that take the last free connection are counted as saturated (the next request
+    waits), waits on this pool that end in a pool timeout are counted as timeouts, and a warning
+    is logged at most once a minute while the pool is saturated.
+    """
+
+    WARN_INTERVAL_SECONDS = 60
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.saturated_checkouts = 0
+        self.timeouts = 0
+        self._last_warning = 0.0
+        self._lock = threading.Lock()
+        event.listen(engine, "checkout", self._on_checkout)
+        # dispose() replaces the pool
+        event.listen(engine, "engine_disposed", lambda disposed: self._watch_timeouts(disposed.pool))
+        self._watch_timeouts(engine.pool)
+        engine.pool_monitor = self
+
+    @property
+    def pool(self):
+        return self.engine.pool
+
+    def _watch_timeouts(self, pool):
+        """Count the pool's checkout timeouts; the pool has no event for them"""
+        connect = pool.connect
+
+        def watched_connect():
+            try:
+                return connect()
+            except exc.TimeoutError:
+                self.record_timeout()
+                raise
+
+        pool.connect = watched_connect
+
+    def capacity(self):
+        """Most connections the pool will open, or None for pools without a limit"""
+        size = getattr(self.pool, "size", None)
+        max_overflow = getattr(self.pool, "_max_overflow", None)
+        if not callable(size) or max_overflow is None or max_overflow < 0:
+            return None
+        return size() + max_overflow
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        checked_out = self.pool.checkedout() if hasattr(self.pool, "checkedout") else 0
+        capacity = self.capacity()
+        saturated = capacity is not None and checked_out >= capacity
+        with self._lock:
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            if saturated:
+                self.saturated_checkouts += 1
+        if saturated:
+            self._warn(f"Connection pool saturated: {checked_out}/{capacity} connections in use")
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+        self._warn(f"Gave up waiting {getattr(self.pool, '_timeout', '?')}s for a pooled connection")
+
+    def _warn(self, message: str):
+        now = time.monotonic()
+        if now - self._last_warning >= self.WARN_INTERVAL_SECONDS:
+            self._last_warning = now
+            logger.warning(message)
+
+    def status(self) -> dict:
+        checked_out = self.pool.checkedout() if hasattr(self.pool, "checkedout") else None
+        capacity = self.capacity()
+        return {
+            "checked_out": checked_out,
+            "capacity": capacity,
+            "utilization": (checked_out / capacity) if capacity and checked_out is not None else None,
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "saturated_checkouts": self.saturated_checkouts,
+            "timeouts": self.timeouts,
+        }
+
+
+def make_engine(database_url: str, database_settings: settings.DatabaseSettings = None, **kwargs):
+    """
+    Create an engine for database_url with the pool settings from app/settings.py (keyword
+    arguments win). Postgres is used as-is; SQLite (local test data, see
+    tools/generate_gold_data.py) gets the gold schema attached and DATE/TIMESTAMP columns
+    returned as date/datetime objects like psycopg2 does.
+    """
+    database_settings = database_settings or settings.database
+    kwargs = {**database_settings.engine_kwargs(database_url), **kwargs}
+    if not database_url.startswith("sqlite"):
+        engine = create_engine(database_url, **kwargs)
+        PoolMonitor(engine)
+        return engine
+
+    connect_args = kwargs.pop("connect_args", {})
+    connect_args.setdefault("detect_types", sqlite3.PARSE_DECLTYPES)
+    connect_args.setdefault("check_same_thread", False)
+    engine = create_engine(database_url, connect_args=connect_args, native_datetime=True, **kwargs)
+    schema_path = sqlite_schema_path(engine.url.database)
+
+    @event.listens_for(engine, "connect")
+    def attach_gold_schema(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"ATTACH DATABASE ? AS {GOLD_SCHEMA}", (schema_path,))
+
+    @event.listens_for(engine, "checkin")
+    def clear_statement_deadline(dbapi_connection, connection_record):
+        if dbapi_connection is not None:
+            dbapi_connection.set_progress_handler(None, 0)
+
+    PoolMonitor(engine)
+    return engine
+
+
+def set_statement_timeout(session: Session, timeout_ms: int):
+    """Limit every statement in the session's transactions to timeout_ms (0: no limit)"""
+    session.info["statement_timeout_ms"] = timeout_ms
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if not timeout_ms:
+        return
+    dbapi_connection = connection.connection.dbapi_connection
+    if connection.dialect.name == "postgresql":
+        # SET LOCAL ends with the transaction, so the pooled connection goes back unchanged;
+        # issued on the raw cursor so it is not counted as one of the request's queries
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+    elif connection.dialect.name == "sqlite":
+        # Approximation for local data: one deadline for the whole transaction
+        deadline = time.monotonic() + timeout_ms / 1000
+        dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+
+
+def is_statement_timeout(error: exc.DBAPIError) -> bool:
+    """True for a statement cancelled by statement_timeout (or the SQLite deadline)"""
+    original = getattr(error, "orig", None)
+    if getattr(original, "pgcode", None) == QUERY_CANCELED:
+        return True
+    return isinstance(original, sqlite3.OperationalError) and str(original) == "interrupted"
+
+
+class ReplicaState:
+    """Health of one read replica: pinged at most every health_interval, skipped retry_interval after a failure"""
+
+    def __init__(self, engine, health_interval: float, retry_interval: float):
+        self.engine = engine
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.health_interval = health_interval
+        self.retry_interval = retry_interval
+        self.healthy = True
+        self.checked_at = None
+        self.retry_at = 0.0
+        self.reads = 0
+        self.failures = 0
+        self._checking = threading.Lock()
+        event.listen(engine, "handle_error", self._on_error)
+
+    def available(self) -> bool:
+        now = time.monotonic()
+        if self.healthy and self.checked_at is not None and now - self.checked_at < self.health_interval:
+            return True
+        if not self.healthy and now < self.retry_at:
+            return False
+        # One thread pings; the others go on with the last known state
+        if not self._checking.acquire(blocking=False):
+            return self.healthy and self.checked_at is not None
+        try:
+            self._ping()
+        finally:
+            self._checking.release()
+        return self.healthy
+
+    def _ping(self):
+        # Raw DBAPI connection, so the ping is not counted as one of the request's queries
+        try:
+            connection = self.engine.raw_connection()
+            try:
+                cursor = connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            finally:
+                connection.close()
+        except Exception as error:
+            self.mark_down(error)
+            return
+        if not self.healthy:
+            logger.warning(f"Read replica {self.name} is back")
+        self.healthy = True
+        self.checked_at = time.monotonic()
+
+    def mark_down(self, error):
+        if self.healthy:
+            logger.warning(f"Read replica {self.name} failed, reading elsewhere for {self.retry_interval:.0f}s: {error}")
+        self.healthy = False
+        self.failures += 1
+        self.retry_at = time.monotonic() + self.retry_interval
+
+    def _on_error(self, context):
+        # Lost connections and failed connects; ordinary SQL errors say nothing about the replica
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(context.original_exception)
+
+
+class ReplicaRouter:
+    """
+    Picks the engine for reporting reads: replicas round-robin, skipping unhealthy ones, and the
+    primary when there are no replicas or none is available.
+    """
+
+    def __init__(self, primary, replicas=(), health_interval: float = 5.0, retry_interval: float = 30.0):
+        self.primary = primary
+        self.replicas = [ReplicaState(replica, health_interval, retry_interval) for replica in replicas]
+        self.primary_reads = 0
+        self._turn = itertools.count()
+
+    @property
+    def replica_engines(self):
+        return [replica.engine for replica in self.replicas]
+
+    def read_engine(self):
+        if self.replicas:
+            start = next(self._turn)
+            for offset in range(len(self.replicas)):
+                replica = self.replicas[(start + offset) % len(self.replicas)]
+                if replica.available():
+                    replica.reads += 1
+                    return replica.engine
+        self.primary_reads += 1
+        return self.primary
+
+    def status(self) -> dict:
+        return {
+            "primary_reads": self.primary_reads,
+            "replicas": [
+                {"name": r.name, "healthy": r.healthy, "reads": r.reads, "failures": r.failures} for r in self.replicas
+            ],
+        }
+
+
+class RoutingSession(Session):
+    """
+    Session whose reads go to the router's read engine, chosen once per session so a request
+    sees one consistent database. Flushes and INSERT/UPDATE/DELETE statements, and sessions
+    marked with use_primary(), use the primary.
+    """
+
+    def __init__(self, *args, router: ReplicaRouter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.router = router
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.router is None or self.info.get("use_primary") or self._flushing or isinstance(clause, UpdateBase):
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        read_engine = self.info.get("read_engine")
+        if read_engine is None:
+            read_engine = self.info["read_engine"] = self.router.read_engine()
+        return read_engine
+
+
+def use_primary(session: Session):
+    """Send every statement of this session to the primary (e.g. reads that must see a load just committed)"""
+    session.info["use_primary"] = True
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
+router = ReplicaRouter(
+    engine,
+    [make_engine(url) for url in settings.database.replica_urls],
+    health_interval=settings.database.replica_health_interval,
+    retry_interval=settings.database.replica_retry_interval,
+)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, router=router)
 
 Base = declarative_base()
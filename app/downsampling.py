@@ -0,0 +1,144 @@
+"""
+Resampling and shape-preserving downsampling for long time series.
+
+Series are handled as aligned columns: one ascending list of dates plus one value column
+per series (None where a series has no value on that date). Downsampling picks the same
+dates for every column so the series stay aligned.
+"""
+
+import warnings
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .cache import to_date
+from .performance_metrics import forward_fill
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+
+def align_series(series: Dict[str, Dict[str, float]]) -> dict:
+    """
+    Turn {name: {'YYYY-MM-DD': value}} into aligned columns:
+    {"dates": [...], "columns": {name: [value or None, ...]}} on the union of all dates.
+    """
+    dates = sorted({day for values in series.values() for day in values})
+    columns = {name: [values.get(day) for day in dates] for name, values in series.items()}
+    return {"dates": dates, "columns": columns}
+
+
+def resample(dates: List[str], columns: Dict[str, List[Optional[float]]], frequency: str) -> dict:
+    """
+    Keep one point per week (ISO week) or month: the last date of each period, with each
+    column's last known value inside that period. 'daily' returns the input unchanged.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency '{frequency}', expected one of {FREQUENCIES}")
+    if frequency == "daily" or not dates:
+        return {"dates": dates, "columns": columns}
+
+    def period_of(day: str):
+        parsed = to_date(day)
+        if frequency == "weekly":
+            iso = parsed.isocalendar()
+            return (iso[0], iso[1])
+        return (parsed.year, parsed.month)
+
+    period_ends = []
+    for i, day in enumerate(dates):
+        if i + 1 == len(dates) or period_of(dates[i + 1]) != period_of(day):
+            period_ends.append(i)
+
+    resampled = {}
+    for name, values in columns.items():
+        out = []
+        period_start = 0
+        for end in period_ends:
+            last = None
+            for value in values[period_start : end + 1]:
+                if value is not None:
+                    last = value
+            out.append(last)
+            period_start = end + 1
+        resampled[name] = out
+
+    return {"dates": [dates[i] for i in period_ends], "columns": resampled}
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets point selection shared by several series.
+
+    - x: (n,) ascending positions
+    - y: (n_series, n) values; NaNs are ignored
+    Each series' triangle areas are scaled by that series' value range and summed, so one
+    set of indices preserves the visible shape of every series. First and last points are kept.
+    """
+    n = x.shape[0]
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows
+        spans = np.nanmax(y, axis=1) - np.nanmin(y, axis=1)
+    spans = np.where((spans > 0) & np.isfinite(spans), spans, 1.0)
+    y = np.nan_to_num(y / spans[:, None])
+    x = np.asarray(x, dtype=float)
+
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    anchor = 0
+
+    for bucket in range(threshold - 2):
+        start = int(np.floor(bucket * every)) + 1
+        end = min(int(np.floor((bucket + 1) * every)) + 1, n - 1)
+        next_start = end
+        next_end = min(int(np.floor((bucket + 2) * every)) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[:, next_start:next_end].mean(axis=1)
+
+        ax, ay = x[anchor], y[:, anchor]
+        areas = np.abs((ax - avg_x) * (y[:, start:end] - ay[:, None]) - (ax - x[start:end])[None, :] * (avg_y - ay)[:, None])
+        anchor = start + int(np.argmax(areas.sum(axis=0)))
+        selected[bucket + 1] = anchor
+
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample(dates: List[str], columns: Dict[str, List[Optional[float]]], max_points: Optional[int]) -> dict:
+    """Reduce aligned columns to at most max_points dates with multi-series LTTB"""
+    if not max_points or len(dates) <= max_points:
+        return {"dates": dates, "columns": columns}
+
+    x = np.array([to_date(day).toordinal() for day in dates], dtype=float)
+    y = np.array([[np.nan if v is None else float(v) for v in values] for values in columns.values()], dtype=float)
+    # Fill gaps forward so a missing value does not read as a drop to zero
+    if y.size:
+        y = forward_fill(y)
+
+    keep = lttb_indices(x, y, max_points)
+    return {
+        "dates": [dates[i] for i in keep],
+        "columns": {name: [values[i] for i in keep] for name, values in columns.items()},
+    }
+
+
+def shape_series(series: Dict[str, Dict[str, float]], frequency: str = "daily", max_points: Optional[int] = None) -> dict:
+    """Align, resample and downsample a set of {date: value} series into aligned columns"""
+    aligned = align_series(series)
+    resampled = resample(aligned["dates"], aligned["columns"], frequency)
+    return downsample(resampled["dates"], resampled["columns"], max_points)
+
+
+def columns_to_dicts(dates: Sequence[str], columns: Dict[str, List[Optional[float]]]) -> Dict[str, Dict[str, float]]:
+    """Inverse of align_series, dropping missing values"""
+    return {
+        name: {day: value for day, value in zip(dates, values) if value is not None}
+        for name, values in columns.items()
+    }
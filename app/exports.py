@@ -0,0 +1,162 @@
+"""
+Bulk exports for notebooks (POST /export/): fact_holdings_all with its account and security
+columns, or fact_transactions, for a date range and account set, as an Arrow IPC stream or a
+Parquet file.
+
+Rows come through a server-side cursor EXPORT_BATCH_SIZE at a time, become one Arrow record
+batch (app/columnar.py) and are written to the response before the next fetch, so a worker holds
+one batch whatever the export size. NUMERIC columns are cast to double precision in the query,
+so each column converts to Arrow in one call instead of value by value. Rows are ordered by
+account and then day, the order of the (AccountCode, AsofDate / TradeDate) indexes, so Postgres
+streams them without a sort. Account and security columns carry the snake_case names the Sankey
+levels use.
+
+An error after the first bytes cuts the response short; the Arrow stream then lacks its
+end-of-stream marker and the Parquet file its footer, so readers fail instead of returning part
+of the rows.
+"""
+
+from typing import Iterator, List
+
+from sqlalchemy import Float, Numeric, cast, select
+
+from . import models, queries, schemas, settings
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+MEDIA_TYPES = {"arrow": ARROW_MEDIA_TYPE, "parquet": PARQUET_MEDIA_TYPE}
+EXTENSIONS = {"arrow": "arrows", "parquet": "parquet"}
+
+# Joined into the holdings export, named as in get_database_column_mapping()
+HOLDINGS_ACCOUNT_COLUMNS = ("AccountType", "AccountCurrencyCode", "CustodianCode", "IsRegisteredAccount")
+HOLDINGS_SECURITY_COLUMNS = (
+    "security_name",
+    "security_symbol",
+    "security_type_code",
+    "security_country",
+    "security_currency_code",
+    "asset_class",
+    "AssetClassLevel1Name",
+    "AssetClassLevel2Name",
+    "AssetClassLevel3Name",
+    "industry_group",
+    "issuer",
+)
+# Lineage columns left out of every export
+EXCLUDED_COLUMNS = ("rawFile",)
+
+
+def _api_name(column_name: str) -> str:
+    names = {database: api for api, database in queries.get_database_column_mapping().items()}
+    return names.get(column_name, queries.camel_to_snake(column_name))
+
+
+def _export_column(column, name: str):
+    # NUMERIC is read as double precision, as it is exported: drivers hand over floats, not
+    # Decimals that would be converted one by one
+    if isinstance(column.type, Numeric) and not isinstance(column.type, Float):
+        return cast(column, Float).label(name)
+    return column.label(name)
+
+
+def _fact_columns(table) -> List:
+    return [_export_column(column, column.name) for column in table.columns if column.name not in EXCLUDED_COLUMNS]
+
+
+def holdings_export_query(account_codes: List[str], start_date, end_date):
+    holdings = models.FactHoldingsAll.__table__
+    accounts = models.DimAccount.__table__
+    securities = models.DimSecurityMaster.__table__
+    statement = (
+        select(
+            *_fact_columns(holdings),
+            *(_export_column(accounts.c[name], _api_name(name)) for name in HOLDINGS_ACCOUNT_COLUMNS),
+            *(_export_column(securities.c[name], _api_name(name)) for name in HOLDINGS_SECURITY_COLUMNS),
+        )
+        .select_from(
+            holdings.outerjoin(accounts, holdings.c.AccountCode == accounts.c.AccountCode).outerjoin(
+                securities, holdings.c.SecurityCode == securities.c.security_code
+            )
+        )
+        .where(holdings.c.AccountCode.in_(account_codes), holdings.c.AsofDate.between(start_date, end_date))
+        .order_by(holdings.c.AccountCode, holdings.c.AsofDate)
+    )
+    return queries.named("holdings_export_query", statement)
+
+
+def transactions_export_query(account_codes: List[str], start_date, end_date):
+    transactions = models.FactTransaction.__table__
+    statement = (
+        select(*_fact_columns(transactions))
+        .where(transactions.c.AccountCode.in_(account_codes), transactions.c.TradeDate.between(start_date, end_date))
+        .order_by(transactions.c.AccountCode, transactions.c.TradeDate)
+    )
+    return queries.named("transactions_export_query", statement)
+
+
+def export_query(request: schemas.ExportRequest):
+    build = holdings_export_query if request.dataset == "holdings" else transactions_export_query
+    return build(request.account_codes, request.start_date, request.end_date)
+
+
+def filename(request: schemas.ExportRequest) -> str:
+    return f"{request.dataset}_{request.start_date}_{request.end_date}.{EXTENSIONS[request.format]}"
+
+
+class _Chunks:
+    """Write-only file collecting what pyarrow writes until it is taken for the response"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream(db, request: schemas.ExportRequest, export_settings: settings.ExportSettings = None) -> Iterator[bytes]:
+    """
+    Response body of an export, one chunk per record batch. The query runs here, so connection
+    and statement errors are raised before the response starts.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from .columnar import arrow_schema
+
+    export_settings = export_settings or settings.exports
+    statement = export_query(request)
+    schema = arrow_schema((column.name, column.type) for column in statement.selected_columns)
+    result = db.execute(
+        statement, execution_options={"stream_results": True, "yield_per": export_settings.batch_size}
+    )
+    sink = _Chunks()
+    if request.format == "parquet":
+        compression = None if export_settings.parquet_compression == "none" else export_settings.parquet_compression
+        writer = pq.ParquetWriter(sink, schema, compression=compression)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    return _write(result, writer, sink, schema, export_settings.batch_size)
+
+
+def _write(result, writer, sink: _Chunks, schema, batch_size: int) -> Iterator[bytes]:
+    from .columnar import record_batches
+
+    try:
+        for batch in record_batches(result, schema, batch_size):
+            writer.write_batch(batch)
+            yield sink.take()
+        writer.close()
+        yield sink.take()
+    finally:
+        result.close()
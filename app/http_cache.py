@@ -0,0 +1,226 @@
+"""
+HTTP conditional requests for report endpoints.
+
+Holdings for a past as_of_date and attribution for a closed period only change when the gold
+layer is reloaded. With @conditional on an endpoint, every response carries a strong ETag
+derived from the request body and the latest ProcessedTimestampEST of the tables the report
+reads, and a request whose If-None-Match names the current ETag gets a 304 without the report
+being computed.
+
+The load times are cached for HTTP_CACHE_VERSION_TTL seconds, so revalidating costs no query
+most of the time; after a reload, ETags change within that interval. Reports ending before
+today may be reused by the client for HTTP_CACHE_MAX_AGE seconds; reports that include today
+must be revalidated on every use.
+
+The endpoints are POSTs, so browsers and proxies do not cache them on their own: clients
+keep the body and ETag and send If-None-Match themselves.
+
+Responses are compressed by GZipMiddleware below, which gives the gzip bytes of a report their
+own strong ETag ("x" becomes "x-gzip"); either form revalidates the report.
+
+REPORTS holds reports computed ahead of the first request by the precompute scheduler
+(app/precompute.py), keyed by the ETag the request would get: a request whose ETag is there is
+answered from it without running the report, and a reload changes every ETag, so an entry is
+never served for data it was not computed from.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+from datetime import date
+from typing import Callable, Dict, Iterable, Optional
+
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware import gzip
+
+from . import analytics, queries, settings
+from .cache import TTLCache, to_date
+from .coalescing import request_key
+
+# {table or (snapshot, table): latest ProcessedTimestampEST as text}
+DATA_VERSIONS = TTLCache("data_versions", maxsize=64, ttl_seconds=settings.http_cache.version_ttl)
+
+# {ETag: report} of precomputed JSON reports
+REPORTS = TTLCache("precomputed_reports", maxsize=settings.precompute.cache_size, ttl_seconds=settings.precompute.cache_ttl)
+
+# Tables whose load time stands for each report; fact_daily_aggregate_values(_slp) have no
+# ProcessedTimestampEST and are loaded with fact_holdings_all
+HOLDINGS_TABLES = ("fact_holdings_all", "dim_accounts", "dim_securitymaster")
+ATTRIBUTION_TABLES = ("fact_holdings_all", "fact_transactions", "fx_rate", "dim_securitymaster")
+
+
+def data_version(db, table: str) -> str:
+    # A Parquet snapshot (ANALYTICS_ENGINE=duckdb) has its own load times
+    snapshot = analytics.snapshot_of(db)
+    key = table if snapshot is None else (snapshot, table)
+    version = DATA_VERSIONS.get(key)
+    if version is None:
+        version = str(db.execute(queries.get_data_version_query(table)).scalar())
+        DATA_VERSIONS.set(key, version)
+    return version
+
+
+def make_etag(key, versions: Iterable[str], release: str = "") -> str:
+    digest = hashlib.sha256(repr((key, tuple(versions), release)).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+# {endpoint name: (tables, representation)} of the endpoints decorated with @conditional
+ENDPOINTS: Dict[str, tuple] = {}
+
+
+def report_etag(name: str, request, db, accept: Optional[str] = None, config: settings.HttpCacheSettings = None) -> str:
+    """ETag of the @conditional endpoint name's response to request, with this Accept header"""
+    config = config or settings.http_cache
+    tables, representation = ENDPOINTS[name]
+    # Versions are read before the report runs: a reload during the run leaves an ETag
+    # that no longer matches, never a current ETag on stale data
+    versions = [data_version(db, table) for table in tables]
+    key = request_key(name, request)
+    if representation is not None:
+        key = (*key, representation(accept))
+    return make_etag(key, versions, config.release)
+
+
+def encoded_etag(etag: str, encoding: str = "gzip") -> str:
+    """ETag of the encoding's bytes of the report etag names: "x" -> "x-gzip" """
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _candidates(if_none_match: str):
+    return [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so W/"x" matches "x"; "x-gzip" matches too"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate in (etag, encoded_etag(etag)) for candidate in _candidates(if_none_match))
+
+
+def cache_control(last_day: Optional[date], max_age: int) -> str:
+    if last_day is not None and last_day < date.today():
+        return f"private, max-age={max_age}, must-revalidate"
+    return "private, no-cache"
+
+
+def conditional(
+    name: str,
+    tables: Iterable[str],
+    last_day: Callable = lambda request: None,
+    request_arg: str = "request",
+    db_arg: str = "db",
+    http_cache_settings: settings.HttpCacheSettings = None,
+    representation: Optional[Callable] = None,
+):
+    """
+    Endpoint decorator adding ETag and Cache-Control to responses, and answering a matching
+    If-None-Match with 304. last_day(request) is the last date the report covers. For endpoints
+    that answer in more than one format, representation(accept header) names the format; it is
+    part of the ETag, and responses carry Vary: Accept. A report precomputed under the request's
+    ETag (REPORTS) is returned without calling the endpoint.
+
+    The endpoint gains two keyword-only parameters, http_request and http_response, that
+    FastAPI fills in; the wrapped function is called without them.
+    """
+    ENDPOINTS[name] = (tuple(tables), representation)
+
+    def validators(http_request: Request, kwargs) -> Optional[Dict[str, str]]:
+        config = http_cache_settings or settings.http_cache
+        if not config.enabled:
+            return None
+        request = kwargs[request_arg]
+        day = last_day(request)
+        headers = {
+            "ETag": report_etag(name, request, kwargs[db_arg], http_request.headers.get("accept"), config),
+            "Cache-Control": cache_control(None if day is None else to_date(day), config.max_age),
+        }
+        if representation is not None:
+            headers["Vary"] = "Accept"
+        return headers
+
+    def precomputed(headers: Optional[Dict[str, str]]):
+        return None if headers is None else REPORTS.get(headers["ETag"])
+
+    def add_headers(result, http_response: Response, headers: Optional[Dict[str, str]]):
+        # A Response returned by the endpoint (a stream) is sent as is, without http_response's headers
+        target = result if isinstance(result, Response) else http_response
+        target.headers.update(headers or {})
+
+    def not_modified(http_request: Request, headers: Optional[Dict[str, str]]) -> Optional[Response]:
+        if headers is not None and etag_matches(http_request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        return None
+
+    def decorator(endpoint):
+        if asyncio.iscoroutinefunction(endpoint):
+
+            @functools.wraps(endpoint)
+            async def async_wrapper(*args, http_request: Request, http_response: Response, **kwargs):
+                headers = await run_in_threadpool(validators, http_request, kwargs)
+                response = not_modified(http_request, headers)
+                if response is not None:
+                    return response
+                result = precomputed(headers)
+                if result is None:
+                    result = await endpoint(*args, **kwargs)
+                add_headers(result, http_response, headers)
+                return result
+
+            wrapper = async_wrapper
+        else:
+
+            @functools.wraps(endpoint)
+            def wrapper(*args, http_request: Request, http_response: Response, **kwargs):
+                headers = validators(http_request, kwargs)
+                response = not_modified(http_request, headers)
+                if response is not None:
+                    return response
+                result = precomputed(headers)
+                if result is None:
+                    result = endpoint(*args, **kwargs)
+                add_headers(result, http_response, headers)
+                return result
+
+        signature = inspect.signature(endpoint)
+        extra = [
+            inspect.Parameter("http_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            inspect.Parameter("http_response", inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ]
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), *extra])
+        return wrapper
+
+    return decorator
+
+
+class GZipMiddleware(gzip.GZipMiddleware):
+    """
+    Starlette's GZipMiddleware, with the ETag of a gzip-encoded response changed to its
+    encoded_etag: a strong ETag names one sequence of bytes. A 304 carries the form of the
+    ETag that the request's If-None-Match sent.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await super().__call__(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match")
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                if etag is not None and etag.endswith('"'):
+                    encoded = encoded_etag(etag)
+                    if headers.get("content-encoding") == "gzip" or (
+                        message["status"] == 304 and if_none_match and encoded in _candidates(if_none_match)
+                    ):
+                        headers["ETag"] = encoded
+            await send(message)
+
+        await super().__call__(scope, receive, send_with_etag)
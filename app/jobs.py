@@ -0,0 +1,409 @@
+"""
+Background jobs for reports that can outlast the gateway timeout.
+
+POST /jobs/performance_attribution_sankey/ and /jobs/performance_benchmark/ take the body of the
+synchronous endpoint and answer 202 with a job id at once. GET /jobs/{id} reports status, stage
+and progress (?wait=N long-polls until the job finishes or N seconds pass), GET
+/jobs/{id}/result returns the report exactly as the synchronous endpoint would, and DELETE
+/jobs/{id} cancels it.
+
+- Workers: a bounded pool of JOB_WORKERS processes per API worker (JOB_EXECUTOR=process, the
+  default), so CPU-bound attribution does not compete with request handling for the GIL;
+  JOB_EXECUTOR=thread runs jobs in threads instead. At most JOB_MAX_PENDING jobs wait or run
+  per API worker; beyond that a submit gets a 503.
+- Store: a SQLite file (JOB_STORE_PATH) shared by the API and its workers holds each job's
+  request, status, stage and JSON result. A finished job is removed JOB_RESULT_TTL seconds
+  after it finishes.
+- Progress: the services call progress(fraction, stage) before each stage. The worker records
+  it and, once the job was cancelled, raises JobCancelled there, so a running job stops at the
+  next stage; a queued job is cancelled before it starts.
+- A job left queued or running by an API worker that no longer exists reads as failed.
+
+The pool and the store are created on the first submit, so importing the app stays free of I/O.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from . import schemas, settings
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Seconds between store reads while GET /jobs/{id}?wait= long-polls
+POLL_INTERVAL = 0.25
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    stage TEXT,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_expires_at ON jobs (expires_at);
+"""
+STATUS_COLUMNS = "job_id, kind, status, progress, stage, error, cancel_requested, owner_pid, created_at, updated_at, expires_at"
+
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once the job was cancelled"""
+
+
+class JobQueueFull(Exception):
+    """JOB_MAX_PENDING jobs are already queued or running in this API worker"""
+
+
+class JobStore:
+    """Jobs in a SQLite file. Every call opens its own connection, so threads and processes can share it."""
+
+    def __init__(self, path: str, result_ttl: float):
+        self.path = path
+        self.result_ttl = result_ttl
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def create_schema(self):
+        with closing(self._connect()) as connection:
+            # Readers (status polls) do not wait for the workers' progress writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def create(self, kind: str, request: dict) -> dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO jobs (job_id, kind, status, request, owner_pid, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(request), os.getpid(), now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """The job without its request and result, or None if unknown or expired"""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                f"SELECT {STATUS_COLUMNS} FROM jobs WHERE job_id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (job_id, time.time()),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def request(self, job_id: str) -> Optional[dict]:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT request FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["request"]) if row is not None else None
+
+    def result(self, job_id: str) -> Optional[str]:
+        """The JSON result of a job that succeeded"""
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT result FROM jobs WHERE job_id = ? AND status = ? AND expires_at >= ?", (job_id, SUCCEEDED, time.time())
+            ).fetchone()
+        return row["result"] if row is not None else None
+
+    def start(self, job_id: str) -> bool:
+        """Mark a queued job running; False (and the job cancelled) if it was cancelled meanwhile"""
+        with closing(self._connect()) as connection:
+            started = connection.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ? AND status = ? AND cancel_requested = 0",
+                (RUNNING, time.time(), job_id, QUEUED),
+            ).rowcount
+        if not started:
+            self.finish(job_id, CANCELLED)
+        return bool(started)
+
+    def progress(self, job_id: str, fraction: float, stage: str) -> bool:
+        """Record progress; False once the job was cancelled"""
+        with closing(self._connect()) as connection:
+            return bool(
+                connection.execute(
+                    "UPDATE jobs SET progress = ?, stage = ?, updated_at = ? WHERE job_id = ? AND cancel_requested = 0",
+                    (fraction, stage, time.time(), job_id),
+                ).rowcount
+            )
+
+    def finish(self, job_id: str, status: str, result: str = None, error: str = None):
+        """Record the outcome of an unfinished job; it expires result_ttl seconds from now"""
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute(
+                f"UPDATE jobs SET status = ?, result = ?, error = ?, progress = CASE WHEN ? = '{SUCCEEDED}' THEN 1 ELSE progress END, "
+                f"updated_at = ?, expires_at = ? WHERE job_id = ? AND status IN ('{QUEUED}', '{RUNNING}')",
+                (status, result, error, status, now, now + self.result_ttl, job_id),
+            )
+
+    def request_cancel(self, job_id: str):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                f"UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE job_id = ? AND status IN ('{QUEUED}', '{RUNNING}')",
+                (time.time(), job_id),
+            )
+
+    def purge_expired(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute("DELETE FROM jobs WHERE expires_at < ?", (time.time(),)).rowcount
+
+
+def _attribution(db, request: schemas.PerformanceAttributionRequest, progress):
+    from . import services
+
+    return services.PerformanceSankeyService(db).generate_sankey_data(
+        start_date=request.start_date,
+        end_date=request.end_date,
+        account_codes=request.account_codes,
+        fx_method=request.fx_method,
+        include_securities=request.include_securities,
+        top_k=request.top_k,
+        progress=progress,
+    )
+
+
+def _benchmark(db, request: schemas.BenchmarkPerformanceRequest, progress):
+    from .benchmark_service import BenchmarkService
+
+    return BenchmarkService(db).get_benchmark_performance(
+        account_codes=request.account_codes,
+        benchmark_symbols=request.benchmark_list,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        include_metrics=request.include_metrics,
+        frequency=request.frequency,
+        max_points=request.max_points,
+        layout=request.layout,
+        progress=progress,
+    )
+
+
+@dataclass(frozen=True)
+class JobKind:
+    # Synchronous endpoint the job stands in for: its statement timeout and response model apply
+    path: str
+    request_model: type
+    response_model: type
+    run: Callable  # (db, request, progress) -> report
+
+
+KINDS: Dict[str, JobKind] = {
+    "performance_attribution_sankey": JobKind(
+        "/performance_attribution_sankey/", schemas.PerformanceAttributionRequest, schemas.PerformanceAttributionResponse, _attribution
+    ),
+    "performance_benchmark": JobKind(
+        "/performance_benchmark/", schemas.BenchmarkPerformanceRequest, schemas.BenchmarkPerformanceResponse, _benchmark
+    ),
+}
+
+# Engines of the workers, by database URL
+_engines: Dict[str, object] = {}
+_engines_lock = threading.Lock()
+
+
+def _session(database_url: Optional[str], path: str):
+    """A report session like get_report_db's: the snapshot with ANALYTICS_ENGINE=duckdb, else the database"""
+    from sqlalchemy.orm import Session
+
+    from . import analytics, database
+
+    if settings.analytics.engine == "duckdb":
+        db = analytics.engines.session()
+    elif database_url is None:
+        db = database.SessionLocal()
+    else:
+        with _engines_lock:
+            if database_url not in _engines:
+                _engines[database_url] = database.make_engine(database_url)
+        db = Session(_engines[database_url])
+    database.set_statement_timeout(db, settings.database.statement_timeout_for(path))
+    return db
+
+
+def run_job(job_id: str, store_path: str, result_ttl: float, database_url: Optional[str] = None):
+    """Run one job to its end and record the outcome; runs in a pool process or thread"""
+    from fastapi.encoders import jsonable_encoder
+
+    store = JobStore(store_path, result_ttl)
+    job = store.get(job_id)
+    if job is None or not store.start(job_id):
+        return
+    kind = KINDS[job["kind"]]
+
+    def progress(fraction: float, stage: str):
+        if not store.progress(job_id, fraction, stage):
+            raise JobCancelled(job_id)
+
+    try:
+        request = kind.request_model.model_validate(store.request(job_id))
+        db = _session(database_url, kind.path)
+        try:
+            report = kind.run(db, request, progress)
+        finally:
+            db.close()
+        result = json.dumps(jsonable_encoder(kind.response_model.model_validate(report)))
+    except JobCancelled:
+        store.finish(job_id, CANCELLED)
+    except Exception as e:
+        store.finish(job_id, FAILED, error=f"{type(e).__name__}: {e}")
+    else:
+        store.finish(job_id, SUCCEEDED, result=result)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """Submits jobs to this API worker's pool and reads them back from the shared store"""
+
+    def __init__(self, job_settings: settings.JobSettings = None, database_url: str = None):
+        self.settings = job_settings or settings.jobs
+        # None: workers use the app's own sessions (DATABASE_URL, replicas)
+        self.database_url = database_url
+        self._store: Optional[JobStore] = None
+        self._executor = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {"submitted": 0, "rejected": 0}
+
+    @property
+    def store(self) -> JobStore:
+        with self._lock:
+            if self._store is None:
+                store = JobStore(self.settings.store_path, self.settings.result_ttl)
+                store.create_schema()
+                self._store = store
+            return self._store
+
+    def _pool(self):
+        if self._executor is None:
+            if self.settings.executor == "process":
+                # spawn, not fork: the API process runs threads (the threadpool, the pool monitor)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.settings.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.settings.workers, thread_name_prefix="job")
+        return self._executor
+
+    def submit(self, kind: str, request: BaseModel) -> dict:
+        store = self.store
+        with self._lock:
+            if len(self._futures) >= self.settings.max_pending:
+                self._counts["rejected"] += 1
+                raise JobQueueFull(f"{len(self._futures)} jobs are already queued or running, retry later")
+            self._counts["submitted"] += 1
+            store.purge_expired()
+            job = store.create(kind, request.model_dump(mode="json"))
+            future = self._pool().submit(run_job, job["job_id"], store.path, store.result_ttl, self.database_url)
+            self._futures[job["job_id"]] = future
+        future.add_done_callback(lambda done: self._on_done(job["job_id"], done))
+        return job
+
+    def _on_done(self, job_id: str, future: Future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        # No-ops unless the worker never recorded an outcome: cancelled before it started (by
+        # DELETE or at shutdown), or the process running it died
+        if future.cancelled():
+            job = self.store.get(job_id)
+            if job is not None and job["cancel_requested"]:
+                self.store.finish(job_id, CANCELLED)
+            else:
+                self.store.finish(job_id, FAILED, error="The API worker shut down before the job started")
+        elif future.exception() is not None:
+            error = future.exception()
+            self.store.finish(job_id, FAILED, error=f"{type(error).__name__}: {error}")
+        job = self.store.get(job_id)
+        if job is not None:
+            with self._lock:
+                self._counts[job["status"]] = self._counts.get(job["status"], 0) + 1
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job is not None and job["status"] not in FINISHED and not _alive(job["owner_pid"]):
+            self.store.finish(job_id, FAILED, error="The API worker running the job exited before it finished")
+            job = self.store.get(job_id)
+        return job
+
+    def result(self, job_id: str) -> Optional[str]:
+        return self.store.result(job_id)
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a job: at once if still queued here, else at its next stage"""
+        job = self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        self.store.request_cancel(job_id)
+        future = self._futures.get(job_id)
+        if future is not None:
+            # Succeeds while the job is queued; its done callback records the cancellation
+            future.cancel()
+        return self.store.get(job_id)
+
+    async def wait(self, job_id: str, seconds: float) -> Optional[dict]:
+        """The job once it finishes, or as it is after seconds (at most JOB_MAX_WAIT)"""
+        deadline = time.monotonic() + min(seconds, self.settings.max_wait)
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                return job
+            await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+    def stats(self) -> Dict[str, int]:
+        """Jobs submitted, rejected and finished (by status) here, and pending (queued or running)"""
+        with self._lock:
+            return dict(self._counts, pending=len(self._futures))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def status(job: dict) -> schemas.JobStatus:
+    def timestamp(value):
+        return datetime.fromtimestamp(value, tz=timezone.utc) if value is not None else None
+
+    return schemas.JobStatus(
+        job_id=job["job_id"],
+        kind=job["kind"],
+        status=job["status"],
+        progress=job["progress"],
+        stage=job["stage"],
+        error=job["error"],
+        created_at=timestamp(job["created_at"]),
+        updated_at=timestamp(job["updated_at"]),
+        expires_at=timestamp(job["expires_at"]),
+    )
+
+
+manager = JobManager()
@@ -1,14 +1,32 @@
-from fastapi import Depends, FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import exc
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from . import services, models, schemas
+from . import admission, analytics, coalescing, database, exports, http_cache, instrumentation, jobs, metrics, ndjson, precompute, services, schemas, settings, warmup
 from .database import SessionLocal, engine
 
-models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Importing this module does no I/O; connections, heavy modules and caches are loaded
+    # here, before uvicorn accepts requests (APP_WARMUP=0 to skip)
+    warmup.warm_up(engine, replicas=database.router.replica_engines)
+    # PRECOMPUTE=1: hot reports are computed after each gold-layer load, behind live requests
+    precompute.scheduler.start()
+    yield
+    precompute.scheduler.stop()
+    jobs.manager.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+# Routes report endpoint start/end so Server-Timing can split validation, compute and serialization
+app.router.route_class = instrumentation.InstrumentedRoute
 
 # Add CORS middleware to allow web requests
 app.add_middleware(
@@ -17,22 +35,85 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["Server-Timing", "ETag"],
 )
+# Report bodies (Sankey nodes/links, daily series) compress well, NDJSON streams included; Arrow
+# and Parquet exports stream uncompressed (Parquet is compressed per column already). Gzip bodies
+# get their own ETag
+app.add_middleware(
+    http_cache.GZipMiddleware,
+    minimum_size=settings.http_cache.gzip_minimum_size,
+    exclude_content_types=(*DEFAULT_EXCLUDED_CONTENT_TYPES, exports.ARROW_MEDIA_TYPE, exports.PARQUET_MEDIA_TYPE),
+)
+
+# Per-request SQL/compute/serialization timings (Server-Timing header + one JSON log line)
+instrumentation.install(app, engine, replicas=database.router.replica_engines)
+# Prometheus latency/in-flight/pool/cache/query metrics, served at GET /metrics
+metrics.install(app, engine, replicas=database.router.replica_engines)
 
 
 # Dependency
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    # Statements run under the endpoint's statement_timeout (DB_STATEMENT_TIMEOUT_MS / DB_STATEMENT_TIMEOUTS)
+    route = request.scope.get("route")
+    database.set_statement_timeout(db, settings.database.statement_timeout_for(getattr(route, "path", None)))
     try:
         yield db
     finally:
         db.close()
 
 
-@app.post("/performance_benchmark/", response_model=schemas.BenchmarkPerformanceResponse)
+def get_report_db(db: Session = Depends(get_db)):
+    """get_db, or with ANALYTICS_ENGINE=duckdb a session over the latest Parquet snapshot"""
+    if settings.analytics.engine != "duckdb":
+        yield db
+        return
+    try:
+        report_db = analytics.engines.session()
+    except analytics.SnapshotUnavailable as error:
+        raise HTTPException(status_code=503, detail=str(error))
+    try:
+        yield report_db
+    finally:
+        report_db.close()
+
+
+@app.exception_handler(exc.TimeoutError)
+async def pool_timeout_handler(request: Request, error: exc.TimeoutError):
+    """Every pooled connection stayed busy for DB_POOL_TIMEOUT seconds (counted by the pool's PoolMonitor)"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database connection pool exhausted, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(exc.OperationalError)
+async def statement_timeout_handler(request: Request, error: exc.OperationalError):
+    if not database.is_statement_timeout(error):
+        raise error
+    route = request.scope.get("route")
+    timeout_ms = settings.database.statement_timeout_for(getattr(route, "path", None))
+    return JSONResponse(status_code=504, content={"detail": f"Query exceeded the {timeout_ms} ms statement timeout"})
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Prometheus metrics for this worker process. Async so a scrape never waits for a
+    threadpool slot behind database-bound requests.
+    """
+    return Response(metrics.render(engine, router=database.router), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post("/performance_benchmark/", response_model=schemas.BenchmarkPerformanceResponse, responses=ndjson.RESPONSES)
+@precompute.learn("/performance_benchmark/")
+@admission.limit("/performance_benchmark/")
 def get_performance_benchmark(
     request: schemas.BenchmarkPerformanceRequest,
-    db: Session = Depends(get_db),
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_report_db),
 ):
     """
     Get performance benchmark data for a given set of accounts and benchmarks.
@@ -42,17 +123,58 @@ def get_performance_benchmark(
         "account_codes": ["5PXABH"],
         "benchmark_list": ["VFV.TO", "XEQT.TO"],
         "start_date": "2024-01-01",
-        "end_date": "2024-12-31"
+        "end_date": "2024-12-31",
+        "include_metrics": true,
+        "frequency": "daily",
+        "max_points": 500,
+        "layout": "columnar"
     }
+
+    With include_metrics, the response also carries time-weighted return, money-weighted IRR,
+    volatility, max drawdown and tracking error for each account, the combined portfolio and
+    each benchmark.
+
+    frequency ("daily", "weekly", "monthly") keeps the last point of each period, and max_points
+    downsamples with LTTB so long ranges keep their visible shape at a bounded size. With
+    layout "columnar" the series come back as one date array plus aligned value arrays in
+    "series" instead of per-day dict entries.
+
+    With Accept: application/x-ndjson the response streams one line per point instead:
+    {"type": "portfolio", "date", "value"}, then {"type": "benchmark", "symbol", "date", "value"}
+    as each benchmark's prices arrive, then {"type": "metrics", ...} and a final {"type": "end"}.
+    layout does not apply.
     """
     from .benchmark_service import BenchmarkService
 
+    if ndjson.accepts(accept):
+        items = BenchmarkService(db).iter_benchmark_performance(
+            account_codes=request.account_codes,
+            benchmark_symbols=request.benchmark_list,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            include_metrics=request.include_metrics,
+            frequency=request.frequency,
+            max_points=request.max_points,
+        )
+        return ndjson.response(items)
+    return _performance_benchmark(request=request, db=db)
+
+
+# A stream cannot be shared, so only JSON responses are coalesced
+@coalescing.coalesce("/performance_benchmark/")
+def _performance_benchmark(request: schemas.BenchmarkPerformanceRequest, db: Session):
+    from .benchmark_service import BenchmarkService
+
     service = BenchmarkService(db)
     data = service.get_benchmark_performance(
         account_codes=request.account_codes,
         benchmark_symbols=request.benchmark_list,
         start_date=request.start_date,
         end_date=request.end_date,
+        include_metrics=request.include_metrics,
+        frequency=request.frequency,
+        max_points=request.max_points,
+        layout=request.layout,
     )
     return data
 
@@ -106,8 +228,19 @@ def read_available_sankey_columns(request: schemas.AvailableSankeyColumnsRequest
     return services.get_available_sankey_columns(db)
 
 
-@app.post("/holdings_agg_for_sankey/", response_model=schemas.SankeyData)
-def read_holdings_for_sankey(request: schemas.SankeyRequest, db: Session = Depends(get_db)):
+# A 304 or a precomputed report is answered before admission, without taking permits
+@app.post("/holdings_agg_for_sankey/", response_model=schemas.SankeyData, responses=ndjson.RESPONSES)
+@precompute.learn("/holdings_agg_for_sankey/")
+@http_cache.conditional(
+    "/holdings_agg_for_sankey/",
+    http_cache.HOLDINGS_TABLES,
+    last_day=lambda request: request.as_of_date,
+    representation=ndjson.representation,
+)
+@admission.limit("/holdings_agg_for_sankey/")
+def read_holdings_for_sankey(
+    request: schemas.SankeyRequest, accept: Optional[str] = Header(None), db: Session = Depends(get_report_db)
+):
     """
     Get holdings data formatted for Sankey diagram visualization.
 
@@ -127,7 +260,22 @@ def read_holdings_for_sankey(request: schemas.SankeyRequest, db: Session = Depen
     }
 
     Use holdings_available_sankey_columns endpoint to get available column options.
+
+    Responses carry an ETag; sending it back as If-None-Match returns 304 (no body) until the
+    holdings are reloaded.
+
+    With Accept: application/x-ndjson the response streams one line per node ({"type": "node",
+    "label"}), then one per link ({"type": "link", "source", "target", "value"}), level by level,
+    and a final {"type": "end"}.
     """
+    if ndjson.accepts(accept):
+        items = ({"type": kind, **item} for kind, item in services.iter_holdings_sankey(db, request=request))
+        return ndjson.response(items)
+    return _holdings_for_sankey(request=request, db=db)
+
+
+@coalescing.coalesce("/holdings_agg_for_sankey/")
+def _holdings_for_sankey(request: schemas.SankeyRequest, db: Session):
     results = services.get_holdings_for_sankey(db, request=request)
     if not results.nodes:
         raise HTTPException(status_code=404, detail="No holdings found for the given criteria")
@@ -154,8 +302,14 @@ def get_available_dates(request: schemas.AvailableDatesRequest, db: Session = De
 
 
 @app.post("/performance_attribution_sankey/", response_model=schemas.PerformanceAttributionResponse)
-async def get_performance_attribution_sankey(
-    request: schemas.PerformanceAttributionRequest, db: Session = Depends(get_db)
+@precompute.learn("/performance_attribution_sankey/")
+@http_cache.conditional(
+    "/performance_attribution_sankey/", http_cache.ATTRIBUTION_TABLES, last_day=lambda request: request.end_date
+)
+@admission.limit("/performance_attribution_sankey/")
+@coalescing.coalesce("/performance_attribution_sankey/")
+def get_performance_attribution_sankey(
+    request: schemas.PerformanceAttributionRequest, db: Session = Depends(get_report_db)
 ):
     """
     Generate performance attribution data with both summary and Sankey diagram.
@@ -174,18 +328,35 @@ async def get_performance_attribution_sankey(
     - Portfolio Fees/Expenses: Management fees and trading costs
     - Other Gain/Loss: Unexplained attribution differences
 
+    FX method:
+    - "endpoint" (default): average of start/end local positions × (end rate - start rate)
+    - "daily": sum of daily mva_local_previous × daily rate change from
+      fact_daily_aggregate_values_slp, correct for positions traded mid-period
+
     Example payload:
     {
         "start_date": "2024-01-01",
         "end_date": "2024-12-31",
-        "account_codes": ["5PXABH", "5PXAZZ"]
+        "account_codes": ["5PXABH", "5PXAZZ"],
+        "fx_method": "daily",
+        "include_securities": true,
+        "top_k": 10
     }
+
+    With include_securities, security_attribution lists for each account the top_k securities by
+    absolute contribution (fx, income, fees, appreciation) plus an "Other" bucket.
+
+    Responses carry an ETag; sending it back as If-None-Match returns 304 (no body) until the
+    gold layer is reloaded.
     """
     service = services.PerformanceSankeyService(db)
     data = service.generate_sankey_data(
         start_date=request.start_date,
         end_date=request.end_date,
         account_codes=request.account_codes,
+        fx_method=request.fx_method,
+        include_securities=request.include_securities,
+        top_k=request.top_k,
     )
     return data
 
@@ -210,3 +381,93 @@ async def get_available_performance_sankey_levels(
     {}
     """
     return ["fx", "dividends", "appreciation", "fees", "other"]
+
+
+@app.post("/export/", response_class=StreamingResponse)
+@admission.limit("/export/")
+def export_rows(request: schemas.ExportRequest, db: Session = Depends(get_db)):
+    """
+    Stream holdings (fact_holdings_all with account and security columns) or transactions for
+    a date range and account set, as an Arrow IPC stream or a Parquet file.
+
+    Example payload:
+    {
+        "dataset": "holdings",
+        "start_date": "2024-01-01",
+        "end_date": "2024-12-31",
+        "account_codes": ["5PXABH", "5PXAZZ"],
+        "format": "arrow"
+    }
+
+    Read with pyarrow.ipc.open_stream(body).read_all() or pyarrow.parquet.read_table. Rows are
+    read EXPORT_BATCH_SIZE at a time and sent as they are converted, so exports of any size use
+    the same memory.
+    """
+    return StreamingResponse(
+        exports.stream(db, request),
+        media_type=exports.MEDIA_TYPES[request.format],
+        headers={"Content-Disposition": f'attachment; filename="{exports.filename(request)}"'},
+    )
+
+
+def _submit_job(kind: str, request, response: Response) -> schemas.JobStatus:
+    try:
+        job = jobs.manager.submit(kind, request)
+    except jobs.JobQueueFull as error:
+        raise HTTPException(status_code=503, detail=str(error), headers={"Retry-After": "5"})
+    response.headers["Location"] = f"/jobs/{job['job_id']}"
+    return jobs.status(job)
+
+
+@app.post("/jobs/performance_attribution_sankey/", response_model=schemas.JobStatus, status_code=202)
+def submit_performance_attribution_job(request: schemas.PerformanceAttributionRequest, response: Response):
+    """
+    Run /performance_attribution_sankey/ in the background, for windows and account sets whose
+    attribution can outlast the gateway timeout. Takes the same payload and answers at once with
+    the job; poll GET /jobs/{job_id} and fetch GET /jobs/{job_id}/result once it succeeded.
+    """
+    return _submit_job("performance_attribution_sankey", request, response)
+
+
+@app.post("/jobs/performance_benchmark/", response_model=schemas.JobStatus, status_code=202)
+def submit_performance_benchmark_job(request: schemas.BenchmarkPerformanceRequest, response: Response):
+    """Run /performance_benchmark/ in the background; same payload, answered with the job"""
+    return _submit_job("performance_benchmark", request, response)
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobStatus)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish")):
+    """
+    Status, stage and progress of a job. With wait, the response is held until the job
+    finishes or wait seconds pass (at most JOB_MAX_WAIT), whichever comes first.
+    """
+    job = await jobs.manager.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return jobs.status(job)
+
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """
+    The report of a job that succeeded, as its synchronous endpoint returns it. 202 with the
+    job's status while it is queued or running, 409 if it failed or was cancelled.
+    """
+    job = jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    result = jobs.manager.result(job_id) if job["status"] == jobs.SUCCEEDED else None
+    if result is not None:
+        return Response(result, media_type="application/json")
+    if job["status"] in jobs.FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job {job['status']}" + (f": {job['error']}" if job["error"] else ""))
+    return JSONResponse(status_code=202, content=jsonable_encoder(jobs.status(job)), headers={"Retry-After": "1"})
+
+
+@app.delete("/jobs/{job_id}", response_model=schemas.JobStatus)
+def cancel_job(job_id: str):
+    """Cancel a job: a queued job never starts, a running one stops at its next stage"""
+    job = jobs.manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return jobs.status(job)
@@ -0,0 +1,397 @@
+"""
+Prometheus metrics for the API, served as text from GET /metrics.
+
+Exposed series:
+
+- api_request_duration_seconds (histogram) and api_requests_total per method and route
+- api_requests_in_flight per method and route
+- db_pool_* from the engine's connection pool and its saturation (app.database.PoolMonitor), and
+  per read replica (replica label) when a ReplicaRouter is passed to render
+- db_replica_* health and reads per read replica, when a ReplicaRouter is passed to render
+- cache_* for every cache registered in app.cache
+- app_warmup_seconds per warm-up step (app.warmup)
+- coalesced_requests_total per endpoint and role, coalesced_in_flight (app.coalescing)
+- jobs_submitted_total, jobs_rejected_total, jobs_finished_total per status and jobs_pending
+  for the background jobs of this worker (app.jobs)
+- admission_queue_seconds (histogram) and admission_rejected_total per endpoint and status,
+  admission_permits_in_use, admission_permits and admission_queued per endpoint (app.admission)
+- precompute_runs_total, precompute_reports_total per status, precompute_deferred_total and
+  precompute_last_run_seconds for the precompute scheduler of this worker (app.precompute)
+- db_queries_total and db_query_rows_total per named query (see queries.named); statements
+  without a name are counted under query="unnamed". Rows are counted as they are fetched
+  (instrumentation.count_rows), so streamed results count too.
+
+Counters are sharded per thread: each thread only ever writes its own shard, so recording
+takes no lock, and a scrape sums the shards without blocking request handling.
+"""
+
+import functools
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from . import cache, coalescing, instrumentation, jobs, warmup
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+UNMATCHED_ROUTE = "unmatched"
+UNNAMED_QUERY = "unnamed"
+
+
+class _Shard:
+    """One thread's counters; only the owning thread mutates it"""
+
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: Dict[Tuple, float] = defaultdict(float)
+        # key -> [bucket counts..., +Inf count, sum]
+        self.histograms: Dict[Tuple, List[float]] = {}
+
+
+class ShardedMetrics:
+    """
+    Counters, gauges (counters that go down) and histograms keyed by (metric name, labels).
+
+    Writers touch only their thread's shard. Shards are registered once per thread, the only
+    place a lock is taken; a reader copies each shard's dicts, which is atomic under the GIL.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, labels: tuple, amount: float = 1.0):
+        self._shard().counters[(name, labels)] += amount
+
+    def observe(self, name: str, labels: tuple, value: float):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self.buckets) + 2)
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def counters(self) -> Dict[Tuple, float]:
+        totals: Dict[Tuple, float] = defaultdict(float)
+        for shard in list(self._shards):
+            for key, value in shard.counters.copy().items():
+                totals[key] += value
+        return totals
+
+    def histograms(self) -> Dict[Tuple, List[float]]:
+        totals: Dict[Tuple, List[float]] = {}
+        for shard in list(self._shards):
+            for key, histogram in shard.histograms.copy().items():
+                histogram = list(histogram)
+                total = totals.setdefault(key, [0] * len(histogram))
+                for i, value in enumerate(histogram):
+                    total[i] += value
+        return totals
+
+    def reset(self):
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+
+registry = ShardedMetrics()
+
+
+def route_label(router, scope) -> str:
+    """The matched route's path template, so labels stay bounded whatever paths are requested"""
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and in-flight requests per route"""
+
+    def __init__(self, app, router, metrics: ShardedMetrics = registry):
+        self.app = app
+        self.router = router
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        labels = (("method", scope["method"]), ("route", route_label(self.router, scope)))
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics = self.metrics
+        metrics.inc("api_requests_in_flight", labels)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.observe("api_request_duration_seconds", labels, perf_counter() - started)
+            metrics.inc("api_requests_total", labels + (("status", str(status)),))
+            metrics.inc("api_requests_in_flight", labels, -1)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    name = context.execution_options.get("query_name", UNNAMED_QUERY) if context is not None else UNNAMED_QUERY
+    labels = (("query", name),)
+    registry.inc("db_queries_total", labels)
+    instrumentation.count_rows(context, functools.partial(registry.inc, "db_query_rows_total", labels))
+
+
+def instrument_engine(engine):
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def install(app, engine, replicas=()):
+    """Add the middleware and engine hooks; the app serves render(engine) at /metrics"""
+    for each in (engine, *replicas):
+        instrument_engine(each)
+    app.add_middleware(MetricsMiddleware, router=app.router)
+
+
+# Exposition
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Exposition:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, labels, value):
+        self.lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+COUNTER_HELP = {
+    "api_requests_total": ("counter", "Requests handled, by method, route and status"),
+    "api_requests_in_flight": ("gauge", "Requests currently being handled"),
+    "db_queries_total": ("counter", "Statements executed, by named query"),
+    "db_query_rows_total": ("counter", "Rows fetched, by named query"),
+    "admission_rejected_total": ("counter", "Requests refused by admission control, by endpoint and status (429 queue full, 503 queued too long)"),
+}
+
+HISTOGRAM_HELP = {
+    "api_request_duration_seconds": "Request latency from the first byte received to the last byte sent",
+    "admission_queue_seconds": "Time requests waited for admission, by endpoint (0 when admitted at once)",
+}
+
+
+def _request_metrics(out: _Exposition, metrics: ShardedMetrics):
+    counters = metrics.counters()
+    for name, (kind, help_text) in COUNTER_HELP.items():
+        out.family(name, kind, help_text)
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                out.sample(name, labels, value)
+
+    histograms = sorted(metrics.histograms().items())
+    for name, help_text in HISTOGRAM_HELP.items():
+        out.family(name, "histogram", help_text)
+        for (metric, labels), histogram in histograms:
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(metrics.buckets + (float("inf"),), histogram[:-1]):
+                cumulative += count
+                out.sample(f"{name}_bucket", labels + (("le", _format_value(bound)),), cumulative)
+            out.sample(f"{name}_sum", labels, histogram[-1])
+            out.sample(f"{name}_count", labels, cumulative)
+
+
+def _pool_metrics(out: _Exposition, engine, router=None):
+    # The primary's pool unlabelled, each read replica's with replica=<url>
+    engines = [((), engine)]
+    if router is not None:
+        engines += [((("replica", replica.name),), replica.engine) for replica in router.replicas]
+
+    # QueuePool (Postgres, file SQLite) has these; Static/SingletonThreadPool (in-memory SQLite) do not
+    gauges = {
+        "db_pool_size": ("size", "Connections the pool keeps open"),
+        "db_pool_checked_out": ("checkedout", "Connections currently in use"),
+        "db_pool_checked_in": ("checkedin", "Idle connections in the pool"),
+        "db_pool_overflow": ("overflow", "Connections opened beyond the pool size (negative while below it)"),
+    }
+    for name, (method, help_text) in gauges.items():
+        samples = [(labels, each.pool) for labels, each in engines if callable(getattr(each.pool, method, None))]
+        if samples:
+            out.family(name, "gauge", help_text)
+        for labels, pool in samples:
+            out.sample(name, labels, getattr(pool, method)())
+
+    statuses = [(labels, each.pool_monitor.status()) for labels, each in engines if getattr(each, "pool_monitor", None)]
+    saturation = [
+        ("db_pool_max_connections", "gauge", "capacity", "Pool size plus maximum overflow"),
+        ("db_pool_utilization", "gauge", "utilization", "Connections in use over the pool's capacity"),
+        ("db_pool_peak_checked_out", "gauge", "peak_checked_out", "Most connections in use at once since start"),
+        ("db_pool_checkouts_total", "counter", "checkouts", "Connections handed out"),
+        ("db_pool_saturated_checkouts_total", "counter", "saturated_checkouts", "Checkouts that took the last free connection"),
+        ("db_pool_timeouts_total", "counter", "timeouts", "Requests that gave up waiting for a connection (503)"),
+    ]
+    for name, kind, field, help_text in saturation:
+        samples = [(labels, status[field]) for labels, status in statuses if status[field] is not None]
+        if samples:
+            out.family(name, kind, help_text)
+        for labels, value in samples:
+            out.sample(name, labels, value)
+
+
+def _cache_metrics(out: _Exposition):
+    stats = sorted((c.stats() for c in cache.all_caches()), key=lambda s: s["name"])
+    families = [
+        ("cache_hits_total", "counter", "hits", "Lookups answered from the cache"),
+        ("cache_partial_hits_total", "counter", "partial_hits", "Date-range lookups answered in part from the cache"),
+        ("cache_misses_total", "counter", "misses", "Lookups not found in the cache"),
+        ("cache_evictions_total", "counter", "evictions", "Entries dropped for size or age"),
+        ("cache_entries", "gauge", "size", "Entries currently cached"),
+        ("cache_hit_ratio", "gauge", "hit_ratio", "Hits (including partial hits) over lookups"),
+    ]
+    for name, kind, field, help_text in families:
+        samples = [(s["name"], s[field]) for s in stats if field in s]
+        if samples:
+            out.family(name, kind, help_text)
+            for cache_name, value in samples:
+                out.sample(name, (("cache", cache_name),), value)
+
+
+def _replica_metrics(out: _Exposition, router):
+    status = router.status()
+    out.family("db_primary_reads_total", "counter", "Sessions whose reads went to the primary")
+    out.sample("db_primary_reads_total", (), status["primary_reads"])
+    families = [
+        ("db_replica_healthy", "gauge", "healthy", "1 while the replica is used for reads"),
+        ("db_replica_reads_total", "counter", "reads", "Sessions whose reads went to the replica"),
+        ("db_replica_failures_total", "counter", "failures", "Failed pings, connects and lost connections"),
+    ]
+    for name, kind, field, help_text in families:
+        if status["replicas"]:
+            out.family(name, kind, help_text)
+        for replica in status["replicas"]:
+            out.sample(name, (("replica", replica["name"]),), int(replica[field]))
+
+
+def _warmup_metrics(out: _Exposition):
+    if warmup.report:
+        out.family("app_warmup_seconds", "gauge", "Time spent per warm-up step before the worker accepted requests")
+        for step, seconds in warmup.report.items():
+            out.sample("app_warmup_seconds", (("step", step),), seconds)
+
+
+def _coalescing_metrics(out: _Exposition):
+    stats = coalescing.flights.stats()
+    out.family("coalesced_requests_total", "counter", "Requests per coalesced endpoint, by role (followers shared a leader's run)")
+    for endpoint, counts in sorted(stats.items()):
+        for role in ("leaders", "followers"):
+            out.sample("coalesced_requests_total", (("endpoint", endpoint), ("role", role[:-1])), counts[role])
+    out.family("coalesced_in_flight", "gauge", "Computations currently shared by coalesced requests")
+    out.sample("coalesced_in_flight", (), coalescing.flights.in_flight())
+
+
+def render(engine, metrics: ShardedMetrics = registry, router=None) -> str:
+    """The Prometheus text exposition of every metric"""
+    out = _Exposition()
+    _warmup_metrics(out)
+    _request_metrics(out, metrics)
+    _pool_metrics(out, engine, router)
+    if router is not None:
+        _replica_metrics(out, router)
+    _cache_metrics(out)
+    _coalescing_metrics(out)
+    _job_metrics(out)
+    _admission_metrics(out)
+    _precompute_metrics(out)
+    return out.text()
+
+
+def _job_metrics(out: _Exposition):
+    stats = jobs.manager.stats()
+    out.family("jobs_submitted_total", "counter", "Background jobs accepted by this worker")
+    out.sample("jobs_submitted_total", (), stats["submitted"])
+    out.family("jobs_rejected_total", "counter", "Job submits refused because JOB_MAX_PENDING jobs were pending (503)")
+    out.sample("jobs_rejected_total", (), stats["rejected"])
+    out.family("jobs_finished_total", "counter", "Background jobs finished, by status")
+    for status in jobs.FINISHED:
+        out.sample("jobs_finished_total", (("status", status),), stats.get(status, 0))
+    out.family("jobs_pending", "gauge", "Background jobs queued or running")
+    out.sample("jobs_pending", (), stats["pending"])
+
+
+def _admission_metrics(out: _Exposition):
+    # app.admission records into this module's registry
+    from . import admission
+
+    stats = {path: limiter.stats() for path, limiter in sorted(admission.limiters.items())}
+    for name, key, help_text in (
+        ("admission_permits", "permits", "Permits of each limited endpoint (ADMISSION_LIMITS)"),
+        ("admission_permits_in_use", "in_use", "Permits held by running requests"),
+        ("admission_queued", "queued_now", "Requests waiting for permits"),
+    ):
+        out.family(name, "gauge", help_text)
+        for path, values in stats.items():
+            out.sample(name, (("endpoint", path),), values[key])
+
+
+def _precompute_metrics(out: _Exposition):
+    # app.precompute imports app.http_cache, which imports this module through app.analytics
+    from . import precompute
+
+    stats = precompute.scheduler.stats()
+    out.family("precompute_runs_total", "counter", "Precompute runs, one per gold-layer load seen")
+    out.sample("precompute_runs_total", (), stats["runs"])
+    out.family("precompute_reports_total", "counter", "Reports precomputed, by status")
+    for status in precompute.STATUSES:
+        out.sample("precompute_reports_total", (("status", status),), stats[status])
+    out.family("precompute_deferred_total", "counter", "Waits of the scheduler for live requests to free pool connections")
+    out.sample("precompute_deferred_total", (), stats["deferred"])
+    out.family("precompute_last_run_seconds", "gauge", "Duration of the last precompute run")
+    out.sample("precompute_last_run_seconds", (), stats["last_run_seconds"])
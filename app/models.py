@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, Numeric, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -86,9 +86,16 @@ class FactAccountRor(Base):
 
 class FactDailyAggregateValue(Base):
     __tablename__ = "fact_daily_aggregate_values"
-    __table_args__ = {'schema': 'phw_dev_gold'}
+    # Composite indexes match migrations/ (tools.migrate); the advisor report there shows why
+    __table_args__ = (
+        Index(
+            "ix_fact_daily_aggregate_values_account_code_as_of_date", "account_code", "as_of_date",
+            postgresql_include=["market_value_accrued_converted", "net_cashflow_converted"],
+        ),
+        {'schema': 'phw_dev_gold'},
+    )
     account_code = Column(String, ForeignKey("phw_dev_gold.dim_accounts.AccountCode"), primary_key=True, index=True)
-    as_of_date = Column(Date)
+    as_of_date = Column(Date, primary_key=True)
     deposit_local = Column(Numeric)
     withdrawal_local = Column(Numeric)
     net_cashflow_local = Column(Numeric)
@@ -105,10 +112,16 @@ class FactDailyAggregateValue(Base):
 
 class FactDailyAggregateValueSlp(Base):
     __tablename__ = "fact_daily_aggregate_values_slp"
-    __table_args__ = {'schema': 'phw_dev_gold'}
+    __table_args__ = (
+        Index(
+            "ix_fact_daily_aggregate_values_slp_account_code_as_of_date", "account_code", "as_of_date",
+            postgresql_include=["mva_local_previous", "security_code"],
+        ),
+        {'schema': 'phw_dev_gold'},
+    )
     account_code = Column(String, ForeignKey("phw_dev_gold.dim_accounts.AccountCode"), primary_key=True, index=True)
     security_code = Column(String, ForeignKey("phw_dev_gold.dim_securitymaster.security_code"), primary_key=True, index=True)
-    as_of_date = Column(Date)
+    as_of_date = Column(Date, primary_key=True)
     deposit = Column(Numeric)
     deposit_local = Column(Numeric)
     withdrawal = Column(Numeric)
@@ -125,12 +138,20 @@ class FactDailyAggregateValueSlp(Base):
 
 class FactHoldingsAll(Base):
     __tablename__ = "fact_holdings_all"
-    __table_args__ = {'schema': 'phw_dev_gold'}
+    __table_args__ = (
+        Index(
+            "ix_fact_holdings_all_accountcode_asofdate_currencycode", "AccountCode", "AsofDate", "CurrencyCode",
+            postgresql_include=["MarketPrice", "MarketValue", "MarketValueAccrued", "Quantity", "SecurityCode", "SecurityFXRate"],
+        ),
+        Index("ix_fact_holdings_all_processedtimestampest", "ProcessedTimestampEST"),
+        {'schema': 'phw_dev_gold'},
+    )
+    # One row per day, account, security and reporting currency
     AsofDate = Column(Date, primary_key=True, index=True)
     AccountCode = Column(String, ForeignKey("phw_dev_gold.dim_accounts.AccountCode"), primary_key=True, index=True)
-    SecurityCode = Column(String, ForeignKey("phw_dev_gold.dim_securitymaster.security_code"), index=True)
+    SecurityCode = Column(String, ForeignKey("phw_dev_gold.dim_securitymaster.security_code"), primary_key=True, index=True)
     SecurityType = Column(String)
-    CurrencyCode = Column(String)
+    CurrencyCode = Column(String, primary_key=True)
     MarketValueAccrued = Column(Float)
     MarketValue = Column(Float)
     AverageCost = Column(Float)
@@ -165,9 +186,60 @@ class FactHoldingsAllRollup(Base):
     LocalMarketAccrued = Column(Numeric)
     MarketValueAccrued = Column(Numeric)
 
+# Rollups of fact_holdings_all owned by the API: created by migrations/0002_holdings_rollups and
+# filled by app/rollups.py, so they are not part of phw_dev_gold_schema.csv
+class FactHoldingsAccountRollup(Base):
+    __tablename__ = "fact_holdings_account_rollup"
+    __table_args__ = {'schema': 'phw_dev_gold', 'info': {'managed_by': 'migrations'}}
+    AsofDate = Column(Date, primary_key=True)
+    AccountCode = Column(String, primary_key=True)
+    CurrencyCode = Column(String, primary_key=True)
+    MarketValueAccrued = Column(Float)
+    MarketValue = Column(Float)
+    BookValue = Column(Float)
+    TotalUnrealizedGL = Column(Float)
+    PriceUnrealizedGL = Column(Float)
+    FXUnrealizedGL = Column(Float)
+    Positions = Column(Integer)
+
+class FactHoldingsAssetClassRollup(Base):
+    __tablename__ = "fact_holdings_asset_class_rollup"
+    __table_args__ = (
+        Index("ix_fact_holdings_asset_class_rollup_accountcode_asofdate_currencycode", "AccountCode", "AsofDate", "CurrencyCode"),
+        {'schema': 'phw_dev_gold', 'info': {'managed_by': 'migrations'}},
+    )
+    # The table has no primary key (the asset class columns may be NULL); the ORM needs one
+    AsofDate = Column(Date, primary_key=True)
+    AccountCode = Column(String, primary_key=True)
+    CurrencyCode = Column(String, primary_key=True)
+    asset_class = Column(String, primary_key=True)
+    AssetClassLevel1Name = Column(String, primary_key=True)
+    AssetClassLevel2Name = Column(String, primary_key=True)
+    AssetClassLevel3Name = Column(String, primary_key=True)
+    security_currency_code = Column(String, primary_key=True)
+    MarketValueAccrued = Column(Float)
+    MarketValue = Column(Float)
+    BookValue = Column(Float)
+    TotalUnrealizedGL = Column(Float)
+    PriceUnrealizedGL = Column(Float)
+    FXUnrealizedGL = Column(Float)
+    Positions = Column(Integer)
+
+class HoldingsRollupDate(Base):
+    __tablename__ = "holdings_rollup_dates"
+    __table_args__ = {'schema': 'phw_dev_gold', 'info': {'managed_by': 'migrations'}}
+    AsofDate = Column(Date, primary_key=True)
+    ProcessedTimestampEST = Column(DateTime)
+    SecurityMasterTimestampEST = Column(DateTime)
+    RefreshedAt = Column(DateTime)
+
 class FactTransaction(Base):
     __tablename__ = "fact_transactions"
-    __table_args__ = {'schema': 'phw_dev_gold'}
+    __table_args__ = (
+        Index("ix_fact_transactions_accountcode_tradedate", "AccountCode", "TradeDate"),
+        Index("ix_fact_transactions_processedtimestampest", "ProcessedTimestampEST"),
+        {'schema': 'phw_dev_gold'},
+    )
     AccountCode = Column(String, ForeignKey("phw_dev_gold.dim_accounts.AccountCode"), primary_key=True, index=True)
     SecurityCode = Column(String, ForeignKey("phw_dev_gold.dim_securitymaster.security_code"), primary_key=True, index=True)
     ExternalTransactionCode = Column(Integer, primary_key=True, index=True)
@@ -192,7 +264,7 @@ class FxRate(Base):
     AsofDate = Column(Date, primary_key=True, index=True)
     BaseCAD = Column(Numeric)
     Local = Column(Numeric)
-    LocalCurrencyCode = Column(String)
+    LocalCurrencyCode = Column(String, primary_key=True)
     ProcessedDate = Column(Date)
     ProcessedTimestampEST = Column(DateTime)
     rawFile = Column(String)
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Newline-delimited JSON (application/x-ndjson) responses for large reports.
+
+A client that sends Accept: application/x-ndjson gets the report as one JSON object per line,
+written as it is produced, instead of one document built, validated and serialized as a whole:
+the Sankey's nodes and then its links, or the benchmark's portfolio points, then each
+benchmark's points once its prices are in, then the metrics. Every line has a "type" key. The
+worker never holds the serialized body, and the client can start drawing after the first line.
+
+Lines are sent in chunks of about CHUNK_SIZE bytes; the first line goes out on its own, and a
+None item from the producer sends what is buffered before slow work (a benchmark's price
+download) starts. An error after the first line cuts the response short: clients treat a body
+whose last line is not "end" as incomplete.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+MEDIA_TYPE = "application/x-ndjson"
+MEDIA_TYPES = (MEDIA_TYPE, "application/ndjson")
+CHUNK_SIZE = 16 * 1024
+
+# OpenAPI responses entry for endpoints with an NDJSON mode
+RESPONSES = {200: {"content": {MEDIA_TYPE: {}}, "description": "With Accept: application/x-ndjson, one JSON object per line"}}
+
+
+def _quality(media_range: str):
+    media_type, _, parameters = media_range.partition(";")
+    quality = 1.0
+    for parameter in parameters.split(";"):
+        name, _, value = parameter.partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+    return media_type.strip().lower(), quality
+
+
+def accepts(accept: Optional[str]) -> bool:
+    """True when the Accept header prefers NDJSON to JSON; JSON stays the default"""
+    if not accept:
+        return False
+    qualities = dict(_quality(media_range) for media_range in accept.split(","))
+    ndjson = max(qualities.get(media_type, 0.0) for media_type in MEDIA_TYPES)
+    return ndjson > 0 and ndjson >= qualities.get("application/json", 0.0)
+
+
+def representation(accept: Optional[str]) -> str:
+    """Media type of the response to a request with this Accept header, for ETags"""
+    return MEDIA_TYPE if accepts(accept) else "application/json"
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    # numpy scalars
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode(items: Iterable[Optional[dict]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Lines of items, in chunks of about chunk_size bytes; a None item flushes the buffer"""
+    buffer = []
+    size = 0
+    first = True
+    for item in items:
+        if item is None:
+            if buffer:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+            continue
+        line = (json.dumps(item, default=_default, separators=(",", ":")) + "\n").encode()
+        if first:
+            first = False
+            yield line
+            continue
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    buffer.append(b'{"type":"end"}\n')
+    yield b"".join(buffer)
+
+
+def response(items: Iterable[Optional[dict]], headers: Optional[dict] = None) -> StreamingResponse:
+    return StreamingResponse(encode(items), media_type=MEDIA_TYPE, headers=headers)
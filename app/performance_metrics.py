@@ -0,0 +1,219 @@
+"""
+Vectorized return metrics for portfolio, account and benchmark value series.
+
+All series are laid out as rows of one (n_series, n_days) matrix on a shared calendar, so
+time-weighted return, money-weighted IRR, volatility, max drawdown and tracking error are
+computed for every account and benchmark in a handful of numpy passes.
+
+Conventions:
+- cash flows are signed from the investor's side (deposit > 0, withdrawal < 0) and are
+  assumed to arrive at the end of their day, so the daily return is
+  r_t = (V_t - CF_t) / V_{t-1} - 1
+- missing values are forward-filled; a series starts on its first observed value
+- annualization uses the observed number of returns per year, so calendar-day and
+  business-day series are treated consistently
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .cache import to_date
+
+DAYS_PER_YEAR = 365.0
+
+
+def build_matrix(dates: Sequence, series: Sequence[Dict]) -> np.ndarray:
+    """Lay out a list of {date: value} dicts as rows aligned to `dates`, NaN where a series has no value"""
+    index = {to_date(d).toordinal(): i for i, d in enumerate(dates)}
+    matrix = np.full((len(series), len(dates)), np.nan)
+    for row, values in enumerate(series):
+        for day, value in values.items():
+            col = index.get(to_date(day).toordinal())
+            if col is not None and value is not None:
+                matrix[row, col] = float(value)
+    return matrix
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """Row-wise forward fill of NaNs (leading NaNs stay NaN)"""
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = values[np.arange(values.shape[0])[:, None], idx]
+    started = np.maximum.accumulate(valid, axis=1)
+    return np.where(started, filled, np.nan)
+
+
+def total_row(values: np.ndarray, cash_flows: np.ndarray):
+    """
+    Combine rows into one total series: forward-filled values are summed once any row has
+    started, and cash flows are summed as-is. Returns (values, cash_flows) 1-D arrays.
+    """
+    filled = forward_fill(values)
+    started = ~np.all(np.isnan(filled), axis=0)
+    total_values = np.where(started, np.nansum(filled, axis=0), np.nan)
+    return total_values, np.sum(cash_flows, axis=0)
+
+
+def daily_returns(values: np.ndarray, cash_flows: np.ndarray) -> np.ndarray:
+    """
+    Daily returns r_t = (V_t - CF_t) / V_{t-1} - 1 for forward-filled values.
+    The first column, and days whose previous value is missing or not positive, are NaN.
+    """
+    returns = np.full(values.shape, np.nan)
+    previous = values[:, :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        step = (values[:, 1:] - cash_flows[:, 1:]) / previous - 1.0
+    returns[:, 1:] = np.where(previous > 0, step, np.nan)
+    return returns
+
+
+def _periods_per_year(returns: np.ndarray, series_years: np.ndarray) -> np.ndarray:
+    observed = np.sum(~np.isnan(returns), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(series_years > 0, observed / series_years, np.nan)
+
+
+def _nanstd(values: np.ndarray) -> np.ndarray:
+    counts = np.sum(~np.isnan(values), axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(values, axis=-1) / counts
+        squared = np.nansum((values - mean[..., None]) ** 2, axis=-1)
+        return np.where(counts > 1, np.sqrt(squared / np.maximum(counts - 1, 1)), np.nan)
+
+
+def money_weighted_irr(
+    start_index: np.ndarray,
+    values: np.ndarray,
+    cash_flows: np.ndarray,
+    day_offsets: np.ndarray,
+    iterations: int = 60,
+) -> np.ndarray:
+    """
+    Annualized money-weighted return (IRR) for every row, solved with a vectorized Newton iteration.
+
+    For each row the starting value is treated as an initial deposit on its first observed
+    day; the IRR is the annual rate r with
+        sum_k A_k * (1 + r) ** ((T - t_k) / 365) = V_T
+    Solving in g = ln(1 + r) keeps the function convex for positive deposits.
+    """
+    n_series, n_days = values.shape
+    rows = np.arange(n_series)
+    columns = np.arange(n_days)
+
+    amounts = np.where(columns[None, :] > start_index[:, None], cash_flows, 0.0)
+    amounts[rows, start_index] += np.nan_to_num(values[rows, start_index])
+    final_value = np.nan_to_num(values[:, -1])
+    horizon = (day_offsets[-1] - day_offsets) / DAYS_PER_YEAR
+
+    growth = np.zeros(n_series)
+    for _ in range(iterations):
+        weights = np.exp(np.clip(growth[:, None] * horizon[None, :], -50.0, 50.0))
+        f = np.sum(amounts * weights, axis=1) - final_value
+        df = np.sum(amounts * horizon[None, :] * weights, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(df != 0, f / df, 0.0)
+        growth = np.clip(growth - step, -10.0, 10.0)
+        if np.all(np.abs(step) < 1e-10):
+            break
+
+    weights = np.exp(np.clip(growth[:, None] * horizon[None, :], -50.0, 50.0))
+    residual = np.abs(np.sum(amounts * weights, axis=1) - final_value)
+    scale = np.maximum(np.sum(np.abs(amounts), axis=1), 1.0)
+    solvable = (np.sum(amounts, axis=1) > 0) & (horizon[start_index] > 0) & (residual / scale < 1e-6)
+    return np.where(solvable, np.expm1(growth), np.nan)
+
+
+def compute_return_metrics(
+    dates: Sequence,
+    values: np.ndarray,
+    cash_flows: np.ndarray,
+    benchmark_rows: Optional[Sequence[int]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Compute return metrics for every row of `values` in one pass.
+
+    - dates: ascending calendar shared by all rows
+    - values: (n_series, n_days) market values, NaN where unknown
+    - cash_flows: (n_series, n_days) external flows, 0 where none
+    - benchmark_rows: row indices that are benchmarks; tracking error is computed for every
+      row against each of them (shape (n_series, n_benchmarks))
+
+    Returns a dict of 1-D arrays (NaN where a metric is undefined).
+    """
+    benchmark_rows = list(benchmark_rows or [])
+    day_offsets = np.array([to_date(d).toordinal() for d in dates], dtype=float)
+    values = forward_fill(np.asarray(values, dtype=float))
+    cash_flows = np.nan_to_num(np.asarray(cash_flows, dtype=float))
+    n_series = values.shape[0]
+
+    has_data = ~np.all(np.isnan(values), axis=1)
+    start_index = np.where(has_data, np.argmax(~np.isnan(values), axis=1), 0)
+
+    returns = daily_returns(values, cash_flows)
+    growth = np.where(np.isnan(returns), 1.0, 1.0 + returns)
+    wealth = np.cumprod(growth, axis=1)
+
+    twr = wealth[:, -1] - 1.0
+    series_years = (day_offsets[-1] - day_offsets[start_index]) / DAYS_PER_YEAR
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annualized_twr = np.where(series_years > 0, np.power(np.maximum(wealth[:, -1], 0.0), 1.0 / series_years) - 1.0, np.nan)
+
+    periods_per_year = _periods_per_year(returns, series_years)
+    volatility = _nanstd(returns) * np.sqrt(periods_per_year)
+
+    running_peak = np.maximum.accumulate(wealth, axis=1)
+    max_drawdown = np.min(wealth / running_peak - 1.0, axis=1)
+
+    tracking_error = np.full((n_series, len(benchmark_rows)), np.nan)
+    if benchmark_rows:
+        active = returns[:, None, :] - returns[benchmark_rows][None, :, :]
+        tracking_error = _nanstd(active) * np.sqrt(periods_per_year)[:, None]
+
+    irr = money_weighted_irr(start_index, values, cash_flows, day_offsets)
+
+    rows = np.arange(n_series)
+    start_value = np.where(has_data, values[rows, start_index], np.nan)
+    net_cash_flow = np.sum(np.where(np.arange(values.shape[1])[None, :] > start_index[:, None], cash_flows, 0.0), axis=1)
+
+    undefined = ~has_data
+    for metric in (twr, annualized_twr, volatility, max_drawdown, irr):
+        metric[undefined] = np.nan
+    tracking_error[undefined] = np.nan
+
+    return {
+        "start_value": start_value,
+        "end_value": values[:, -1],
+        "net_cash_flow": net_cash_flow,
+        "twr": twr,
+        "annualized_twr": annualized_twr,
+        "irr": irr,
+        "volatility": volatility,
+        "max_drawdown": max_drawdown,
+        "tracking_error": tracking_error,
+    }
+
+
+def metrics_to_records(
+    labels: List[str], kinds: List[str], metrics: Dict[str, np.ndarray], benchmark_labels: List[str]
+) -> List[dict]:
+    """Turn the metric arrays into one JSON-friendly dict per series (NaN becomes None)"""
+
+    def clean(value):
+        value = float(value)
+        return None if np.isnan(value) else value
+
+    records = []
+    for row, (label, kind) in enumerate(zip(labels, kinds)):
+        record = {"label": label, "kind": kind}
+        for name in ("start_value", "end_value", "net_cash_flow", "twr", "annualized_twr", "irr", "volatility", "max_drawdown"):
+            record[name] = clean(metrics[name][row])
+        if kind == "benchmark":
+            record["tracking_error"] = {}
+        else:
+            record["tracking_error"] = {
+                benchmark: clean(metrics["tracking_error"][row, col]) for col, benchmark in enumerate(benchmark_labels)
+            }
+        records.append(record)
+    return records
@@ -0,0 +1,318 @@
+"""
+Precomputed reports for the requests every morning starts with.
+
+After the nightly load, the first users of the day pay the cold cost of the month-end and
+year-to-date reports of the same few hundred households. With PRECOMPUTE=1 each worker runs a
+scheduler thread that notices a gold-layer load (a new latest ProcessedTimestampEST in a report
+table) and runs the hot report shapes once, ahead of the requests:
+
+- /holdings_agg_for_sankey/ and /performance_attribution_sankey/ reports go to
+  http_cache.REPORTS under the ETag a request for them gets, and are answered from there
+- /performance_benchmark/ runs fill the benchmark caches (prices, cash flows, value histories)
+
+Hot shapes come from PRECOMPUTE_SHAPES, a JSON list of {"path": ..., "request": {...}}, and from
+this worker's traffic: @learn on an endpoint counts its requests, and the PRECOMPUTE_LEARNED most
+requested follow the configured ones. Dates in a shape may be relative to the latest loaded day:
+
+- "latest": the latest AsofDate in fact_holdings_all
+- "month_end": the last month end on or before it
+- "year_start": January 1 of its year
+
+so {"start_date": "year_start", "end_date": "latest"} is the year-to-date attribution. Learned
+requests for one of these days are counted in relative form, and yesterday's hot requests are
+precomputed for today's data.
+
+Live traffic comes first: the thread runs at a lower OS scheduling priority where the platform
+allows it, starts at most one report per PRECOMPUTE_INTERVAL seconds, and only while every pool
+its reports may read (the primary's and each read replica's, or the DuckDB snapshot's with
+ANALYTICS_ENGINE=duckdb) has fewer than PRECOMPUTE_MAX_BUSY_CONNECTIONS connections in use,
+waiting otherwise.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import http_cache, jobs, queries, schemas, services, settings
+from .cache import to_date
+
+logger = logging.getLogger(__name__)
+
+DATE_FIELDS = ("as_of_date", "start_date", "end_date")
+# Tables whose loads trigger a run
+LOAD_TABLES = tuple(sorted(set(http_cache.HOLDINGS_TABLES + http_cache.ATTRIBUTION_TABLES)))
+STATUSES = ("computed", "failed")
+
+
+def _no_progress(fraction, stage):
+    pass
+
+
+# {path: (request model, run(db, request) -> report)}
+KINDS: Dict[str, Tuple[type, Callable]] = {
+    "/holdings_agg_for_sankey/": (
+        schemas.SankeyRequest,
+        lambda db, request: services.get_holdings_for_sankey(db, request=request),
+    ),
+    **{
+        kind.path: (kind.request_model, lambda db, request, run=kind.run: run(db, request, _no_progress))
+        for kind in jobs.KINDS.values()
+    },
+}
+
+
+def anchors(latest: date) -> Dict[str, date]:
+    """{relative date: day} for the latest loaded day"""
+    if (latest + timedelta(days=1)).month != latest.month:
+        month_end = latest
+    else:
+        month_end = latest.replace(day=1) - timedelta(days=1)
+    return {"latest": latest, "month_end": month_end, "year_start": latest.replace(month=1, day=1)}
+
+
+def resolve(shape: dict, latest: Optional[date]) -> dict:
+    """shape with its relative dates replaced by days"""
+    relative = [field for field in DATE_FIELDS if shape.get(field) in ("latest", "month_end", "year_start")]
+    if not relative:
+        return shape
+    if latest is None:
+        raise ValueError("no holdings are loaded to resolve relative dates")
+    days = anchors(latest)
+    return {**shape, **{field: days[shape[field]].isoformat() for field in relative}}
+
+
+def relative(request: dict, latest: Optional[date]) -> dict:
+    """request with its dates that fall on a relative date replaced by its name"""
+    if latest is None:
+        return request
+    # "latest" wins when it is also a month end
+    names = {day.isoformat(): name for name, day in reversed(list(anchors(latest).items()))}
+    return {field: names.get(str(value), value) if field in DATE_FIELDS else value for field, value in request.items()}
+
+
+def _lower_priority():
+    """Lower the calling thread's CPU priority (per thread on Linux); a no-op elsewhere"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _session(path: str):
+    """A report session like get_report_db's: the snapshot with ANALYTICS_ENGINE=duckdb, else the database"""
+    from . import analytics, database
+
+    db = analytics.engines.session() if settings.analytics.engine == "duckdb" else database.SessionLocal()
+    database.set_statement_timeout(db, settings.database.statement_timeout_for(path))
+    return db
+
+
+def _report_engines() -> list:
+    """Engines a _session may read from: the snapshot's with ANALYTICS_ENGINE=duckdb, else the primary and every replica"""
+    from . import analytics, database
+
+    if settings.analytics.engine == "duckdb":
+        return [analytics.engines.current()]
+    return [database.router.primary, *database.router.replica_engines]
+
+
+class Scheduler:
+    """
+    Precomputes the hot report shapes after each load. start() runs it in a daemon thread;
+    check() is one poll, for tests and tools. The engine passed to check(), run() and start()
+    is the one whose pool is watched for live load; by default, every engine of report_engines().
+    """
+
+    def __init__(
+        self,
+        precompute_settings: settings.PrecomputeSettings = None,
+        session: Callable = _session,
+        report_engines: Callable = _report_engines,
+    ):
+        self.settings = precompute_settings or settings.precompute
+        self.session = session
+        self.report_engines = report_engines
+        # Load times of LOAD_TABLES at the last run, and the latest AsofDate then
+        self.versions: Optional[tuple] = None
+        self.latest: Optional[date] = None
+        self._learned: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_start = 0.0
+        self._stats = {"runs": 0, "deferred": 0, "last_run_seconds": 0.0, **{status: 0 for status in STATUSES}}
+
+    # Learning
+
+    def record(self, path: str, request) -> None:
+        """Count one request to path as a shape"""
+        if not self.settings.enabled or self.settings.learned <= 0:
+            return
+        key = (path, json.dumps(relative(request.model_dump(mode="json"), self.latest), sort_keys=True))
+        with self._lock:
+            self._learned[key] += 1
+            # Keep the counts bounded; shapes requested once in a while drop out
+            if len(self._learned) > 4 * self.settings.learned:
+                self._learned = Counter(dict(self._learned.most_common(2 * self.settings.learned)))
+
+    def shapes(self) -> List[Tuple[str, dict]]:
+        """(path, request) to precompute: the configured shapes, then the most requested ones"""
+        shapes = []
+        if self.settings.shapes_path:
+            try:
+                with open(self.settings.shapes_path) as f:
+                    shapes = [(shape["path"], shape["request"]) for shape in json.load(f)]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Could not read precompute shapes from {self.settings.shapes_path}: {e}")
+        seen = {(path, json.dumps(shape, sort_keys=True)) for path, shape in shapes}
+        with self._lock:
+            learned = self._learned.most_common(self.settings.learned) if self.settings.learned > 0 else []
+        for key, _ in learned:
+            if key not in seen:
+                shapes.append((key[0], json.loads(key[1])))
+        return shapes
+
+    # Running
+
+    def check(self, engine=None) -> bool:
+        """Precompute when the report tables show a load not seen yet; True when it ran"""
+        db = self.session(None)
+        try:
+            versions = tuple(str(db.execute(queries.get_data_version_query(table)).scalar()) for table in LOAD_TABLES)
+            if versions == self.versions:
+                return False
+            latest = db.execute(queries.GET_LATEST_HOLDINGS_DATE).scalar()
+        finally:
+            db.close()
+
+        # What this worker derived from the previous load
+        from .benchmark_service import invalidate_benchmark_caches
+
+        http_cache.DATA_VERSIONS.clear()
+        invalidate_benchmark_caches()
+        self.latest = None if latest is None else to_date(latest)
+        self.run(engine)
+        self.versions = versions
+        return True
+
+    def run(self, engine=None) -> Dict[str, int]:
+        """Precompute every shape once; {status: count}"""
+        started = time.perf_counter()
+        counts = {status: 0 for status in STATUSES}
+        for path, shape in self.shapes():
+            if self._stop.is_set():
+                break
+            status = self._precompute(engine, path, shape)
+            counts[status] += 1
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["last_run_seconds"] = elapsed
+            for status, count in counts.items():
+                self._stats[status] += count
+        print(f"♨️ Precomputed {counts['computed']} reports in {elapsed:.1f} s ({counts['failed']} failed)")
+        return counts
+
+    def _precompute(self, engine, path: str, shape: dict) -> str:
+        try:
+            request_model, run = KINDS[path]
+            request = request_model.model_validate(resolve(shape, self.latest))
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Skipping precompute shape {path} {shape}: {e}")
+            return "failed"
+        self._wait_turn(engine)
+        db = self.session(path)
+        try:
+            if path in http_cache.ENDPOINTS and settings.http_cache.enabled:
+                # The ETag is taken before the run, as a request takes it
+                etag = http_cache.report_etag(path, request, db)
+                http_cache.REPORTS.set(etag, run(db, request))
+            else:
+                run(db, request)
+            return "computed"
+        except Exception as e:
+            logger.warning(f"Precompute of {path} failed: {e}")
+            return "failed"
+        finally:
+            db.close()
+
+    def _busy(self, engines) -> bool:
+        """True while a pool of engines has max_busy_connections or more connections in use"""
+        for engine in engines:
+            pool = getattr(engine, "pool", None)
+            if hasattr(pool, "checkedout") and pool.checkedout() >= self.settings.max_busy_connections:
+                return True
+        return False
+
+    def _wait_turn(self, engine=None):
+        """Wait out PRECOMPUTE_INTERVAL since the last report and any live load on the pools the report may read"""
+        delay = self._last_start + self.settings.min_interval - time.monotonic()
+        if delay > 0:
+            self._stop.wait(delay)
+        engines = [engine] if engine is not None else self.report_engines()
+        while self._busy(engines) and not self._stop.is_set():
+            with self._lock:
+                self._stats["deferred"] += 1
+            self._stop.wait(max(self.settings.min_interval, 0.1))
+        self._last_start = time.monotonic()
+
+    def _loop(self, engine):
+        _lower_priority()
+        while not self._stop.is_set():
+            try:
+                self.check(engine)
+            except Exception as e:
+                logger.warning(f"Precompute check failed: {e}")
+            self._stop.wait(self.settings.poll_interval)
+
+    def start(self, engine=None) -> bool:
+        """Start the scheduler thread (PRECOMPUTE=1); the first check runs right away"""
+        if not self.settings.enabled or self._thread is not None:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(engine,), name="precompute", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, learned=len(self._learned))
+
+
+scheduler = Scheduler()
+
+
+def learn(path: str, request_arg: str = "request"):
+    """Endpoint decorator counting the endpoint's requests as shapes for the scheduler"""
+
+    def decorator(endpoint):
+        if asyncio.iscoroutinefunction(endpoint):
+
+            @functools.wraps(endpoint)
+            async def async_wrapper(*args, **kwargs):
+                scheduler.record(path, kwargs[request_arg])
+                return await endpoint(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            scheduler.record(path, kwargs[request_arg])
+            return endpoint(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,7 +1,32 @@
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
+from sqlalchemy.sql.elements import TextClause
+import functools
 import re
 
 
+def with_account_codes(query):
+    """
+    Bind :account_codes as an expanding IN list, so a tuple or list of codes renders as
+    IN (...) on every driver (psycopg2 and sqlite3 alike).
+    """
+    return query.bindparams(bindparam("account_codes", expanding=True))
+
+
+def named(name: str, query):
+    """Tag query with a name; /metrics reports statement and row counts per name"""
+    return query.execution_options(query_name=name)
+
+
+def named_query(build):
+    """Decorator naming the queries a builder function returns after the function"""
+
+    @functools.wraps(build)
+    def wrapper(*args, **kwargs):
+        return named(build.__name__, build(*args, **kwargs))
+
+    return wrapper
+
+
 def camel_to_snake(name):
     """Convert CamelCase to snake_case"""
     # Insert an underscore before any uppercase letter that follows a lowercase letter
@@ -53,6 +78,7 @@ def get_database_column_mapping():
     }
 
 
+@named_query
 def get_holdings_query():
     return text(
         """
@@ -72,6 +98,7 @@ def get_holdings_query():
     )
 
 
+@named_query
 def get_aggregated_holdings_query(account_group_by_clause: list[str], security_group_by_clause: list[str]):
     account_cols = ", ".join([f'a."{col}"' for col in account_group_by_clause])
     security_cols = ", ".join([f's."{col}"' for col in security_group_by_clause])
@@ -85,7 +112,7 @@ def get_aggregated_holdings_query(account_group_by_clause: list[str], security_g
     select_clause = ", ".join(group_by_cols)
     group_by_clause = ", ".join(group_by_cols)
 
-    return text(
+    return with_account_codes(text(
         f"""
         SELECT
             {select_clause},
@@ -98,17 +125,18 @@ def get_aggregated_holdings_query(account_group_by_clause: list[str], security_g
         AND h."AccountCode" IN :account_codes
         GROUP BY {group_by_clause}
     """
-    )
+    ))
 
 
-def get_sankey_holdings_query(sankey_levels: list[str]):
+def _sankey_columns(sankey_levels: list[str]):
     """
-    Generate a query for Sankey diagram data with dynamic column selection.
-    Supports prefixed columns: 'account.ColumnName' or 'security.ColumnName'
+    SELECT and GROUP BY expressions for Sankey levels, plus the dim_securitymaster columns they use.
+    Supports prefixed columns: 'account.ColumnName' (alias a) or 'security.ColumnName' (alias s)
     """
     column_mapping = get_database_column_mapping()
     select_cols = []
     group_by_cols = []
+    security_cols = []
 
     for level in sankey_levels:
         if level.startswith("account."):
@@ -117,24 +145,31 @@ def get_sankey_holdings_query(sankey_levels: list[str]):
             db_col_name = column_mapping.get(snake_case_col, snake_case_col)
             select_cols.append(f'a."{db_col_name}" AS {snake_case_col}')
             group_by_cols.append(f'a."{db_col_name}"')
-        elif level.startswith("security."):
+            continue
+        if level.startswith("security."):
             snake_case_col = level[9:]  # Remove 'security.' prefix
             # Get actual database column name
             db_col_name = column_mapping.get(snake_case_col, snake_case_col)
-            select_cols.append(f's."{db_col_name}" AS {snake_case_col}')
-            group_by_cols.append(f's."{db_col_name}"')
         else:
             # Default behavior for backward compatibility - assume it's from security table
             snake_case_col = camel_to_snake(level)
             db_col_name = column_mapping.get(snake_case_col, level)
-            select_cols.append(f's."{db_col_name}" AS {snake_case_col}')
-            group_by_cols.append(f's."{db_col_name}"')
+        select_cols.append(f's."{db_col_name}" AS {snake_case_col}')
+        group_by_cols.append(f's."{db_col_name}"')
+        security_cols.append(db_col_name)
 
-    # Combine clauses
-    select_clause = ", ".join(select_cols)
-    group_by_clause = ", ".join(group_by_cols)
+    return ", ".join(select_cols), ", ".join(group_by_cols), security_cols
 
-    return text(
+
+@named_query
+def get_sankey_holdings_query(sankey_levels: list[str]):
+    """
+    Generate a query for Sankey diagram data with dynamic column selection.
+    Supports prefixed columns: 'account.ColumnName' or 'security.ColumnName'
+    """
+    select_clause, group_by_clause, _ = _sankey_columns(sankey_levels)
+
+    return with_account_codes(text(
         f"""
         SELECT
             {select_clause},
@@ -148,18 +183,76 @@ def get_sankey_holdings_query(sankey_levels: list[str]):
         GROUP BY {group_by_clause}
         ORDER BY total_market_value DESC
     """
-    )
+    ))
+
+
+# dim_securitymaster columns kept in fact_holdings_asset_class_rollup
+ASSET_CLASS_ROLLUP_COLUMNS = (
+    "asset_class",
+    "AssetClassLevel1Name",
+    "AssetClassLevel2Name",
+    "AssetClassLevel3Name",
+    "security_currency_code",
+)
 
 
-def get_available_sankey_columns_query():
+def sankey_levels_in_rollup(sankey_levels: list[str]) -> bool:
+    """Whether every security level of a Sankey is a column of fact_holdings_asset_class_rollup"""
+    return set(_sankey_columns(sankey_levels)[2]) <= set(ASSET_CLASS_ROLLUP_COLUMNS)
+
+
+@named_query
+def get_sankey_rollup_query(sankey_levels: list[str]):
+    """
+    get_sankey_holdings_query over the asset class rollup, for levels sankey_levels_in_rollup accepts.
+    The rollup takes the place of s, so the level expressions are shared.
+    """
+    select_clause, group_by_clause, _ = _sankey_columns(sankey_levels)
+
+    return with_account_codes(text(
+        f"""
+        SELECT
+            {select_clause},
+            SUM(s."MarketValueAccrued") as total_market_value
+        FROM phw_dev_gold.fact_holdings_asset_class_rollup s
+        JOIN phw_dev_gold.dim_accounts a ON s."AccountCode" = a."AccountCode"
+        WHERE s."CurrencyCode" = 'CAD'
+        AND s."AsofDate" = :as_of_date
+        AND s."AccountCode" IN :account_codes
+        GROUP BY {group_by_clause}
+        ORDER BY total_market_value DESC
+    """
+    ))
+
+
+@named_query
+def get_available_sankey_columns_query(dialect: str = "postgresql"):
     """
     Get available columns for Sankey diagram grouping from both account and security tables.
     Returns snake_case column names for API consistency while mapping to correct database columns.
+    SQLite (generated local data) has no information_schema, so its catalog is read with pragma_table_info.
     """
     column_mapping = get_database_column_mapping()
     # Create reverse mapping to get snake_case names for display
     reverse_mapping = {v: k for k, v in column_mapping.items()}
 
+    if dialect == "sqlite":
+        return text(
+            """
+        SELECT 'account' as table_type, name as column_name, 'account.' || name as prefixed_name
+        FROM pragma_table_info('dim_accounts', 'phw_dev_gold')
+        WHERE name NOT IN ('AccountCode', 'ProcessedDate', 'ProcessedTimestampEST', 'rawFile')
+
+        UNION ALL
+
+        SELECT 'security' as table_type, name as column_name, 'security.' || name as prefixed_name
+        FROM pragma_table_info('dim_securitymaster', 'phw_dev_gold')
+        WHERE name NOT IN ('secid', 'security_code', 'ProcessedDate')
+
+        ORDER BY table_type, column_name
+    """
+        )
+
     return text(
         """
         SELECT 
@@ -187,43 +280,67 @@ def get_available_sankey_columns_query():
     )
 
 
+@named_query
 def get_available_dates_query():
     """
     Get available as_of_date values for given account codes from fact_holdings_all table.
     """
-    return text(
+    return with_account_codes(text(
         """
         SELECT DISTINCT h."AsofDate" as as_of_date
         FROM phw_dev_gold.fact_holdings_all h
         WHERE h."AccountCode" IN :account_codes
         ORDER BY h."AsofDate" ASC
     """
-    )
+    ))
+
+
+@named_query
+def get_rollup_available_dates_query():
+    """
+    get_available_dates_query over fact_holdings_account_rollup.
+    """
+    return with_account_codes(text(
+        """
+        SELECT DISTINCT r."AsofDate" as as_of_date
+        FROM phw_dev_gold.fact_holdings_account_rollup r
+        WHERE r."AccountCode" IN :account_codes
+        ORDER BY r."AsofDate" ASC
+    """
+    ))
+
+
+@named_query
+def get_data_version_query(table: str):
+    """
+    Latest load time of a gold table; table is one of our own table names, never user input.
+    """
+    return text(f'SELECT MAX("ProcessedTimestampEST") AS processed FROM phw_dev_gold.{table}')
 
 
 # Query to get start and end market values
-GET_MARKET_VALUES = text(
+GET_MARKET_VALUES = with_account_codes(text(
     """
     SELECT
         (SELECT SUM("MarketValueAccrued") FROM phw_dev_gold.fact_holdings_all WHERE "AsofDate" = :start_date AND "AccountCode" IN :account_codes AND "CurrencyCode" = 'CAD') as start_mva,
         (SELECT SUM("MarketValueAccrued") FROM phw_dev_gold.fact_holdings_all WHERE "AsofDate" = :end_date AND "AccountCode" IN :account_codes AND "CurrencyCode" = 'CAD') as end_mva
 """
-)
+))
 
 # Query to get net contributions over the period
-GET_NET_CONTRIBUTIONS = text(
+GET_NET_CONTRIBUTIONS = with_account_codes(text(
     """
     SELECT SUM(net_cashflow_converted) as net_contribution
     FROM phw_dev_gold.fact_daily_aggregate_values
     WHERE as_of_date > :start_date AND as_of_date <= :end_date
     AND account_code IN :account_codes
 """
-)
+))
 
 # Simplified queries for performance attribution - calculations done in Python for better debugging
 
 # Get holdings data for start and end dates
-GET_HOLDINGS_FOR_ATTRIBUTION = text(
+GET_HOLDINGS_FOR_ATTRIBUTION = with_account_codes(text(
     """
     SELECT 
         h."AsofDate" as as_of_date,
@@ -245,10 +362,10 @@ GET_HOLDINGS_FOR_ATTRIBUTION = text(
     AND h."CurrencyCode" = 'CAD'
     ORDER BY h."AsofDate", h."SecurityCode"
     """
-)
+))
 
 # Get all transactions for the period
-GET_TRANSACTIONS_FOR_ATTRIBUTION = text(
+GET_TRANSACTIONS_FOR_ATTRIBUTION = with_account_codes(text(
     """
     SELECT 
         ft."AccountCode" as account_code,
@@ -271,7 +388,7 @@ GET_TRANSACTIONS_FOR_ATTRIBUTION = text(
     AND ft."AccountCode" IN :account_codes
     ORDER BY ft."TradeDate", ft."SecurityCode"
     """
-)
+))
 
 # Get FX rates for the period (for transaction conversion and FX gain calculation)
 GET_FX_RATES_FOR_ATTRIBUTION = text(
@@ -289,7 +406,7 @@ GET_FX_RATES_FOR_ATTRIBUTION = text(
 )
 
 # Get daily aggregate values for net contributions
-GET_DAILY_AGGREGATE_FOR_ATTRIBUTION = text(
+GET_DAILY_AGGREGATE_FOR_ATTRIBUTION = with_account_codes(text(
     """
     SELECT 
         account_code,
@@ -302,4 +419,169 @@ GET_DAILY_AGGREGATE_FOR_ATTRIBUTION = text(
     AND account_code IN :account_codes
     ORDER BY as_of_date, account_code
     """
+))
+
+# Get per-account daily market values and net cash flows for return metrics
+GET_DAILY_AGGREGATE_SERIES = with_account_codes(text(
+    """
+    SELECT 
+        account_code,
+        as_of_date,
+        market_value_accrued_converted as market_value_accrued,
+        net_cashflow_converted as net_cashflow
+    FROM phw_dev_gold.fact_daily_aggregate_values
+    WHERE as_of_date >= :start_date 
+    AND as_of_date <= :end_date
+    AND account_code IN :account_codes
+    ORDER BY account_code, as_of_date
+    """
+))
+
+# Get daily per-security local positions for daily FX attribution (foreign securities only)
+GET_DAILY_POSITIONS_FOR_FX_ATTRIBUTION = with_account_codes(text(
+    """
+    SELECT 
+        slp.account_code,
+        slp.security_code,
+        slp.as_of_date,
+        slp.mva_local_previous,
+        sm.security_currency_code
+    FROM phw_dev_gold.fact_daily_aggregate_values_slp slp
+    JOIN phw_dev_gold.dim_securitymaster sm ON slp.security_code = sm.security_code
+    WHERE slp.as_of_date > :start_date 
+    AND slp.as_of_date <= :end_date
+    AND slp.account_code IN :account_codes
+    AND sm.security_currency_code <> 'CAD'
+    ORDER BY slp.account_code, slp.security_code, slp.as_of_date
+    """
+))
+
+
+# Daily portfolio market values (all reporting currencies, as the fact_holdings_all query in
+# benchmark_service sums them) from the account rollup
+GET_ROLLUP_PORTFOLIO_DAILY_VALUES = with_account_codes(text(
+    """
+    SELECT r."AsofDate" as as_of_date, SUM(r."MarketValueAccrued") as total_mva
+    FROM phw_dev_gold.fact_holdings_account_rollup r
+    WHERE r."AccountCode" IN :account_codes
+    AND r."AsofDate" >= :start_date
+    AND r."AsofDate" <= :end_date
+    GROUP BY r."AsofDate"
+    ORDER BY r."AsofDate"
+    """
+))
+
+# Holdings rollup maintenance (app/rollups.py). :dates are AsofDate values as the database
+# returned them, so they compare equal on every driver.
+
+# Rolled-up days, the latest load they reflect, and whether they were grouped with the current
+# security master
+GET_ROLLUP_STATE = text(
+    """
+    SELECT
+        COUNT(*) as dates,
+        MIN(r."AsofDate") as first_date,
+        MAX(r."AsofDate") as last_date,
+        MAX(r."ProcessedTimestampEST") as watermark,
+        CASE WHEN MIN(r."SecurityMasterTimestampEST") IS NOT DISTINCT FROM
+            (SELECT MAX(sm."ProcessedTimestampEST") FROM phw_dev_gold.dim_securitymaster sm)
+        THEN 1 ELSE 0 END as security_master_current
+    FROM phw_dev_gold.holdings_rollup_dates r
+    """
 )
+
+# Days with holdings loaded after the rollup's watermark (uses ix_fact_holdings_all_processedtimestampest)
+GET_STALE_ROLLUP_DATES = text(
+    """
+    SELECT DISTINCT h."AsofDate" as as_of_date
+    FROM phw_dev_gold.fact_holdings_all h
+    WHERE h."ProcessedTimestampEST" > (SELECT MAX(r."ProcessedTimestampEST") FROM phw_dev_gold.holdings_rollup_dates r)
+    ORDER BY h."AsofDate"
+    """
+)
+
+GET_ROLLUP_DATES = text('SELECT r."AsofDate" as as_of_date FROM phw_dev_gold.holdings_rollup_dates r')
+
+GET_HOLDINGS_DATES = text(
+    """
+    SELECT DISTINCT h."AsofDate" as as_of_date
+    FROM phw_dev_gold.fact_holdings_all h
+    ORDER BY h."AsofDate"
+    """
+)
+
+# Latest loaded day, the "latest" of precomputed report shapes
+GET_LATEST_HOLDINGS_DATE = text('SELECT MAX(h."AsofDate") as as_of_date FROM phw_dev_gold.fact_holdings_all h')
+
+# Postgres only: one refresh at a time, across workers and hosts
+LOCK_ROLLUP_REFRESH = text("SELECT pg_advisory_lock(hashtext('phw_dev_gold.holdings_rollups'))")
+UNLOCK_ROLLUP_REFRESH = text("SELECT pg_advisory_unlock(hashtext('phw_dev_gold.holdings_rollups'))")
+
+DELETE_ACCOUNT_ROLLUP = text('DELETE FROM phw_dev_gold.fact_holdings_account_rollup WHERE "AsofDate" IN :dates').bindparams(
+    bindparam("dates", expanding=True)
+)
+DELETE_ASSET_CLASS_ROLLUP = text('DELETE FROM phw_dev_gold.fact_holdings_asset_class_rollup WHERE "AsofDate" IN :dates').bindparams(
+    bindparam("dates", expanding=True)
+)
+DELETE_ROLLUP_DATES = text('DELETE FROM phw_dev_gold.holdings_rollup_dates WHERE "AsofDate" IN :dates').bindparams(
+    bindparam("dates", expanding=True)
+)
+
+REFRESH_ACCOUNT_ROLLUP = text(
+    """
+    INSERT INTO phw_dev_gold.fact_holdings_account_rollup (
+        "AsofDate", "AccountCode", "CurrencyCode", "MarketValueAccrued", "MarketValue", "BookValue",
+        "TotalUnrealizedGL", "PriceUnrealizedGL", "FXUnrealizedGL", "Positions"
+    )
+    SELECT
+        h."AsofDate", h."AccountCode", h."CurrencyCode",
+        SUM(h."MarketValueAccrued"), SUM(h."MarketValue"), SUM(h."BookValue"),
+        SUM(h."TotalUnrealizedGL"), SUM(h."PriceUnrealizedGL"), SUM(h."FXUnrealizedGL"), COUNT(*)
+    FROM phw_dev_gold.fact_holdings_all h
+    WHERE h."AsofDate" IN :dates
+    GROUP BY h."AsofDate", h."AccountCode", h."CurrencyCode"
+    """
+).bindparams(bindparam("dates", expanding=True))
+
+# Inner join, as the Sankey queries: holdings of securities missing from the master are left out
+REFRESH_ASSET_CLASS_ROLLUP = text(
+    """
+    INSERT INTO phw_dev_gold.fact_holdings_asset_class_rollup (
+        "AsofDate", "AccountCode", "CurrencyCode",
+        asset_class, "AssetClassLevel1Name", "AssetClassLevel2Name", "AssetClassLevel3Name", security_currency_code,
+        "MarketValueAccrued", "MarketValue", "BookValue",
+        "TotalUnrealizedGL", "PriceUnrealizedGL", "FXUnrealizedGL", "Positions"
+    )
+    SELECT
+        h."AsofDate", h."AccountCode", h."CurrencyCode",
+        s.asset_class, s."AssetClassLevel1Name", s."AssetClassLevel2Name", s."AssetClassLevel3Name", s.security_currency_code,
+        SUM(h."MarketValueAccrued"), SUM(h."MarketValue"), SUM(h."BookValue"),
+        SUM(h."TotalUnrealizedGL"), SUM(h."PriceUnrealizedGL"), SUM(h."FXUnrealizedGL"), COUNT(*)
+    FROM phw_dev_gold.fact_holdings_all h
+    JOIN phw_dev_gold.dim_securitymaster s ON h."SecurityCode" = s.security_code
+    WHERE h."AsofDate" IN :dates
+    GROUP BY
+        h."AsofDate", h."AccountCode", h."CurrencyCode",
+        s.asset_class, s."AssetClassLevel1Name", s."AssetClassLevel2Name", s."AssetClassLevel3Name", s.security_currency_code
+    """
+).bindparams(bindparam("dates", expanding=True))
+
+REFRESH_ROLLUP_DATES = text(
+    """
+    INSERT INTO phw_dev_gold.holdings_rollup_dates ("AsofDate", "ProcessedTimestampEST", "SecurityMasterTimestampEST", "RefreshedAt")
+    SELECT
+        h."AsofDate",
+        MAX(h."ProcessedTimestampEST"),
+        (SELECT MAX(sm."ProcessedTimestampEST") FROM phw_dev_gold.dim_securitymaster sm),
+        :refreshed_at
+    FROM phw_dev_gold.fact_holdings_all h
+    WHERE h."AsofDate" IN :dates
+    GROUP BY h."AsofDate"
+    """
+).bindparams(bindparam("dates", expanding=True))
+
+
+# Name every query constant above after itself
+for _name, _query in list(globals().items()):
+    if _name.isupper() and isinstance(_query, TextClause):
+        globals()[_name] = named(_name, _query)
@@ -0,0 +1,158 @@
+"""
+Daily holdings rollups maintained from fact_holdings_all.
+
+Attribution, benchmark and Sankey reports all sum fact_holdings_all per day and account. Two
+rollups keep those sums (created by migrations/0002_holdings_rollups):
+
+    fact_holdings_account_rollup        per day, account and reporting currency
+    fact_holdings_asset_class_rollup    the same, split by the asset class columns of
+                                        dim_securitymaster (queries.ASSET_CLASS_ROLLUP_COLUMNS)
+
+Each holds market value (accrued and not), book value and unrealized G/L, plus the number of
+positions. holdings_rollup_dates records every rolled-up day with the latest
+ProcessedTimestampEST of its holdings. refresh() rebuilds the days loaded since the last refresh
+(an indexed lookup on ProcessedTimestampEST), and every day on the first run or once
+dim_securitymaster was reloaded. Run it after each load: python -m tools.refresh_rollups.
+
+Services call coverage(db) before reading a rollup. A day is covered unless holdings for it
+were loaded after the last refresh; days with no holdings at all are covered, since both sides
+are empty. Coverage is cached per load time of fact_holdings_all and dim_securitymaster (see
+http_cache.data_version), so once a load is seen, requests for its days read fact_holdings_all
+until the next refresh. Without the migration, before the first refresh, or with
+HOLDINGS_ROLLUPS=false, nothing is covered.
+
+/metrics counts reads per query name; rollup reads are get_sankey_rollup_query,
+get_rollup_available_dates_query and GET_ROLLUP_PORTFOLIO_DAILY_VALUES.
+"""
+
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from sqlalchemy import inspect
+
+from . import analytics, http_cache, queries, settings
+from .cache import TTLCache, to_date
+from .database import GOLD_SCHEMA
+
+ROLLUP_TABLES = ("fact_holdings_account_rollup", "fact_holdings_asset_class_rollup", "holdings_rollup_dates")
+
+# Days per refresh statement, so the IN lists stay short
+REFRESH_CHUNK_DAYS = 31
+
+
+@dataclass(frozen=True)
+class Coverage:
+    first: Optional[date] = None
+    last: Optional[date] = None
+    # Days with holdings loaded after the last refresh
+    stale: FrozenSet[date] = frozenset()
+    # The asset class rollup was grouped with the current dim_securitymaster
+    asset_classes: bool = False
+
+    @property
+    def refreshed(self) -> bool:
+        return self.first is not None
+
+    @property
+    def complete(self) -> bool:
+        """Every day with holdings is rolled up and current"""
+        return self.refreshed and not self.stale
+
+    def covers(self, start, end=None, asset_classes: bool = False) -> bool:
+        if not self.refreshed or (asset_classes and not self.asset_classes):
+            return False
+        start = to_date(start)
+        end = start if end is None else to_date(end)
+        return not any(start <= day <= end for day in self.stale)
+
+
+NOT_COVERED = Coverage()
+
+# {(fact_holdings_all version, dim_securitymaster version): Coverage}
+COVERAGE = TTLCache("holdings_rollup_coverage", maxsize=8, ttl_seconds=settings.rollups.coverage_ttl)
+
+
+def has_rollup_tables(connection) -> bool:
+    inspector = inspect(connection)
+    return all(inspector.has_table(table, schema=GOLD_SCHEMA) for table in ROLLUP_TABLES)
+
+
+def load_coverage(connection) -> Coverage:
+    if not has_rollup_tables(connection):
+        return NOT_COVERED
+    state = connection.execute(queries.GET_ROLLUP_STATE).one()
+    if not state.dates:
+        return NOT_COVERED
+    stale = frozenset(to_date(day) for day in connection.execute(queries.GET_STALE_ROLLUP_DATES).scalars())
+    return Coverage(to_date(state.first_date), to_date(state.last_date), stale, bool(state.security_master_current))
+
+
+def coverage(db, rollup_settings: settings.RollupSettings = None) -> Coverage:
+    """What the rollups cover for the database db reads from"""
+    if not (rollup_settings or settings.rollups).enabled:
+        return NOT_COVERED
+    if analytics.snapshot_of(db) is not None:
+        # Parquet snapshots carry the facts only
+        return NOT_COVERED
+    key = (http_cache.data_version(db, "fact_holdings_all"), http_cache.data_version(db, "dim_securitymaster"))
+    cached = COVERAGE.get(key)
+    if cached is None:
+        cached = load_coverage(db.connection())
+        COVERAGE.set(key, cached)
+    return cached
+
+
+def _chunks(days: List, size: int) -> Iterable[List]:
+    for offset in range(0, len(days), size):
+        yield days[offset : offset + size]
+
+
+def _refresh_days(connection, days: List, chunk_days: int):
+    refreshed_at = datetime.now()
+    for chunk in _chunks(days, chunk_days):
+        params = {"dates": chunk}
+        connection.execute(queries.DELETE_ACCOUNT_ROLLUP, params)
+        connection.execute(queries.DELETE_ASSET_CLASS_ROLLUP, params)
+        connection.execute(queries.DELETE_ROLLUP_DATES, params)
+        connection.execute(queries.REFRESH_ACCOUNT_ROLLUP, params)
+        connection.execute(queries.REFRESH_ASSET_CLASS_ROLLUP, params)
+        connection.execute(queries.REFRESH_ROLLUP_DATES, dict(params, refreshed_at=refreshed_at))
+
+
+def refresh(engine, full: bool = False, chunk_days: int = REFRESH_CHUNK_DAYS) -> Dict[str, object]:
+    """
+    Bring the rollups up to date with fact_holdings_all in one transaction, so readers see the
+    old or the new rollup of a day, never half of it. On Postgres the transaction is REPEATABLE
+    READ (a load committing meanwhile is picked up by the next refresh) and refreshes are
+    serialized with an advisory lock.
+    """
+    started = time.perf_counter()
+    postgres = engine.dialect.name == "postgresql"
+    with engine.connect() as connection:
+        if postgres:
+            connection.execute(queries.LOCK_ROLLUP_REFRESH)
+            connection.commit()
+            connection.execution_options(isolation_level="REPEATABLE READ")
+        try:
+            with connection.begin():
+                state = connection.execute(queries.GET_ROLLUP_STATE).one()
+                full = full or not state.dates or not state.security_master_current
+                if full:
+                    # Days no longer loaded are dropped as well
+                    days = connection.execute(queries.GET_HOLDINGS_DATES).scalars().all()
+                    gone = set(connection.execute(queries.GET_ROLLUP_DATES).scalars()) - set(days)
+                    for chunk in _chunks(sorted(gone), chunk_days):
+                        connection.execute(queries.DELETE_ACCOUNT_ROLLUP, {"dates": chunk})
+                        connection.execute(queries.DELETE_ASSET_CLASS_ROLLUP, {"dates": chunk})
+                        connection.execute(queries.DELETE_ROLLUP_DATES, {"dates": chunk})
+                else:
+                    days = connection.execute(queries.GET_STALE_ROLLUP_DATES).scalars().all()
+                _refresh_days(connection, days, chunk_days)
+        finally:
+            if postgres:
+                connection.execute(queries.UNLOCK_ROLLUP_REFRESH)
+                connection.commit()
+    COVERAGE.clear()
+    return {"full": full, "days": len(days), "seconds": round(time.perf_counter() - started, 3)}
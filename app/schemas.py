@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
 
 
 class BenchmarkPerformanceRequest(BaseModel):
@@ -7,6 +7,12 @@ class BenchmarkPerformanceRequest(BaseModel):
     benchmark_list: List[str]
     start_date: str
     end_date: str
+    include_metrics: bool = False
+    frequency: Literal["daily", "weekly", "monthly"] = "daily"
+    max_points: Optional[int] = Field(None, ge=3, description="Downsample each series to at most this many points")
+    layout: Literal["dict", "columnar"] = Field(
+        "dict", description="'columnar' returns aligned arrays instead of per-day dict entries"
+    )
 
     class Config:
         schema_extra = {
@@ -15,13 +21,45 @@ class BenchmarkPerformanceRequest(BaseModel):
                 "benchmark_list": ["VFV.TO", "XEQT.TO"],
                 "start_date": "2022-01-01",
                 "end_date": "2022-12-31",
+                "include_metrics": True,
+                "frequency": "daily",
+                "max_points": 500,
+                "layout": "columnar",
             }
         }
 
 
+class ReturnMetrics(BaseModel):
+    """Return metrics for one account, the combined portfolio or one benchmark"""
+
+    label: str
+    kind: str  # "account", "portfolio", "benchmark"
+    start_value: Optional[float] = None
+    end_value: Optional[float] = None
+    net_cash_flow: Optional[float] = None
+    twr: Optional[float] = Field(None, description="Cumulative time-weighted return")
+    annualized_twr: Optional[float] = None
+    irr: Optional[float] = Field(None, description="Annualized money-weighted return")
+    volatility: Optional[float] = Field(None, description="Annualized volatility of daily returns")
+    max_drawdown: Optional[float] = None
+    tracking_error: Dict[str, Optional[float]] = Field(
+        default_factory=dict, description="Annualized tracking error versus each benchmark"
+    )
+
+
+class BenchmarkSeries(BaseModel):
+    """Aligned columnar series: every value array has one entry per date (None where missing)"""
+
+    dates: List[str]
+    portfolio: List[Optional[float]]
+    benchmarks: Dict[str, List[Optional[float]]]
+
+
 class BenchmarkPerformanceResponse(BaseModel):
-    portfolio_values: Dict[str, float]
-    benchmark_performance: Dict[str, Dict[str, float]]
+    portfolio_values: Optional[Dict[str, float]] = None
+    benchmark_performance: Optional[Dict[str, Dict[str, float]]] = None
+    series: Optional[BenchmarkSeries] = None
+    metrics: Optional[List[ReturnMetrics]] = None
 
 
 from datetime import date, datetime
@@ -377,6 +415,12 @@ class PerformanceAttributionRequest(BaseModel):
     start_date: date
     end_date: date
     account_codes: List[str]
+    fx_method: Literal["endpoint", "daily"] = Field(
+        "endpoint",
+        description="'endpoint' averages start/end positions; 'daily' sums daily positions × daily FX rate changes",
+    )
+    include_securities: bool = Field(False, description="Add a per-security drill-down for each account")
+    top_k: int = Field(10, ge=1, le=100, description="Securities listed per account before the 'Other' bucket")
 
     class Config:
         schema_extra = {
@@ -384,6 +428,9 @@ class PerformanceAttributionRequest(BaseModel):
                 "start_date": "2024-01-01",
                 "end_date": "2024-12-31",
                 "account_codes": ["5PXABH", "5PXAZZ"],
+                "fx_method": "daily",
+                "include_securities": True,
+                "top_k": 10,
             }
         }
 
@@ -420,14 +467,69 @@ class PerformanceSummary(BaseModel):
     start_date: str
     end_date: str
     account_codes: List[str]
+    fx_method: str = "endpoint"
+
+
+class SecurityContribution(BaseModel):
+    security_code: str  # "OTHER" for the bucket of securities outside the top K
+    security_symbol: Optional[str] = None
+    security_name: Optional[str] = None
+    start_mva: float
+    end_mva: float
+    fx: float
+    income: float
+    fees: float
+    appreciation: float
+    total: float
+
+
+class AccountSecurityAttribution(BaseModel):
+    account_code: str
+    securities: List[SecurityContribution]
+    security_count: int = Field(description="Number of securities before the top-K cut")
+    unattributed: float = Field(description="Account gain/loss not explained by its securities (e.g. cash movements)")
 
 
 class PerformanceAttributionResponse(BaseModel):
     perf_summary: PerformanceSummary
     perf_sankey: PerformanceSankeyData
+    security_attribution: Optional[List[AccountSecurityAttribution]] = None
 
 
 # Legacy response for backward compatibility
 class PerformanceSankeyResponse(BaseModel):
     nodes: List[PerformanceNode]
     links: List[PerformanceLink]
+
+
+class ExportRequest(BaseModel):
+    dataset: Literal["holdings", "transactions"] = Field(
+        description="'holdings': fact_holdings_all with account and security columns; 'transactions': fact_transactions"
+    )
+    start_date: date
+    end_date: date
+    account_codes: List[str] = Field(min_length=1)
+    format: Literal["arrow", "parquet"] = Field("arrow", description="Arrow IPC stream or Parquet file")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "dataset": "holdings",
+                "start_date": "2024-01-01",
+                "end_date": "2024-12-31",
+                "account_codes": ["5PXABH", "5PXAZZ"],
+                "format": "arrow",
+            }
+        }
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str = Field(description="Report the job runs: 'performance_attribution_sankey' or 'performance_benchmark'")
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    progress: float = Field(description="Share of the work done, 0 to 1")
+    stage: Optional[str] = Field(None, description="Stage running, e.g. 'transactions' or 'sankey'")
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    expires_at: Optional[datetime] = Field(None, description="When the job and its result are removed; set once it finishes")
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
-from . import models, schemas, queries
-from typing import List
+from . import models, schemas, queries, rollups, settings, transaction_flows
+from typing import Iterator, List, Tuple
 from decimal import Decimal
 
 
@@ -124,7 +124,7 @@ def get_available_sankey_columns(db: Session) -> schemas.AvailableSankeyColumns:
     """
     from .queries import get_database_column_mapping, camel_to_snake
 
-    query = queries.get_available_sankey_columns_query()
+    query = queries.get_available_sankey_columns_query(dialect=db.get_bind().dialect.name)
     results = db.execute(query).fetchall()
 
     # Get our column mapping for name conversion
@@ -164,15 +164,32 @@ def get_holdings_for_sankey(db: Session, request: schemas.SankeyRequest) -> sche
     Get holdings data formatted for Sankey diagram visualization.
     Creates a hierarchical structure with Grand Total as the root node.
     """
-    query = queries.get_sankey_holdings_query(sankey_levels=request.sankey_levels)
+    nodes, links = [], []
+    for kind, item in iter_holdings_sankey(db, request):
+        if kind == "node":
+            nodes.append(schemas.SankeyNode(**item))
+        else:
+            links.append(schemas.SankeyLink(**item))
+    return schemas.SankeyData(nodes=nodes, links=links)
+
+
+def iter_holdings_sankey(db: Session, request: schemas.SankeyRequest) -> Iterator[Tuple[str, dict]]:
+    """
+    The holdings Sankey as ("node", {"label"}) and ("link", {"source", "target", "value"}) items:
+    every node, then the links one level at a time. The query runs here, before the first item.
+    """
+    if queries.sankey_levels_in_rollup(request.sankey_levels) and rollups.coverage(db).covers(
+        request.as_of_date, asset_classes=True
+    ):
+        query = queries.get_sankey_rollup_query(sankey_levels=request.sankey_levels)
+    else:
+        query = queries.get_sankey_holdings_query(sankey_levels=request.sankey_levels)
     results = db.execute(
         query, {"as_of_date": request.as_of_date, "account_codes": tuple(request.account_codes)}
     ).fetchall()
 
     # Convert results to dictionaries for easier processing
     data = []
-    total_value = 0
-
     for row in results:
         row_dict = {}
         for i, level in enumerate(request.sankey_levels):
@@ -183,32 +200,29 @@ def get_holdings_for_sankey(db: Session, request: schemas.SankeyRequest) -> sche
         # Round market value to 2 decimal places
         row_dict["value"] = round(float(row.total_market_value), 2)
         data.append(row_dict)
-        total_value += row_dict["value"]
+    return _sankey_items(data, request.sankey_levels)
 
-    # Build Sankey nodes and links
-    nodes = [schemas.SankeyNode(label="Grand Total")]  # Root node
-    node_map = {"Grand Total": 0}
-    node_counter = 1
-    
+
+def _sankey_items(data: List[dict], sankey_levels: List[str]) -> Iterator[Tuple[str, dict]]:
     # Collect all unique node labels first
     all_node_labels = set(["Grand Total"])
     for item in data:
-        for level in request.sankey_levels:
+        for level in sankey_levels:
             clean_level = level.replace("account.", "").replace("security.", "")
             all_node_labels.add(str(item[clean_level]))
-    
-    # Create all nodes
+
+    # Root node, then all other nodes
+    yield "node", {"label": "Grand Total"}
+    node_map = {"Grand Total": 0}
+    node_counter = 1
     for label in sorted(all_node_labels):
         if label not in node_map:
-            nodes.append(schemas.SankeyNode(label=label))
+            yield "node", {"label": label}
             node_map[label] = node_counter
             node_counter += 1
 
     # Now create links level by level
-    links = []
-    
-    # Process each level of the hierarchy
-    for level_idx, level in enumerate(request.sankey_levels):
+    for level_idx, level in enumerate(sankey_levels):
         clean_level = level.replace("account.", "").replace("security.", "")
 
         if level_idx == 0:
@@ -219,43 +233,33 @@ def get_holdings_for_sankey(db: Session, request: schemas.SankeyRequest) -> sche
                 if key not in level_aggregation:
                     level_aggregation[key] = 0
                 level_aggregation[key] += item["value"]
-            
+
             # Create links from Grand Total to first level
             for group_name, group_value in level_aggregation.items():
                 rounded_value = round(float(group_value), 2)
                 if group_name in node_map:
-                    links.append(
-                        schemas.SankeyLink(source=0, target=node_map[group_name], value=rounded_value)
-                    )
+                    yield "link", {"source": 0, "target": node_map[group_name], "value": rounded_value}
         else:
             # Subsequent levels: links from previous level
-            prev_level = request.sankey_levels[level_idx - 1]
+            prev_level = sankey_levels[level_idx - 1]
             prev_clean_level = prev_level.replace("account.", "").replace("security.", "")
-            
+
             # Create a mapping from (prev_level_value, curr_level_value) -> aggregated_value
             link_aggregation = {}
             for item in data:
                 prev_key = str(item[prev_clean_level])
                 curr_key = str(item[clean_level])
                 link_key = (prev_key, curr_key)
-                
+
                 if link_key not in link_aggregation:
                     link_aggregation[link_key] = 0
                 link_aggregation[link_key] += item["value"]
-            
+
             # Create links from previous level to current level
             for (prev_name, curr_name), link_value in link_aggregation.items():
                 if prev_name in node_map and curr_name in node_map:
                     rounded_link_value = round(float(link_value), 2)
-                    links.append(
-                        schemas.SankeyLink(
-                            source=node_map[prev_name], 
-                            target=node_map[curr_name], 
-                            value=rounded_link_value
-                        )
-                    )
-
-    return schemas.SankeyData(nodes=nodes, links=links)
+                    yield "link", {"source": node_map[prev_name], "target": node_map[curr_name], "value": rounded_link_value}
 
 
 def get_available_dates_for_accounts(
@@ -264,7 +268,10 @@ def get_available_dates_for_accounts(
     """
     Get available as_of_date values for given account codes from holdings data.
     """
-    query = queries.get_available_dates_query()
+    if rollups.coverage(db).complete:
+        query = queries.get_rollup_available_dates_query()
+    else:
+        query = queries.get_available_dates_query()
     results = db.execute(query, {"account_codes": tuple(request.account_codes)}).fetchall()
 
     # Extract dates from results
@@ -284,11 +291,23 @@ def get_available_dates_for_accounts(
     )
 
 
+def _no_progress(fraction, stage):
+    pass
+
+
 class PerformanceSankeyService:
     def __init__(self, db: Session):
         self.db = db
 
-    def generate_sankey_data(self, start_date, end_date, account_codes):
+    def generate_sankey_data(
+        self, start_date, end_date, account_codes, fx_method="endpoint", include_securities=False, top_k=10,
+        progress=None,
+    ):
+        """
+        progress, when given, is called as progress(fraction done, stage) before each stage
+        (background jobs report it, see app/jobs.py)
+        """
+        progress = progress or _no_progress
         # Fixed attribution levels with account breakdown
         attribution_levels = ["fx", "dividends", "appreciation", "fees", "other", "account"]
 
@@ -325,49 +344,96 @@ FROM phw_dev_gold.fx_rate
 WHERE "AsofDate" IN ('{start_date.strftime('%Y-%m-%d')}', '{end_date.strftime('%Y-%m-%d')}')
 ORDER BY "AsofDate", "CurrencyCode";""")
 
-        print(f"\n📊 Daily Aggregate Net Cash Flow:")
-        print(f"""SELECT "AsofDate", "AccountCode", "NetCashflow"
-FROM phw_dev_gold.fact_daily_aggregate_values
-WHERE "AsofDate" BETWEEN '{start_date.strftime('%Y-%m-%d')}' AND '{end_date.strftime('%Y-%m-%d')}'
-AND "AccountCode" IN ('{account_codes_str}')
-ORDER BY "AsofDate", "AccountCode";""")
         print("=" * 50)
 
         # Get holdings data
+        progress(0.0, "holdings")
         holdings_data = self.db.execute(queries.GET_HOLDINGS_FOR_ATTRIBUTION, params).fetchall()
         print(f"\n📈 Retrieved {len(holdings_data)} holdings records")
 
-        # Get transaction data
-        transactions_data = self.db.execute(queries.GET_TRANSACTIONS_FOR_ATTRIBUTION, params).fetchall()
-        print(f"💱 Retrieved {len(transactions_data)} transaction records")
-
         # Get FX rates
         fx_rates_data = self.db.execute(queries.GET_FX_RATES_FOR_ATTRIBUTION, params).fetchall()
         print(f"💵 Retrieved {len(fx_rates_data)} FX rate records")
+        fx_rates = self._fx_rate_lookup(fx_rates_data)
 
-        # Get daily aggregate data for net contributions
-        daily_agg_data = self.db.execute(queries.GET_DAILY_AGGREGATE_FOR_ATTRIBUTION, params).fetchall()
-        print(f"📊 Retrieved {len(daily_agg_data)} daily aggregate records")
+        # Transactions of the whole period are the long read of the request: they come through a
+        # server-side cursor and are classified as they arrive, never held as one list
+        progress(0.1, "transactions")
+        transactions_result = self.db.execute(
+            queries.GET_TRANSACTIONS_FOR_ATTRIBUTION, params, execution_options=settings.database.stream_options()
+        )
+        try:
+            flows = transaction_flows.classify(transactions_result, fx_rates, self._convert_to_cad)
+        finally:
+            transactions_result.close()
+        print(f"💱 Classified {flows.rows} transaction records")
+
+        # Daily FX attribution replaces the start/end approximation with per-day positions
+        daily_fx_gains = None
+        if fx_method == "daily":
+            progress(0.4, "daily_fx")
+            daily_fx_gains = self._calculate_daily_fx_gains(params, start_date, end_date)
 
         # 2. Process the data in Python for better debugging
+        progress(0.6, "attribution")
         attribution_results = self._calculate_performance_attribution(
-            holdings_data, transactions_data, fx_rates_data, daily_agg_data, start_date, end_date, account_codes
+            holdings_data, flows, fx_rates, start_date, end_date, account_codes, daily_fx_gains=daily_fx_gains,
         )
 
         # 3. Build Sankey structure from calculated results
+        progress(0.8, "sankey")
         sankey_data = self._build_sankey_from_attribution(attribution_results, attribution_levels)
 
         # 4. Build performance summary
         performance_summary = self._build_performance_summary(attribution_results, start_date, end_date, account_codes)
+        performance_summary.fx_method = fx_method
+
+        # 5. Optional security-level drill-down from the holdings and transaction totals already loaded
+        security_attribution = None
+        if include_securities:
+            progress(0.9, "securities")
+            security_attribution = self._calculate_security_attributions(
+                holdings_data, flows, attribution_results, start_date, end_date, top_k
+            )
 
-        # 5. Return combined response
+        # 6. Return combined response
         return schemas.PerformanceAttributionResponse(
             perf_summary=performance_summary,
             perf_sankey=schemas.PerformanceSankeyData(nodes=sankey_data.nodes, links=sankey_data.links),
+            security_attribution=security_attribution,
         )
 
+    def _calculate_daily_fx_gains(self, params, start_date, end_date):
+        """Load daily per-security positions and sum mva_local_previous × daily FX rate change"""
+        from datetime import timedelta
+        from . import fx_attribution
+
+        # Load rates from a few days before the start so the first day always has a previous rate
+        rate_params = dict(params, start_date=start_date - timedelta(days=fx_attribution.FX_RATE_LOOKBACK_DAYS))
+        fx_rates_data = self.db.execute(queries.GET_FX_RATES_FOR_ATTRIBUTION, rate_params).fetchall()
+
+        # The largest result set of the request and read once in order, so it is streamed in
+        # batches through a server-side cursor instead of being materialised as one list
+        positions_data = self.db.execute(
+            queries.GET_DAILY_POSITIONS_FOR_FX_ATTRIBUTION, params, execution_options=settings.database.stream_options()
+        )
+
+        fx_gains, stats = fx_attribution.daily_fx_gains(positions_data, fx_rates_data, start_date, end_date)
+        print(
+            f"🌍 Daily FX attribution: {stats['positions']} positions over {stats['rows']} daily records"
+            f" ({stats['missing_rate_rows']} records without an FX rate)"
+        )
+        return fx_gains
+
+    def _fx_rate_lookup(self, fx_rates_data):
+        """{(YYYY-MM-DD, currency): rate} of FX rate rows"""
+        return {
+            (rate.as_of_date.strftime("%Y-%m-%d"), rate.currency_code): float(rate.exchange_rate)
+            for rate in fx_rates_data
+        }
+
     def _calculate_performance_attribution(
-        self, holdings_data, transactions_data, fx_rates_data, daily_agg_data, start_date, end_date, account_codes
+        self, holdings_data, flows, fx_rates, start_date, end_date, account_codes, daily_fx_gains=None,
     ):
         """Calculate performance attribution with detailed logging for debugging"""
 
@@ -375,13 +441,6 @@ ORDER BY "AsofDate", "AccountCode";""")
         print("🧮 PERFORMANCE ATTRIBUTION CALCULATION")
         print("=" * 100)
 
-        # Create lookup dictionaries for efficient data access
-        fx_rates = {}
-        for rate in fx_rates_data:
-            date_key = rate.as_of_date.strftime("%Y-%m-%d")
-            currency = rate.currency_code
-            fx_rates[(date_key, currency)] = float(rate.exchange_rate)
-
         # Separate holdings by date
         start_holdings = {}
         end_holdings = {}
@@ -431,139 +490,36 @@ ORDER BY "AsofDate", "AccountCode";""")
         print(f"\n💰 TOTAL Start MVA: ${start_mva:,.2f} CAD")
         print(f"💰 TOTAL End MVA: ${end_mva:,.2f} CAD")
 
-        # Calculate net contributions from daily aggregate data
+        # Net contribution from the multiplier transactions, converted to CAD while streaming
         print(f"\n💱 NET CONTRIBUTION DETAILED ANALYSIS:")
         print("=" * 60)
-        
-        # Print SQL query for manual testing BEFORE calculating values
-        account_codes_str = "', '".join(account_codes)
-        
-        # Calculate net contribution directly from transactions using multiplier values
-        print(f"📊 CALCULATING NET CONTRIBUTION FROM MULTIPLIER TRANSACTIONS:")
-        print("-" * 50)
-        
-        # Net contribution types based on transaction_types.csv multipliers
-        net_contrib_in_types = ["CCR", "CRD", "SRD", "TCI", "TSI"]   # Multiplier = 1
-        net_contrib_out_types = ["CDR", "CWD", "SWD", "TCO", "TSO"]  # Multiplier = -1
-        
-        account_net_contributions = {}
-        account_transaction_details = {}
-        
-        # Process each transaction for net contribution calculation
-        for txn in transactions_data:
-            account = txn.account_code
-            
-            if account not in account_net_contributions:
-                account_net_contributions[account] = Decimal("0")
-                account_transaction_details[account] = []
-            
-            # Convert to CAD using FX rates - this is crucial for accurate net contribution
-            amount_cad = self._convert_to_cad(txn.settlement_amount, txn.settlement_currency, txn.trade_date, fx_rates)
-            
-            # Check if this transaction affects net contribution
-            if txn.transaction_type_code in net_contrib_in_types:
-                # Multiplier = 1 (positive net contribution)
-                net_amount = Decimal(str(abs(amount_cad)))
-                account_net_contributions[account] += net_amount
-                account_transaction_details[account].append({
-                    'date': txn.trade_date,
-                    'type': txn.transaction_type_code,
-                    'symbol': txn.security_symbol,
-                    'amount_cad': net_amount,
-                    'flow': 'IN',
-                    'multiplier': 1,
-                    'original_currency': txn.settlement_currency,
-                    'original_amount': txn.settlement_amount,
-                    'fx_rate': fx_rates.get((txn.trade_date.strftime("%Y-%m-%d"), txn.settlement_currency), 1.0) if txn.settlement_currency != 'CAD' else 1.0
-                })
-                
-            elif txn.transaction_type_code in net_contrib_out_types:
-                # Multiplier = -1 (negative net contribution)
-                net_amount = -Decimal(str(abs(amount_cad)))
-                account_net_contributions[account] += net_amount
-                account_transaction_details[account].append({
-                    'date': txn.trade_date,
-                    'type': txn.transaction_type_code,
-                    'symbol': txn.security_symbol,
-                    'amount_cad': net_amount,
-                    'flow': 'OUT',
-                    'multiplier': -1,
-                    'original_currency': txn.settlement_currency,
-                    'original_amount': txn.settlement_amount,
-                    'fx_rate': fx_rates.get((txn.trade_date.strftime("%Y-%m-%d"), txn.settlement_currency), 1.0) if txn.settlement_currency != 'CAD' else 1.0
-                })
-        
-        # Calculate total net contribution from transactions (not daily aggregates)
-        net_contribution = sum(account_net_contributions.values())
-        
-        print(f"📊 NET CONTRIBUTION BY ACCOUNT (from transactions, sorted by date):")
+        net_contribution = flows.net_contribution
+
+        print(f"📊 NET CONTRIBUTION BY ACCOUNT (from transactions):")
         print("-" * 50)
-        
-        for account in sorted(account_net_contributions.keys()):
-            account_contrib = account_net_contributions[account]
-            account_transactions = account_transaction_details[account]
-            
-            print(f"\n🏦 {account} NET CONTRIBUTION: ${account_contrib:,.2f}")
-            
-            if account_transactions:
-                # Sort transactions by date
-                sorted_transactions = sorted(account_transactions, key=lambda x: x['date'])
-                
-                print(f"   � Transaction Details ({len(sorted_transactions)} multiplier transactions):")
-                
-                for txn in sorted_transactions:
-                    flow_icon = "📈" if txn['flow'] == 'IN' else "📉"
-                    multiplier_text = f"(×{txn['multiplier']})"
-                    
-                    # Show FX conversion details for non-CAD transactions
-                    if txn['original_currency'] != 'CAD':
-                        fx_note = f" [{txn['original_currency']} {txn['original_amount']:,.2f} @ {txn['fx_rate']:.4f}]"
-                    else:
-                        fx_note = ""
-                    
-                    print(f"      {flow_icon} {txn['date']}: {txn['type']} {txn['symbol']} ${txn['amount_cad']:>12,.2f} {multiplier_text}{fx_note}")
-                
-                # Show summary by flow direction
-                cash_in_total = sum(t['amount_cad'] for t in sorted_transactions if t['flow'] == 'IN')
-                cash_out_total = sum(abs(t['amount_cad']) for t in sorted_transactions if t['flow'] == 'OUT')
-                
-                print(f"   💰 Total Cash/Security IN:  ${cash_in_total:,.2f}")
-                print(f"   💸 Total Cash/Security OUT: ${cash_out_total:,.2f}")
-                print(f"   🔄 Net Flow:                ${cash_in_total - cash_out_total:,.2f}")
-                
-                # Show transaction type breakdown
-                type_summary = {}
-                for txn in sorted_transactions:
-                    txn_type = txn['type']
-                    if txn_type not in type_summary:
-                        type_summary[txn_type] = {'count': 0, 'total': Decimal("0")}
-                    type_summary[txn_type]['count'] += 1
-                    type_summary[txn_type]['total'] += txn['amount_cad']
-                
-                if type_summary:
-                    print(f"   📋 Transaction Type Summary:")
-                    for txn_type, summary in sorted(type_summary.items()):
-                        print(f"      • {txn_type}: {summary['count']} transactions, ${summary['total']:,.2f}")
-                        
-                # Show FX impact summary for this account
-                fx_transactions = [t for t in sorted_transactions if t['original_currency'] != 'CAD']
-                if fx_transactions:
-                    print(f"   🌍 FX Conversion Summary:")
-                    fx_by_currency = {}
-                    for txn in fx_transactions:
-                        curr = txn['original_currency']
-                        if curr not in fx_by_currency:
-                            fx_by_currency[curr] = {'transactions': 0, 'original_total': Decimal("0"), 'cad_total': Decimal("0")}
-                        fx_by_currency[curr]['transactions'] += 1
-                        fx_by_currency[curr]['original_total'] += Decimal(str(txn['original_amount']))
-                        fx_by_currency[curr]['cad_total'] += abs(txn['amount_cad'])
-                    
-                    for curr, summary in fx_by_currency.items():
-                        avg_rate = summary['cad_total'] / summary['original_total'] if summary['original_total'] != 0 else 0
-                        print(f"      • {curr}: {summary['transactions']} txns, {curr} {summary['original_total']:,.2f} → CAD ${summary['cad_total']:,.2f} (avg rate: {avg_rate:.4f})")
-            else:
+
+        for account in sorted(flows.accounts):
+            account_flows = flows.accounts[account]
+            print(f"\n🏦 {account} NET CONTRIBUTION: ${account_flows.net_contribution:,.2f}")
+
+            if not account_flows.by_type:
                 print(f"   ✅ No multiplier transactions affecting net contribution")
-        
+                continue
+
+            print(f"   💰 Total Cash/Security IN:  ${account_flows.cash_in:,.2f}")
+            print(f"   💸 Total Cash/Security OUT: ${account_flows.cash_out:,.2f}")
+            print(f"   🔄 Net Flow:                ${account_flows.cash_in - account_flows.cash_out:,.2f}")
+
+            print(f"   📋 Transaction Type Summary:")
+            for txn_type, (count, total) in sorted(account_flows.by_type.items()):
+                print(f"      • {txn_type}: {count} transactions, ${total:,.2f}")
+
+            if account_flows.by_currency:
+                print(f"   🌍 FX Conversion Summary:")
+                for curr, (count, original_total, cad_total) in account_flows.by_currency.items():
+                    avg_rate = cad_total / original_total if original_total != 0 else 0
+                    print(f"      • {curr}: {count} txns, {curr} {original_total:,.2f} → CAD ${cad_total:,.2f} (avg rate: {avg_rate:.4f})")
+
         print(f"\n💱 TOTAL Net Contribution (from transactions with FX conversion): ${net_contribution:,.2f} CAD")
         print("=" * 60)
 
@@ -572,15 +528,17 @@ ORDER BY "AsofDate", "AccountCode";""")
         print(f"📈 Total Gain/Loss: ${total_gain_loss:,.2f} CAD")
 
         # Process transactions and categorize them
-        income_total, fees_total, security_contributions = self._process_transactions(
-            transactions_data, fx_rates, start_date, end_date
-        )
+        income_total, fees_total, security_contributions = self._process_transactions(flows)
 
         print(f"💵 Total Income: ${income_total:,.2f} CAD")
         print(f"💸 Total Fees: ${fees_total:,.2f} CAD")
 
         # Calculate FX gains for each security
-        fx_gains = self._calculate_fx_gains(start_holdings, end_holdings, fx_rates, start_date, end_date)
+        if daily_fx_gains is not None:
+            print("\n🌍 Using daily-position FX attribution (fact_daily_aggregate_values_slp)")
+            fx_gains = daily_fx_gains
+        else:
+            fx_gains = self._calculate_fx_gains(start_holdings, end_holdings, fx_rates, start_date, end_date)
 
         fx_total = sum(fx_gains.values())
         print(f"🌍 Total FX Gain/Loss: ${fx_total:,.2f} CAD")
@@ -619,197 +577,37 @@ ORDER BY "AsofDate", "AccountCode";""")
             "fx_gains_by_security": fx_gains,
             "security_contributions": security_contributions,
             "account_attributions": self._calculate_account_attributions(
-                holdings_data, transactions_data, fx_rates_data, daily_agg_data, start_date, end_date, account_codes, appreciation_total
+                holdings_data, flows, fx_rates, start_date, end_date, account_codes, appreciation_total,
+                daily_fx_gains=daily_fx_gains,
             ),
         }
 
-    def _process_transactions(self, transactions_data, fx_rates, start_date, end_date):
-        """Process transactions and categorize them into income, fees, and contributions"""
+    def _process_transactions(self, flows):
+        """Income, fees and per-security net contributions of the classified transactions"""
 
         print("\n💱 PROCESSING TRANSACTIONS BY ACCOUNT")
         print("-" * 40)
 
-        # Define transaction type categories based on transaction_types.csv
-        # Only transactions with a multiplier value (1 or -1) affect net contribution/cash flow
-
-        # Income types (part of investment gains, not cash flow)
-        income_types = [
-            "CDV",  # Cash Dividend/ Dividend Income
-            "DVI",  # Dividend Income
-            "SDV",  # Stock Dividend (Tax-Free)
-            "INT",  # Interest Income
-            "FNI",  # Foreign Income
-            "IPS",  # Interest from Cash
-            "DRI",  # Dividend Distribution Reinvestment
-            "SDT",  # Stock Dividend (Taxable)
-            "GRI",  # Capital Gain Distribution Reinvestment
-            "FRI",  # Foreign Income Distribution Reinvestment
-            "IRI",  # Interest Distribution Reinvestment
-            "CGR",  # Capital Gain Reinvestment
-            "DVR",  # Dividend Reinvestment
-            "FIR",  # Foreign Income Reinvestment
-            "FID",  # Foreign Income Distribution
-            "IIR",  # Interest Reinvestment
-            "IID",  # Interest Distribution
-            "INR",  # Income Reinvestment
-            "IND",  # Income Distribution
-            "MAT",  # Maturity
-        ]
-
-        # Fees (typically have no multiplier, so don't affect net contribution)
-        fee_types = ["MFE", "FEE", "ADM", "EXP", "AFE", "TFE", "VFE", "LFE", "PFE", "RDF", "RFE", "CDT", "CFE", "CMF"]
-
-        # Cash flow transactions with explicit multipliers from transaction_types.csv
-        # These affect Net Contribution, NOT income
-        cash_in_types = ["CCR", "CRD", "SRD", "TCI", "TSI"]  # Multiplier = 1 (cash/security in)
-        cash_out_types = [
-            "CDR",
-            "CWD",
-            "SWD",
-            "TCO",
-            "TSO",
-        ]  # Multiplier = -1 (cash/security out)
-
-        # Buy/Sell transactions (JSL, JBY) - these don't affect net contribution as they're just conversions
-        trading_types = ["JSL", "JBY"]  # These convert between cash and securities, net effect = 0
-
-        income_total = Decimal("0")
-        fees_total = Decimal("0")
-        security_contributions = {}
-
+        # Categories follow the multipliers of transaction_types.csv (app/transaction_flows.py):
+        # only transactions with a multiplier (1 or -1) affect net contribution
         print(f"📋 Transaction Categories:")
-        print(f"  💰 Income (part of gains): {income_types}")
-        print(f"  💸 Fees: {fee_types}")
-        print(f"  📈 Cash In (Net Contribution +): {cash_in_types}")
-        print(f"  📉 Cash Out (Net Contribution -): {cash_out_types}")
-        print(f"  🔄 Trading (No net contribution): {trading_types}")
+        print(f"  💰 Income (part of gains): {sorted(transaction_flows.INCOME_TYPES)}")
+        print(f"  💸 Fees: {sorted(transaction_flows.FEE_TYPES)}")
+        print(f"  📈 Cash In (Net Contribution +): {sorted(transaction_flows.CASH_IN_TYPES)}")
+        print(f"  📉 Cash Out (Net Contribution -): {sorted(transaction_flows.CASH_OUT_TYPES)}")
+        print(f"  🔄 Trading (No net contribution): {sorted(transaction_flows.TRADING_TYPES)}")
         print()
 
-        # Add SQL query for detailed multiplier transaction analysis
-        account_codes_str = "', '".join({txn.account_code for txn in transactions_data})
-        multiplier_types = cash_in_types + cash_out_types
-        multiplier_types_str = "', '".join(multiplier_types)
-        
-        print(f"📋 SQL QUERY FOR NET CONTRIBUTION TRANSACTIONS:")
-        print("-" * 50)
-        print(f"""-- Transactions that affect Net Contribution (multiplier transactions)
-SELECT 
-    "TradeDate", 
-    "AccountCode", 
-    "SecuritySymbol", 
-    "TransactionTypeCode",
-    "SettlementAmount", 
-    "SettlementCurrency",
-    dt.multiplier,
-    CASE 
-        WHEN dt.multiplier = 1 THEN 'CASH/SECURITY IN (+)'
-        WHEN dt.multiplier = -1 THEN 'CASH/SECURITY OUT (-)'
-        ELSE 'NO NET CONTRIBUTION IMPACT'
-    END as contribution_type
-FROM phw_dev_gold.fact_transactions ft
-LEFT JOIN phw_dev_gold.dim_transaction_types dt ON ft."TransactionTypeCode" = dt."TransactionType"
-WHERE "TradeDate" BETWEEN '{start_date.strftime('%Y-%m-%d')}' AND '{end_date.strftime('%Y-%m-%d')}'
-AND "AccountCode" IN ('{account_codes_str}')
-AND "TransactionTypeCode" IN ('{multiplier_types_str}')
-ORDER BY "AccountCode", "TradeDate", "SettlementAmount" DESC;""")
-        print("-" * 50)
-        print()
-
-        # Track net contribution transactions by account
-        net_contrib_by_account = {}
-        net_contrib_transactions = []
-
-        for txn in transactions_data:
-            # Convert transaction amount to CAD
-            amount_cad = self._convert_to_cad(txn.settlement_amount, txn.settlement_currency, txn.trade_date, fx_rates)
-
-            # Categorize transaction based on transaction_types.csv multiplier values
-            if txn.transaction_type_code in income_types:
-                income_total += Decimal(str(abs(amount_cad)))
-                print(f"  � Income: [{txn.account_code}] {txn.security_symbol} {txn.transaction_type_code} ${amount_cad:,.2f}")
-
-            elif txn.transaction_type_code in fee_types and amount_cad < 0:
-                fees_total += Decimal(str(abs(amount_cad)))
-                print(f"  💸 Fee: [{txn.account_code}] {txn.security_symbol} {txn.transaction_type_code} ${abs(amount_cad):,.2f}")
-
-            elif txn.transaction_type_code in cash_in_types:
-                # Transactions with multiplier = 1 (positive cash flow) - affects Net Contribution
-                security_code = txn.security_code
-                if security_code not in security_contributions:
-                    security_contributions[security_code] = Decimal("0")
-                security_contributions[security_code] += Decimal(str(abs(amount_cad)))
-                print(f"  � Cash In (Net Contrib): [{txn.account_code}] {txn.security_symbol} {txn.transaction_type_code} ${abs(amount_cad):,.2f}")
-
-            elif txn.transaction_type_code in cash_out_types:
-                # Transactions with multiplier = -1 (negative cash flow) - affects Net Contribution
-                security_code = txn.security_code
-                if security_code not in security_contributions:
-                    security_contributions[security_code] = Decimal("0")
-                security_contributions[security_code] -= Decimal(str(abs(amount_cad)))
-                print(f"  � Cash Out (Net Contrib): [{txn.account_code}] {txn.security_symbol} {txn.transaction_type_code} ${-abs(amount_cad):,.2f}")
-
-            elif txn.transaction_type_code in trading_types:
-                # Buy/Sell transactions - no net contribution impact
-                print(f"  🔄 Trading (No Net Impact): [{txn.account_code}] {txn.security_symbol} {txn.transaction_type_code} ${amount_cad:,.2f}")
-
-            else:
-                # Unclassified transaction - log for investigation
-                print(f"  ❓ Unclassified: [{txn.account_code}] {txn.security_symbol} {txn.transaction_type_code} ${amount_cad:,.2f}")
-
-        # After processing all transactions, show detailed net contribution analysis
-        print(f"\n🔍 NET CONTRIBUTION TRANSACTION ANALYSIS:")
-        print("=" * 60)
-        
-        # Calculate transaction-based net contribution by account
-        transaction_net_contrib_by_account = {}
-        for txn in transactions_data:
-            account = txn.account_code
-            if account not in transaction_net_contrib_by_account:
-                transaction_net_contrib_by_account[account] = Decimal("0")
-                
-            amount_cad = self._convert_to_cad(txn.settlement_amount, txn.settlement_currency, txn.trade_date, fx_rates)
-            
-            if txn.transaction_type_code in cash_in_types:
-                transaction_net_contrib_by_account[account] += Decimal(str(abs(amount_cad)))
-            elif txn.transaction_type_code in cash_out_types:
-                transaction_net_contrib_by_account[account] -= Decimal(str(abs(amount_cad)))
-        
-        total_transaction_net_contrib = sum(transaction_net_contrib_by_account.values())
-        print(f"💱 Total from Net Contribution Transactions: ${total_transaction_net_contrib:,.2f}")
-        
-        for account in sorted(transaction_net_contrib_by_account.keys()):
-            account_contrib = transaction_net_contrib_by_account[account]
-            account_transactions = [txn for txn in transactions_data if txn.account_code == account and 
-                                  (txn.transaction_type_code in cash_in_types or txn.transaction_type_code in cash_out_types)]
-            
-            print(f"\n🏦 {account} Net Contribution from Transactions: ${account_contrib:,.2f}")
-            
-            if account_transactions:
-                print(f"   📊 Transaction Details ({len(account_transactions)} transactions):")
-                
-                # Sort by date and amount
-                sorted_txns = sorted(account_transactions, key=lambda x: x.trade_date)
-                
-                for txn in sorted_txns:
-                    amount_cad = self._convert_to_cad(txn.settlement_amount, txn.settlement_currency, txn.trade_date, fx_rates)
-                    flow_icon = "📈" if txn.transaction_type_code in cash_in_types else "📉"
-                    flow_amount = abs(amount_cad) if txn.transaction_type_code in cash_in_types else -abs(amount_cad)
-                    currency_note = f" ({txn.settlement_currency} {txn.settlement_amount:,.2f})" if txn.settlement_currency != 'CAD' else ""
-                    print(f"      {flow_icon} {txn.trade_date}: {txn.transaction_type_code} {txn.security_symbol} ${flow_amount:>12,.2f}{currency_note}")
-                
-                # Show totals by flow direction
-                cash_in_total = sum(abs(self._convert_to_cad(txn.settlement_amount, txn.settlement_currency, txn.trade_date, fx_rates)) 
-                                  for txn in account_transactions if txn.transaction_type_code in cash_in_types)
-                cash_out_total = sum(abs(self._convert_to_cad(txn.settlement_amount, txn.settlement_currency, txn.trade_date, fx_rates)) 
-                                   for txn in account_transactions if txn.transaction_type_code in cash_out_types)
-                
-                print(f"   💰 Total Cash IN:  ${cash_in_total:,.2f}")
-                print(f"   💸 Total Cash OUT: ${cash_out_total:,.2f}")
-                print(f"   🔄 Net Flow:       ${cash_in_total - cash_out_total:,.2f}")
-        
-        print("=" * 60)
+        for account in sorted(flows.accounts):
+            account_flows = flows.accounts[account]
+            print(
+                f"  🏦 {account}: Income ${account_flows.income:,.2f}, Fees ${account_flows.fees:,.2f}, "
+                f"Cash In ${account_flows.cash_in:,.2f}, Cash Out ${account_flows.cash_out:,.2f}"
+            )
+        if flows.unclassified:
+            print(f"  ❓ Unclassified: {flows.unclassified} of {flows.rows} transactions")
 
-        return income_total, fees_total, security_contributions
+        return flows.income_total, flows.fees_total, flows.security_contributions
 
     def _convert_to_cad(self, amount, currency, date, fx_rates):
         """Convert amount to CAD using FX rates"""
@@ -914,7 +712,8 @@ ORDER BY "AccountCode", "TradeDate", "SettlementAmount" DESC;""")
         return fx_gains
 
     def _calculate_account_attributions(
-        self, holdings_data, transactions_data, fx_rates_data, daily_agg_data, start_date, end_date, account_codes, global_appreciation_total
+        self, holdings_data, flows, fx_rates, start_date, end_date, account_codes, global_appreciation_total,
+        daily_fx_gains=None,
     ):
         """Calculate attribution breakdown by account for more detailed analysis"""
 
@@ -937,13 +736,6 @@ ORDER BY "AccountCode", "TradeDate", "SettlementAmount" DESC;""")
                 "other": Decimal("0"),
             }
 
-        # Create FX rates lookup
-        fx_rates = {}
-        for rate in fx_rates_data:
-            date_key = rate.as_of_date.strftime("%Y-%m-%d")
-            currency = rate.currency_code
-            fx_rates[(date_key, currency)] = float(rate.exchange_rate)
-
         # Process holdings by account
         for holding in holdings_data:
             account_code = holding.account_code
@@ -958,151 +750,111 @@ ORDER BY "AccountCode", "TradeDate", "SettlementAmount" DESC;""")
             elif date_str == end_date.strftime("%Y-%m-%d"):
                 account_attributions[account_code]["end_mva"] += market_value
 
-        # Process transaction-based net contribution by account (with FX conversion)
-        net_contrib_in_types = ["CCR", "CRD", "SRD", "TCI", "TSI"]   # Multiplier = 1
-        net_contrib_out_types = ["CDR", "CWD", "SWD", "TCO", "TSO"]  # Multiplier = -1
-        
-        for transaction in transactions_data:
-            account_code = transaction.account_code
-            if account_code in account_attributions:
-                # Convert to CAD using FX rates for accurate net contribution
-                amount_cad = self._convert_to_cad(transaction.settlement_amount, transaction.settlement_currency, transaction.trade_date, fx_rates)
-                
-                if transaction.transaction_type_code in net_contrib_in_types:
-                    # Multiplier = 1 (positive net contribution)
-                    account_attributions[account_code]["net_contribution"] += Decimal(str(abs(amount_cad)))
-                elif transaction.transaction_type_code in net_contrib_out_types:
-                    # Multiplier = -1 (negative net contribution)
-                    account_attributions[account_code]["net_contribution"] -= Decimal(str(abs(amount_cad)))
+        # Net contribution, income and fees by account, from the classified transactions
+        for account_code, attr in account_attributions.items():
+            account_flows = flows.accounts.get(account_code)
+            if account_flows is None:
+                continue
+            attr["net_contribution"] = account_flows.net_contribution
+            attr["income"] = account_flows.income
+            attr["fees"] = account_flows.fees  # Negative, like the global calculation
+            print(f"    📊 Account Income: [{account_code}] ${account_flows.income:,.2f}, Fees: ${account_flows.fees:,.2f}")
 
         # Calculate total gain/loss by account
         for account_code in account_attributions:
             attr = account_attributions[account_code]
             attr["total_gain_loss"] = attr["end_mva"] - attr["start_mva"] - attr["net_contribution"]
 
-        # Process transactions by account using the same classification as main calculation
-        income_types = [
-            "CDV",
-            "DVI",
-            "SDV",
-            "INT",
-            "FNI",
-            "IPS",
-            "DRI",
-            "SDT",
-            "GRI",
-            "FRI",
-            "IRI",
-            "CGR",
-            "DVR",
-            "FIR",
-            "FID",
-            "IIR",
-            "IID",
-            "INR",
-            "IND",
-            "MAT",
-        ]
-        fee_types = ["MFE", "FEE", "ADM", "EXP", "AFE", "TFE", "VFE", "LFE", "PFE", "RDF", "RFE", "CDT", "CFE", "CMF"]
-
-        for transaction in transactions_data:
-            account_code = transaction.account_code
-            if account_code not in account_attributions:
-                continue
-
-            amount = Decimal(str(transaction.settlement_amount or 0))
-            trans_type = transaction.transaction_type_code
-
-            # Convert to CAD if needed (using the same method as global calculation)
-            amount_cad = self._convert_to_cad(transaction.settlement_amount, transaction.settlement_currency, transaction.trade_date, fx_rates)
-            amount = Decimal(str(amount_cad))
-
-            # Categorize transaction (using the same logic as global calculation)
-            if trans_type in income_types:
-                account_attributions[account_code]["income"] += Decimal(str(abs(amount_cad)))
-                print(f"    📊 Account Income: [{account_code}] {trans_type} ${abs(amount_cad):,.2f}")
-            elif trans_type in fee_types and amount_cad < 0:
-                account_attributions[account_code]["fees"] -= Decimal(str(abs(amount_cad)))  # Keep as negative like global calc
-                print(f"    📊 Account Fee: [{account_code}] {trans_type} ${-abs(amount_cad):,.2f}")
-
         # Calculate FX gains by account - track security-by-security for each account
         print("\n🌍 CALCULATING FX GAINS BY ACCOUNT")
         print("-" * 40)
 
-        # Group holdings by account and security for FX calculation
-        account_security_holdings = {}
-        for holding in holdings_data:
-            account_code = holding.account_code
-            security_code = holding.security_code
-            date_str = holding.as_of_date.strftime("%Y-%m-%d")
+        if daily_fx_gains is not None:
+            # Daily-position FX gains are already per (security, account)
+            from .fx_attribution import sum_by_account
+
+            daily_fx_by_account = sum_by_account(daily_fx_gains)
+            for account_code in account_codes:
+                if account_code not in account_attributions:
+                    continue
+                account_fx_gain = daily_fx_by_account.get(account_code, Decimal("0"))
+                account_attributions[account_code]["fx_gain"] = account_fx_gain
+                print(f"🏦 {account_code} Total FX Gain (daily): ${account_fx_gain:,.2f}")
+        else:
+            # Group holdings by account and security for FX calculation
+            account_security_holdings = {}
+            for holding in holdings_data:
+                account_code = holding.account_code
+                security_code = holding.security_code
+                date_str = holding.as_of_date.strftime("%Y-%m-%d")
 
-            if account_code not in account_security_holdings:
-                account_security_holdings[account_code] = {}
+                if account_code not in account_security_holdings:
+                    account_security_holdings[account_code] = {}
 
-            if security_code not in account_security_holdings[account_code]:
-                account_security_holdings[account_code][security_code] = {}
+                if security_code not in account_security_holdings[account_code]:
+                    account_security_holdings[account_code][security_code] = {}
 
-            account_security_holdings[account_code][security_code][date_str] = holding
+                account_security_holdings[account_code][security_code][date_str] = holding
 
-        # Calculate FX gains for each account's holdings
-        for account_code in account_codes:
-            if account_code not in account_attributions:
-                continue
+            # Calculate FX gains for each account's holdings
+            for account_code in account_codes:
+                if account_code not in account_attributions:
+                    continue
 
-            account_fx_gain = Decimal("0")
+                account_fx_gain = Decimal("0")
 
-            if account_code in account_security_holdings:
-                for security_code, security_holdings in account_security_holdings[account_code].items():
-                    start_date_str = start_date.strftime("%Y-%m-%d")
-                    end_date_str = end_date.strftime("%Y-%m-%d")
+                if account_code in account_security_holdings:
+                    for security_code, security_holdings in account_security_holdings[account_code].items():
+                        start_date_str = start_date.strftime("%Y-%m-%d")
+                        end_date_str = end_date.strftime("%Y-%m-%d")
 
-                    start_holding = security_holdings.get(start_date_str)
-                    end_holding = security_holdings.get(end_date_str)
+                        start_holding = security_holdings.get(start_date_str)
+                        end_holding = security_holdings.get(end_date_str)
 
-                    # Skip if we don't have both start and end holdings
-                    if not start_holding or not end_holding:
-                        continue
+                        # Skip if we don't have both start and end holdings
+                        if not start_holding or not end_holding:
+                            continue
 
-                    # Skip CAD securities (no FX impact)
-                    security_currency = start_holding.security_currency_code
-                    if security_currency == "CAD":
-                        continue
+                        # Skip CAD securities (no FX impact)
+                        security_currency = start_holding.security_currency_code
+                        if security_currency == "CAD":
+                            continue
 
-                    # Get FX rates for start and end dates
-                    start_fx_key = (start_date_str, security_currency)
-                    end_fx_key = (end_date_str, security_currency)
+                        # Get FX rates for start and end dates
+                        start_fx_key = (start_date_str, security_currency)
+                        end_fx_key = (end_date_str, security_currency)
 
-                    if start_fx_key not in fx_rates or end_fx_key not in fx_rates:
-                        print(f"  ⚠️  Missing FX rates for {security_currency} in {account_code}")
-                        continue
+                        if start_fx_key not in fx_rates or end_fx_key not in fx_rates:
+                            print(f"  ⚠️  Missing FX rates for {security_currency} in {account_code}")
+                            continue
 
-                    start_fx_rate = fx_rates[start_fx_key]
-                    end_fx_rate = fx_rates[end_fx_key]
+                        start_fx_rate = fx_rates[start_fx_key]
+                        end_fx_rate = fx_rates[end_fx_key]
 
-                    # Calculate FX gain for this security in this account
-                    start_value = Decimal(str(start_holding.market_value_accrued or 0))
-                    end_value = Decimal(str(end_holding.market_value_accrued or 0))
+                        # Calculate FX gain for this security in this account
+                        start_value = Decimal(str(start_holding.market_value_accrued or 0))
+                        end_value = Decimal(str(end_holding.market_value_accrued or 0))
 
-                    if start_value > 0 and end_value > 0:
-                        # Convert to local currency amounts
-                        start_local = start_value / Decimal(str(start_fx_rate))
-                        end_local = end_value / Decimal(str(end_fx_rate))
-                        fx_change = Decimal(str(end_fx_rate - start_fx_rate))
+                        if start_value > 0 and end_value > 0:
+                            # Convert to local currency amounts
+                            start_local = start_value / Decimal(str(start_fx_rate))
+                            end_local = end_value / Decimal(str(end_fx_rate))
+                            fx_change = Decimal(str(end_fx_rate - start_fx_rate))
 
-                        # Calculate FX impact (simplified - using average position)
-                        avg_local_position = (start_local + end_local) / 2
-                        security_fx_gain = avg_local_position * fx_change
+                            # Calculate FX impact (simplified - using average position)
+                            avg_local_position = (start_local + end_local) / 2
+                            security_fx_gain = avg_local_position * fx_change
 
-                        account_fx_gain += security_fx_gain
+                            account_fx_gain += security_fx_gain
 
-                        if abs(security_fx_gain) > Decimal("1.00"):  # Only log meaningful amounts
-                            symbol = start_holding.security_symbol or security_code
-                            print(
-                                f"  💱 {account_code} - {symbol}: ${security_fx_gain:,.2f} (FX: {start_fx_rate:.4f} → {end_fx_rate:.4f})"
-                            )
+                            if abs(security_fx_gain) > Decimal("1.00"):  # Only log meaningful amounts
+                                symbol = start_holding.security_symbol or security_code
+                                print(
+                                    f"  💱 {account_code} - {symbol}: ${security_fx_gain:,.2f} (FX: {start_fx_rate:.4f} → {end_fx_rate:.4f})"
+                                )
 
-            account_attributions[account_code]["fx_gain"] = account_fx_gain
-            print(f"🏦 {account_code} Total FX Gain: ${account_fx_gain:,.2f}")
+                account_attributions[account_code]["fx_gain"] = account_fx_gain
+                print(f"🏦 {account_code} Total FX Gain: ${account_fx_gain:,.2f}")
 
         # Calculate market appreciation as residual for each account
         # IMPORTANT: Account appreciations should be proportional shares of the global appreciation,
@@ -1141,6 +893,118 @@ ORDER BY "AccountCode", "TradeDate", "SettlementAmount" DESC;""")
 
         return account_attributions
 
+    def _calculate_security_attributions(
+        self, holdings_data, flows, results, start_date, end_date, top_k
+    ):
+        """
+        Per-security contribution by category for each account, limited to the top-K contributors
+        (by absolute total) plus an "Other" bucket.
+
+        For each (account, security):
+        - fx: the per-security FX gain already computed for the attribution
+        - income / fees: income and fee transactions booked against the security
+        - appreciation: change in market value, less net money put into the security
+          (buys - sells + transfers in - transfers out), less fx
+        Cash-like positions (price of 1) only move because of flows, so they get no appreciation.
+        Whatever the securities do not explain at account level is reported as unattributed.
+
+        flows is the period's TransactionFlows.
+        """
+        print("\n🔎 CALCULATING SECURITY-LEVEL ATTRIBUTION")
+        print("-" * 40)
+
+        start_date_str = start_date.strftime("%Y-%m-%d")
+        end_date_str = end_date.strftime("%Y-%m-%d")
+
+        securities = {}
+
+        def entry(account_code, security_code, source):
+            key = (account_code, security_code or "CASH")
+            if key not in securities:
+                securities[key] = {
+                    "security_symbol": getattr(source, "security_symbol", None),
+                    "security_name": getattr(source, "security_name", None),
+                    "start_mva": Decimal("0"),
+                    "end_mva": Decimal("0"),
+                    "invested": Decimal("0"),
+                    "income": Decimal("0"),
+                    "fees": Decimal("0"),
+                    "cash_like": False,
+                }
+            return securities[key]
+
+        for holding in holdings_data:
+            item = entry(holding.account_code, holding.security_code, holding)
+            value = Decimal(str(holding.market_value_accrued or 0))
+            date_str = holding.as_of_date.strftime("%Y-%m-%d")
+            if date_str == start_date_str:
+                item["start_mva"] += value
+            elif date_str == end_date_str:
+                item["end_mva"] += value
+            if holding.market_price is not None and Decimal(str(holding.market_price)) == 1:
+                item["cash_like"] = True
+
+        for (account_code, security_code), security_flows in flows.securities.items():
+            item = entry(account_code, security_code, security_flows)
+            item["invested"] += security_flows.invested
+            item["income"] += security_flows.income
+            item["fees"] += security_flows.fees
+
+        fx_gains = results.get("fx_gains_by_security", {})
+        by_account = {}
+        for (account_code, security_code), item in securities.items():
+            fx = Decimal(str(fx_gains.get((security_code, account_code), 0)))  # no FX on the cash bucket
+            if item["cash_like"]:
+                appreciation = Decimal("0")
+            else:
+                appreciation = item["end_mva"] - item["start_mva"] - item["invested"] - fx
+            total = appreciation + fx + item["income"] + item["fees"]
+            by_account.setdefault(account_code, []).append(
+                {
+                    "security_code": security_code,
+                    "security_symbol": item["security_symbol"],
+                    "security_name": item["security_name"],
+                    "start_mva": float(item["start_mva"]),
+                    "end_mva": float(item["end_mva"]),
+                    "fx": float(fx),
+                    "income": float(item["income"]),
+                    "fees": float(item["fees"]),
+                    "appreciation": float(appreciation),
+                    "total": float(total),
+                }
+            )
+
+        account_attributions = results.get("account_attributions", {})
+        drill_down = []
+        for account_code in sorted(by_account):
+            contributions = sorted(by_account[account_code], key=lambda c: abs(c["total"]), reverse=True)
+            top, rest = contributions[:top_k], contributions[top_k:]
+
+            if rest:
+                other = {"security_code": "OTHER", "security_symbol": None, "security_name": f"Other ({len(rest)} securities)"}
+                for field in ("start_mva", "end_mva", "fx", "income", "fees", "appreciation", "total"):
+                    other[field] = sum(c[field] for c in rest)
+                top.append(other)
+
+            account_gain_loss = account_attributions.get(account_code, {}).get("total_gain_loss")
+            explained = sum(c["total"] for c in contributions)
+            unattributed = float(account_gain_loss) - explained if account_gain_loss is not None else 0.0
+
+            print(
+                f"🏦 {account_code}: {len(contributions)} securities, top {len(top) - (1 if rest else 0)} shown, "
+                f"explained ${explained:,.2f}, unattributed ${unattributed:,.2f}"
+            )
+            drill_down.append(
+                schemas.AccountSecurityAttribution(
+                    account_code=account_code,
+                    securities=[schemas.SecurityContribution(**c) for c in top],
+                    security_count=len(contributions),
+                    unattributed=unattributed,
+                )
+            )
+
+        return drill_down
+
     def _build_performance_summary(self, results, start_date, end_date, account_codes):
         """Build performance summary from attribution results"""
 
@@ -0,0 +1,378 @@
+"""
+Runtime settings read from the environment (and .env via python-dotenv).
+
+Database settings:
+
+    DB_POOL_SIZE              connections kept open per worker process (default 10)
+    DB_MAX_OVERFLOW           extra connections opened under load, closed when idle (default 10)
+    DB_POOL_TIMEOUT           seconds a request waits for a connection before a 503 (default 10)
+    DB_POOL_RECYCLE           seconds before a connection is replaced, -1 to never (default 1800)
+    DB_POOL_PRE_PING          test connections on checkout, dropping dead ones (default true)
+    DB_STATEMENT_TIMEOUT_MS   per-statement limit for API requests, 0 for none (default 30000)
+    DB_STATEMENT_TIMEOUTS     per-endpoint overrides, e.g. "/performance_attribution_sankey/=120000"
+    DB_STREAM_RESULTS         read the largest result sets through server-side cursors (default true)
+    DB_STREAM_BATCH_SIZE      rows fetched per round trip when streaming (default 5000)
+
+Read replicas (DATABASE_URL stays the primary):
+
+    DATABASE_REPLICA_URLS         comma-separated replica URLs that serve reporting reads
+    DB_REPLICA_HEALTH_INTERVAL    seconds a healthy replica is trusted before it is pinged again (default 5)
+    DB_REPLICA_RETRY_INTERVAL     seconds a failed replica is left out before it is retried (default 30)
+
+Worker warm-up (app/warmup.py, before the worker accepts requests):
+
+    APP_WARMUP                  warm up at startup (default true)
+    WARMUP_CONNECTIONS          connections opened per engine (default: DB_POOL_SIZE)
+    WARMUP_BENCHMARKS           comma-separated benchmark symbols whose prices are preloaded (default none)
+    WARMUP_BENCHMARK_YEARS      years of prices preloaded per symbol (default 5)
+
+HTTP caching of report responses (app/http_cache.py):
+
+    HTTP_CACHE                  send ETags and answer If-None-Match with 304 (default true)
+    HTTP_CACHE_MAX_AGE          seconds clients may reuse a report for a past date unchecked (default 3600)
+    HTTP_CACHE_VERSION_TTL      seconds a table's latest ProcessedTimestampEST is reused (default 60)
+    APP_RELEASE                 release identifier mixed into ETags, so a deploy invalidates them
+    GZIP_MINIMUM_SIZE           responses of at least this many bytes are gzip-compressed (default 1024)
+
+Holdings rollups (app/rollups.py, refreshed by tools/refresh_rollups.py):
+
+    HOLDINGS_ROLLUPS            read the rollups when they cover a request (default true)
+    HOLDINGS_ROLLUP_COVERAGE_TTL  seconds the rolled-up and stale days are reused (default 60)
+
+Embedded analytic engine (app/analytics.py, snapshots written by tools/export_parquet.py):
+
+    ANALYTICS_ENGINE            "database" (default), or "duckdb" to run the Sankey, attribution and
+                                benchmark reports on DuckDB over the latest Parquet snapshot
+    PARQUET_SNAPSHOT_DIR        snapshot root holding LATEST (default snapshots)
+    DUCKDB_THREADS              threads per DuckDB connection, 0 for DuckDB's default (one per core)
+    ANALYTICS_SNAPSHOT_CHECK_INTERVAL  seconds between checks of LATEST for a new snapshot (default 30)
+
+Bulk exports (app/exports.py, POST /export/):
+
+    EXPORT_BATCH_SIZE           rows per fetch, Arrow record batch and Parquet row group (default 50000)
+    EXPORT_PARQUET_COMPRESSION  Parquet codec: snappy (default), zstd, gzip or none
+
+Background jobs (app/jobs.py, POST /jobs/...):
+
+    JOB_EXECUTOR                "process" (default) or "thread": where jobs run
+    JOB_WORKERS                 jobs run at once per API worker process (default 2)
+    JOB_MAX_PENDING             jobs queued or running per API worker before submits get a 503 (default 100)
+    JOB_STORE_PATH              SQLite file holding job status and results (default jobs.db)
+    JOB_RESULT_TTL              seconds a job and its result are kept after it finishes (default 86400)
+    JOB_MAX_WAIT                longest long-poll of GET /jobs/{id}?wait=, in seconds (default 60)
+
+Precomputed reports (app/precompute.py, after each gold-layer load):
+
+    PRECOMPUTE                  run the precompute scheduler in each worker (default false)
+    PRECOMPUTE_SHAPES           JSON file of report requests to precompute (default none)
+    PRECOMPUTE_LEARNED          most requested report shapes of this worker also precomputed, 0 for none (default 50)
+    PRECOMPUTE_POLL_INTERVAL    seconds between checks for a new load (default 300)
+    PRECOMPUTE_INTERVAL         least seconds between two precomputed reports (default 2)
+    PRECOMPUTE_MAX_BUSY_CONNECTIONS  a report only starts while each pool it may read has fewer connections in use (default 2)
+    PRECOMPUTE_CACHE_SIZE       precomputed reports kept per worker (default 256)
+    PRECOMPUTE_CACHE_TTL        seconds a precomputed report is kept (default 86400)
+
+Admission control (app/admission.py, per worker process):
+
+    ADMISSION                   limit concurrent requests per report endpoint (default true)
+    ADMISSION_LIMITS            per-endpoint overrides as path=permits:queue, e.g.
+                                "/performance_attribution_sankey/=2:8"; permits 0 for no limit
+    ADMISSION_QUEUE_TIMEOUT     seconds a request waits for permits before a 503 (default 10)
+    ADMISSION_COST_UNIT         account-days per permit; a request takes accounts x days / unit
+                                permits, at least 1 and at most the endpoint's (default 3650)
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# {path: (permits, queue)}: requests of an endpoint running at once (in permits) and waiting
+DEFAULT_ADMISSION_LIMITS = {
+    "/performance_attribution_sankey/": (4, 16),
+    "/performance_benchmark/": (6, 24),
+    "/holdings_agg_for_sankey/": (8, 32),
+    "/export/": (2, 4),
+}
+
+# Attribution reads a period of holdings, transactions and daily positions; it gets a longer
+# budget than the lookups, but a runaway query still gives its connection back
+DEFAULT_STATEMENT_TIMEOUTS = {"/performance_attribution_sankey/": 120_000}
+
+
+def _bool(value: str) -> bool:
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def _timeouts(value: str) -> Dict[str, int]:
+    """Parse "path=ms,path=ms" into {path: ms}"""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        path, separator, ms = item.rpartition("=")
+        if not separator or not path:
+            raise ValueError(f"DB_STATEMENT_TIMEOUTS entries must look like /path/=milliseconds, got {item!r}")
+        timeouts[path] = int(ms)
+    return timeouts
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: float = 10.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    statement_timeout_ms: int = 30_000
+    endpoint_statement_timeouts: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_STATEMENT_TIMEOUTS))
+    stream_results: bool = True
+    stream_batch_size: int = 5000
+    replica_urls: Tuple[str, ...] = ()
+    replica_health_interval: float = 5.0
+    replica_retry_interval: float = 30.0
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "DatabaseSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        timeouts = dict(defaults.endpoint_statement_timeouts)
+        timeouts.update(_timeouts(environ.get("DB_STATEMENT_TIMEOUTS", "")))
+        return cls(
+            pool_size=int(environ.get("DB_POOL_SIZE", defaults.pool_size)),
+            max_overflow=int(environ.get("DB_MAX_OVERFLOW", defaults.max_overflow)),
+            pool_timeout=float(environ.get("DB_POOL_TIMEOUT", defaults.pool_timeout)),
+            pool_recycle=int(environ.get("DB_POOL_RECYCLE", defaults.pool_recycle)),
+            pool_pre_ping=_bool(environ.get("DB_POOL_PRE_PING", str(defaults.pool_pre_ping))),
+            statement_timeout_ms=int(environ.get("DB_STATEMENT_TIMEOUT_MS", defaults.statement_timeout_ms)),
+            endpoint_statement_timeouts=timeouts,
+            stream_results=_bool(environ.get("DB_STREAM_RESULTS", str(defaults.stream_results))),
+            stream_batch_size=int(environ.get("DB_STREAM_BATCH_SIZE", defaults.stream_batch_size)),
+            replica_urls=tuple(url.strip() for url in environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()),
+            replica_health_interval=float(environ.get("DB_REPLICA_HEALTH_INTERVAL", defaults.replica_health_interval)),
+            replica_retry_interval=float(environ.get("DB_REPLICA_RETRY_INTERVAL", defaults.replica_retry_interval)),
+        )
+
+    def engine_kwargs(self, database_url: str) -> dict:
+        """create_engine pool arguments; in-memory SQLite keeps its single shared connection"""
+        kwargs = {"pool_pre_ping": self.pool_pre_ping, "pool_recycle": self.pool_recycle}
+        if database_url.startswith("sqlite") and database_url.split("://", 1)[1] in ("", "/", "/:memory:"):
+            return kwargs
+        kwargs.update(pool_size=self.pool_size, max_overflow=self.max_overflow, pool_timeout=self.pool_timeout)
+        return kwargs
+
+    def statement_timeout_for(self, path: Optional[str]) -> int:
+        """Milliseconds allowed per statement for requests to path (0: no limit)"""
+        return self.endpoint_statement_timeouts.get(path, self.statement_timeout_ms)
+
+    def stream_options(self) -> dict:
+        """Execution options for result sets that are read once, in order"""
+        if not self.stream_results:
+            return {}
+        return {"stream_results": True, "yield_per": self.stream_batch_size}
+
+
+database = DatabaseSettings.from_env()
+
+
+@dataclass(frozen=True)
+class WarmupSettings:
+    enabled: bool = True
+    connections: int = database.pool_size
+    benchmark_symbols: Tuple[str, ...] = ()
+    benchmark_years: int = 5
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "WarmupSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        return cls(
+            enabled=_bool(environ.get("APP_WARMUP", str(defaults.enabled))),
+            connections=int(environ.get("WARMUP_CONNECTIONS", defaults.connections)),
+            benchmark_symbols=tuple(s.strip() for s in environ.get("WARMUP_BENCHMARKS", "").split(",") if s.strip()),
+            benchmark_years=int(environ.get("WARMUP_BENCHMARK_YEARS", defaults.benchmark_years)),
+        )
+
+
+warmup = WarmupSettings.from_env()
+
+
+@dataclass(frozen=True)
+class HttpCacheSettings:
+    enabled: bool = True
+    max_age: int = 3600
+    version_ttl: float = 60.0
+    release: str = ""
+    gzip_minimum_size: int = 1024
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "HttpCacheSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        return cls(
+            enabled=_bool(environ.get("HTTP_CACHE", str(defaults.enabled))),
+            max_age=int(environ.get("HTTP_CACHE_MAX_AGE", defaults.max_age)),
+            version_ttl=float(environ.get("HTTP_CACHE_VERSION_TTL", defaults.version_ttl)),
+            release=environ.get("APP_RELEASE", defaults.release),
+            gzip_minimum_size=int(environ.get("GZIP_MINIMUM_SIZE", defaults.gzip_minimum_size)),
+        )
+
+
+http_cache = HttpCacheSettings.from_env()
+
+
+@dataclass(frozen=True)
+class RollupSettings:
+    enabled: bool = True
+    coverage_ttl: float = 60.0
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "RollupSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        return cls(
+            enabled=_bool(environ.get("HOLDINGS_ROLLUPS", str(defaults.enabled))),
+            coverage_ttl=float(environ.get("HOLDINGS_ROLLUP_COVERAGE_TTL", defaults.coverage_ttl)),
+        )
+
+
+rollups = RollupSettings.from_env()
+
+
+@dataclass(frozen=True)
+class AnalyticsSettings:
+    engine: str = "database"
+    snapshot_dir: str = "snapshots"
+    duckdb_threads: int = 0
+    snapshot_check_interval: float = 30.0
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "AnalyticsSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        engine = environ.get("ANALYTICS_ENGINE", defaults.engine).strip().lower()
+        if engine not in ("database", "duckdb"):
+            raise ValueError(f"ANALYTICS_ENGINE must be 'database' or 'duckdb', got {engine!r}")
+        return cls(
+            engine=engine,
+            snapshot_dir=environ.get("PARQUET_SNAPSHOT_DIR", defaults.snapshot_dir),
+            duckdb_threads=int(environ.get("DUCKDB_THREADS", defaults.duckdb_threads)),
+            snapshot_check_interval=float(environ.get("ANALYTICS_SNAPSHOT_CHECK_INTERVAL", defaults.snapshot_check_interval)),
+        )
+
+
+analytics = AnalyticsSettings.from_env()
+
+
+@dataclass(frozen=True)
+class ExportSettings:
+    batch_size: int = 50_000
+    parquet_compression: str = "snappy"
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "ExportSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        return cls(
+            batch_size=int(environ.get("EXPORT_BATCH_SIZE", defaults.batch_size)),
+            parquet_compression=environ.get("EXPORT_PARQUET_COMPRESSION", defaults.parquet_compression).strip().lower(),
+        )
+
+
+exports = ExportSettings.from_env()
+
+
+@dataclass(frozen=True)
+class JobSettings:
+    executor: str = "process"
+    workers: int = 2
+    max_pending: int = 100
+    store_path: str = "jobs.db"
+    result_ttl: float = 86400.0
+    max_wait: float = 60.0
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "JobSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        executor = environ.get("JOB_EXECUTOR", defaults.executor).strip().lower()
+        if executor not in ("process", "thread"):
+            raise ValueError(f"JOB_EXECUTOR must be 'process' or 'thread', got {executor!r}")
+        return cls(
+            executor=executor,
+            workers=int(environ.get("JOB_WORKERS", defaults.workers)),
+            max_pending=int(environ.get("JOB_MAX_PENDING", defaults.max_pending)),
+            store_path=environ.get("JOB_STORE_PATH", defaults.store_path),
+            result_ttl=float(environ.get("JOB_RESULT_TTL", defaults.result_ttl)),
+            max_wait=float(environ.get("JOB_MAX_WAIT", defaults.max_wait)),
+        )
+
+
+jobs = JobSettings.from_env()
+
+
+@dataclass(frozen=True)
+class PrecomputeSettings:
+    enabled: bool = False
+    shapes_path: Optional[str] = None
+    learned: int = 50
+    poll_interval: float = 300.0
+    min_interval: float = 2.0
+    max_busy_connections: int = 2
+    cache_size: int = 256
+    cache_ttl: float = 86400.0
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "PrecomputeSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        return cls(
+            enabled=_bool(environ.get("PRECOMPUTE", str(defaults.enabled))),
+            shapes_path=environ.get("PRECOMPUTE_SHAPES") or None,
+            learned=int(environ.get("PRECOMPUTE_LEARNED", defaults.learned)),
+            poll_interval=float(environ.get("PRECOMPUTE_POLL_INTERVAL", defaults.poll_interval)),
+            min_interval=float(environ.get("PRECOMPUTE_INTERVAL", defaults.min_interval)),
+            max_busy_connections=int(environ.get("PRECOMPUTE_MAX_BUSY_CONNECTIONS", defaults.max_busy_connections)),
+            cache_size=int(environ.get("PRECOMPUTE_CACHE_SIZE", defaults.cache_size)),
+            cache_ttl=float(environ.get("PRECOMPUTE_CACHE_TTL", defaults.cache_ttl)),
+        )
+
+
+precompute = PrecomputeSettings.from_env()
+
+
+def _limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "path=permits:queue,..." into {path: (permits, queue)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        path, separator, limit = item.rpartition("=")
+        permits, colon, queue = limit.partition(":")
+        if not separator or not path or not colon:
+            raise ValueError(f"ADMISSION_LIMITS entries must look like /path/=permits:queue, got {item!r}")
+        limits[path] = (int(permits), int(queue))
+    return limits
+
+
+@dataclass(frozen=True)
+class AdmissionSettings:
+    enabled: bool = True
+    limits: Dict[str, Tuple[int, int]] = field(default_factory=lambda: dict(DEFAULT_ADMISSION_LIMITS))
+    queue_timeout: float = 10.0
+    cost_unit: int = 3650
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "AdmissionSettings":
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        limits = dict(defaults.limits)
+        limits.update(_limits(environ.get("ADMISSION_LIMITS", "")))
+        return cls(
+            enabled=_bool(environ.get("ADMISSION", str(defaults.enabled))),
+            limits=limits,
+            queue_timeout=float(environ.get("ADMISSION_QUEUE_TIMEOUT", defaults.queue_timeout)),
+            cost_unit=int(environ.get("ADMISSION_COST_UNIT", defaults.cost_unit)),
+        )
+
+
+admission = AdmissionSettings.from_env()
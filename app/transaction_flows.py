@@ -0,0 +1,173 @@
+"""
+Single-pass classification of the transactions of a performance attribution period.
+
+A multi-year window for a large household has hundreds of thousands of transactions. They are
+read through a server-side cursor (services.PerformanceSankeyService) and each one is added to
+running totals here as it arrives: net contribution, income and fees per account, and money
+invested, income and fees per (account, security). Nothing keeps the rows themselves, so memory
+follows the number of accounts and positions, not the length of the period.
+
+Categories follow the transaction type multipliers of transaction_types.csv:
+
+- cash in / cash out (multiplier 1 / -1) are net contributions, not gains
+- income and fee types are part of the gain
+- buys and sells (JBY, JSL) only move money between cash and securities
+"""
+
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Tuple
+
+INCOME_TYPES = frozenset(
+    {
+        "CDV",  # Cash Dividend/ Dividend Income
+        "DVI",  # Dividend Income
+        "SDV",  # Stock Dividend (Tax-Free)
+        "INT",  # Interest Income
+        "FNI",  # Foreign Income
+        "IPS",  # Interest from Cash
+        "DRI",  # Dividend Distribution Reinvestment
+        "SDT",  # Stock Dividend (Taxable)
+        "GRI",  # Capital Gain Distribution Reinvestment
+        "FRI",  # Foreign Income Distribution Reinvestment
+        "IRI",  # Interest Distribution Reinvestment
+        "CGR",  # Capital Gain Reinvestment
+        "DVR",  # Dividend Reinvestment
+        "FIR",  # Foreign Income Reinvestment
+        "FID",  # Foreign Income Distribution
+        "IIR",  # Interest Reinvestment
+        "IID",  # Interest Distribution
+        "INR",  # Income Reinvestment
+        "IND",  # Income Distribution
+        "MAT",  # Maturity
+    }
+)
+FEE_TYPES = frozenset({"MFE", "FEE", "ADM", "EXP", "AFE", "TFE", "VFE", "LFE", "PFE", "RDF", "RFE", "CDT", "CFE", "CMF"})
+CASH_IN_TYPES = frozenset({"CCR", "CRD", "SRD", "TCI", "TSI"})  # Multiplier = 1
+CASH_OUT_TYPES = frozenset({"CDR", "CWD", "SWD", "TCO", "TSO"})  # Multiplier = -1
+TRADING_TYPES = frozenset({"JSL", "JBY"})
+# Money put into / taken out of a security, for the security drill-down
+INVEST_IN_TYPES = CASH_IN_TYPES | {"JBY"}
+INVEST_OUT_TYPES = CASH_OUT_TYPES | {"JSL"}
+
+ZERO = Decimal("0")
+
+
+class AccountFlows:
+    """Running totals of one account"""
+
+    __slots__ = ("net_contribution", "cash_in", "cash_out", "income", "fees", "by_type", "by_currency")
+
+    def __init__(self):
+        self.net_contribution = ZERO
+        self.cash_in = ZERO
+        self.cash_out = ZERO
+        self.income = ZERO
+        # Fees with a negative amount, as a negative total
+        self.fees = ZERO
+        # {net contribution type: [count, CAD total]}
+        self.by_type: Dict[str, list] = {}
+        # {settlement currency: [count, original total, CAD total]} of foreign net contributions
+        self.by_currency: Dict[str, list] = {}
+
+
+class SecurityFlows:
+    """Running totals of one (account, security) for the security drill-down"""
+
+    __slots__ = ("security_symbol", "security_name", "invested", "income", "fees")
+
+    def __init__(self, security_symbol, security_name):
+        self.security_symbol = security_symbol
+        self.security_name = security_name
+        self.invested = ZERO
+        self.income = ZERO
+        # Every fee transaction, whatever its sign
+        self.fees = ZERO
+
+
+class TransactionFlows:
+    """
+    Attribution totals of a stream of transaction rows (account_code, security_code,
+    transaction_type_code, trade_date, settlement_amount, settlement_currency and optionally
+    security_symbol / security_name). convert(amount, currency, trade_date, fx_rates) returns
+    the CAD amount as a float.
+    """
+
+    def __init__(self, fx_rates: Dict[Tuple[str, str], float], convert: Callable):
+        self.fx_rates = fx_rates
+        self.convert = convert
+        self.rows = 0
+        self.unclassified = 0
+        self.income_total = ZERO
+        # Fees with a negative amount, as a positive total
+        self.fees_total = ZERO
+        self.accounts: Dict[str, AccountFlows] = {}
+        # {security_code: net contribution} of cash in / cash out transactions
+        self.security_contributions: Dict[str, Decimal] = {}
+        # {(account_code, security_code or "CASH"): SecurityFlows}, in order of first transaction
+        self.securities: Dict[Tuple[str, str], SecurityFlows] = {}
+
+    @property
+    def net_contribution(self) -> Decimal:
+        return sum((account.net_contribution for account in self.accounts.values()), ZERO)
+
+    def account(self, account_code: str) -> AccountFlows:
+        flows = self.accounts.get(account_code)
+        if flows is None:
+            flows = self.accounts[account_code] = AccountFlows()
+        return flows
+
+    def add(self, txn):
+        self.rows += 1
+        amount_cad = self.convert(txn.settlement_amount, txn.settlement_currency, txn.trade_date, self.fx_rates)
+        magnitude = Decimal(str(abs(amount_cad)))
+        trans_type = txn.transaction_type_code
+        account = self.account(txn.account_code)
+
+        key = (txn.account_code, txn.security_code or "CASH")
+        security = self.securities.get(key)
+        if security is None:
+            security = self.securities[key] = SecurityFlows(
+                getattr(txn, "security_symbol", None), getattr(txn, "security_name", None)
+            )
+
+        if trans_type in INCOME_TYPES:
+            self.income_total += magnitude
+            account.income += magnitude
+            security.income += magnitude
+        elif trans_type in FEE_TYPES:
+            if amount_cad < 0:
+                self.fees_total += magnitude
+                account.fees -= magnitude
+            security.fees -= magnitude
+        elif trans_type in CASH_IN_TYPES or trans_type in CASH_OUT_TYPES:
+            if trans_type in CASH_IN_TYPES:
+                signed = magnitude
+                account.cash_in += magnitude
+            else:
+                signed = -magnitude
+                account.cash_out += magnitude
+            account.net_contribution += signed
+            self.security_contributions[txn.security_code] = self.security_contributions.get(txn.security_code, ZERO) + signed
+            security.invested += signed
+            by_type = account.by_type.setdefault(trans_type, [0, ZERO])
+            by_type[0] += 1
+            by_type[1] += signed
+            if txn.settlement_currency != "CAD":
+                by_currency = account.by_currency.setdefault(txn.settlement_currency, [0, ZERO, ZERO])
+                by_currency[0] += 1
+                by_currency[1] += Decimal(str(txn.settlement_amount or 0))
+                by_currency[2] += magnitude
+        elif trans_type in TRADING_TYPES:
+            security.invested += magnitude if trans_type == "JBY" else -magnitude
+        else:
+            self.unclassified += 1
+
+    def add_all(self, transactions: Iterable) -> "TransactionFlows":
+        for txn in transactions:
+            self.add(txn)
+        return self
+
+
+def classify(transactions: Iterable, fx_rates: Dict[Tuple[str, str], float], convert: Callable) -> TransactionFlows:
+    """TransactionFlows of an iterable of rows (a list, a result, or a streamed result)"""
+    return TransactionFlows(fx_rates, convert).add_all(transactions)
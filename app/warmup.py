@@ -0,0 +1,97 @@
+"""
+Worker warm-up, run from the app's lifespan before uvicorn starts accepting connections.
+
+Importing app.main does no I/O and skips heavy modules, so it stays fast. What the first
+requests would otherwise pay for happens here:
+
+- connections: open the pool's connections to the primary and every replica
+- modules: import the numeric and benchmark modules (yfinance brings pandas)
+- benchmark prices: preload the price cache for WARMUP_BENCHMARKS
+
+Each step is timed; the report is logged and exported at /metrics as app_warmup_seconds.
+"""
+
+import importlib
+import logging
+from datetime import date, timedelta
+from time import perf_counter
+from typing import Dict, Iterable
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_MODULES = (
+    "numpy",
+    "app.performance_metrics",
+    "app.downsampling",
+    "app.fx_attribution",
+    "app.benchmark_service",
+    "yfinance",
+)
+
+# {step: seconds} of the last warm-up in this process
+report: Dict[str, float] = {}
+
+
+def open_connections(engine, count: int) -> int:
+    """Check out count connections at once and return them, leaving them open in the pool"""
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.raw_connection())
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def preload_modules(modules: Iterable[str] = PRELOAD_MODULES) -> int:
+    loaded = 0
+    for module in modules:
+        try:
+            importlib.import_module(module)
+            loaded += 1
+        except ImportError as e:
+            logger.warning(f"Warm-up could not import {module}: {e}")
+    return loaded
+
+
+def preload_benchmark_prices(symbols: Iterable[str], years: int) -> int:
+    """Fill the benchmark price cache for the last `years` years (downloads on a cold cache)"""
+    from .benchmark_service import BenchmarkService
+
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=365 * years)
+    service = BenchmarkService(db=None)
+    loaded = 0
+    for symbol in symbols:
+        if service._get_benchmark_data(symbol, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")):
+            loaded += 1
+    return loaded
+
+
+def warm_up(engine, replicas=(), warmup_settings: settings.WarmupSettings = None) -> Dict[str, float]:
+    """Run every warm-up step; a failing step is logged and skipped so the worker still starts"""
+    warmup_settings = warmup_settings or settings.warmup
+    if not warmup_settings.enabled:
+        return {}
+
+    steps = [
+        ("connections", lambda: sum(open_connections(e, warmup_settings.connections) for e in (engine, *replicas))),
+        ("modules", preload_modules),
+        ("benchmark_prices", lambda: preload_benchmark_prices(warmup_settings.benchmark_symbols, warmup_settings.benchmark_years)),
+    ]
+    started = perf_counter()
+    report.clear()
+    for name, step in steps:
+        step_started = perf_counter()
+        try:
+            count = step()
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            count = 0
+        report[name] = perf_counter() - step_started
+        print(f"🔥 Warm-up {name}: {count} in {report[name] * 1000:.0f} ms")
+    report["total"] = perf_counter() - started
+    return dict(report)
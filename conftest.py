@@ -0,0 +1,108 @@
+"""
+Shared fixtures for the root-level checks: small phw_dev_gold datasets generated on SQLite
+(tools/generate_gold_data.py).
+
+A test takes the gold_data fixture and calls it for each dataset it needs:
+
+    def test_report(gold_data):
+        dataset = gold_data(app=True)             # or migrations=True, accounts=..., end_date=...
+        dataset.client.post(...)                  # TestClient of app.main reading dataset.engine
+
+The test modules also run as scripts; their __main__ blocks open a GoldData themselves:
+
+    with GoldData() as gold_data:
+        test_report(gold_data)
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+
+START, END = date(2024, 1, 1), date(2024, 3, 29)
+ACCOUNTS = ["SYN000000", "SYN000001"]
+
+
+class Dataset:
+    """One generated database: its directory, URL and engine, and with app=True a TestClient reading it"""
+
+    def __init__(self, directory: str, url: str, engine, client=None):
+        self.directory = directory
+        self.url = url
+        self.engine = engine
+        self.client = client
+
+
+class GoldData:
+    """
+    Generates datasets in temporary directories. close() disposes their engines, removes the
+    app's database override and deletes the directories; caches derived from a dataset's load
+    times are cleared before and after.
+    """
+
+    def __init__(self):
+        self._stack = contextlib.ExitStack()
+
+    def __call__(
+        self,
+        accounts: int = 3,
+        securities: int = 60,
+        start_date: date = START,
+        end_date: date = END,
+        migrations: bool = False,
+        app: bool = False,
+    ) -> Dataset:
+        from sqlalchemy.orm import Session
+
+        from app import http_cache, rollups
+        from app.database import make_engine
+        from tools import migrate
+        from tools.generate_gold_data import generate
+
+        directory = self._stack.enter_context(tempfile.TemporaryDirectory())
+        url = f"sqlite:///{os.path.join(directory, 'gold.db')}"
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate(url, accounts=accounts, securities=securities, start_date=start_date, end_date=end_date)
+            engine = make_engine(url)
+            self._stack.callback(engine.dispose)
+            if migrations:
+                migrate.migrate(engine)
+
+        for derived in (http_cache.DATA_VERSIONS, rollups.COVERAGE):
+            derived.clear()
+            self._stack.callback(derived.clear)
+
+        client = None
+        if app:
+            from fastapi.testclient import TestClient
+
+            from app import main
+
+            def get_db():
+                with Session(engine) as db:
+                    yield db
+
+            main.app.dependency_overrides[main.get_db] = get_db
+            self._stack.callback(main.app.dependency_overrides.pop, main.get_db, None)
+            client = TestClient(main.app)
+        return Dataset(directory, url, engine, client)
+
+    def close(self):
+        self._stack.close()
+
+    def __enter__(self) -> "GoldData":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@pytest.fixture
+def gold_data():
+    with GoldData() as factory:
+        yield factory
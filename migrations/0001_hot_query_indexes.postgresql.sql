@@ -0,0 +1,25 @@
+-- migrate: no-transaction
+-- CONCURRENTLY keeps the tables readable and loadable while the indexes build.
+
+-- GET_DAILY_AGGREGATE_FOR_ATTRIBUTION, GET_DAILY_AGGREGATE_SERIES, GET_NET_CONTRIBUTIONS
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fact_daily_aggregate_values_account_code_as_of_date ON phw_dev_gold.fact_daily_aggregate_values ("account_code", "as_of_date") INCLUDE ("market_value_accrued_converted", "net_cashflow_converted");
+
+-- GET_DAILY_POSITIONS_FOR_FX_ATTRIBUTION
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fact_daily_aggregate_values_slp_account_code_as_of_date ON phw_dev_gold.fact_daily_aggregate_values_slp ("account_code", "as_of_date") INCLUDE ("mva_local_previous", "security_code");
+
+-- GET_HOLDINGS_FOR_ATTRIBUTION, GET_MARKET_VALUES, get_aggregated_holdings_query, get_available_dates_query, get_holdings_query, get_sankey_holdings_query
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fact_holdings_all_accountcode_asofdate_currencycode ON phw_dev_gold.fact_holdings_all ("AccountCode", "AsofDate", "CurrencyCode") INCLUDE ("MarketPrice", "MarketValue", "MarketValueAccrued", "Quantity", "SecurityCode", "SecurityFXRate");
+
+-- get_data_version_query[fact_holdings_all]
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fact_holdings_all_processedtimestampest ON phw_dev_gold.fact_holdings_all ("ProcessedTimestampEST");
+
+-- GET_TRANSACTIONS_FOR_ATTRIBUTION
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fact_transactions_accountcode_tradedate ON phw_dev_gold.fact_transactions ("AccountCode", "TradeDate");
+
+-- get_data_version_query[fact_transactions]
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fact_transactions_processedtimestampest ON phw_dev_gold.fact_transactions ("ProcessedTimestampEST");
+
+ANALYZE phw_dev_gold.fact_daily_aggregate_values;
+ANALYZE phw_dev_gold.fact_daily_aggregate_values_slp;
+ANALYZE phw_dev_gold.fact_holdings_all;
+ANALYZE phw_dev_gold.fact_transactions;
@@ -0,0 +1,20 @@
+
+-- GET_DAILY_AGGREGATE_FOR_ATTRIBUTION, GET_DAILY_AGGREGATE_SERIES, GET_NET_CONTRIBUTIONS
+CREATE INDEX IF NOT EXISTS phw_dev_gold.ix_fact_daily_aggregate_values_account_code_as_of_date ON fact_daily_aggregate_values ("account_code", "as_of_date");
+
+-- GET_DAILY_POSITIONS_FOR_FX_ATTRIBUTION
+CREATE INDEX IF NOT EXISTS phw_dev_gold.ix_fact_daily_aggregate_values_slp_account_code_as_of_date ON fact_daily_aggregate_values_slp ("account_code", "as_of_date");
+
+-- GET_HOLDINGS_FOR_ATTRIBUTION, GET_MARKET_VALUES, get_aggregated_holdings_query, get_available_dates_query, get_holdings_query, get_sankey_holdings_query
+CREATE INDEX IF NOT EXISTS phw_dev_gold.ix_fact_holdings_all_accountcode_asofdate_currencycode ON fact_holdings_all ("AccountCode", "AsofDate", "CurrencyCode");
+
+-- get_data_version_query[fact_holdings_all]
+CREATE INDEX IF NOT EXISTS phw_dev_gold.ix_fact_holdings_all_processedtimestampest ON fact_holdings_all ("ProcessedTimestampEST");
+
+-- GET_TRANSACTIONS_FOR_ATTRIBUTION
+CREATE INDEX IF NOT EXISTS phw_dev_gold.ix_fact_transactions_accountcode_tradedate ON fact_transactions ("AccountCode", "TradeDate");
+
+-- get_data_version_query[fact_transactions]
+CREATE INDEX IF NOT EXISTS phw_dev_gold.ix_fact_transactions_processedtimestampest ON fact_transactions ("ProcessedTimestampEST");
+
+ANALYZE phw_dev_gold;
@@ -0,0 +1,47 @@
+-- Daily holdings rollups maintained by app/rollups.py (python -m tools.refresh_rollups after each load).
+-- The tables start empty; the API reads fact_holdings_all until the first refresh.
+
+-- Totals per account, day and reporting currency
+CREATE TABLE IF NOT EXISTS phw_dev_gold.fact_holdings_account_rollup (
+    "AsofDate" DATE NOT NULL,
+    "AccountCode" TEXT NOT NULL,
+    "CurrencyCode" TEXT NOT NULL,
+    "MarketValueAccrued" DOUBLE PRECISION,
+    "MarketValue" DOUBLE PRECISION,
+    "BookValue" DOUBLE PRECISION,
+    "TotalUnrealizedGL" DOUBLE PRECISION,
+    "PriceUnrealizedGL" DOUBLE PRECISION,
+    "FXUnrealizedGL" DOUBLE PRECISION,
+    "Positions" INTEGER NOT NULL,
+    PRIMARY KEY ("AccountCode", "AsofDate", "CurrencyCode")
+);
+
+-- Totals per account, day, reporting currency and asset class (dim_securitymaster columns)
+CREATE TABLE IF NOT EXISTS phw_dev_gold.fact_holdings_asset_class_rollup (
+    "AsofDate" DATE NOT NULL,
+    "AccountCode" TEXT NOT NULL,
+    "CurrencyCode" TEXT NOT NULL,
+    asset_class TEXT,
+    "AssetClassLevel1Name" TEXT,
+    "AssetClassLevel2Name" TEXT,
+    "AssetClassLevel3Name" TEXT,
+    security_currency_code TEXT,
+    "MarketValueAccrued" DOUBLE PRECISION,
+    "MarketValue" DOUBLE PRECISION,
+    "BookValue" DOUBLE PRECISION,
+    "TotalUnrealizedGL" DOUBLE PRECISION,
+    "PriceUnrealizedGL" DOUBLE PRECISION,
+    "FXUnrealizedGL" DOUBLE PRECISION,
+    "Positions" INTEGER NOT NULL
+);
+
+-- get_sankey_rollup_query
+CREATE INDEX IF NOT EXISTS ix_fact_holdings_asset_class_rollup_accountcode_asofdate_currencycode ON phw_dev_gold.fact_holdings_asset_class_rollup ("AccountCode", "AsofDate", "CurrencyCode");
+
+-- One row per rolled-up day: the load it reflects and the security master it was grouped with
+CREATE TABLE IF NOT EXISTS phw_dev_gold.holdings_rollup_dates (
+    "AsofDate" DATE PRIMARY KEY,
+    "ProcessedTimestampEST" TIMESTAMP,
+    "SecurityMasterTimestampEST" TIMESTAMP,
+    "RefreshedAt" TIMESTAMP NOT NULL
+);
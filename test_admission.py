@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Checks for admission control (app/admission.py): permits weighted by account-days, FIFO grants
+that let no light request overtake a heavy one, 429 on a full queue and 503 after the queue
+timeout with Retry-After, cheap endpoints answering during a burst, 304s and precomputed
+reports answered while the queue is full, and the /metrics series.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app import admission, database, http_cache, metrics, settings
+from conftest import ACCOUNTS, END, GoldData
+
+
+class Report(BaseModel):
+    account_codes: List[str]
+    start_date: date
+    end_date: date
+
+
+def test_weights_and_costs():
+    limiter = admission.Limiter("/x/", permits=4, queue_size=2, queue_timeout=1)
+    assert [limiter.weight(cost) for cost in (0, 0.2, 1, 2.5, 40)] == [1, 1, 1, 3, 4]
+
+    month = Report(account_codes=["A"], start_date="2024-01-01", end_date="2024-01-31")
+    years = Report(account_codes=["A", "B", "B"], start_date="2020-01-01", end_date="2024-12-31")
+    assert admission.account_days(month) == 31
+    assert admission.account_days(years) == 2 * 1827
+    # An as-of request counts one day per account; unknown shapes count one
+    assert admission.account_days(type("Sankey", (), {"as_of_date": "2024-01-31", "account_codes": ["A"]})()) == 1
+    assert admission.account_days(object()) == 1
+
+
+def test_fifo_queue_and_refusals():
+    async def scenario():
+        limiter = admission.Limiter("/x/", permits=2, queue_size=2, queue_timeout=0.2)
+        assert await limiter.acquire(1) == 0.0
+        heavy = asyncio.ensure_future(limiter.acquire(2))
+        await asyncio.sleep(0.01)
+        light = asyncio.ensure_future(limiter.acquire(1))
+        await asyncio.sleep(0.01)
+        # One permit is free, but the light request waits behind the heavy one
+        assert not light.done() and limiter.stats()["queued_now"] == 2
+        try:
+            await limiter.acquire(1)
+            assert False, "the queue is full"
+        except admission.Rejected as e:
+            assert e.status_code == 429 and e.retry_after >= 1
+
+        # The heavy request goes away; the light one fits right away
+        heavy.cancel()
+        assert await asyncio.wait_for(light, 0.1) >= 0.01
+        assert limiter.in_use == 2
+
+        try:
+            await limiter.acquire(1)
+            assert False, "nothing was released"
+        except admission.Rejected as e:
+            assert e.status_code == 503 and e.retry_after >= 1
+        limiter.release(1, 0.5)
+        limiter.release(1, 0.5)
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats == {
+        "admitted": 2, "queued": 3, "rejected_full": 1, "rejected_timeout": 1,
+        "in_use": 0, "permits": 2, "queued_now": 0,
+    }
+
+
+def test_endpoint_decorator():
+    app = FastAPI()
+    config = settings.AdmissionSettings(enabled=True, limits={"/heavy/": (2, 1)}, queue_timeout=0.3, cost_unit=10)
+    entered, finish = threading.Event(), threading.Event()
+
+    @app.post("/heavy/")
+    @admission.limit("/heavy/", admission_settings=config)
+    def heavy(request: Report):
+        entered.set()
+        finish.wait(5)
+        return {"accounts": request.account_codes}
+
+    @app.get("/cheap/")
+    def cheap():
+        return {"ok": True}
+
+    client = TestClient(app)
+    limiter = admission.limiters["/heavy/"]
+    # 10 account-days take one permit, 30 take both
+    one = {"account_codes": ["A"], "start_date": "2024-01-01", "end_date": "2024-01-10"}
+    three = {**one, "account_codes": ["A", "B", "C"]}
+
+    with ThreadPoolExecutor(2) as pool:
+        running = pool.submit(client.post, "/heavy/", json=one)
+        assert entered.wait(5)
+        queued = pool.submit(client.post, "/heavy/", json=three)
+        deadline = time.monotonic() + 5
+        while limiter.stats()["queued_now"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        full = client.post("/heavy/", json=one)
+        assert full.status_code == 429 and int(full.headers["retry-after"]) >= 1
+        # The burst does not hold up endpoints without a limit
+        started = time.monotonic()
+        assert client.get("/cheap/").json() == {"ok": True}
+        assert time.monotonic() - started < 0.2
+
+        timed_out = queued.result(5)
+        assert timed_out.status_code == 503 and "retry-after" in timed_out.headers
+        finish.set()
+        assert running.result(5).json() == {"accounts": ["A"]}
+
+    assert client.post("/heavy/", json=three).json() == {"accounts": ["A", "B", "C"]}
+    assert limiter.stats()["in_use"] == 0
+
+    # The decorated endpoint keeps its body model for validation
+    assert client.post("/heavy/", json={"account_codes": ["A"]}).status_code == 422
+
+    text = metrics.render(database.engine)
+    assert 'admission_rejected_total{endpoint="/heavy/",status="429"} 1' in text
+    assert 'admission_rejected_total{endpoint="/heavy/",status="503"} 1' in text
+    assert 'admission_queue_seconds_count{endpoint="/heavy/"}' in text
+    assert 'admission_permits{endpoint="/heavy/"} 2' in text
+
+
+def test_disabled_endpoint_is_not_limited():
+    app = FastAPI()
+    config = settings.AdmissionSettings(enabled=False, limits={"/off/": (1, 0)})
+
+    @app.post("/off/")
+    @admission.limit("/off/", admission_settings=config)
+    async def off(request: Report):
+        await asyncio.sleep(0.1)
+        return {"ok": True}
+
+    client = TestClient(app)
+    body = {"account_codes": ["A"], "start_date": "2024-01-01", "end_date": "2024-01-02"}
+    with ThreadPoolExecutor(3) as pool:
+        responses = list(pool.map(lambda _: client.post("/off/", json=body), range(3)))
+    assert [r.status_code for r in responses] == [200] * 3
+    assert "/off/" not in admission.limiters
+
+
+def test_cached_answers_skip_admission(gold_data):
+    client = gold_data(accounts=2, securities=30, app=True).client
+    payload = {"as_of_date": str(END), "account_codes": ACCOUNTS}
+    first = client.post("/holdings_agg_for_sankey/", json=payload, headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+
+    # Every permit is taken and the queue is full
+    limiter = admission.limiters["/holdings_agg_for_sankey/"]
+    limiter.in_use = limiter.permits
+    limiter._waiters.extend((1, Future()) for _ in range(limiter.queue_size))
+    try:
+        assert client.post("/holdings_agg_for_sankey/", json=payload).status_code == 429
+        revalidated = client.post("/holdings_agg_for_sankey/", json=payload, headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        # A report precomputed under the request's ETag is served as well
+        http_cache.REPORTS.set(etag, first.json())
+        precomputed = client.post("/holdings_agg_for_sankey/", json=payload, headers={"Accept-Encoding": "identity"})
+        assert precomputed.status_code == 200 and precomputed.json() == first.json()
+        assert limiter.stats()["rejected_full"] == 1
+    finally:
+        http_cache.REPORTS.clear()
+        limiter._waiters.clear()
+        limiter.in_use = 0
+
+
+if __name__ == "__main__":
+    test_weights_and_costs()
+    test_fifo_queue_and_refusals()
+    test_endpoint_decorator()
+    test_disabled_endpoint_is_not_limited()
+    with GoldData() as gold_data:
+        test_cached_answers_skip_admission(gold_data)
+    print("✅ Admission checks passed")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Checks for Parquet snapshots and the embedded DuckDB engine (tools/export_parquet.py,
+app/analytics.py) on a small generated SQLite dataset: the report services give the same
+results on both engines, LATEST moves to each new snapshot, and ANALYTICS_ENGINE=duckdb routes
+the report endpoints to the snapshot.
+"""
+
+import contextlib
+import io
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import analytics, http_cache, rollups, settings
+from conftest import ACCOUNTS, END, START, GoldData
+from tools import benchmark_engines, export_parquet
+
+
+def _exported(gold_data, app=False):
+    """(dataset, snapshot root) for a generated dataset exported once"""
+    dataset = gold_data(app=app)
+    root = os.path.join(dataset.directory, "snapshots")
+    with contextlib.redirect_stdout(io.StringIO()):
+        export_parquet.export(dataset.engine, root, batch_size=500)
+    return dataset, root
+
+
+def test_export_and_views(gold_data):
+    dataset, root = _exported(gold_data)
+    engine = dataset.engine
+    snapshot = analytics.latest_snapshot(root)
+    manifest = analytics.read_manifest(snapshot)
+    with engine.connect() as conn:
+        holdings = conn.execute(text("SELECT COUNT(*) FROM phw_dev_gold.fact_holdings_all")).scalar()
+    assert manifest["tables"]["fact_holdings_all"] == {
+        "rows": holdings,
+        "partition": "AsofDate",
+        "version": manifest["tables"]["fact_holdings_all"]["version"],
+    }
+    assert os.path.isdir(os.path.join(snapshot, "fact_holdings_all", f"AsofDate={END}"))
+    # The API's own tables are not exported
+    assert "fact_holdings_account_rollup" not in manifest["tables"]
+
+    duckdb_engine = analytics.make_engine(snapshot)
+    try:
+        with Session(duckdb_engine) as db:
+            assert db.execute(text("SELECT COUNT(*) FROM phw_dev_gold.fact_holdings_all")).scalar() == holdings
+            day = db.execute(text('SELECT MAX("AsofDate") FROM phw_dev_gold.fact_holdings_all')).scalar()
+            assert day == END
+            assert analytics.snapshot_of(db) == snapshot
+            assert not rollups.coverage(db).refreshed
+    finally:
+        duckdb_engine.dispose()
+
+
+def test_engines_agree(gold_data):
+    dataset, root = _exported(gold_data)
+    engine = dataset.engine
+    duckdb_engine = analytics.make_engine(analytics.latest_snapshot(root))
+    try:
+        for name, case in benchmark_engines.report_cases(ACCOUNTS, START, END).items():
+            benchmark_engines.clear_caches()
+            with contextlib.redirect_stdout(io.StringIO()):
+                with Session(engine) as db:
+                    expected = case(db)
+                with Session(duckdb_engine) as db:
+                    actual = case(db)
+            assert expected, name
+            assert benchmark_engines.differences(expected, actual) == [], name
+    finally:
+        duckdb_engine.dispose()
+    assert benchmark_engines.differences({"a": [1.0, "x"]}, {"a": [1.000001, "y"]}) == ["/a[1]: 'x' vs 'y'"]
+
+
+def test_latest_snapshot_switch(gold_data):
+    dataset, root = _exported(gold_data)
+    engine = dataset.engine
+    engines = analytics.SnapshotEngines(settings.AnalyticsSettings(engine="duckdb", snapshot_dir=root, snapshot_check_interval=0))
+    empty = analytics.SnapshotEngines(settings.AnalyticsSettings(engine="duckdb", snapshot_dir=os.path.join(root, "none")))
+    try:
+        try:
+            empty.current()
+            assert False, "no snapshot yet"
+        except analytics.SnapshotUnavailable:
+            pass
+
+        first = engines.current()
+        assert engines.current() is first
+        with contextlib.redirect_stdout(io.StringIO()):
+            export_parquet.export(engine, root, keep=1)
+        second = engines.current()
+        assert second is not first and second.snapshot == analytics.latest_snapshot(root)
+        # keep=1 removed the first snapshot
+        assert not os.path.exists(first.snapshot)
+        with open(os.path.join(root, analytics.LATEST)) as f:
+            assert os.path.join(root, f.read()) == second.snapshot
+        with engines.session() as db:
+            assert db.execute(text("SELECT COUNT(*) FROM phw_dev_gold.dim_accounts")).scalar() == 3
+    finally:
+        engines.dispose()
+
+
+def test_report_endpoints_on_duckdb(gold_data):
+    dataset, root = _exported(gold_data, app=True)
+    config = settings.AnalyticsSettings(engine="duckdb", snapshot_dir=root)
+    original_settings, original_engines = settings.analytics, analytics.engines
+    settings.analytics, analytics.engines = config, analytics.SnapshotEngines(config)
+    try:
+        client = dataset.client
+        payload = {"as_of_date": str(END), "account_codes": ACCOUNTS}
+        response = client.post("/holdings_agg_for_sankey/", json=payload)
+        assert response.status_code == 200 and response.json()["nodes"]
+        # ETags follow the snapshot's load times
+        assert http_cache.DATA_VERSIONS.get((analytics.latest_snapshot(root), "fact_holdings_all")) is not None
+
+        with open(os.path.join(root, analytics.LATEST), "w") as f:
+            f.write("")
+        analytics.engines.dispose()
+        unavailable = client.post("/holdings_agg_for_sankey/", json=payload)
+        assert unavailable.status_code == 503 and "snapshot" in unavailable.json()["detail"]
+        # Endpoints outside the reports still read the database
+        assert client.post("/holdings_available_dates/", json={"account_codes": ACCOUNTS}).status_code == 200
+    finally:
+        analytics.engines.dispose()
+        settings.analytics, analytics.engines = original_settings, original_engines
+
+
+if __name__ == "__main__":
+    for test in (test_export_and_views, test_engines_agree, test_latest_snapshot_switch, test_report_endpoints_on_duckdb):
+        with GoldData() as gold_data:
+            test(gold_data)
+    print("✅ Analytic engine checks passed")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Checks for the benchmark cache layer.
+
+Runs without a database or network: the DB loaders and the price download are replaced
+by in-memory fakes that count how often (and for which ranges) they are called.
+"""
+
+import os
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.cache import DateRangeCache
+from app import benchmark_service
+from app.benchmark_service import BenchmarkService
+
+
+def _days(start, end):
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+class FakeBenchmarkService(BenchmarkService):
+    """BenchmarkService with deterministic data sources that record every load"""
+
+    def __init__(self):
+        super().__init__(db=None)
+        self.loads = []
+
+    def _query_portfolio_cash_flows(self, account_codes, start_date, end_date):
+        self.loads.append(("cash_flows", start_date, end_date))
+        return {d.strftime("%Y-%m-%d"): 1000.0 for d in _days(start_date, end_date) if d.day in (1, 15)}
+
+    def _query_portfolio_daily_values(self, account_codes, start_date, end_date):
+        self.loads.append(("values", start_date, end_date))
+        return {d.strftime("%Y-%m-%d"): 50000.0 + d.toordinal() % 97 for d in _days(start_date, end_date)}
+
+    def _download_benchmark_data(self, benchmark_symbol, start_date, end_date):
+        self.loads.append(("prices", start_date, end_date))
+        start = date.fromisoformat(start_date)
+        end = date.fromisoformat(end_date)
+        return {d.strftime("%Y-%m-%d"): 100.0 + (d.toordinal() % 31) for d in _days(start, end) if d.weekday() < 5}
+
+
+def test_date_range_cache_returns_only_missing_subranges():
+    cache = DateRangeCache("test_ranges")
+    cache.put_range("k", "2024-01-01", "2024-01-31", {"2024-01-10": 1})
+    cache.put_range("k", "2024-03-01", "2024-03-31", {"2024-03-10": 3})
+
+    values, missing = cache.get_range("k", "2024-01-15", "2024-03-15")
+    assert values == {"2024-03-10": 3}
+    assert missing == [(date(2024, 2, 1), date(2024, 2, 29))]
+
+    cache.put_range("k", "2024-02-01", "2024-02-29", {})
+    _, missing = cache.get_range("k", "2024-01-01", "2024-03-31")
+    assert missing == []
+    assert cache.stats()["partial_hits"] == 1
+
+
+def test_overlapping_requests_reuse_cached_subranges():
+    benchmark_service.invalidate_benchmark_caches()
+    benchmark_service.PRICE_CACHE.clear()
+    service = FakeBenchmarkService()
+
+    first = service.get_benchmark_performance(["A1"], ["VFV.TO"], "2023-01-01", "2023-06-30")
+    service.loads.clear()
+    second = service.get_benchmark_performance(["A1"], ["VFV.TO"], "2023-03-01", "2023-09-30")
+
+    # Only July-September is loaded again
+    assert service.loads and all(str(start) >= "2023-07-01" for _, start, _ in service.loads)
+    assert second["portfolio_values"]["2023-03-01"] == first["portfolio_values"]["2023-03-01"]
+
+
+def test_continued_replay_matches_fresh_replay():
+    benchmark_service.invalidate_benchmark_caches()
+    service = FakeBenchmarkService()
+
+    service.get_benchmark_performance(["A1"], ["VFV.TO"], "2022-01-01", "2022-06-30")
+    extended = service.get_benchmark_performance(["A1"], ["VFV.TO"], "2022-01-01", "2022-12-31")
+    truncated = service.get_benchmark_performance(["A1"], ["VFV.TO"], "2022-01-01", "2022-03-31")
+
+    benchmark_service.invalidate_benchmark_caches()
+    fresh = FakeBenchmarkService().get_benchmark_performance(["A1"], ["VFV.TO"], "2022-01-01", "2022-12-31")
+
+    assert extended["benchmark_performance"]["VFV.TO"] == fresh["benchmark_performance"]["VFV.TO"]
+    assert max(truncated["benchmark_performance"]["VFV.TO"]) == "2022-03-31"
+
+
+def test_ranges_reaching_today_are_reloaded():
+    benchmark_service.invalidate_benchmark_caches()
+    benchmark_service.PRICE_CACHE.clear()
+    service = FakeBenchmarkService()
+    today = date.today()
+    start = (today - timedelta(days=30)).isoformat()
+
+    service.get_benchmark_performance(["A1"], ["VFV.TO"], start, today.isoformat())
+    service.loads.clear()
+    service.get_benchmark_performance(["A1"], ["VFV.TO"], start, today.isoformat())
+    # Today can still change: every source loads it again, and only it
+    assert sorted(kind for kind, _, _ in service.loads) == ["cash_flows", "prices", "values"]
+    assert all(str(start) == today.isoformat() for _, start, _ in service.loads)
+
+
+def test_cached_replay_is_not_shared_with_the_caller():
+    benchmark_service.invalidate_benchmark_caches()
+    service = FakeBenchmarkService()
+
+    history, _ = service._get_benchmark_value_history(["A1"], "VFV.TO", {}, "2022-01-01", "2022-03-31")
+    history["2022-03-31"] = None
+    again, _ = service._get_benchmark_value_history(["A1"], "VFV.TO", {}, "2022-01-01", "2022-03-31")
+    assert again["2022-03-31"] is not None
+
+
+if __name__ == "__main__":
+    test_date_range_cache_returns_only_missing_subranges()
+    test_overlapping_requests_reuse_cached_subranges()
+    test_continued_replay_matches_fresh_replay()
+    test_ranges_reaching_today_are_reloaded()
+    test_cached_replay_is_not_shared_with_the_caller()
+    print("✅ Benchmark cache checks passed")
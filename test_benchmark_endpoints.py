@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Checks for the endpoint benchmark suite (tools/benchmark_endpoints.py): regression thresholds,
+rows counted as they are fetched, so a streamed result is not buffered by the recorder, and the
+app's database override removed once a dataset is closed.
+"""
+
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from tools.benchmark_endpoints import DEFAULT_TOLERANCES, DatasetContext, QueryRecorder, compare, endpoint_cases
+
+BASELINE = {"small/service/x": {"wall_ms": 100.0, "db_ms": 2.0, "queries": 4, "rows": 1000, "peak_kb": 2048.0}}
+
+
+def test_regressions_respect_relative_and_absolute_allowance():
+    within = {"small/service/x": {"wall_ms": 129.0, "db_ms": 6.5, "queries": 4, "rows": 1000, "peak_kb": 2900.0}}
+    assert compare(BASELINE, within, DEFAULT_TOLERANCES) == []
+
+    worse = {"small/service/x": {"wall_ms": 140.0, "db_ms": 2.0, "queries": 5, "rows": 1000, "peak_kb": 2048.0}}
+    regressions = compare(BASELINE, worse, DEFAULT_TOLERANCES)
+    assert [r.split(":")[0] for r in regressions] == ["small/service/x wall_ms", "small/service/x queries"]
+
+    # Cases missing from the baseline are not regressions
+    assert compare(BASELINE, {"large/service/x": worse["small/service/x"]}, DEFAULT_TOLERANCES) == []
+
+
+def test_rows_are_counted_as_fetched():
+    engine = create_engine("sqlite://")
+    recorder = QueryRecorder(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (n INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (:n)"), [{"n": n} for n in range(5000)])
+
+    recorder.reset()
+    with engine.connect() as conn:
+        rows = iter(conn.execution_options(yield_per=100).execute(text("SELECT n FROM t")))
+        for _ in range(10):
+            next(rows)
+        # Only what the stream has fetched so far
+        assert 10 <= recorder.rows <= 100
+        assert sum(1 for _ in rows) + 10 == recorder.rows == 5000
+
+    recorder.reset()
+    with Session(engine) as db:
+        assert db.execute(text("SELECT COUNT(*) FROM t")).scalar() == 5000
+        assert len(db.execute(text("SELECT n FROM t WHERE n < 42")).all()) == 42
+    assert recorder.queries == 2 and recorder.rows == 43
+
+
+def test_endpoint_cases_leave_the_app_as_found():
+    from app.main import get_db
+    from tools.offline_app import app
+
+    ctx = DatasetContext("small", "sqlite://", accounts_per_request=2)
+    try:
+        assert endpoint_cases(ctx) and app.dependency_overrides[get_db] == ctx.get_db
+    finally:
+        ctx.close()
+    assert get_db not in app.dependency_overrides
+
+
+if __name__ == "__main__":
+    test_regressions_respect_relative_and_absolute_allowance()
+    test_rows_are_counted_as_fetched()
+    test_endpoint_cases_leave_the_app_as_found()
+    print("✅ Benchmark suite checks passed")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Checks for request coalescing (app/coalescing.py): concurrent identical requests run once and
+share the outcome, for sync and async endpoints, and a cancelled leader hands over to a follower.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app import coalescing, database, metrics
+
+
+class Query(BaseModel):
+    accounts: list
+    start: date
+    level: str = "asset_class"
+
+
+def _slow(calls, result, delay=0.2):
+    def fn():
+        calls.append(threading.get_ident())
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return fn
+
+
+def test_request_key_normalizes_bodies():
+    key = coalescing.request_key("/x/", Query(accounts=["A", "B"], start=date(2024, 1, 2)))
+    assert key == coalescing.request_key("/x/", Query(accounts=["A", "B"], start="2024-01-02", level="asset_class"))
+    assert key != coalescing.request_key("/x/", Query(accounts=["B", "A"], start=date(2024, 1, 2)))
+    assert key != coalescing.request_key("/y/", Query(accounts=["A", "B"], start=date(2024, 1, 2)))
+
+
+def test_concurrent_callers_share_one_run():
+    flight = coalescing.SingleFlight()
+    calls = []
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: flight.do(("/x/", "k"), _slow(calls, {"total": 1})), range(8)))
+    assert len(calls) == 1
+    assert results == [{"total": 1}] * 8
+    assert flight.stats() == {"/x/": {"leaders": 1, "followers": 7}}
+    assert flight.in_flight() == 0
+
+    # Finished runs are not kept
+    flight.do(("/x/", "k"), _slow(calls, None, delay=0))
+    assert len(calls) == 2
+
+
+def test_errors_are_shared():
+    flight = coalescing.SingleFlight()
+    calls = []
+
+    def call(_):
+        try:
+            flight.do(("/x/", "k"), _slow(calls, ValueError("boom")))
+        except ValueError as e:
+            return str(e)
+        assert False, "expected ValueError"
+
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(call, range(4))) == ["boom"] * 4
+    assert len(calls) == 1
+
+
+def test_async_and_sync_callers_share_runs():
+    flight = coalescing.SingleFlight()
+    calls = []
+
+    async def leader():
+        calls.append("async")
+        await asyncio.sleep(0.2)
+        return "from async"
+
+    async def scenario():
+        task = asyncio.ensure_future(flight.do_async(("/x/", "k"), leader))
+        await asyncio.sleep(0.05)
+        # A sync follower in a thread and an async follower on the loop
+        follower = asyncio.get_running_loop().run_in_executor(None, flight.do, ("/x/", "k"), _slow(calls, "from sync"))
+        return await asyncio.gather(task, flight.do_async(("/x/", "k"), leader), follower)
+
+    assert asyncio.run(scenario()) == ["from async"] * 3
+    assert calls == ["async"]
+
+
+def test_cancelled_leader_hands_over_to_follower():
+    flight = coalescing.SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(len(calls))
+        await asyncio.sleep(0.2)
+        return len(calls)
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.do_async(("/x/", "k"), slow))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(flight.do_async(("/x/", "k"), slow))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == 2
+    assert len(calls) == 2
+    assert flight.stats()["/x/"] == {"leaders": 2, "followers": 1}
+
+
+def test_endpoint_decorator():
+    app = FastAPI()
+    calls = []
+
+    @app.post("/sync/")
+    @coalescing.coalesce("/sync/")
+    def sync_endpoint(request: Query):
+        calls.append(request.accounts)
+        time.sleep(0.3)
+        return {"accounts": request.accounts}
+
+    client = TestClient(app)
+    bodies = [{"accounts": ["A"], "start": "2024-01-02"}] * 4 + [{"accounts": ["B"], "start": "2024-01-02"}]
+    with ThreadPoolExecutor(len(bodies)) as pool:
+        responses = list(pool.map(lambda body: client.post("/sync/", json=body), bodies))
+    assert [r.json() for r in responses] == [{"accounts": ["A"]}] * 4 + [{"accounts": ["B"]}]
+    assert sorted(calls) == [["A"], ["B"]]
+
+    # The decorated endpoint keeps its body model for validation and the schema
+    assert client.post("/sync/", json={"accounts": ["A"]}).status_code == 422
+    assert "Query" in str(client.get("/openapi.json").json()["components"]["schemas"])
+
+
+def test_metrics_export():
+    exposition = metrics.render(database.engine)
+    assert "coalesced_in_flight 0" in exposition
+    assert 'coalesced_requests_total{endpoint="/sync/",role="follower"}' in exposition
+
+
+if __name__ == "__main__":
+    test_request_key_normalizes_bodies()
+    test_concurrent_callers_share_one_run()
+    test_errors_are_shared()
+    test_async_and_sync_callers_share_runs()
+    test_cancelled_leader_hands_over_to_follower()
+    test_endpoint_decorator()
+    test_metrics_export()
+    print("✅ Coalescing checks passed")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Checks for the database settings layer (app/settings.py, app/database.py): environment parsing,
+pool arguments, the per-session statement timeout and pool saturation reporting, on temporary
+SQLite databases.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import exc, text
+from sqlalchemy.orm import Session
+
+from app import database
+from app.settings import DatabaseSettings
+
+# Runs for minutes unless interrupted
+SLOW_QUERY = text(
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) SELECT count(*) FROM n"
+)
+
+
+def test_settings_from_environment():
+    settings = DatabaseSettings.from_env(
+        {
+            "DB_POOL_SIZE": "20",
+            "DB_POOL_PRE_PING": "false",
+            "DB_STATEMENT_TIMEOUT_MS": "5000",
+            "DB_STATEMENT_TIMEOUTS": "/fx_rate/=1000, /performance_attribution_sankey/=60000",
+            "DB_STREAM_RESULTS": "0",
+        }
+    )
+    assert settings.pool_size == 20 and settings.max_overflow == DatabaseSettings().max_overflow
+    assert settings.pool_pre_ping is False
+    assert settings.statement_timeout_for("/fx_rate/") == 1000
+    assert settings.statement_timeout_for("/performance_attribution_sankey/") == 60000
+    assert settings.statement_timeout_for("/holdings_agg_for_sankey/") == 5000
+    assert settings.stream_options() == {}
+    assert DatabaseSettings().stream_options() == {"stream_results": True, "yield_per": 5000}
+
+    assert "pool_size" in settings.engine_kwargs("postgresql://localhost/phw")
+    assert "pool_size" in settings.engine_kwargs("sqlite:///perf.db")
+    # The in-memory SQLite pool keeps one connection and takes no size arguments
+    assert "pool_size" not in settings.engine_kwargs("sqlite://")
+
+    try:
+        DatabaseSettings.from_env({"DB_STATEMENT_TIMEOUTS": "5000"})
+        assert False, "a timeout without a path is rejected"
+    except ValueError:
+        pass
+
+
+def test_statement_timeout_cancels_runaway_query():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = database.make_engine(f"sqlite:///{os.path.join(directory, 'timeout.db')}")
+
+        with Session(engine) as session:
+            database.set_statement_timeout(session, 50)
+            try:
+                session.execute(SLOW_QUERY)
+                assert False, "the query should have been cancelled"
+            except exc.OperationalError as error:
+                assert database.is_statement_timeout(error)
+
+        # The deadline does not outlive the session on the pooled connection
+        with Session(engine) as session:
+            assert session.execute(text("SELECT 1")).scalar() == 1
+        engine.dispose()
+
+
+def test_pool_reports_saturation_and_times_out():
+    with tempfile.TemporaryDirectory() as directory:
+        settings = DatabaseSettings(pool_size=1, max_overflow=0, pool_timeout=0.1)
+        engine = database.make_engine(f"sqlite:///{os.path.join(directory, 'pool.db')}", settings)
+
+        with engine.connect():
+            status = engine.pool_monitor.status()
+            assert status["capacity"] == 1 and status["utilization"] == 1.0
+            assert status["saturated_checkouts"] == 1
+            try:
+                engine.connect()
+                assert False, "the second checkout should time out"
+            except exc.TimeoutError:
+                pass
+        assert engine.pool_monitor.status()["checked_out"] == 0
+        assert engine.pool_monitor.status()["peak_checked_out"] == 1
+        assert engine.pool_monitor.status()["timeouts"] == 1
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_settings_from_environment()
+    test_statement_timeout_cancels_runaway_query()
+    test_pool_reports_saturation_and_times_out()
+    print("✅ Database settings checks passed")
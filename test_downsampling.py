@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Checks for benchmark series resampling and LTTB downsampling (app/downsampling.py).
+"""
+
+from datetime import date, timedelta
+
+from app.downsampling import shape_series
+
+
+def _daily_series(days, value_of, start=date(2015, 1, 1)):
+    return {(start + timedelta(days=n)).strftime("%Y-%m-%d"): value_of(n) for n in range(days)}
+
+
+def test_max_points_bounds_size_and_keeps_shape():
+    portfolio = _daily_series(3653, lambda n: 100.0 + n * 0.01 + (500.0 if n == 2000 else 0.0))
+    benchmark = _daily_series(3653, lambda n: 100.0 + n * 0.02)
+
+    shaped = shape_series({"portfolio": portfolio, "VFV.TO": benchmark}, max_points=400)
+
+    assert len(shaped["dates"]) == 400
+    assert all(len(values) == 400 for values in shaped["columns"].values())
+    assert shaped["dates"][0] == "2015-01-01" and shaped["dates"][-1] == max(portfolio)
+    # The one-day spike is what a chart must not lose
+    assert max(shaped["columns"]["portfolio"]) == max(portfolio.values())
+
+
+def test_weekly_and_monthly_keep_last_value_of_each_period():
+    series = {"portfolio": _daily_series(366, float, start=date(2024, 1, 1))}
+
+    monthly = shape_series(series, frequency="monthly")
+    assert len(monthly["dates"]) == 12
+    assert monthly["dates"][0] == "2024-01-31" and monthly["columns"]["portfolio"][0] == 30.0
+
+    weekly = shape_series(series, frequency="weekly")
+    assert 52 <= len(weekly["dates"]) <= 54
+
+
+def test_series_with_different_calendars_stay_aligned():
+    business_days = {
+        day: 1.0 for day in _daily_series(30, float) if date.fromisoformat(day).weekday() < 5
+    }
+    calendar_days = _daily_series(30, float)
+
+    shaped = shape_series({"portfolio": business_days, "XEQT.TO": calendar_days}, max_points=10)
+    assert len(shaped["columns"]["portfolio"]) == len(shaped["columns"]["XEQT.TO"]) == len(shaped["dates"])
+
+
+if __name__ == "__main__":
+    test_max_points_bounds_size_and_keeps_shape()
+    test_weekly_and_monthly_keep_last_value_of_each_period()
+    test_series_with_different_calendars_stay_aligned()
+    print("✅ Downsampling checks passed")
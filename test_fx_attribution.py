@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Checks for daily-position FX attribution (app/fx_attribution.py). No database needed.
+"""
+
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from app.fx_attribution import daily_fx_gains
+
+Position = namedtuple("Position", "account_code security_code as_of_date mva_local_previous security_currency_code")
+Rate = namedtuple("Rate", "as_of_date currency_code exchange_rate")
+
+START = date(2024, 1, 1)
+
+
+def _rates(days, rate_of):
+    return [Rate(START + timedelta(days=n), "USD", rate_of(n)) for n in range(-3, days + 1)]
+
+
+def test_position_bought_mid_period_only_earns_fx_while_held():
+    # USD/CAD moves 1.30 -> 1.40 evenly over 10 days; 1000 USD is held from day 5 onwards
+    rates = _rates(10, lambda n: 1.30 + 0.01 * max(n, 0))
+    positions = [
+        Position("A1", "AAPL", START + timedelta(days=n), 0 if n <= 5 else 1000, "USD") for n in range(1, 11)
+    ]
+
+    gains, stats = daily_fx_gains(positions, rates, START, START + timedelta(days=10))
+
+    # Held through 5 daily moves of 0.01 -> 1000 × 0.05 = 50 CAD
+    assert gains[("AAPL", "A1")] == Decimal("50.0")
+    assert stats["missing_rate_rows"] == 0
+
+
+def test_gaps_compare_against_previous_record_and_weekend_rates_carry_forward():
+    rates = [Rate(START, "USD", 1.30), Rate(START + timedelta(days=3), "USD", 1.33)]
+    positions = [
+        Position("A1", "SPY", START + timedelta(days=3), 2000, "USD"),
+    ]
+    gains, _ = daily_fx_gains(positions, rates, START, START + timedelta(days=3))
+    assert abs(gains[("SPY", "A1")] - Decimal("60")) < Decimal("0.0001")
+
+
+def test_multi_year_household_is_vectorized():
+    days = 3 * 365
+    rng = np.random.default_rng(3)
+    path = 1.30 + np.cumsum(rng.normal(0, 0.002, days + 4))
+    rates = [Rate(START + timedelta(days=n), "USD", float(path[n + 3])) for n in range(-3, days + 1)]
+    positions = [
+        Position(f"A{a}", f"S{s}", START + timedelta(days=n), 1000.0, "USD")
+        for a in range(10)
+        for s in range(30)
+        for n in range(1, days + 1)
+    ]
+
+    started = time.perf_counter()
+    gains, stats = daily_fx_gains(positions, rates, START, START + timedelta(days=days))
+    elapsed = time.perf_counter() - started
+
+    assert stats["rows"] == len(positions) and len(gains) == 300
+    # Constant position: daily sums telescope to position × total rate change
+    expected = 1000.0 * (path[days + 3] - path[3])
+    assert abs(float(gains[("S0", "A0")]) - expected) < 1e-3
+    assert elapsed < 5.0, f"{len(positions)} rows took {elapsed:.2f}s"
+
+
+if __name__ == "__main__":
+    test_position_bought_mid_period_only_earns_fx_while_held()
+    test_gaps_compare_against_previous_record_and_weekend_rates_carry_forward()
+    test_multi_year_household_is_vectorized()
+    print("✅ Daily FX attribution checks passed")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Checks for HTTP conditional requests (app/http_cache.py): ETags on the holdings Sankey endpoint
+over a small generated dataset, 304s without recomputing, new ETags after a reload, and gzip
+with its own ETag.
+"""
+
+import os
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import text
+
+from app import http_cache, services
+from conftest import ACCOUNTS, END, GoldData
+
+
+def test_etag_comparison_and_cache_control():
+    assert http_cache.etag_matches('"a", W/"b"', '"b"')
+    assert http_cache.etag_matches("*", '"b"')
+    assert not http_cache.etag_matches('"a"', '"b"') and not http_cache.etag_matches(None, '"b"')
+    # Either encoding's ETag revalidates the report
+    assert http_cache.encoded_etag('"b"') == '"b-gzip"'
+    assert http_cache.etag_matches('"b-gzip"', '"b"') and http_cache.etag_matches('W/"b-gzip"', '"b"')
+    assert not http_cache.etag_matches('"a-gzip"', '"b"')
+    assert http_cache.cache_control(date(2024, 1, 1), 60) == "private, max-age=60, must-revalidate"
+    assert http_cache.cache_control(date.today(), 60) == "private, no-cache"
+    assert http_cache.cache_control(date.today() + timedelta(days=1), 60) == "private, no-cache"
+
+
+def test_holdings_revalidation(gold_data):
+    dataset = gold_data(accounts=2, securities=30, app=True)
+    engine = dataset.engine
+    computed = []
+    original = services.get_holdings_for_sankey
+
+    def counting(db, request):
+        computed.append(request.as_of_date)
+        return original(db, request=request)
+
+    services.get_holdings_for_sankey = counting
+    try:
+        client = dataset.client
+        payload = {"as_of_date": str(END), "account_codes": ACCOUNTS}
+
+        first = client.post("/holdings_agg_for_sankey/", json=payload)
+        assert first.status_code == 200 and first.json()["nodes"]
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and first.headers["cache-control"].startswith("private, max-age=")
+        assert first.headers["content-encoding"] == "gzip"
+
+        revalidated = client.post("/holdings_agg_for_sankey/", json=payload, headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304 and revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+        # The identity bytes have their own ETag, and each revalidates with a 304 carrying it
+        identity = {"Accept-Encoding": "identity"}
+        plain = client.post("/holdings_agg_for_sankey/", json=payload, headers=identity)
+        assert "content-encoding" not in plain.headers and plain.json() == first.json()
+        plain_etag = plain.headers["etag"]
+        assert etag == http_cache.encoded_etag(plain_etag)
+        revalidated = client.post(
+            "/holdings_agg_for_sankey/", json=payload, headers={**identity, "If-None-Match": plain_etag}
+        )
+        assert revalidated.status_code == 304 and revalidated.headers["etag"] == plain_etag
+        assert computed == [END, END]
+
+        # A different body is a different report
+        other = dict(payload, account_codes=["SYN000000"])
+        assert client.post("/holdings_agg_for_sankey/", json=other, headers={"If-None-Match": etag}).status_code == 200
+
+        # A reload moves ProcessedTimestampEST; once the cached version expires the ETag changes
+        with engine.begin() as conn:
+            conn.execute(text('UPDATE phw_dev_gold.fact_holdings_all SET "ProcessedTimestampEST" = \'2030-01-01 06:00:00\''))
+        http_cache.DATA_VERSIONS.clear()
+        reloaded = client.post("/holdings_agg_for_sankey/", json=payload, headers={"If-None-Match": etag})
+        assert reloaded.status_code == 200 and reloaded.headers["etag"] != etag
+    finally:
+        services.get_holdings_for_sankey = original
+
+
+if __name__ == "__main__":
+    test_etag_comparison_and_cache_control()
+    with GoldData() as gold_data:
+        test_holdings_revalidation(gold_data)
+    print("✅ HTTP cache checks passed")
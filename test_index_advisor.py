@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Checks for the index advisor (tools/index_advisor.py) and the migration runner (tools/migrate.py):
+predicate extraction, proposals on a small generated SQLite dataset, and that the shipped
+migrations apply once, change the plans and match the indexes declared in app/models.py.
+"""
+
+import contextlib
+import io
+import os
+import re
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import text
+
+from app import models, queries
+from conftest import GoldData
+from tools import index_advisor, migrate
+
+END = date(2024, 6, 28)
+
+
+def test_table_uses_from_predicates_and_joins():
+    columns = index_advisor._table_columns()
+    uses = index_advisor.table_uses(queries.GET_HOLDINGS_FOR_ATTRIBUTION.text, columns)
+    assert set(uses["fact_holdings_all"].equality) == {"AsofDate", "AccountCode", "CurrencyCode"}
+    assert uses["dim_securitymaster"].equality == ["security_code"]
+    assert "MarketValueAccrued" in uses["fact_holdings_all"].reads
+
+    uses = index_advisor.table_uses(queries.GET_TRANSACTIONS_FOR_ATTRIBUTION.text, columns)
+    assert uses["fact_transactions"].equality == ["AccountCode"] and uses["fact_transactions"].ranges == ["TradeDate"]
+
+    # Unaliased columns of single-table queries, and <> is not indexable
+    uses = index_advisor.table_uses(queries.GET_NET_CONTRIBUTIONS.text, columns)
+    assert uses["fact_daily_aggregate_values"].equality == ["account_code"]
+    uses = index_advisor.table_uses(queries.GET_DAILY_POSITIONS_FOR_FX_ATTRIBUTION.text, columns)
+    assert "security_currency_code" not in uses["dim_securitymaster"].equality + uses["dim_securitymaster"].ranges
+
+
+def test_proposals_and_migrations_on_generated_data(gold_data):
+    engine = gold_data(end_date=END).engine
+    hot = index_advisor.hot_queries()
+    params = index_advisor.sample_parameters(engine, accounts=2)
+    assert params["as_of_date"] == END and len(params["account_codes"]) == 2
+
+    proposals = {(p.table, p.columns): p for p in index_advisor.propose(hot, engine, min_rows=0)}
+    holdings = proposals[("fact_holdings_all", ("AccountCode", "AsofDate", "CurrencyCode"))]
+    assert {"get_sankey_holdings_query", "GET_HOLDINGS_FOR_ATTRIBUTION", "get_available_dates_query"} <= set(holdings.queries)
+    assert "SecurityCode" in holdings.include
+    # (AccountCode) alone is a prefix of the composite and is not proposed separately
+    assert ("fact_holdings_all", ("AccountCode",)) not in proposals
+
+    before = index_advisor.measure(engine, hot, params, repeat=1)
+    assert "fact_holdings_all" in before["get_sankey_holdings_query"]["full_scans"]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        applied = migrate.migrate(engine)
+        assert [m.version for m in applied] == [m.version for m in migrate.discover("sqlite")]
+        assert migrate.migrate(engine) == []
+    after = index_advisor.measure(engine, hot, params, repeat=1)
+    assert "fact_holdings_all" not in after["get_sankey_holdings_query"]["full_scans"]
+    assert any("ix_fact_holdings_all_accountcode_asofdate_currencycode" in step for step in after["get_sankey_holdings_query"]["plan"])
+    with engine.connect() as conn:
+        names = conn.execute(text("SELECT name FROM phw_dev_gold.schema_migrations ORDER BY version")).scalars().all()
+        assert names == [m.name for m in migrate.discover("sqlite")] and names[0] == "hot_query_indexes"
+
+    report = index_advisor.render_report(before, after, list(proposals.values()), "test")
+    assert "| get_sankey_holdings_query |" in report
+
+
+def test_models_declare_the_migrated_indexes():
+    declared = {
+        index.name
+        for table in models.Base.metadata.tables.values()
+        for index in table.indexes
+        if not index.name.startswith("ix_phw_dev_gold_")  # generated names of index=True columns
+    }
+    for dialect in ("postgresql", "sqlite"):
+        created = set()
+        for migration in migrate.discover(dialect):
+            created.update(re.findall(r"CREATE INDEX.*?(?:phw_dev_gold\.)?(ix_\w+) ON", migration.sql()))
+        assert created == declared, (dialect, created ^ declared)
+
+
+def test_split_statements_drops_comments():
+    sql = "-- migrate: no-transaction\n-- why\nCREATE INDEX a ON t (x);\n\nANALYZE t;\n"
+    assert migrate.split_statements(sql) == ["CREATE INDEX a ON t (x)", "ANALYZE t"]
+
+
+if __name__ == "__main__":
+    test_table_uses_from_predicates_and_joins()
+    with GoldData() as gold_data:
+        test_proposals_and_migrations_on_generated_data(gold_data)
+    test_models_declare_the_migrated_indexes()
+    test_split_statements_drops_comments()
+    print("✅ Index advisor checks passed")
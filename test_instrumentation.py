@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Checks for per-request instrumentation (app/instrumentation.py): Server-Timing phases and SQL
+counters for sync and async endpoints and failed statements, using a small app on a temporary
+SQLite database.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy import create_engine, text
+
+from app import instrumentation
+
+
+class Query(BaseModel):
+    limit: int
+
+
+def _app(engine):
+    app = FastAPI()
+    app.router.route_class = instrumentation.InstrumentedRoute
+
+    @app.post("/sync/")
+    def sync_endpoint(query: Query):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1")).fetchall()
+            return [row[0] for row in conn.execute(text("SELECT n FROM numbers LIMIT :n"), {"n": query.limit})]
+
+    @app.post("/broken/")
+    def broken_endpoint(query: Query):
+        with engine.connect() as conn:
+            try:
+                conn.execute(text("SELECT n FROM missing"))
+            except Exception:
+                pass
+            conn.execute(text("SELECT :n"), {"n": query.limit})
+            # Nothing is left behind on the pooled connection by the failed statement
+            return sorted(conn.info)
+
+    @app.post("/async/")
+    async def async_endpoint(query: Query):
+        return {"limit": query.limit}
+
+    instrumentation.install(app, engine)
+    return app
+
+
+def _phases(header):
+    return {entry.split(";")[0].strip(): entry for entry in header.split(",")}
+
+
+def test_server_timing_splits_request_phases():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'numbers.db')}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE numbers (n INTEGER)"))
+            conn.execute(text("INSERT INTO numbers VALUES (1), (2), (3)"))
+        client = TestClient(_app(engine))
+
+        response = client.post("/sync/", json={"limit": 2})
+        assert response.json() == [1, 2]
+        phases = _phases(response.headers["server-timing"])
+        assert set(phases) == {"validate", "sql", "compute", "serialize", "total"}
+        # sqlite3 has no rowcount for SELECTs; rows are counted as they are fetched
+        assert 'desc="2 queries 3 rows"' in phases["sql"]
+
+        phases = _phases(client.post("/async/", json={"limit": 1}).headers["server-timing"])
+        assert 'desc="0 queries 0 rows"' in phases["sql"]
+
+        response = client.post("/broken/", json={"limit": 1})
+        assert response.json() == []
+        assert 'desc="1 queries' in _phases(response.headers["server-timing"])["sql"]
+
+        # Validation errors never reach the endpoint
+        response = client.post("/sync/", json={"limit": "many"})
+        assert response.status_code == 422
+        assert set(_phases(response.headers["server-timing"])) == {"total"}
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_server_timing_splits_request_phases()
+    print("✅ Instrumentation checks passed")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Checks for background report jobs (app/jobs.py, /jobs/...): an attribution job run in a worker
+process returns what the synchronous endpoint returns, with its stages recorded; queued and
+running jobs can be cancelled; submits beyond JOB_MAX_PENDING are refused; finished jobs expire
+and jobs of an exited API worker read as failed.
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from pydantic import BaseModel
+
+from app import jobs, settings
+from conftest import ACCOUNTS, END, START, GoldData
+
+
+class _Request(BaseModel):
+    steps: int
+
+
+class _Response(BaseModel):
+    steps: int
+
+
+def test_attribution_job_in_a_worker_process(gold_data):
+    dataset = gold_data(app=True)
+    config = settings.JobSettings(executor="process", workers=1, store_path=os.path.join(dataset.directory, "jobs.db"))
+    original = jobs.manager
+    jobs.manager = jobs.JobManager(config, database_url=dataset.url)
+    try:
+        client = dataset.client
+        payload = {"start_date": str(START), "end_date": str(END), "account_codes": ACCOUNTS, "include_securities": True}
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = client.post("/performance_attribution_sankey/", json=payload).json()
+
+        submitted = client.post("/jobs/performance_attribution_sankey/", json=payload)
+        assert submitted.status_code == 202
+        job_id = submitted.json()["job_id"]
+        assert submitted.headers["location"] == f"/jobs/{job_id}"
+        assert submitted.json()["status"] in ("queued", "running")
+
+        finished = client.get(f"/jobs/{job_id}", params={"wait": 60}).json()
+        assert finished["status"] == "succeeded", finished
+        assert finished["progress"] == 1 and finished["stage"] == "securities" and finished["expires_at"]
+
+        result = client.get(f"/jobs/{job_id}/result")
+        assert result.status_code == 200 and result.json() == expected
+
+        assert client.post("/jobs/performance_attribution_sankey/", json=dict(payload, top_k=0)).status_code == 422
+        assert client.get("/jobs/unknown").status_code == 404
+        assert "jobs_finished_total{status=\"succeeded\"} 1" in client.get("/metrics").text
+    finally:
+        jobs.manager.shutdown()
+        jobs.manager = original
+
+
+def test_cancel_and_pending_limit():
+    release = threading.Event()
+    started = threading.Event()
+
+    def run(db, request, progress):
+        for step in range(request.steps):
+            progress(step / request.steps, f"step {step}")
+            started.set()
+            if request.steps > 1:
+                release.wait(0.05)
+        if request.steps < 0:
+            raise ValueError("negative steps")
+        return {"steps": request.steps}
+
+    jobs.KINDS["test"] = jobs.JobKind("/test/", _Request, _Response, run)
+    with tempfile.TemporaryDirectory() as directory:
+        config = settings.JobSettings(executor="thread", workers=1, max_pending=2, store_path=os.path.join(directory, "jobs.db"))
+        manager = jobs.JobManager(config, database_url="sqlite://")
+        try:
+            running = manager.submit("test", _Request(steps=10_000))["job_id"]
+            assert started.wait(5)
+            queued = manager.submit("test", _Request(steps=1))["job_id"]
+            try:
+                manager.submit("test", _Request(steps=1))
+                assert False, "two jobs are pending"
+            except jobs.JobQueueFull:
+                pass
+            assert manager.stats()["rejected"] == 1
+
+            assert manager.cancel(queued)["status"] == "cancelled"
+            assert manager.get(running)["stage"].startswith("step")
+            manager.cancel(running)
+            assert asyncio.run(manager.wait(running, 5))["status"] == "cancelled"
+            assert manager.result(running) is None
+
+            failed = manager.submit("test", _Request(steps=-1))["job_id"]
+            job = asyncio.run(manager.wait(failed, 5))
+            assert job["status"] == "failed" and job["error"] == "ValueError: negative steps"
+
+            done = manager.submit("test", _Request(steps=1))["job_id"]
+            assert asyncio.run(manager.wait(done, 5))["status"] == "succeeded"
+            assert manager.result(done) == '{"steps": 1}'
+            # A finished job cannot be cancelled any more
+            assert manager.cancel(done)["status"] == "succeeded"
+        finally:
+            manager.shutdown()
+            del jobs.KINDS["test"]
+
+
+def test_expiry_and_exited_owner():
+    with tempfile.TemporaryDirectory() as directory:
+        store = jobs.JobStore(os.path.join(directory, "jobs.db"), result_ttl=0.2)
+        store.create_schema()
+        manager = jobs.JobManager(settings.JobSettings(store_path=store.path, result_ttl=0.2))
+
+        job_id = store.create("performance_benchmark", {"account_codes": ["A"]})["job_id"]
+        assert store.request(job_id) == {"account_codes": ["A"]}
+        store.finish(job_id, jobs.SUCCEEDED, result="{}")
+        assert manager.get(job_id)["status"] == "succeeded"
+        time.sleep(0.3)
+        assert manager.get(job_id) is None and store.result(job_id) is None
+        assert store.purge_expired() == 1
+
+        # Queued by an API worker that has exited since
+        orphan = store.create("performance_benchmark", {})["job_id"]
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        with contextlib.closing(store._connect()) as connection:
+            connection.execute("UPDATE jobs SET owner_pid = ? WHERE job_id = ?", (exited.pid, orphan))
+        job = manager.get(orphan)
+        assert job["status"] == "failed" and "exited" in job["error"]
+
+
+if __name__ == "__main__":
+    with GoldData() as gold_data:
+        test_attribution_job_in_a_worker_process(gold_data)
+    test_cancel_and_pending_limit()
+    test_expiry_and_exited_owner()
+    print("✅ Job checks passed")
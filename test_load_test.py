@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Checks for the load-test client and statistics (tools/load_test.py) against a tiny in-process
+HTTP server, so no uvicorn or database is needed.
+"""
+
+import asyncio
+from datetime import date
+
+from tools.load_test import RequestMix, run_load
+
+
+async def _serve(reader, writer):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            if b"/fx_rate/" in head:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 2\r\n\r\n{}")
+            else:
+                writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n2\r\n[]\r\n0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+
+async def _load():
+    server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    mix = RequestMix(["A", "B", "C"], date(2024, 1, 1), date(2024, 12, 31), mix={"/fx_rate/": 1, "/holdings_available_dates/": 3})
+    async with server:
+        return await run_load("127.0.0.1", port, mix, concurrency=4, duration=0.3, warmup=0.05)
+
+
+def test_load_run_reports_percentiles_and_errors_per_endpoint():
+    results = asyncio.run(_load())
+    ok, failing = results["endpoints"]["/holdings_available_dates/"], results["endpoints"]["/fx_rate/"]
+    assert ok["requests"] > 0 and ok["errors"] == 0
+    assert ok["p50_ms"] <= ok["p95_ms"] <= ok["p99_ms"] <= ok["max_ms"]
+    assert failing["requests"] == 0 and failing["errors"] > 0
+    assert results["overall"]["requests"] == ok["requests"]
+
+
+if __name__ == "__main__":
+    test_load_run_reports_percentiles_and_errors_per_endpoint()
+    print("✅ Load test checks passed")
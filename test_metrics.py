@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Checks for the Prometheus /metrics endpoint (app/metrics.py): a small scraper stub parses the
+text exposition after requests against a temporary SQLite database, rows counted per named query
+as they are fetched on a generated dataset, and the sharded counters summed correctly across
+threads.
+"""
+
+import os
+import re
+import tempfile
+import threading
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy import create_engine, text
+
+from app import cache, metrics, queries
+from conftest import ACCOUNTS, GoldData
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def scrape(client):
+    """Minimal Prometheus scraper: {(name, frozenset(labels)): value} plus {family: type}"""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    samples, types = {}, {}
+    for line in response.text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+        elif line and not line.startswith("#"):
+            match = SAMPLE.match(line)
+            assert match, f"unparseable sample line: {line!r}"
+            name, _, labels, value = match.groups()
+            family = re.sub(r"_(bucket|sum|count)$", "", name)
+            assert family in types or name in types, f"sample before its # TYPE: {line!r}"
+            samples[(name, frozenset(LABEL.findall(labels or "")))] = float(value)
+    return samples, types
+
+
+class Query(BaseModel):
+    limit: int
+
+
+def _app(engine):
+    app = FastAPI()
+    numbers = queries.named("NUMBERS", text("SELECT n FROM numbers LIMIT :n"))
+    lookups = cache.TTLCache("test_metrics_lookups", maxsize=4)
+
+    @app.post("/numbers/")
+    def numbers_endpoint(query: Query):
+        values = lookups.get(query.limit)
+        if values is None:
+            with engine.connect() as conn:
+                values = [row[0] for row in conn.execute(numbers, {"n": query.limit})]
+            lookups.set(query.limit, values)
+        return values
+
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        return Response(metrics.render(engine), media_type=metrics.CONTENT_TYPE)
+
+    metrics.install(app, engine)
+    return app
+
+
+def test_scraper_reads_request_pool_cache_and_query_metrics():
+    metrics.registry.reset()
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'numbers.db')}")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE numbers (n INTEGER)"))
+            conn.execute(text("INSERT INTO numbers VALUES (1), (2), (3)"))
+        client = TestClient(_app(engine))
+
+        assert client.post("/numbers/", json={"limit": 2}).json() == [1, 2]
+        assert client.post("/numbers/", json={"limit": 2}).json() == [1, 2]
+        assert client.post("/numbers/", json={"limit": "many"}).status_code == 422
+        assert client.post("/nowhere/", json={}).status_code == 404
+        samples, types = scrape(client)
+
+        route = {("method", "POST"), ("route", "/numbers/")}
+        assert types["api_request_duration_seconds"] == "histogram"
+        assert samples[("api_requests_total", frozenset(route | {("status", "200")}))] == 2
+        assert samples[("api_requests_total", frozenset(route | {("status", "422")}))] == 1
+        assert samples[("api_requests_total", frozenset({("method", "POST"), ("route", "unmatched"), ("status", "404")}))] == 1
+        assert samples[("api_requests_in_flight", frozenset(route))] == 0
+        # The scrape itself is in flight while it renders
+        assert samples[("api_requests_in_flight", frozenset({("method", "GET"), ("route", "/metrics")}))] == 1
+
+        buckets = sorted(
+            (float("inf") if dict(labels)["le"] == "+Inf" else float(dict(labels)["le"]), value)
+            for (name, labels), value in samples.items()
+            if name == "api_request_duration_seconds_bucket" and route <= labels
+        )
+        counts = [value for _, value in buckets]
+        assert counts == sorted(counts) and counts[-1] == 3
+        assert samples[("api_request_duration_seconds_count", frozenset(route))] == 3
+        assert samples[("api_request_duration_seconds_sum", frozenset(route))] > 0
+
+        # Cached on the second request, so the named query ran once
+        assert samples[("db_queries_total", frozenset({("query", "NUMBERS")}))] == 1
+        assert samples[("db_query_rows_total", frozenset({("query", "NUMBERS")}))] == 2
+        lookups = frozenset({("cache", "test_metrics_lookups")})
+        assert samples[("cache_hits_total", lookups)] == 1
+        assert samples[("cache_misses_total", lookups)] == 1
+        assert samples[("cache_hit_ratio", lookups)] == 0.5
+
+        assert types["db_pool_checked_out"] == "gauge"
+        assert samples[("db_pool_checked_out", frozenset())] == 0
+        engine.dispose()
+
+
+def test_thread_shards():
+    registry = metrics.ShardedMetrics(buckets=(1.0,))
+
+    def work():
+        for _ in range(1000):
+            registry.inc("hits", ())
+            registry.observe("latency", (), 0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.counters()[("hits", ())] == 4000
+    assert registry.histograms()[("latency", ())] == [4000, 0, 2000.0]
+
+    assert queries.get_available_dates_query().get_execution_options()["query_name"] == "get_available_dates_query"
+
+
+def test_query_rows_are_counted_as_fetched(gold_data):
+    # sqlite3 reports no rowcount for SELECTs, like a server-side cursor right after execute
+    engine = gold_data().engine
+    metrics.instrument_engine(engine)
+    metrics.registry.reset()
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(
+            queries.get_available_dates_query(), {"account_codes": ACCOUNTS}
+        )
+        dates = [row.as_of_date for row in result]
+    assert queries.get_available_dates_query().get_execution_options()["query_name"] == "get_available_dates_query"
+    labels = (("query", "get_available_dates_query"),)
+    assert len(dates) > 1
+    assert metrics.registry.counters()[("db_query_rows_total", labels)] == len(dates)
+    assert metrics.registry.counters()[("db_queries_total", labels)] == 1
+
+if __name__ == "__main__":
+    test_scraper_reads_request_pool_cache_and_query_metrics()
+    test_thread_shards()
+    with GoldData() as gold_data:
+        test_query_rows_are_counted_as_fetched(gold_data)
+    print("✅ Metrics checks passed")
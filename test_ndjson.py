@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Checks for the NDJSON mode of the report endpoints (app/ndjson.py): Accept negotiation, chunked
+encoding in flat memory, Sankey and benchmark streams carrying the same nodes, links, points and
+metrics as the JSON responses, portfolio points sent before a benchmark's prices are fetched,
+and ETags that tell the two formats apart.
+"""
+
+import json
+import os
+import tracemalloc
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy.orm import Session
+
+from app import benchmark_service, ndjson
+from app.benchmark_service import BenchmarkService
+from conftest import ACCOUNTS, END, START, GoldData
+
+NDJSON = {"Accept": ndjson.MEDIA_TYPE}
+
+
+def _lines(body: bytes):
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+def test_negotiation_and_encoding():
+    assert not ndjson.accepts(None) and not ndjson.accepts("*/*") and not ndjson.accepts("application/json")
+    assert ndjson.accepts("application/x-ndjson") and ndjson.accepts("application/ndjson, application/json")
+    assert not ndjson.accepts("application/x-ndjson;q=0.5, application/json")
+    assert not ndjson.accepts("application/x-ndjson;q=0")
+
+    chunks = list(ndjson.encode([{"n": 1}, {"n": 2}, None, {"n": 3, "day": date(2024, 1, 2)}], chunk_size=1024))
+    # The first line alone, the buffer at the flush, then the rest with the end line
+    assert chunks == [b'{"n":1}\n', b'{"n":2}\n', b'{"n":3,"day":"2024-01-02"}\n{"type":"end"}\n']
+
+    def points(count):
+        return ({"type": "point", "date": f"2024-01-{n % 28 + 1:02d}", "value": n * 1.5} for n in range(count))
+
+    tracemalloc.start()
+    try:
+        size = sum(len(chunk) for chunk in ndjson.encode(points(200_000)))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert size > 8_000_000 and peak < 512 * 1024, (size, peak)
+
+
+def test_sankey_stream_matches_json(gold_data):
+    client = gold_data(app=True).client
+    payload = {"as_of_date": str(END), "account_codes": ACCOUNTS}
+    document = client.post("/holdings_agg_for_sankey/", json=payload)
+    streamed = client.post("/holdings_agg_for_sankey/", json=payload, headers=NDJSON)
+    assert streamed.status_code == 200 and streamed.headers["content-type"] == ndjson.MEDIA_TYPE
+
+    lines = _lines(streamed.content)
+    assert lines[-1] == {"type": "end"}
+    nodes = [{"label": line["label"]} for line in lines if line["type"] == "node"]
+    links = [{key: line[key] for key in ("source", "target", "value")} for line in lines if line["type"] == "link"]
+    assert {"nodes": nodes, "links": links} == document.json()
+    assert len(links) > 3
+
+    # One ETag per format, each revalidating only its own
+    json_etag, ndjson_etag = document.headers["etag"], streamed.headers["etag"]
+    assert json_etag != ndjson_etag and streamed.headers["vary"].startswith("Accept")
+    revalidated = client.post(
+        "/holdings_agg_for_sankey/", json=payload, headers={**NDJSON, "If-None-Match": ndjson_etag}
+    )
+    assert revalidated.status_code == 304
+    other = client.post("/holdings_agg_for_sankey/", json=payload, headers={**NDJSON, "If-None-Match": json_etag})
+    assert other.status_code == 200
+
+
+class _RecordingService(BenchmarkService):
+    """Serves fixed prices and records the NDJSON chunks sent before each download"""
+
+    def __init__(self, db, sent):
+        super().__init__(db)
+        self.sent = sent
+        self.sent_before_download = []
+
+    def _download_benchmark_data(self, benchmark_symbol, start_date, end_date):
+        self.sent_before_download.append(b"".join(self.sent))
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        return {d.strftime("%Y-%m-%d"): 100.0 + d.toordinal() % 31 for d in days if d.weekday() < 5}
+
+
+def test_benchmark_stream_matches_json(gold_data):
+    benchmark_service.invalidate_benchmark_caches()
+    benchmark_service.PRICE_CACHE.clear()
+    dataset = gold_data(app=True)
+    with Session(dataset.engine) as db:
+        sent = []
+        service = _RecordingService(db, sent)
+        items = service.iter_benchmark_performance(ACCOUNTS, ["VFV.TO", "XEQT.TO"], str(START), str(END))
+        for chunk in ndjson.encode(items):
+            sent.append(chunk)
+    # Every portfolio point went out before the first price download, and the first
+    # benchmark's points before the second download
+    portfolio_days = sum(line["type"] == "portfolio" for line in _lines(b"".join(sent)))
+    before_first, before_second = map(_lines, service.sent_before_download)
+    assert portfolio_days > 50 and [line["type"] for line in before_first] == ["portfolio"] * portfolio_days
+    assert {line.get("symbol") for line in before_second} == {None, "VFV.TO"}
+
+    client = dataset.client
+    for options in ({"include_metrics": True}, {"frequency": "weekly", "max_points": 10}):
+        payload = {
+            "account_codes": ACCOUNTS, "benchmark_list": ["VFV.TO", "XEQT.TO"],
+            "start_date": str(START), "end_date": str(END), **options,
+        }
+        document = client.post("/performance_benchmark/", json=payload).json()
+        lines = _lines(client.post("/performance_benchmark/", json=payload, headers=NDJSON).content)
+        assert lines[-1] == {"type": "end"}
+
+        portfolio = {line["date"]: line["value"] for line in lines if line["type"] == "portfolio"}
+        benchmarks = {}
+        for line in lines:
+            if line["type"] == "benchmark":
+                benchmarks.setdefault(line["symbol"], {})[line["date"]] = line["value"]
+        assert portfolio == document["portfolio_values"]
+        assert benchmarks == document["benchmark_performance"]
+        metrics = [{k: v for k, v in line.items() if k != "type"} for line in lines if line["type"] == "metrics"]
+        assert metrics == (document["metrics"] or [])
+    assert len(portfolio) <= 10
+
+
+if __name__ == "__main__":
+    test_negotiation_and_encoding()
+    for test in (test_sankey_stream_matches_json, test_benchmark_stream_matches_json):
+        with GoldData() as gold_data:
+            test(gold_data)
+    print("✅ NDJSON checks passed")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Checks for the monthly partitioning tool (tools/partition_holdings.py): partition names and
+bounds, and that the API's point-in-time reads of fact_holdings_all constrain AsofDate so
+Postgres can prune partitions. The conversion itself needs Postgres and is not run here.
+"""
+
+import os
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.database import make_engine
+from tools import partition_holdings
+
+
+def test_partition_names_and_bounds():
+    assert partition_holdings.months_between("2023-11-30", date(2024, 2, 1)) == [
+        date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1),
+    ]
+    assert partition_holdings.partition_ddl(["2024-12-31", date(2024, 12, 2), "2025-01-15"]) == [
+        "CREATE TABLE IF NOT EXISTS phw_dev_gold.fact_holdings_all_p2024_12 PARTITION OF phw_dev_gold.fact_holdings_all "
+        "FOR VALUES FROM ('2024-12-01') TO ('2025-01-01')",
+        "CREATE TABLE IF NOT EXISTS phw_dev_gold.fact_holdings_all_p2025_01 PARTITION OF phw_dev_gold.fact_holdings_all "
+        "FOR VALUES FROM ('2025-01-01') TO ('2025-02-01')",
+    ]
+
+
+def test_point_in_time_reads_prune():
+    keys = {result["query"]: result["key"] for result in partition_holdings.check_pruning()}
+    for name in ("get_sankey_holdings_query", "GET_HOLDINGS_FOR_ATTRIBUTION", "REFRESH_ACCOUNT_ROLLUP", "REFRESH_ASSET_CLASS_ROLLUP"):
+        assert keys[name] == "=", name
+    # Account-only lookups read every partition (through each partition's index)
+    assert keys["get_holdings_query"] is None
+    # Reads of the rollups and other tables are not listed
+    assert "GET_ROLLUP_PORTFOLIO_DAILY_VALUES" not in keys and "GET_TRANSACTIONS_FOR_ATTRIBUTION" not in keys
+
+
+def test_postgres_only():
+    engine = make_engine("sqlite://")
+    for action in (lambda: partition_holdings.convert(engine), lambda: partition_holdings.ensure_partitions(engine, date.today(), date.today())):
+        try:
+            action()
+        except SystemExit as error:
+            assert "Postgres" in str(error)
+        else:
+            assert False, "expected SystemExit"
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    test_partition_names_and_bounds()
+    test_point_in_time_reads_prune()
+    test_postgres_only()
+    print("✅ Partitioning checks passed")
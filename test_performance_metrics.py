@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Checks for the vectorized return-metrics engine (app/performance_metrics.py).
+Pure numpy, no database needed.
+"""
+
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.performance_metrics import compute_return_metrics
+
+
+def _calendar(days, start=date(2015, 1, 1)):
+    return [start + timedelta(days=n) for n in range(days)]
+
+
+def test_deposits_do_not_change_time_weighted_return():
+    dates = _calendar(366)
+    daily = 0.0003
+    growth = (1 + daily) ** np.arange(366)
+
+    values = np.vstack([1000.0 * growth, 1000.0 * growth])
+    flows = np.zeros_like(values)
+    # Second series gets a 500 deposit half way through
+    flows[1, 183] = 500.0
+    values[1, 183:] += 500.0 * growth[183:] / growth[183]
+
+    metrics = compute_return_metrics(dates, values, flows)
+    expected = growth[-1] - 1
+    assert np.allclose(metrics["twr"], expected)
+    # With no flows the money-weighted return equals the annualized time-weighted return
+    assert abs(metrics["irr"][0] - metrics["annualized_twr"][0]) < 1e-6
+    assert metrics["max_drawdown"][0] == 0.0
+
+
+def test_drawdown_and_tracking_error():
+    dates = _calendar(5)
+    values = np.array(
+        [
+            [100.0, 120.0, 90.0, 95.0, 130.0],
+            [100.0, 120.0, 90.0, 95.0, 130.0],
+            [100.0, 101.0, 102.0, 103.0, 104.0],
+        ]
+    )
+    metrics = compute_return_metrics(dates, values, np.zeros_like(values), benchmark_rows=[1, 2])
+    assert abs(metrics["max_drawdown"][0] - (90.0 / 120.0 - 1)) < 1e-12
+    assert metrics["tracking_error"][0, 0] == 0.0
+    assert metrics["tracking_error"][0, 1] > 0
+
+
+def test_late_start_and_empty_series():
+    dates = _calendar(4)
+    values = np.array([[np.nan, np.nan, 100.0, 110.0], [np.nan] * 4])
+    metrics = compute_return_metrics(dates, values, np.zeros_like(values))
+    assert abs(metrics["twr"][0] - 0.10) < 1e-12
+    assert metrics["start_value"][0] == 100.0
+    assert np.isnan(metrics["twr"][1]) and np.isnan(metrics["irr"][1])
+
+
+def test_ten_year_daily_series_for_many_accounts_is_fast():
+    days = 3653
+    rng = np.random.default_rng(7)
+    values = 1e5 * np.cumprod(1 + rng.normal(0.0003, 0.01, size=(53, days)), axis=1)
+    flows = np.where(rng.random((53, days)) < 0.01, 1000.0, 0.0)
+
+    started = time.perf_counter()
+    metrics = compute_return_metrics(_calendar(days), values, flows, benchmark_rows=[50, 51, 52])
+    elapsed = time.perf_counter() - started
+
+    assert metrics["tracking_error"].shape == (53, 3)
+    assert np.all(np.isfinite(metrics["irr"]))
+    assert elapsed < 1.0, f"metrics took {elapsed:.3f}s"
+
+
+if __name__ == "__main__":
+    test_deposits_do_not_change_time_weighted_return()
+    test_drawdown_and_tracking_error()
+    test_late_start_and_empty_series()
+    test_ten_year_daily_series_for_many_accounts_is_fast()
+    print("✅ Return metrics checks passed")
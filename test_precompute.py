@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Checks for the precompute scheduler (app/precompute.py): relative dates, configured and learned
+shapes precomputed after a load on a generated dataset and served without recomputing, a new
+run only after another load, and reports waiting while live requests hold pool connections,
+including those of a read replica.
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import database, http_cache, precompute, services, settings
+from app.database import make_engine
+from conftest import ACCOUNTS, END, GoldData
+
+
+def test_relative_dates():
+    latest = date(2024, 3, 29)
+    assert precompute.anchors(latest) == {
+        "latest": latest, "month_end": date(2024, 2, 29), "year_start": date(2024, 1, 1),
+    }
+    assert precompute.anchors(date(2024, 3, 31))["month_end"] == date(2024, 3, 31)
+
+    shape = {"start_date": "year_start", "end_date": "latest", "account_codes": ["A"]}
+    assert precompute.resolve(shape, latest) == {"start_date": "2024-01-01", "end_date": "2024-03-29", "account_codes": ["A"]}
+    assert precompute.relative(precompute.resolve(shape, latest), latest) == shape
+    # Other dates stay as they are, and a month end that is also the latest day reads as latest
+    assert precompute.relative({"as_of_date": "2023-06-30"}, latest) == {"as_of_date": "2023-06-30"}
+    assert precompute.relative({"as_of_date": "2024-03-31"}, date(2024, 3, 31)) == {"as_of_date": "latest"}
+    try:
+        precompute.resolve(shape, None)
+        assert False, "nothing is loaded"
+    except ValueError:
+        pass
+
+
+def test_precomputed_after_load(gold_data):
+    dataset = gold_data(app=True)
+    engine, client = dataset.engine, dataset.client
+    shapes_path = os.path.join(dataset.directory, "shapes.json")
+    ytd = {"start_date": "year_start", "end_date": "latest", "account_codes": ACCOUNTS}
+    with open(shapes_path, "w") as f:
+        json.dump([{"path": "/performance_attribution_sankey/", "request": ytd}], f)
+
+    config = settings.PrecomputeSettings(enabled=True, shapes_path=shapes_path, learned=10, min_interval=0)
+    scheduler = precompute.Scheduler(config, session=lambda path: Session(engine))
+    computed = []
+    original_scheduler, original_sankey = precompute.scheduler, services.get_holdings_for_sankey
+
+    def counting(db, request):
+        computed.append(request.as_of_date)
+        return original_sankey(db, request=request)
+
+    precompute.scheduler = scheduler
+    services.get_holdings_for_sankey = counting
+    http_cache.REPORTS.clear()
+    try:
+        sankey = {"as_of_date": str(END), "account_codes": ACCOUNTS}
+        expected = client.post("/holdings_agg_for_sankey/", json=sankey).json()
+        client.post("/holdings_agg_for_sankey/", json=sankey)
+        assert len(computed) == 2
+        # Learned before the first run knows the latest day, so as an absolute date
+        path, learned = scheduler.shapes()[1]
+        assert path == "/holdings_agg_for_sankey/" and learned["as_of_date"] == str(END)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert scheduler.check(engine)
+        assert scheduler.latest == END and scheduler.stats()["computed"] == 2
+        assert len(computed) == 3 and len(http_cache.REPORTS) == 2
+
+        # Served from the precomputed reports
+        assert client.post("/holdings_agg_for_sankey/", json=sankey).json() == expected
+        hits = http_cache.REPORTS.hits
+        attribution = {"start_date": "2024-01-01", "end_date": str(END), "account_codes": ACCOUNTS}
+        precomputed = client.post("/performance_attribution_sankey/", json=attribution)
+        assert len(computed) == 3 and http_cache.REPORTS.hits == hits + 1
+        assert precomputed.headers["etag"]
+        http_cache.REPORTS.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert client.post("/performance_attribution_sankey/", json=attribution).json() == precomputed.json()
+
+        # Learned now in relative form; nothing runs until the next load
+        assert ("/holdings_agg_for_sankey/", "latest") in [(path, shape.get("as_of_date")) for path, shape in scheduler.shapes()]
+        assert not scheduler.check(engine)
+        with engine.begin() as conn:
+            conn.execute(text('UPDATE phw_dev_gold.fact_transactions SET "ProcessedTimestampEST" = \'2030-01-01 06:00:00\''))
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert scheduler.check(engine)
+        assert scheduler.stats()["runs"] == 2 and "precompute_runs_total 2" in client.get("/metrics").text
+    finally:
+        precompute.scheduler = original_scheduler
+        services.get_holdings_for_sankey = original_sankey
+        http_cache.REPORTS.clear()
+
+
+def test_waits_for_live_requests():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(f"sqlite:///{os.path.join(directory, 'empty.db')}")
+        config = settings.PrecomputeSettings(enabled=True, max_busy_connections=1, min_interval=0.05)
+        scheduler = precompute.Scheduler(config)
+        live = engine.connect()
+        live.exec_driver_sql("SELECT 1")
+        released = threading.Timer(0.3, live.close)
+        released.start()
+        try:
+            started = time.monotonic()
+            scheduler._wait_turn(engine)
+            assert time.monotonic() - started >= 0.25 and scheduler.stats()["deferred"] >= 2
+            # At most one report per PRECOMPUTE_INTERVAL
+            started = time.monotonic()
+            scheduler._wait_turn(engine)
+            assert time.monotonic() - started >= 0.04
+        finally:
+            released.cancel()
+            live.close()
+            engine.dispose()
+
+
+def test_waits_for_busy_replicas():
+    with tempfile.TemporaryDirectory() as directory:
+        primary, replica = (make_engine(f"sqlite:///{os.path.join(directory, name + '.db')}") for name in ("primary", "replica"))
+        original_router = database.router
+        database.router = database.ReplicaRouter(primary, [replica])
+        config = settings.PrecomputeSettings(enabled=True, max_busy_connections=1, min_interval=0)
+        scheduler = precompute.Scheduler(config)
+        # Live requests hold the replica's connections; the primary is idle
+        live = replica.connect()
+        live.exec_driver_sql("SELECT 1")
+        released = threading.Timer(0.3, live.close)
+        released.start()
+        try:
+            assert scheduler.report_engines() == [primary, replica]
+            started = time.monotonic()
+            scheduler._wait_turn()
+            assert time.monotonic() - started >= 0.25 and scheduler.stats()["deferred"] >= 1
+        finally:
+            released.cancel()
+            live.close()
+            database.router = original_router
+            primary.dispose()
+            replica.dispose()
+
+
+if __name__ == "__main__":
+    test_relative_dates()
+    with GoldData() as gold_data:
+        test_precomputed_after_load(gold_data)
+    test_waits_for_live_requests()
+    test_waits_for_busy_replicas()
+    print("✅ Precompute checks passed")
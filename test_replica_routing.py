@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Checks for read-replica routing (app/database.py ReplicaRouter / RoutingSession) with a primary
+and replicas as separate local SQLite databases: round-robin reads, writes on the primary, and
+failover when a replica cannot be reached, and pool timeouts counted on the pool that timed out.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import Column, MetaData, String, Table, exc, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app import database, metrics
+from app.settings import DatabaseSettings
+
+source = Table("source", MetaData(), Column("name", String))
+
+
+def _instance(directory, name, database_settings=None):
+    """A database whose source table names the instance"""
+    engine = database.make_engine(f"sqlite:///{os.path.join(directory, name + '.db')}", database_settings)
+    with engine.begin() as conn:
+        source.create(conn)
+        conn.execute(insert(source), {"name": name})
+    return engine
+
+
+def _read(Session):
+    with Session() as session:
+        return session.execute(text("SELECT name FROM source")).scalars().first()
+
+
+def test_reads_round_robin_and_writes_go_to_primary():
+    with tempfile.TemporaryDirectory() as directory:
+        primary, replica_a, replica_b = (_instance(directory, name) for name in ("primary", "a", "b"))
+        router = database.ReplicaRouter(primary, [replica_a, replica_b])
+        Session = sessionmaker(class_=database.RoutingSession, bind=primary, router=router)
+
+        assert [_read(Session) for _ in range(4)] == ["a", "b", "a", "b"]
+
+        with Session() as session:
+            # The session keeps the replica it started with
+            assert {session.execute(text("SELECT name FROM source")).scalar() for _ in range(3)} == {"a"}
+            session.execute(insert(source), {"name": "written"})
+            session.commit()
+        with primary.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM source WHERE name = 'written'")).scalar() == 1
+
+        with Session() as session:
+            database.use_primary(session)
+            assert session.execute(text("SELECT name FROM source")).scalars().first() == "primary"
+
+        exposition = metrics.render(primary, router=router)
+        assert 'db_replica_reads_total{replica="sqlite:///' in exposition
+        for engine in (primary, replica_a, replica_b):
+            engine.dispose()
+
+
+def test_failover_to_healthy_replica_then_primary():
+    with tempfile.TemporaryDirectory() as directory:
+        primary, replica_a = _instance(directory, "primary"), _instance(directory, "a")
+        # The directory does not exist yet, so connecting fails until it is created
+        missing_directory = os.path.join(directory, "later")
+        unreachable = database.make_engine(f"sqlite:///{os.path.join(missing_directory, 'b.db')}")
+
+        router = database.ReplicaRouter(primary, [unreachable, replica_a], retry_interval=0)
+        Session = sessionmaker(class_=database.RoutingSession, bind=primary, router=router)
+        assert [_read(Session) for _ in range(3)] == ["a", "a", "a"]
+        assert not router.replicas[0].healthy and router.replicas[0].failures >= 1
+
+        router = database.ReplicaRouter(primary, [unreachable], retry_interval=0)
+        Session = sessionmaker(class_=database.RoutingSession, bind=primary, router=router)
+        assert _read(Session) == "primary"
+        assert router.status()["primary_reads"] == 1
+
+        # Retried once retry_interval has passed, and used again when it answers
+        os.makedirs(missing_directory)
+        with unreachable.begin() as conn:
+            source.create(conn)
+            conn.execute(insert(source), {"name": "b"})
+        assert _read(Session) == "b"
+        assert router.replicas[0].healthy
+        for engine in (primary, replica_a, unreachable):
+            engine.dispose()
+
+
+def test_replica_pool_timeouts_are_counted_on_the_replica():
+    with tempfile.TemporaryDirectory() as directory:
+        small = DatabaseSettings(pool_size=1, max_overflow=0, pool_timeout=0.1)
+        primary, replica = _instance(directory, "primary"), _instance(directory, "a", small)
+        router = database.ReplicaRouter(primary, [replica], health_interval=60)
+        Session = sessionmaker(class_=database.RoutingSession, bind=primary, router=router)
+        # Pinged once while free, so the reads below go to the replica
+        assert _read(Session) == "a"
+
+        for _ in range(2):
+            with replica.connect():
+                try:
+                    _read(Session)
+                    assert False, "the replica's only connection is taken"
+                except exc.TimeoutError:
+                    pass
+            # Still counted after dispose() replaces the pool
+            replica.dispose()
+        assert replica.pool_monitor.status()["timeouts"] == 2
+        assert primary.pool_monitor.status()["timeouts"] == 0
+
+        exposition = metrics.render(primary, router=router)
+        assert f'db_pool_timeouts_total{{replica="{router.replicas[0].name}"}} 2' in exposition
+        assert "db_pool_timeouts_total 0" in exposition
+        for engine in (primary, replica):
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    test_reads_round_robin_and_writes_go_to_primary()
+    test_failover_to_healthy_replica_then_primary()
+    test_replica_pool_timeouts_are_counted_on_the_replica()
+    print("✅ Replica routing checks passed")
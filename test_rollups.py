@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Checks for the daily holdings rollups (app/rollups.py) on a small generated SQLite dataset:
+rollup reads agree with fact_holdings_all, refreshes only rebuild newly loaded days, and the
+services read the rollups only while they cover the request.
+"""
+
+import os
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app import benchmark_service, http_cache, queries, rollups, schemas, services, settings
+from conftest import ACCOUNTS, END, START, GoldData
+
+LEVELS = ["account.account_type", "security.security_currency_code", "security.asset_class_level_1_name"]
+
+
+def _query_names(engine):
+    names = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        names.append(context.execution_options.get("query_name"))
+
+    event.listen(engine, "before_cursor_execute", record)
+    return names
+
+
+def _sankey_rows(db, query, as_of_date):
+    rows = db.execute(query, {"as_of_date": as_of_date, "account_codes": ACCOUNTS}).fetchall()
+    return {tuple(row[:-1]): round(float(row[-1]), 2) for row in rows}
+
+
+def test_rollups_agree_with_fact_holdings(gold_data):
+    engine = gold_data(migrations=True).engine
+    with engine.connect() as conn:
+        assert not rollups.load_coverage(conn).refreshed
+    result = rollups.refresh(engine)
+    assert result["full"] and result["days"] > 0
+
+    with Session(engine) as db:
+        for day in (START, END):
+            rollup = _sankey_rows(db, queries.get_sankey_rollup_query(LEVELS), day)
+            fact = _sankey_rows(db, queries.get_sankey_holdings_query(LEVELS), day)
+            assert rollup and rollup.keys() == fact.keys()
+            assert all(abs(rollup[key] - fact[key]) < 0.01 for key in fact)
+
+        params = {"account_codes": ACCOUNTS}
+        assert (
+            db.execute(queries.get_rollup_available_dates_query(), params).scalars().all()
+            == db.execute(queries.get_available_dates_query(), params).scalars().all()
+        )
+
+        # Book value and G/L per account and currency match a direct sum
+        totals = db.execute(
+            text(
+                'SELECT SUM("BookValue"), SUM("TotalUnrealizedGL"), COUNT(*) FROM phw_dev_gold.fact_holdings_all '
+                "WHERE \"AccountCode\" = 'SYN000000' AND \"AsofDate\" = :day AND \"CurrencyCode\" = 'CAD'"
+            ),
+            {"day": END},
+        ).one()
+        rolled = db.execute(
+            text(
+                'SELECT "BookValue", "TotalUnrealizedGL", "Positions" FROM phw_dev_gold.fact_holdings_account_rollup '
+                "WHERE \"AccountCode\" = 'SYN000000' AND \"AsofDate\" = :day AND \"CurrencyCode\" = 'CAD'"
+            ),
+            {"day": END},
+        ).one()
+        assert abs(rolled[0] - totals[0]) < 0.01 and abs(rolled[1] - totals[1]) < 0.01 and rolled[2] == totals[2]
+
+
+def test_incremental_refresh(gold_data):
+    engine = gold_data(migrations=True).engine
+    rollups.refresh(engine)
+    assert rollups.refresh(engine)["days"] == 0
+
+    # Reload the last day with doubled values
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                'UPDATE phw_dev_gold.fact_holdings_all SET "MarketValueAccrued" = "MarketValueAccrued" * 2, '
+                "\"ProcessedTimestampEST\" = '2030-01-01 06:00:00' WHERE \"AsofDate\" = :day"
+            ),
+            {"day": END},
+        )
+    with engine.connect() as conn:
+        coverage = rollups.load_coverage(conn)
+    assert coverage.stale == {END}
+    assert coverage.covers(START, date(2024, 3, 28)) and not coverage.covers(START, END) and not coverage.complete
+
+    result = rollups.refresh(engine)
+    assert not result["full"] and result["days"] == 1
+    with Session(engine) as db:
+        rollup = _sankey_rows(db, queries.get_sankey_rollup_query(LEVELS), END)
+        fact = _sankey_rows(db, queries.get_sankey_holdings_query(LEVELS), END)
+        assert all(abs(rollup[key] - fact[key]) < 0.01 for key in fact)
+
+    # A security master reload regroups every day
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE phw_dev_gold.dim_securitymaster SET \"ProcessedTimestampEST\" = '2030-01-02 06:00:00'"))
+    with engine.connect() as conn:
+        coverage = rollups.load_coverage(conn)
+    assert coverage.covers(END) and not coverage.covers(END, asset_classes=True)
+    assert rollups.refresh(engine)["full"]
+
+
+def test_services_read_rollups_when_covered(gold_data):
+    engine = gold_data(migrations=True).engine
+    names = _query_names(engine)
+    request = schemas.SankeyRequest(as_of_date=END, account_codes=list(ACCOUNTS), sankey_levels=LEVELS)
+    dates_request = schemas.AvailableDatesRequest(account_codes=list(ACCOUNTS))
+
+    with Session(engine) as db:
+        # Not refreshed yet: fact_holdings_all
+        before = services.get_holdings_for_sankey(db, request=request)
+        assert "get_sankey_holdings_query" in names and "get_sankey_rollup_query" not in names
+
+    rollups.refresh(engine)
+    del names[:]
+    with Session(engine) as db:
+        after = services.get_holdings_for_sankey(db, request=request)
+        dates = services.get_available_dates_for_accounts(db, request=dates_request)
+        values = benchmark_service.BenchmarkService(db)._query_portfolio_daily_values(list(ACCOUNTS), START, END)
+    assert {"get_sankey_rollup_query", "get_rollup_available_dates_query", "GET_ROLLUP_PORTFOLIO_DAILY_VALUES"} <= set(names)
+    assert [node.label for node in after.nodes] == [node.label for node in before.nodes]
+    assert dates.earliest_date == START and dates.latest_date == END
+    assert len(values) == dates.date_count and min(values) == str(START)
+
+    # A level outside the asset class rollup reads fact_holdings_all
+    del names[:]
+    with Session(engine) as db:
+        other = request.model_copy(update={"sankey_levels": ["security.security_type_code"]})
+        services.get_holdings_for_sankey(db, request=other)
+    assert "get_sankey_holdings_query" in names
+
+    # A load after the refresh: the loaded day falls back until the next refresh
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE phw_dev_gold.fact_holdings_all SET \"ProcessedTimestampEST\" = '2030-01-01 06:00:00' WHERE \"AsofDate\" = :day"),
+            {"day": END},
+        )
+    http_cache.DATA_VERSIONS.clear()
+    del names[:]
+    with Session(engine) as db:
+        services.get_holdings_for_sankey(db, request=request)
+        services.get_available_dates_for_accounts(db, request=dates_request)
+        services.get_holdings_for_sankey(db, request=request.model_copy(update={"as_of_date": START}))
+    assert names.count("get_sankey_holdings_query") == 1 and "get_available_dates_query" in names
+    assert "get_sankey_rollup_query" in names
+
+    # Switched off
+    with Session(engine) as db:
+        assert not rollups.coverage(db, rollup_settings=settings.RollupSettings(enabled=False)).covers(START)
+
+
+if __name__ == "__main__":
+    for test in (test_rollups_agree_with_fact_holdings, test_incremental_refresh, test_services_read_rollups_when_covered):
+        with GoldData() as gold_data:
+            test(gold_data)
+    print("✅ Rollup checks passed")
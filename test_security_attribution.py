@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Checks for the security-level attribution drill-down.
+Rows are plain namespaces shaped like the attribution query results, no database needed.
+"""
+
+import os
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app import transaction_flows
+from app.services import PerformanceSankeyService
+
+START, END = date(2024, 1, 1), date(2024, 3, 31)
+
+
+def _holding(day, security, value, price=10.0):
+    return SimpleNamespace(
+        as_of_date=day, account_code="A1", security_code=security, market_value_accrued=value,
+        market_price=price, security_symbol=security, security_name=f"{security} Inc",
+    )
+
+
+def _txn(security, type_code, amount):
+    return SimpleNamespace(
+        account_code="A1", security_code=security, transaction_type_code=type_code, trade_date=date(2024, 2, 1),
+        settlement_amount=amount, settlement_currency="CAD", security_symbol=security, security_name=None,
+    )
+
+
+def test_top_k_with_other_bucket_and_unattributed_remainder():
+    holdings = [_holding(START, f"S{n}", 1000.0) for n in range(5)]
+    holdings += [_holding(END, f"S{n}", 1000.0 + 100.0 * n) for n in range(5)]
+    holdings += [_holding(START, "CASHCAD", 500.0, price=1), _holding(END, "CASHCAD", 700.0, price=1)]
+    transactions = [_txn("S4", "JBY", -250.0), _txn("S1", "DVI", 30.0), _txn("S2", "MFE", -5.0)]
+    results = {
+        "fx_gains_by_security": {("S3", "A1"): Decimal("40")},
+        "account_attributions": {"A1": {"total_gain_loss": Decimal("1200")}},
+    }
+
+    service = PerformanceSankeyService(db=None)
+    flows = transaction_flows.classify(transactions, service._fx_rate_lookup([]), service._convert_to_cad)
+    (account,) = service._calculate_security_attributions(holdings, flows, results, START, END, top_k=2)
+
+    by_code = {s.security_code: s for s in account.securities}
+    assert [s.security_code for s in account.securities] == ["S3", "S2", "OTHER"]
+    assert account.security_count == 6
+    # S4 grew 400 but 250 of that was a purchase
+    assert by_code["S3"].fx == 40.0 and by_code["S3"].appreciation == 260.0
+    assert by_code["S2"].fees == -5.0 and by_code["S2"].total == 195.0
+    # Other = S4 (150) + S1 (100 + 30 income) + S0 (0) + cash (no appreciation)
+    assert by_code["OTHER"].total == 280.0
+    assert abs(account.unattributed - (1200.0 - 300.0 - 195.0 - 280.0)) < 1e-9
+
+
+if __name__ == "__main__":
+    test_top_k_with_other_bucket_and_unattributed_remainder()
+    print("✅ Security attribution checks passed")
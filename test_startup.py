@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Checks for fast startup (app/main.py, app/warmup.py): importing the app does no DDL, opens no
+database connection and leaves yfinance/pandas/pyarrow/duckdb unloaded; the warm-up fills the pool instead.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app import database, settings, warmup
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_PROBE = """
+import json, sys
+import app.main
+print(json.dumps({name: name in sys.modules for name in ("yfinance", "pandas", "pyarrow", "duckdb")}))
+"""
+
+
+def test_import_does_no_io_and_no_heavy_imports():
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "untouched.db")
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", IMPORT_PROBE],
+            cwd=REPO_ROOT,
+            env={**os.environ, "DATABASE_URL": f"sqlite:///{database_path}"},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert json.loads(output.stdout.strip().splitlines()[-1]) == dict.fromkeys(("yfinance", "pandas", "pyarrow", "duckdb"), False)
+        # SQLite creates the file on first connect, so no file means no connection
+        assert not os.path.exists(database_path)
+
+
+def test_warm_up_opens_pool_connections():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = database.make_engine(
+            f"sqlite:///{os.path.join(directory, 'warm.db')}", settings.DatabaseSettings(pool_size=3)
+        )
+        report = warmup.warm_up(engine, warmup_settings=settings.WarmupSettings(connections=3))
+        assert set(report) == {"connections", "modules", "benchmark_prices", "total"}
+        assert engine.pool.checkedin() == 3 and engine.pool.checkedout() == 0
+        assert warmup.warm_up(engine, warmup_settings=settings.WarmupSettings(enabled=False)) == {}
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_import_does_no_io_and_no_heavy_imports()
+    test_warm_up_opens_pool_connections()
+    print("✅ Startup checks passed")
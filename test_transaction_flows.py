@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Checks for the single-pass transaction classification of the performance attribution
+(app/transaction_flows.py): totals match the category rules, peak memory does not grow with the
+number of transactions, and the service reads the period's transactions through a server-side
+cursor on a generated SQLite dataset grown to tens of thousands of transactions.
+"""
+
+import contextlib
+import io
+import os
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app import queries, settings, transaction_flows
+from app.services import PerformanceSankeyService
+from conftest import END, START, GoldData
+
+ACCOUNTS = ["SYN000000", "SYN000001", "SYN000002"]
+TYPES = ["DVI", "MFE", "CCR", "CWD", "JBY", "JSL", "XYZ"]
+
+
+def _txn(account, security, type_code, amount, currency="CAD", day=date(2024, 2, 1)):
+    return SimpleNamespace(
+        account_code=account, security_code=security, transaction_type_code=type_code, trade_date=day,
+        settlement_amount=amount, settlement_currency=currency, security_symbol=security, security_name=None,
+    )
+
+
+def _convert(amount, currency, day, fx_rates):
+    return PerformanceSankeyService(db=None)._convert_to_cad(amount, currency, day, fx_rates)
+
+
+def test_totals_follow_categories():
+    fx_rates = {("2024-02-01", "USD"): 1.5}
+    flows = transaction_flows.classify(
+        [
+            _txn("A1", "S1", "DVI", 30.0),
+            _txn("A1", "S1", "MFE", -5.0),
+            _txn("A1", "S1", "MFE", 2.0),  # Fee refund: in the security's fees only
+            _txn("A1", None, "CCR", 100.0, "USD"),
+            _txn("A2", "S2", "CWD", -40.0),
+            _txn("A2", "S2", "JBY", -250.0),
+            _txn("A2", "S2", "JSL", 100.0),
+            _txn("A2", "S3", "XYZ", 1.0),
+        ],
+        fx_rates,
+        _convert,
+    )
+    assert flows.rows == 8 and flows.unclassified == 1
+    assert flows.income_total == Decimal("30.0") and flows.fees_total == Decimal("5.0")
+    assert flows.net_contribution == Decimal("150.0") - Decimal("40.0")
+    assert flows.security_contributions == {None: Decimal("150.0"), "S2": Decimal("-40.0")}
+
+    a1, a2 = flows.accounts["A1"], flows.accounts["A2"]
+    assert (a1.income, a1.fees, a1.cash_in) == (Decimal("30.0"), Decimal("-5.0"), Decimal("150.0"))
+    assert a1.by_currency == {"USD": [1, Decimal("100.0"), Decimal("150.0")]}
+    assert a2.by_type == {"CWD": [1, Decimal("-40.0")]} and a2.cash_out == Decimal("40.0")
+
+    assert flows.securities[("A1", "S1")].fees == Decimal("-7.0")
+    assert flows.securities[("A1", "CASH")].invested == Decimal("150.0")
+    # Bought 250, sold 100, withdrew 40
+    assert flows.securities[("A2", "S2")].invested == Decimal("110.0")
+    assert list(flows.securities)[-1] == ("A2", "S3")
+
+
+def _synthetic(rows):
+    """rows transactions over 4 accounts x 40 securities, made one at a time"""
+    day = date(2020, 1, 1)
+    for n in range(rows):
+        yield _txn(f"A{n % 4}", f"S{n % 40}", TYPES[n % len(TYPES)], float(n % 997) - 400.0, day=day + timedelta(days=n % 1500))
+
+
+def _peak(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_peak_memory_does_not_follow_row_count():
+    small = _peak(lambda: transaction_flows.classify(_synthetic(5_000), {}, _convert))
+    large = _peak(lambda: transaction_flows.classify(_synthetic(100_000), {}, _convert))
+    # 20 times the rows, the same accounts and positions
+    assert large < small * 1.2 + 64 * 1024, (small, large)
+
+
+def _grow_transactions(engine, rows):
+    """Add rows synthetic transactions to the generated accounts and securities"""
+    with engine.begin() as conn:
+        securities = conn.execute(text("SELECT security_code FROM phw_dev_gold.dim_securitymaster ORDER BY 1")).scalars().all()
+        days = (END - START).days
+        conn.execute(
+            text(
+                'INSERT INTO phw_dev_gold.fact_transactions ("AccountCode", "SecurityCode", "ExternalTransactionCode", '
+                '"TransactionTypeCode", "TradeDate", "SettlementAmount", "SettlementCurrency") '
+                "VALUES (:account, :security, :code, :type, :day, :amount, 'CAD')"
+            ),
+            [
+                {
+                    "account": ACCOUNTS[n % len(ACCOUNTS)],
+                    "security": securities[n % len(securities)],
+                    "code": 10_000_000 + n,
+                    "type": TYPES[n % len(TYPES)],
+                    "day": START + timedelta(days=1 + n % days),
+                    "amount": float(n % 997) - 400.0,
+                }
+                for n in range(rows)
+            ],
+        )
+
+
+def test_service_streams_transactions(gold_data):
+    engine = gold_data().engine
+    _grow_transactions(engine, 30_000)
+    params = {"start_date": START, "end_date": END, "account_codes": ACCOUNTS}
+
+    with Session(engine) as db:
+        service = PerformanceSankeyService(db)
+        fx_rates = service._fx_rate_lookup(db.execute(queries.GET_FX_RATES_FOR_ATTRIBUTION, params).fetchall())
+        materialised = db.execute(queries.GET_TRANSACTIONS_FOR_ATTRIBUTION, params).fetchall()
+        expected = transaction_flows.classify(materialised, fx_rates, service._convert_to_cad)
+        del materialised
+
+        def fetch_all():
+            rows = db.execute(queries.GET_TRANSACTIONS_FOR_ATTRIBUTION, params).fetchall()
+            transaction_flows.classify(rows, fx_rates, service._convert_to_cad)
+
+        def stream():
+            result = db.execute(
+                queries.GET_TRANSACTIONS_FOR_ATTRIBUTION, params, execution_options=settings.database.stream_options()
+            )
+            transaction_flows.classify(result, fx_rates, service._convert_to_cad)
+
+        fetched_peak, streamed_peak = _peak(fetch_all), _peak(stream)
+    assert expected.rows > 30_000
+    assert streamed_peak * 4 < fetched_peak, (streamed_peak, fetched_peak)
+
+    streamed = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM phw_dev_gold.fact_transactions ft" in statement:
+            streamed.append(context.execution_options.get("stream_results"))
+
+    with Session(engine) as db, contextlib.redirect_stdout(io.StringIO()):
+        summary = PerformanceSankeyService(db).generate_sankey_data(START, END, ACCOUNTS).perf_summary
+    assert streamed == [True]
+    assert summary.net_contribution == float(expected.net_contribution)
+    assert summary.income_total == float(expected.income_total)
+    assert summary.fees_total == float(expected.fees_total)
+
+
+if __name__ == "__main__":
+    test_totals_follow_categories()
+    test_peak_memory_does_not_follow_row_count()
+    with GoldData() as gold_data:
+        test_service_streams_transactions(gold_data)
+    print("✅ Transaction flow checks passed")
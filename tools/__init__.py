@@ -0,0 +1 @@
+"""Developer tools for loading test data and measuring the API (run with `python -m tools.<name>`)."""
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark suite with regression thresholds.
+
+Runs the service function behind each heavy endpoint, and the endpoint itself through the
+FastAPI test client, against generated datasets of several sizes (see DATASET_SIZES in
+tools/generate_gold_data.py). For every case it records:
+
+- wall_ms: median wall time over --repeat runs
+- db_ms:   median time spent executing SQL (driver execute calls)
+- queries: statements executed in one run
+- rows:    rows fetched in one run
+- peak_kb: peak Python memory of one run (tracemalloc, measured in a separate run)
+
+Usage:
+    python -m tools.benchmark_endpoints --sizes small,medium --save benchmarks/baseline.json
+    python -m tools.benchmark_endpoints --sizes small,medium --compare benchmarks/baseline.json
+
+--compare exits with status 1 when a metric is worse than baseline × (1 + tolerance) plus a
+small absolute allowance (so sub-millisecond noise is not a regression). Tolerances are saved
+with the baseline and can be overridden with --tolerance metric=fraction.
+
+Benchmark prices come from tools/offline_app.py, and in-process caches are cleared before
+every run unless --warm is given, so each run measures the full request path.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(REPO_ROOT, ".benchmarks")
+
+METRICS = ("wall_ms", "db_ms", "queries", "rows", "peak_kb")
+DEFAULT_TOLERANCES = {"wall_ms": 0.25, "db_ms": 0.25, "queries": 0.0, "rows": 0.0, "peak_kb": 0.25}
+# Regressions smaller than this are noise, whatever the relative change
+MIN_DELTA = {"wall_ms": 5.0, "db_ms": 5.0, "queries": 0, "rows": 0, "peak_kb": 512.0}
+
+BENCHMARK_SYMBOLS = ["VFV.TO", "XEQT.TO"]
+
+
+class QueryRecorder:
+    """
+    Counts statements, SQL execution time and fetched rows for one engine. Rows are counted as
+    the result fetches them from the cursor, so streamed and yield_per results stay streamed.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.reset()
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def reset(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self._started = None
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        from app.instrumentation import count_rows
+
+        self.queries += 1
+        if self._started is not None:
+            self.db_seconds += time.perf_counter() - self._started
+            self._started = None
+        count_rows(context, self._fetched)
+
+    def _fetched(self, rows: int):
+        self.rows += rows
+
+
+class DatasetContext:
+    """Engine, sessions and request parameters for one generated dataset"""
+
+    def __init__(self, size: str, database_url: str, accounts_per_request: int):
+        from sqlalchemy.orm import sessionmaker
+
+        from app.database import make_engine
+        from tools.generate_gold_data import DATASET_END_DATE, DATASET_SIZES
+
+        preset = DATASET_SIZES[size]
+        self.size = size
+        self._stack = ExitStack()
+        self.engine = make_engine(database_url)
+        self._stack.callback(self.engine.dispose)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.recorder = QueryRecorder(self.engine)
+        self.account_codes = [f"SYN{i:06d}" for i in range(min(accounts_per_request, preset["accounts"]))]
+        self.end_date = DATASET_END_DATE
+        self.start_date = max(preset["start_date"], DATASET_END_DATE - timedelta(days=365))
+
+    def get_db(self):
+        db = self.Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def callback(self, function, *args):
+        """Call function(*args) on close()"""
+        self._stack.callback(function, *args)
+
+    def close(self):
+        self._stack.close()
+
+
+def service_cases(ctx: DatasetContext) -> Dict[str, Callable]:
+    from app import schemas, services
+    from app.benchmark_service import BenchmarkService
+
+    def holdings_agg_for_sankey(db):
+        request = schemas.SankeyRequest(as_of_date=ctx.end_date, account_codes=ctx.account_codes)
+        return services.get_holdings_for_sankey(db, request=request)
+
+    def performance_attribution_sankey(db):
+        return services.PerformanceSankeyService(db).generate_sankey_data(ctx.start_date, ctx.end_date, ctx.account_codes)
+
+    def performance_benchmark(db):
+        return BenchmarkService(db).get_benchmark_performance(
+            ctx.account_codes, BENCHMARK_SYMBOLS, ctx.start_date.isoformat(), ctx.end_date.isoformat(), include_metrics=True
+        )
+
+    return {
+        "service/holdings_agg_for_sankey": holdings_agg_for_sankey,
+        "service/performance_attribution_sankey": performance_attribution_sankey,
+        "service/performance_benchmark": performance_benchmark,
+    }
+
+
+def endpoint_payloads(ctx: DatasetContext) -> Dict[str, dict]:
+    return {
+        "/holdings_agg_for_sankey/": {"as_of_date": ctx.end_date.isoformat(), "account_codes": ctx.account_codes},
+        "/performance_attribution_sankey/": {
+            "start_date": ctx.start_date.isoformat(),
+            "end_date": ctx.end_date.isoformat(),
+            "account_codes": ctx.account_codes,
+        },
+        "/performance_benchmark/": {
+            "account_codes": ctx.account_codes,
+            "benchmark_list": BENCHMARK_SYMBOLS,
+            "start_date": ctx.start_date.isoformat(),
+            "end_date": ctx.end_date.isoformat(),
+            "include_metrics": True,
+        },
+    }
+
+
+def endpoint_cases(ctx: DatasetContext) -> Dict[str, Callable]:
+    from fastapi.testclient import TestClient
+
+    from app.main import get_db
+    from tools.offline_app import app
+
+    app.dependency_overrides[get_db] = ctx.get_db
+    ctx.callback(app.dependency_overrides.pop, get_db, None)
+    client = TestClient(app)
+
+    def call(path, payload):
+        def run(_db):
+            response = client.post(path, json=payload)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+            return response
+
+        return run
+
+    return {f"endpoint{path.rstrip('/')}": call(path, payload) for path, payload in endpoint_payloads(ctx).items()}
+
+
+def clear_caches():
+    from app.cache import all_caches
+
+    for cache in all_caches():
+        cache.clear()
+
+
+def measure(ctx: DatasetContext, case: Callable, repeat: int, warm: bool) -> dict:
+    """Run a case once as warm-up, `repeat` times for timings and once under tracemalloc"""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+
+        def run_once():
+            if not warm:
+                clear_caches()
+            ctx.recorder.reset()
+            db = ctx.Session()
+            try:
+                started = time.perf_counter()
+                case(db)
+                return time.perf_counter() - started
+            finally:
+                db.close()
+
+        run_once()
+        walls, db_times = [], []
+        for _ in range(repeat):
+            walls.append(run_once())
+            db_times.append(ctx.recorder.db_seconds)
+        queries, rows = ctx.recorder.queries, ctx.recorder.rows
+
+        tracemalloc.start()
+        try:
+            run_once()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "wall_ms": round(statistics.median(walls) * 1000, 3),
+        "db_ms": round(statistics.median(db_times) * 1000, 3),
+        "queries": queries,
+        "rows": rows,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_suite(sizes: List[str], data_dir: str, repeat: int, accounts_per_request: int, warm: bool, only=None) -> dict:
+    from tools.generate_gold_data import ensure_sqlite_dataset
+
+    results = {}
+    for size in sizes:
+        database_url = ensure_sqlite_dataset(size, data_dir)
+        ctx = DatasetContext(size, database_url, accounts_per_request)
+        try:
+            cases = {**service_cases(ctx), **endpoint_cases(ctx)}
+            for name, case in cases.items():
+                if only and not any(token in name for token in only):
+                    continue
+                key = f"{size}/{name}"
+                results[key] = measure(ctx, case, repeat, warm)
+                print(_format_row(key, results[key]))
+        finally:
+            ctx.close()
+    return results
+
+
+def compare(baseline: dict, current: dict, tolerances: dict) -> List[str]:
+    """Human-readable regressions of current against baseline"""
+    regressions = []
+    for key, metrics in current.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric in METRICS:
+            if metric not in reference:
+                continue
+            allowed = reference[metric] * (1 + tolerances.get(metric, 0.0)) + MIN_DELTA[metric]
+            if metrics[metric] > allowed:
+                change = (metrics[metric] / reference[metric] - 1) * 100 if reference[metric] else float("inf")
+                regressions.append(
+                    f"{key} {metric}: {reference[metric]} -> {metrics[metric]} (+{change:.0f}%, allowed {allowed:.1f})"
+                )
+    return regressions
+
+
+def _format_row(key: str, metrics: dict) -> str:
+    return (
+        f"   {key:<58} {metrics['wall_ms']:>10.1f} ms  db {metrics['db_ms']:>9.1f} ms  "
+        f"{metrics['queries']:>4} queries  {metrics['rows']:>9,} rows  {metrics['peak_kb']:>10,.0f} KiB"
+    )
+
+
+def _parse_tolerances(values: List[str]) -> dict:
+    tolerances = {}
+    for value in values or []:
+        metric, _, fraction = value.partition("=")
+        if metric not in METRICS:
+            raise SystemExit(f"Unknown metric '{metric}', expected one of {', '.join(METRICS)}")
+        tolerances[metric] = float(fraction)
+    return tolerances
+
+
+def main(argv=None):
+    from tools.generate_gold_data import DATASET_SIZES
+
+    parser = argparse.ArgumentParser(description="Benchmark the heavy endpoints on generated datasets")
+    parser.add_argument("--sizes", default="small", help=f"Comma-separated dataset sizes: {', '.join(DATASET_SIZES)}")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (median is reported)")
+    parser.add_argument("--accounts-per-request", type=int, default=10)
+    parser.add_argument("--only", help="Comma-separated substrings; run only matching cases")
+    parser.add_argument("--warm", action="store_true", help="Keep in-process caches between runs")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated SQLite datasets are kept")
+    parser.add_argument("--save", help="Write results as a baseline JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", action="append", help="Override a tolerance, e.g. wall_ms=0.5")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in DATASET_SIZES]
+    if unknown:
+        parser.error(f"Unknown sizes: {', '.join(unknown)}")
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    sys.path.insert(0, REPO_ROOT)
+
+    print(f"⏱️  Benchmarking sizes {', '.join(sizes)} ({args.repeat} runs per case, caches {'warm' if args.warm else 'cleared'})")
+    only = [token.strip() for token in args.only.split(",")] if args.only else None
+    results = run_suite(sizes, args.data_dir, args.repeat, args.accounts_per_request, args.warm, only)
+
+    baseline = None
+    tolerances = dict(DEFAULT_TOLERANCES)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        tolerances.update(baseline.get("tolerances", {}))
+    tolerances.update(_parse_tolerances(args.tolerance))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "repeat": args.repeat,
+                    "accounts_per_request": args.accounts_per_request,
+                    "tolerances": tolerances,
+                    "results": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"💾 Saved {len(results)} results to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(baseline.get("results", {}), results, tolerances)
+        missing = sorted(set(results) - set(baseline.get("results", {})))
+        if missing:
+            print(f"ℹ️  Not in baseline: {', '.join(missing)}")
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.compare}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print(f"\n✅ No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
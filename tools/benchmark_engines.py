@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Run the heavy report reads on the database and on the embedded DuckDB engine (app/analytics.py)
+side by side: every case runs on both, results must agree (floats to a small tolerance), and
+the median wall time of each is reported.
+
+Cases are the service calls behind /holdings_agg_for_sankey/, /performance_attribution_sankey/
+(endpoint and daily FX) and the database reads of /performance_benchmark/ (daily portfolio
+values and cash flows; benchmark prices come from yfinance and are left out). In-process caches
+are cleared before every run.
+
+Usage:
+    python -m tools.benchmark_engines --database-url postgresql://localhost/phw --snapshots snapshots
+    python -m tools.benchmark_engines --database-url sqlite:///perf.db --snapshots /tmp/snapshots --export
+
+--export writes a fresh snapshot of the database first (tools/export_parquet.py); otherwise the
+snapshot LATEST names is used, and should hold the same data for the results to agree.
+Exits with status 1 when a case disagrees.
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEVELS = ["account.account_type", "security.security_currency_code", "security.asset_class_level_1_name"]
+
+
+def report_cases(account_codes: List[str], start_date, end_date) -> Dict[str, Callable]:
+    """Case name -> function of a session returning plain, comparable data"""
+    from fastapi.encoders import jsonable_encoder
+
+    from app import schemas, services
+    from app.benchmark_service import BenchmarkService
+
+    def holdings_sankey(db):
+        request = schemas.SankeyRequest(as_of_date=end_date, account_codes=account_codes, sankey_levels=LEVELS)
+        return jsonable_encoder(services.get_holdings_for_sankey(db, request=request))
+
+    def attribution(fx_method):
+        def run(db):
+            return jsonable_encoder(
+                services.PerformanceSankeyService(db).generate_sankey_data(
+                    start_date, end_date, account_codes, fx_method=fx_method, include_securities=True
+                )
+            )
+
+        return run
+
+    def portfolio_values(db):
+        return BenchmarkService(db)._query_portfolio_daily_values(account_codes, start_date, end_date)
+
+    def cash_flows(db):
+        return BenchmarkService(db)._query_portfolio_cash_flows(account_codes, start_date, end_date)
+
+    return {
+        "holdings_agg_for_sankey": holdings_sankey,
+        "attribution/endpoint": attribution("endpoint"),
+        "attribution/daily": attribution("daily"),
+        "benchmark/portfolio_values": portfolio_values,
+        "benchmark/cash_flows": cash_flows,
+    }
+
+
+def differences(left, right, path: str = "", tolerance: float = 1e-6) -> List[str]:
+    """Where two results differ; numbers compare to a relative tolerance (and 0.01 absolute)"""
+    if isinstance(left, dict) and isinstance(right, dict):
+        found = [f"{path}/{key}: only on one side" for key in sorted(set(left) ^ set(right), key=str)]
+        for key in left.keys() & right.keys():
+            found += differences(left[key], right[key], f"{path}/{key}", tolerance)
+        return found
+    if isinstance(left, list) and isinstance(right, list):
+        if len(left) != len(right):
+            return [f"{path}: {len(left)} vs {len(right)} items"]
+        found = []
+        for index, (a, b) in enumerate(zip(left, right)):
+            found += differences(a, b, f"{path}[{index}]", tolerance)
+        return found
+    numbers = (int, float)
+    if isinstance(left, numbers) and isinstance(right, numbers) and not isinstance(left, bool):
+        if math.isclose(left, right, rel_tol=tolerance, abs_tol=0.01):
+            return []
+    elif left == right:
+        return []
+    return [f"{path}: {left!r} vs {right!r}"]
+
+
+def clear_caches():
+    from app.cache import all_caches
+
+    for cache in all_caches():
+        cache.clear()
+
+
+def timed(session_factory, case: Callable, repeat: int):
+    """(last result, median seconds) over repeat runs after a warm-up run"""
+    seconds = []
+    result = None
+    for run in range(repeat + 1):
+        clear_caches()
+        with session_factory() as db:
+            started = time.perf_counter()
+            result = case(db)
+            if run:
+                seconds.append(time.perf_counter() - started)
+    return result, statistics.median(seconds)
+
+
+def default_window(engine, accounts: int):
+    """First accounts account codes and the last year of holdings"""
+    from sqlalchemy import text
+
+    from app.cache import to_date
+
+    with engine.connect() as conn:
+        codes = conn.execute(
+            text('SELECT "AccountCode" FROM phw_dev_gold.dim_accounts ORDER BY "AccountCode" LIMIT :limit'), {"limit": accounts}
+        ).scalars().all()
+        first, last = conn.execute(text('SELECT MIN("AsofDate"), MAX("AsofDate") FROM phw_dev_gold.fact_holdings_all')).one()
+    first, last = to_date(first), to_date(last)
+    return list(codes), max(first, last - timedelta(days=365)), last
+
+
+def compare_engines(database_engine, snapshot: str, repeat: int, accounts: int, only: Optional[List[str]] = None) -> int:
+    from sqlalchemy.orm import Session
+
+    from app import analytics, settings
+
+    duckdb_engine = analytics.make_engine(snapshot, settings.analytics.duckdb_threads)
+    try:
+        account_codes, start_date, end_date = default_window(database_engine, accounts)
+        print(f"📅 {len(account_codes)} account(s), {start_date} .. {end_date}")
+        print(f"   {'case':<30} {database_engine.dialect.name:>12} {'duckdb':>12} {'speed-up':>9}")
+        failed = 0
+        for name, case in report_cases(account_codes, start_date, end_date).items():
+            if only and not any(token in name for token in only):
+                continue
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                expected, database_seconds = timed(lambda: Session(database_engine), case, repeat)
+                actual, duckdb_seconds = timed(lambda: Session(duckdb_engine), case, repeat)
+            found = differences(expected, actual)
+            status = "✅" if not found else "❌"
+            print(
+                f"{status} {name:<30} {database_seconds * 1000:>10.1f}ms {duckdb_seconds * 1000:>10.1f}ms "
+                f"{database_seconds / max(duckdb_seconds, 1e-9):>8.1f}x"
+            )
+            for difference in found[:5]:
+                print(f"      {difference}")
+            failed += bool(found)
+        return failed
+    finally:
+        duckdb_engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Database to compare with (default: $DATABASE_URL)")
+    parser.add_argument("--snapshots", default=os.getenv("PARQUET_SNAPSHOT_DIR", "snapshots"), help="Snapshot root (default: $PARQUET_SNAPSHOT_DIR or snapshots)")
+    parser.add_argument("--export", action="store_true", help="Export a fresh snapshot of the database first")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case and engine (median is reported)")
+    parser.add_argument("--accounts", type=int, default=10, help="Accounts per request")
+    parser.add_argument("--only", help="Comma-separated substrings; run only matching cases")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    sys.path.insert(0, REPO_ROOT)
+    from app.analytics import latest_snapshot
+    from app.database import make_engine
+
+    engine = make_engine(args.database_url)
+    try:
+        if args.export:
+            from tools.export_parquet import export
+
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                export(engine, args.snapshots)
+        snapshot = latest_snapshot(args.snapshots)
+        if snapshot is None:
+            print(f"❌ No snapshot in {args.snapshots}; run python -m tools.export_parquet or pass --export")
+            return 1
+        print(f"⏱️  {engine.dialect.name} vs duckdb over {snapshot} ({args.repeat} runs per case)")
+        only = [token.strip() for token in args.only.split(",")] if args.only else None
+        failed = compare_engines(engine, snapshot, args.repeat, args.accounts, only)
+    finally:
+        engine.dispose()
+    if failed:
+        print(f"\n❌ {failed} case(s) disagree")
+        return 1
+    print("\n✅ Both engines agree")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Cold-start measurement for the API: how long a fresh worker takes to import, to accept its
+first request, and to answer the first request of each endpoint.
+
+For each scenario (warm-up on and off by default) this measures:
+
+- import_ms: `import app.main` in a fresh interpreter (median of --runs), plus whether it
+  pulled in yfinance/pandas or opened a database connection, which it should not
+- ready_ms: spawning uvicorn (tools/offline_app.py) until the first response
+- first_ms / second_ms: the first and second request to every endpoint of the load-test mix
+
+Results are appended to a JSON-lines history so cold start can be tracked across changes, and
+--max-import-ms / --max-ready-ms turn it into a check that fails with exit code 1.
+
+Usage:
+    python -m tools.cold_start --size small
+    python -m tools.cold_start --size small --history .benchmarks/cold_start.jsonl --max-ready-ms 5000
+    python -m tools.cold_start --env WARMUP_CONNECTIONS=20 --scenarios warm
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from tools.load_test import (
+    DEFAULT_DATA_DIR,
+    ENDPOINT_MIX,
+    REPO_ROOT,
+    HttpConnection,
+    RequestMix,
+    _free_port,
+    start_server,
+    stop_server,
+)
+
+SCENARIOS = {"warm": {"APP_WARMUP": "1"}, "cold": {"APP_WARMUP": "0"}}
+
+READY_PATH = "/available_performance_sankey_levels/"
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+pool = app.main.engine.pool
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    "yfinance": "yfinance" in sys.modules,
+    "pandas": "pandas" in sys.modules,
+    "connections": pool.checkedin() + pool.checkedout() if hasattr(pool, "checkedin") else None,
+}))
+"""
+
+
+def measure_import(database_url: str, env: Dict[str, str], runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", IMPORT_PROBE],
+            cwd=REPO_ROOT,
+            env={**os.environ, "DATABASE_URL": database_url, **env},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    result = dict(samples[-1])
+    result["import_ms"] = round(statistics.median(sample["import_ms"] for sample in samples), 1)
+    return result
+
+
+async def _first_response(host: str, port: int, started: float, timeout: float) -> float:
+    """Seconds from started until READY_PATH first answers 200"""
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        connection = HttpConnection(host, port)
+        try:
+            status, _ = await connection.post(READY_PATH, {})
+            if status == 200:
+                return time.perf_counter() - started
+        except OSError:
+            pass
+        finally:
+            await connection.close()
+        await asyncio.sleep(0.01)
+    raise SystemExit(f"Server on {host}:{port} did not answer within {timeout:.0f}s")
+
+
+async def _first_requests(host: str, port: int, payloads: Dict[str, dict]) -> Dict[str, dict]:
+    connection = HttpConnection(host, port)
+    results = {}
+    try:
+        for path, payload in payloads.items():
+            timings = []
+            for _ in range(2):
+                sent = time.perf_counter()
+                status, _ = await connection.post(path, payload)
+                timings.append((time.perf_counter() - sent) * 1000)
+            results[path] = {"status": status, "first_ms": round(timings[0], 1), "second_ms": round(timings[1], 1)}
+    finally:
+        await connection.close()
+    return results
+
+
+def measure_server(database_url: str, env: Dict[str, str], payloads: Dict[str, dict], data_dir: str) -> dict:
+    port = _free_port()
+    log_path = os.path.join(data_dir, "cold_start_server.log")
+    started = time.perf_counter()
+    process = start_server(database_url, port, 1, env, log_path)
+    try:
+        ready = asyncio.run(_first_response("127.0.0.1", port, started, timeout=120))
+        endpoints = asyncio.run(_first_requests("127.0.0.1", port, payloads))
+    finally:
+        stop_server(process)
+    return {"ready_ms": round(ready * 1000, 1), "endpoints": endpoints}
+
+
+def endpoint_payloads(account_codes: List[str], start_date, end_date, seed: int = 7) -> Dict[str, dict]:
+    """One fixed request per endpoint, drawn like the load test draws them"""
+    payloads = {}
+    for path in ENDPOINT_MIX:
+        _, payloads[path] = RequestMix(account_codes, start_date, end_date, seed=seed, mix={path: 1}).next()
+    return payloads
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+        return output.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _previous(history_path: str, scenario: str) -> Optional[dict]:
+    if not history_path or not os.path.exists(history_path):
+        return None
+    previous = None
+    with open(history_path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("scenario") == scenario:
+                previous = record
+    return previous
+
+
+def _delta(current: float, previous: Optional[float]) -> str:
+    if previous is None:
+        return ""
+    return f" ({current - previous:+.0f} ms vs previous)"
+
+
+def print_report(record: dict, previous: Optional[dict]):
+    imported = record["import"]
+    print(f"\n🧊 {record['scenario']} ({record['env']})")
+    print(
+        f"   import app.main  {imported['import_ms']:>8.1f} ms{_delta(imported['import_ms'], previous and previous['import']['import_ms'])}"
+        f"   yfinance={imported['yfinance']} pandas={imported['pandas']} connections={imported['connections']}"
+    )
+    print(f"   first response   {record['ready_ms']:>8.1f} ms{_delta(record['ready_ms'], previous and previous['ready_ms'])}")
+    print(f"   {'endpoint':<40} {'first':>9} {'second':>9}")
+    for path, timing in record["endpoints"].items():
+        print(f"   {path:<40} {timing['first_ms']:>9.1f} {timing['second_ms']:>9.1f}")
+
+
+def main(argv=None):
+    from tools.generate_gold_data import DATASET_END_DATE, DATASET_SIZES, ensure_sqlite_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="small", choices=list(DATASET_SIZES), help="Generated dataset to serve")
+    parser.add_argument("--database-url", help="Serve this database instead of a generated dataset")
+    parser.add_argument("--scenarios", default="warm,cold", help=f"Comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters for the import timing")
+    parser.add_argument("--env", action="append", default=[], help="NAME=VALUE passed to every scenario")
+    parser.add_argument("--history", help="Append results to this JSON-lines file and compare with its last entry")
+    parser.add_argument("--max-import-ms", type=float, help="Fail when importing app.main takes longer")
+    parser.add_argument("--max-ready-ms", type=float, help="Fail when the first response takes longer")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, REPO_ROOT)
+    os.makedirs(args.data_dir, exist_ok=True)
+    database_url = args.database_url or ensure_sqlite_dataset(args.size, args.data_dir)
+    preset = DATASET_SIZES[args.size]
+    accounts = [f"SYN{i:06d}" for i in range(preset["accounts"])]
+    payloads = endpoint_payloads(accounts, preset["start_date"], DATASET_END_DATE)
+    extra_env = dict(value.split("=", 1) for value in args.env)
+
+    failures = []
+    for scenario in args.scenarios.split(","):
+        env = {**SCENARIOS[scenario], **extra_env}
+        record = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "scenario": scenario,
+            "size": None if args.database_url else args.size,
+            "env": env,
+            "import": measure_import(database_url, env, args.runs),
+            **measure_server(database_url, env, payloads, args.data_dir),
+        }
+        print_report(record, _previous(args.history, scenario))
+        if args.history:
+            with open(args.history, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+        if args.max_import_ms is not None and record["import"]["import_ms"] > args.max_import_ms:
+            failures.append(f"{scenario}: import took {record['import']['import_ms']:.0f} ms > {args.max_import_ms:.0f} ms")
+        if args.max_ready_ms is not None and record["ready_ms"] > args.max_ready_ms:
+            failures.append(f"{scenario}: first response took {record['ready_ms']:.0f} ms > {args.max_ready_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Export the phw_dev_gold tables to a Parquet snapshot for the embedded analytic engine
+(app/analytics.py, ANALYTICS_ENGINE=duckdb).
+
+Each run writes one snapshot directory under --output and then points LATEST at it:
+
+    snapshots/
+        LATEST                                  name of the current snapshot
+        20250102T063000/
+            manifest.json                       tables, row counts, partition columns, source load times
+            dim_accounts/data.parquet
+            fact_holdings_all/AsofDate=2024-01-02/part-0.parquet
+            fact_transactions/TradeDate=2024-01-02/part-0.parquet
+            ...
+
+Fact tables are partitioned hive-style by their date column, so a query for a day or a period
+only opens the files of those days. Tables are read through a streaming cursor in record
+batches, ordered by the partition column so each partition is written once, and the snapshot
+only appears under its name (and in LATEST) once complete: a reader never sees half of one.
+
+Usage:
+    python -m tools.export_parquet --database-url postgresql://localhost/phw --output snapshots
+    python -m tools.export_parquet --database-url sqlite:///perf.db --output snapshots --keep 2
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import select
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Date column each fact table is partitioned by; the others are written as one file
+PARTITION_COLUMNS = {
+    "fact_holdings_all": "AsofDate",
+    "fact_transactions": "TradeDate",
+    "fact_daily_aggregate_values": "as_of_date",
+    "fact_daily_aggregate_values_slp": "as_of_date",
+}
+
+
+def export_tables() -> List:
+    """The gold tables mapped in app/models.py; the API's own tables (rollups) are left out"""
+    from app import models
+
+    return [
+        table
+        for table in models.Base.metadata.sorted_tables
+        if table.info.get("managed_by") != "migrations"
+    ]
+
+
+def export_table(conn, table, directory: str, batch_size: int) -> int:
+    """Write one table under directory; returns its row count"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    from app.columnar import record_batches, table_schema
+
+    schema = table_schema(table)
+    partition = PARTITION_COLUMNS.get(table.name)
+    statement = select(table)
+    if partition:
+        statement = statement.order_by(table.c[partition])
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+    batches = record_batches(result, schema, batch_size)
+    target = os.path.join(directory, table.name)
+    os.makedirs(target)
+
+    first = next(batches, None)
+    if first is None:
+        # Empty tables get a file too, so their view has columns to read
+        pq.write_table(schema.empty_table(), os.path.join(target, "data.parquet"))
+        return 0
+
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for batch in itertools.chain([first], batches):
+            rows += batch.num_rows
+            yield batch
+
+    if partition is None:
+        with pq.ParquetWriter(os.path.join(target, "data.parquet"), schema) as writer:
+            for batch in counted():
+                writer.write_batch(batch)
+    else:
+        ds.write_dataset(
+            pa.RecordBatchReader.from_batches(schema, counted()),
+            target,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([schema.field(partition)]), flavor="hive"),
+            basename_template="part-{i}.parquet",
+            max_rows_per_group=batch_size,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+    return rows
+
+
+def export(engine, root: str, batch_size: int = 50_000, keep: int = 3) -> Dict:
+    """Write a new snapshot of every table under root, make it LATEST; returns its manifest"""
+    from app import queries
+    from app.analytics import LATEST, MANIFEST
+
+    os.makedirs(root, exist_ok=True)
+    name = stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    for suffix in itertools.count(1):
+        if not os.path.exists(os.path.join(root, name)):
+            break
+        name = f"{stamp}-{suffix}"
+    staging = os.path.join(root, f".{name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    started = time.perf_counter()
+    manifest = {"snapshot": name, "exported_at": datetime.now().isoformat(timespec="seconds"), "dialect": engine.dialect.name, "tables": {}}
+    try:
+        with engine.connect() as conn:
+            for table in export_tables():
+                table_started = time.perf_counter()
+                rows = export_table(conn, table, staging, batch_size)
+                version = None
+                if "ProcessedTimestampEST" in table.c:
+                    version = conn.execute(queries.get_data_version_query(table.name)).scalar()
+                manifest["tables"][table.name] = {
+                    "rows": rows,
+                    "partition": PARTITION_COLUMNS.get(table.name) if rows else None,
+                    "version": None if version is None else str(version),
+                }
+                print(f"   ✅ {table.name:<35} {rows:>12,} rows in {time.perf_counter() - table_started:.1f}s")
+        manifest["seconds"] = round(time.perf_counter() - started, 3)
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, os.path.join(root, name))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(root, f".{LATEST}.tmp")
+    with open(pointer, "w") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(root, LATEST))
+
+    snapshots = sorted(entry for entry in os.listdir(root) if os.path.isfile(os.path.join(root, entry, MANIFEST)))
+    for old in snapshots[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Source database (default: $DATABASE_URL)")
+    parser.add_argument("--output", default=os.getenv("PARQUET_SNAPSHOT_DIR", "snapshots"), help="Snapshot root (default: $PARQUET_SNAPSHOT_DIR or snapshots)")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Rows per record batch and row group")
+    parser.add_argument("--keep", type=int, default=3, help="Snapshots kept, the new one included")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    sys.path.insert(0, REPO_ROOT)
+    from app.database import make_engine
+
+    engine = make_engine(args.database_url)
+    try:
+        print(f"📦 Exporting {engine.dialect.name} phw_dev_gold to {args.output}")
+        manifest = export(engine, args.output, args.batch_size, args.keep)
+    finally:
+        engine.dispose()
+    total = sum(table["rows"] for table in manifest["tables"].values())
+    print(f"✅ Snapshot {manifest['snapshot']}: {total:,} rows in {manifest['seconds']:.1f}s ({total / max(manifest['seconds'], 1e-9):,.0f} rows/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1035 @@
+#!/usr/bin/env python3
+"""
+Synthetic phw_dev_gold data generator.
+
+Creates the tables described in phw_dev_gold_schema.csv and fills the ones the API reads with
+seeded, internally consistent data, so every endpoint can be exercised locally at 10×–100×
+production volume:
+
+- dim_accounts, dim_securitymaster (multi-currency equities, ETFs, funds, bonds and cash),
+  dim_transaction_types
+- fx_rate: one random-walk rate per foreign currency and business day
+- fact_holdings_all: one CAD-reporting row per account, security and business day
+- fact_transactions: deposits, withdrawals, buys, sells, income and fees
+- fact_daily_aggregate_values / fact_daily_aggregate_values_slp: daily values and flows per
+  account and per account × security
+- fact_holdings_all_rollup, fact_account_ror
+
+Market values, cash balances, transactions and daily aggregates agree with each other, so the
+attribution identity (end - start - contributions = appreciation + income + fees + fx) holds.
+
+Usage:
+    python -m tools.generate_gold_data --database-url sqlite:///perf.db --replace
+    python -m tools.generate_gold_data --database-url postgresql://localhost/phw --scale 10 --replace
+    python -m tools.generate_gold_data --accounts 2000 --securities 5000 --years 5 --replace
+    python -m tools.generate_gold_data --database-url postgresql://localhost/phw --replace --partition-holdings
+
+SQLite keeps the phw_dev_gold schema in an attached file next to the database
+(perf.db -> perf.phw_dev_gold.db, see app/database.py). Postgres is loaded with COPY, SQLite
+with executemany. Data is generated and loaded one batch of accounts at a time so memory stays
+flat as volume grows, and every account is seeded on its own so the data does not depend on
+the batch size.
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from datetime import date, timedelta
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_CSV = os.path.join(REPO_ROOT, "phw_dev_gold_schema.csv")
+GOLD_SCHEMA = "phw_dev_gold"
+RAW_FILE = "synthetic"
+
+# Scale 1 volume; --scale multiplies accounts and securities
+BASE_ACCOUNTS = 50
+BASE_SECURITIES = 500
+POSITIONS_PER_ACCOUNT = (10, 30)
+TRADES_PER_POSITION_PER_YEAR = 3.0
+EXTERNAL_FLOWS_PER_YEAR = 4.0
+MANAGEMENT_FEE_RATE = 0.01
+BUSINESS_DAYS_PER_YEAR = 252.0
+
+# Tables that exist in the schema file but are not part of the gold data model
+SKIPPED_TABLES = {"test"}
+
+# Currency -> (CAD per unit on day one, share of securities)
+CURRENCIES = {
+    "CAD": (1.0, 0.55),
+    "USD": (1.35, 0.30),
+    "EUR": (1.47, 0.06),
+    "GBP": (1.72, 0.05),
+    "JPY": (0.0092, 0.02),
+    "CHF": (1.52, 0.02),
+}
+COUNTRIES = {"CAD": "CA", "USD": "US", "EUR": "DE", "GBP": "GB", "JPY": "JP", "CHF": "CH"}
+FX_DAILY_VOLATILITY = 0.005
+
+# type code -> (description, share, price range, daily vol, annual yield range, payments/year, income type)
+SECURITY_TYPES = {
+    "EQ": ("Common Stock", 0.55, (10.0, 300.0), 0.018, (0.0, 0.05), 4, "DVI"),
+    "ETF": ("Exchange Traded Fund", 0.20, (15.0, 120.0), 0.010, (0.01, 0.04), 4, "DVI"),
+    "MF": ("Mutual Fund", 0.10, (8.0, 40.0), 0.008, (0.01, 0.05), 4, "FNI"),
+    "BOND": ("Fixed Income", 0.15, (90.0, 110.0), 0.002, (0.02, 0.06), 2, "INT"),
+}
+ASSET_CLASSES = {
+    "EQ": ("Equity", "EQ", {"CAD": "Canadian Equity", "USD": "US Equity"}, "International Equity"),
+    "ETF": ("Equity", "EQ", {"CAD": "Canadian Equity", "USD": "US Equity"}, "International Equity"),
+    "MF": ("Balanced", "BAL", {}, "Balanced Funds"),
+    "BOND": ("Fixed Income", "FI", {"CAD": "Canadian Fixed Income"}, "Global Fixed Income"),
+}
+INDUSTRIES = ["Financials", "Energy", "Materials", "Industrials", "Technology", "Health Care", "Utilities", "Real Estate"]
+ISSUER_WORDS = ["North", "Maple", "Summit", "Harbour", "Pioneer", "Granite", "Atlas", "Boreal", "Cedar", "Aurora", "Pacific", "Prairie"]
+ISSUER_SUFFIXES = ["Holdings", "Capital", "Resources", "Group", "Industries", "Partners", "Energy", "Systems"]
+
+ACCOUNT_TYPES = [("RRSP", "Y"), ("TFSA", "Y"), ("RRIF", "Y"), ("RESP", "Y"), ("Non-Registered", "N"), ("Corporate", "N")]
+CUSTODIANS = [("CIBC", "CIBC Mellon"), ("RBC", "RBC Investor Services"), ("NBIN", "National Bank Independent Network")]
+
+TRANSACTION_TYPES = [
+    ("CDV", "Cash Dividend", True),
+    ("DVI", "Dividend Income", True),
+    ("INT", "Interest", True),
+    ("FNI", "Fund Income", True),
+    ("MFE", "Management Fee", False),
+    ("CRD", "Cash Receipt / Deposit", False),
+    ("TCI", "Transfer Cash In", False),
+    ("CWD", "Cash Withdrawal", False),
+    ("TCO", "Transfer Cash Out", False),
+    ("JBY", "Buy", False),
+    ("JSL", "Sell", True),
+]
+DEPOSIT_TYPES = ["CRD", "TCI"]
+WITHDRAWAL_TYPES = ["CWD", "TCO"]
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+SQLITE_TYPES = {
+    "text": "TEXT",
+    "character varying": "VARCHAR",
+    "integer": "INTEGER",
+    "real": "REAL",
+    "double precision": "REAL",
+    "numeric": "NUMERIC",
+    "boolean": "BOOLEAN",
+    "date": "DATE",
+    # Left to SQLAlchemy's DateTime processing (sqlite3 only converts DATE, see app/database.py)
+    "timestamp without time zone": "DATETIME",
+}
+
+
+def read_schema(path: str = SCHEMA_CSV) -> Dict[str, List[Tuple[str, str, Optional[str]]]]:
+    """{table: [(column, data_type, max_length or None), ...]} in schema order"""
+    tables: Dict[str, List[Tuple[str, str, Optional[str]]]] = {}
+    with open(path, newline="") as f:
+        for table, column, data_type, length, _default, _nullable in csv.reader(f):
+            if table in SKIPPED_TABLES:
+                continue
+            tables.setdefault(table, []).append((column, data_type, None if length == "null" else length))
+    return tables
+
+
+def create_table_sql(table: str, columns, dialect: str) -> str:
+    definitions = []
+    for name, data_type, length in columns:
+        if dialect == "sqlite":
+            column_type = SQLITE_TYPES.get(data_type, "TEXT")
+        elif data_type == "character varying" and length:
+            column_type = f"varchar({length})"
+        else:
+            column_type = data_type
+        definitions.append(f'"{name}" {column_type}')
+    return f"CREATE TABLE {GOLD_SCHEMA}.{table} ({', '.join(definitions)})"
+
+
+def model_drift(schema) -> List[str]:
+    """Differences between the schema file and the ORM models in app/models.py"""
+    from app import models
+
+    problems = []
+    for mapper in models.Base.registry.mappers:
+        table = mapper.local_table
+        if table.info.get("managed_by") == "migrations":
+            continue
+        if table.name not in schema:
+            problems.append(f"{table.name}: mapped in app/models.py but missing from the schema file")
+            continue
+        schema_columns = {column for column, _, _ in schema[table.name]}
+        model_columns = set(table.columns.keys())
+        for column in sorted(model_columns - schema_columns):
+            problems.append(f"{table.name}.{column}: in app/models.py but not in the schema file")
+        for column in sorted(schema_columns - model_columns):
+            problems.append(f"{table.name}.{column}: in the schema file but not mapped in app/models.py")
+    return problems
+
+
+def model_index_sql(dialect: str) -> List[str]:
+    """CREATE INDEX statements for the columns declared with index=True in app/models.py"""
+    from app import models
+
+    statements = []
+    for mapper in models.Base.registry.mappers:
+        table = mapper.local_table
+        for column in table.columns:
+            if not column.index:
+                continue
+            name = f"ix_{table.name}_{column.name}".lower()
+            if dialect == "sqlite":
+                statements.append(f'CREATE INDEX IF NOT EXISTS {GOLD_SCHEMA}.{name} ON {table.name} ("{column.name}")')
+            else:
+                statements.append(f'CREATE INDEX IF NOT EXISTS {name} ON {GOLD_SCHEMA}.{table.name} ("{column.name}")')
+    return statements
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+
+class GoldLoader:
+    """Bulk loader over a raw DBAPI connection: COPY on Postgres, executemany on SQLite"""
+
+    def __init__(self, engine, schema, partition_holdings: bool = False):
+        self.engine = engine
+        self.schema = schema
+        self.dialect = engine.dialect.name
+        if self.dialect not in ("postgresql", "sqlite"):
+            raise SystemExit(f"Unsupported database '{self.dialect}', expected postgresql or sqlite")
+        if partition_holdings and self.dialect != "postgresql":
+            raise SystemExit("--partition-holdings needs Postgres")
+        self.partition_holdings = partition_holdings
+        self.connection = engine.raw_connection()
+        self.row_counts: Dict[str, int] = {}
+        self._partition_months = set()
+
+    def create_tables(self, replace: bool):
+        cursor = self.connection.cursor()
+        if self.dialect == "sqlite":
+            cursor.execute(f"PRAGMA {GOLD_SCHEMA}.journal_mode=OFF")
+            cursor.execute(f"PRAGMA {GOLD_SCHEMA}.synchronous=OFF")
+        else:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {GOLD_SCHEMA}")
+
+        existing = [table for table in self.schema if self._table_exists(cursor, table)]
+        if existing and not replace:
+            raise SystemExit(f"Tables already exist in {GOLD_SCHEMA}: {', '.join(existing)} (use --replace)")
+        for table in existing:
+            cursor.execute(f"DROP TABLE {GOLD_SCHEMA}.{table}")
+        for table, columns in self.schema.items():
+            sql = create_table_sql(table, columns, self.dialect)
+            if self.partition_holdings and table == "fact_holdings_all":
+                sql += ' PARTITION BY RANGE ("AsofDate")'
+            cursor.execute(sql)
+        self.connection.commit()
+
+    def _table_exists(self, cursor, table: str) -> bool:
+        if self.dialect == "sqlite":
+            cursor.execute(f"SELECT 1 FROM {GOLD_SCHEMA}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        else:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.tables WHERE table_schema = %s AND table_name = %s", (GOLD_SCHEMA, table)
+            )
+        return cursor.fetchone() is not None
+
+    def load(self, table: str, rows: List[tuple]):
+        if not rows:
+            return
+        columns = ", ".join(f'"{column}"' for column, _, _ in self.schema[table])
+        cursor = self.connection.cursor()
+        if self.partition_holdings and table == "fact_holdings_all":
+            self._ensure_partitions(cursor, table, rows)
+        if self.dialect == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {GOLD_SCHEMA}.{table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            placeholders = ", ".join("?" for _ in self.schema[table])
+            cursor.executemany(f"INSERT INTO {GOLD_SCHEMA}.{table} ({columns}) VALUES ({placeholders})", rows)
+        self.row_counts[table] = self.row_counts.get(table, 0) + len(rows)
+
+    def _ensure_partitions(self, cursor, table: str, rows: List[tuple]):
+        """Create the monthly partitions (tools/partition_holdings.py) the rows need before loading them"""
+        from tools.partition_holdings import month_start, partition_ddl
+
+        position = [column for column, _, _ in self.schema[table]].index("AsofDate")
+        months = {month_start(row[position]) for row in rows} - self._partition_months
+        for statement in partition_ddl(months):
+            cursor.execute(statement)
+        self._partition_months |= months
+
+    def commit(self):
+        self.connection.commit()
+
+    def execute(self, statements: List[str]):
+        cursor = self.connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def build_rows(schema_columns, n_rows: int, values: dict) -> List[tuple]:
+    """
+    Zip column values into row tuples in schema order. A value is either a list of n_rows
+    items or a scalar repeated on every row; columns without a value are NULL.
+    """
+    columns = []
+    for column, _, _ in schema_columns:
+        value = values.get(column)
+        columns.append(value if isinstance(value, list) else repeat(value, n_rows))
+    return list(zip(*columns)) if n_rows else []
+
+
+def _money(values: np.ndarray) -> list:
+    return np.round(values, 2).tolist()
+
+
+def _amount(values: np.ndarray) -> list:
+    return np.round(values, 6).tolist()
+
+
+# ---------------------------------------------------------------------------
+# Generation
+# ---------------------------------------------------------------------------
+
+
+class GoldDataGenerator:
+    """
+    Generates the gold tables. Market-wide data (securities, prices, FX) is built once from the
+    seed; each account is generated from its own seed so results do not depend on batching.
+    """
+
+    def __init__(self, schema, accounts: int, securities: int, start_date: date, end_date: date, seed: int = 42):
+        self.schema = schema
+        self.n_accounts = accounts
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        calendar = np.arange(np.datetime64(start_date), np.datetime64(end_date + timedelta(days=1)))
+        self.days = [day.item() for day in calendar[np.is_busday(calendar)]]
+        if len(self.days) < 2:
+            raise SystemExit("The date range needs at least two business days")
+        self.day_str = np.array([day.isoformat() for day in self.days], dtype=object)
+        processed = [day + timedelta(days=1) for day in self.days]
+        self.processed_date = np.array([day.isoformat() for day in processed], dtype=object)
+        self.processed_ts = np.array([f"{day.isoformat()} 06:00:00" for day in processed], dtype=object)
+
+        self.currencies = list(CURRENCIES)
+        self.fx = self._fx_paths()
+        self._build_securities(securities)
+        self._build_calendar_events()
+
+    # -- market data -------------------------------------------------------
+
+    def _fx_paths(self) -> np.ndarray:
+        """(n_currencies, n_days) CAD per unit of currency; CAD is constant 1"""
+        n_days = len(self.days)
+        shocks = self.rng.normal(0.0, FX_DAILY_VOLATILITY, size=(len(self.currencies), n_days))
+        shocks[:, 0] = 0.0
+        paths = np.exp(np.cumsum(shocks, axis=1))
+        start = np.array([CURRENCIES[c][0] for c in self.currencies])[:, None]
+        paths = start * paths
+        paths[self.currencies.index("CAD")] = 1.0
+        return paths
+
+    def _build_securities(self, n_securities: int):
+        rng = self.rng
+        n_days = len(self.days)
+        type_codes = list(SECURITY_TYPES)
+        type_share = np.array([SECURITY_TYPES[t][1] for t in type_codes])
+        currency_share = np.array([CURRENCIES[c][1] for c in self.currencies])
+
+        self.sec_type = rng.choice(type_codes, size=n_securities, p=type_share / type_share.sum())
+        self.sec_currency_idx = rng.choice(len(self.currencies), size=n_securities, p=currency_share / currency_share.sum())
+        self.sec_code = [f"S{n:07d}" for n in range(n_securities)]
+        self.sec_yield = np.empty(n_securities)
+        self.sec_payments = np.empty(n_securities, dtype=int)
+        self.sec_income_type = []
+
+        prices = np.empty((n_securities, n_days))
+        for i, type_code in enumerate(self.sec_type):
+            _, _, (low, high), vol, (y_low, y_high), payments, income_type = SECURITY_TYPES[type_code]
+            shocks = rng.normal(0.0002, vol, size=n_days)
+            shocks[0] = 0.0
+            prices[i] = rng.uniform(low, high) * np.exp(np.cumsum(shocks))
+            self.sec_yield[i] = rng.uniform(y_low, y_high)
+            self.sec_payments[i] = payments
+            self.sec_income_type.append(income_type)
+        self.prices = np.round(prices, 4)
+        self.sec_fx = self.fx[self.sec_currency_idx]
+        self.sec_pay_offset = rng.integers(0, 3, size=n_securities)
+
+        # One cash security per currency; accounts hold CAD cash
+        self.cash_code = {c: f"CASH{c}" for c in self.currencies}
+
+    def _build_calendar_events(self):
+        """Day indices of income payments (by payments/year and month offset) and month ends"""
+        months = np.array([day.year * 12 + day.month - 1 for day in self.days])
+        month_end = np.r_[months[1:] != months[:-1], True]
+        self.month_end_days = np.nonzero(month_end)[0]
+
+        mid_month = np.zeros(len(self.days), dtype=bool)
+        seen = set()
+        for i, day in enumerate(self.days):
+            if day.day >= 15 and (day.year, day.month) not in seen:
+                seen.add((day.year, day.month))
+                mid_month[i] = True
+        self.pay_days = {}
+        for payments in {SECURITY_TYPES[t][5] for t in SECURITY_TYPES}:
+            step = 12 // payments
+            for offset in range(3):
+                self.pay_days[(payments, offset)] = np.nonzero(mid_month & (months % step == offset % step))[0]
+
+    # -- static tables -----------------------------------------------------
+
+    def transaction_type_rows(self) -> List[tuple]:
+        n = len(TRANSACTION_TYPES)
+        return build_rows(
+            self.schema["dim_transaction_types"],
+            n,
+            {
+                "TransactionType": [code for code, _, _ in TRANSACTION_TYPES],
+                "Description": [description for _, description, _ in TRANSACTION_TYPES],
+                "Taxable": [taxable for _, _, taxable in TRANSACTION_TYPES],
+                "ProcessedDate": self.processed_date[-1],
+                "ProcessedTimestampEST": self.processed_ts[-1],
+                "rawFile": RAW_FILE,
+            },
+        )
+
+    def security_rows(self) -> List[tuple]:
+        rng = np.random.default_rng([self.seed, 1])
+        codes, names, symbols, types, type_desc, countries, currencies = [], [], [], [], [], [], []
+        l1, l1_code, l3, industry, issuers = [], [], [], [], []
+        for i, code in enumerate(self.sec_code):
+            currency = self.currencies[self.sec_currency_idx[i]]
+            type_code = str(self.sec_type[i])
+            issuer = f"{ISSUER_WORDS[rng.integers(len(ISSUER_WORDS))]} {ISSUER_SUFFIXES[rng.integers(len(ISSUER_SUFFIXES))]}"
+            class_name, class_code, regional, fallback = ASSET_CLASSES[type_code]
+            codes.append(code)
+            symbols.append(_symbol(i) + (".TO" if currency == "CAD" and type_code in ("EQ", "ETF") else ""))
+            names.append(f"{issuer} {SECURITY_TYPES[type_code][0]}")
+            types.append(type_code)
+            type_desc.append(SECURITY_TYPES[type_code][0])
+            countries.append(COUNTRIES[currency])
+            currencies.append(currency)
+            l1.append(class_name)
+            l1_code.append(class_code)
+            l3.append(regional.get(currency, fallback))
+            industry.append(INDUSTRIES[rng.integers(len(INDUSTRIES))] if class_code == "EQ" else class_name)
+            issuers.append(issuer)
+        for currency, code in self.cash_code.items():
+            codes.append(code)
+            symbols.append(code)
+            names.append(f"{currency} Cash")
+            types.append("CASH")
+            type_desc.append("Cash")
+            countries.append(COUNTRIES[currency])
+            currencies.append(currency)
+            l1.append("Cash")
+            l1_code.append("CASH")
+            l3.append("Cash")
+            industry.append("Cash")
+            issuers.append(None)
+
+        n = len(codes)
+        return build_rows(
+            self.schema["dim_securitymaster"],
+            n,
+            {
+                "secid": [f"SID{i:07d}" for i in range(n)],
+                "security_code": codes,
+                "security_name": names,
+                "security_symbol": symbols,
+                "security_description": names,
+                "security_type_code": types,
+                "security_type_description": type_desc,
+                "sec_status": "Active",
+                "security_country": countries,
+                "security_currency_code": currencies,
+                "cusip": [f"{i:09d}" for i in range(n)],
+                "isin": [f"{country}{i:010d}" for i, country in enumerate(countries)],
+                "asset_class": l1,
+                "asset_class_code": l1_code,
+                "industry_group": industry,
+                "industry_group_code": [value[:4].upper() for value in industry],
+                "issuer_code": [issuer[:6].upper() if issuer else None for issuer in issuers],
+                "issuer": issuers,
+                "ProcessedDate": self.processed_date[-1],
+                "AssetClassLevel1Name": l1,
+                "AssetClassLevel2Name": l1,
+                "AssetClassLevel3Name": l3,
+                "AssetClassLevel1": l1_code,
+                "AssetClassLevel2": l1_code,
+                "AssetClassLevel3": [value[:3].upper() for value in l3],
+                "ProcessedTimestampEST": self.processed_ts[-1],
+                "rawFile": RAW_FILE,
+            },
+        )
+
+    def fx_rate_rows(self) -> List[tuple]:
+        foreign = [i for i, c in enumerate(self.currencies) if c != "CAD"]
+        rates = np.round(self.fx[foreign], 6)
+        n_days = len(self.days)
+        cur_idx = np.repeat(foreign, n_days)
+        day_idx = np.tile(np.arange(n_days), len(foreign))
+        local = rates.ravel()
+        return build_rows(
+            self.schema["fx_rate"],
+            len(local),
+            {
+                "AsofDate": self.day_str[day_idx].tolist(),
+                "BaseCAD": np.round(1.0 / local, 6).tolist(),
+                "Local": local.tolist(),
+                "LocalCurrencyCode": [self.currencies[i] for i in cur_idx],
+                "ProcessedDate": self.processed_date[day_idx].tolist(),
+                "ProcessedTimestampEST": self.processed_ts[day_idx].tolist(),
+                "rawFile": RAW_FILE,
+            },
+        )
+
+    # -- accounts ----------------------------------------------------------
+
+    def account_tables(self, index: int) -> Dict[str, List[tuple]]:
+        """Every per-account table for one account, as {table: rows}"""
+        rng = np.random.default_rng([self.seed, 1000 + index])
+        code = f"SYN{index:06d}"
+        account_type, registered = ACCOUNT_TYPES[rng.integers(len(ACCOUNT_TYPES))]
+        account_name = f"{account_type} {index:06d}"
+        n_days = len(self.days)
+        years = n_days / BUSINESS_DAYS_PER_YEAR
+
+        n_positions = int(rng.integers(POSITIONS_PER_ACCOUNT[0], POSITIONS_PER_ACCOUNT[1] + 1))
+        n_positions = min(n_positions, len(self.sec_code))
+        held = np.sort(rng.choice(len(self.sec_code), size=n_positions, replace=False))
+        prices = self.prices[held]
+        fx = self.sec_fx[held]
+        account_value = float(rng.lognormal(np.log(400_000.0), 0.8))
+        target = account_value / n_positions * rng.uniform(0.5, 1.5, n_positions)
+        late_start = rng.random(n_positions) < 0.2
+
+        # Trades: a quantity and average-cost step path per position
+        quantity = np.zeros((n_positions, n_days))
+        avg_cost = np.zeros((n_positions, n_days))
+        trades = []  # (position, day, quantity change, local price)
+        for pos in range(n_positions):
+            opening = 0.0 if late_start[pos] else float(np.floor(target[pos] / (prices[pos, 0] * fx[pos, 0])))
+            q = opening
+            cost = prices[pos, 0]
+            deltas = np.zeros(n_days)
+            costs = [(0, cost)]
+            n_trades = min(int(rng.poisson(TRADES_PER_POSITION_PER_YEAR * years)) + int(late_start[pos]), n_days - 1)
+            for day in np.sort(rng.choice(np.arange(1, n_days), size=n_trades, replace=False)):
+                price = prices[pos, day]
+                if q == 0 or rng.random() < 0.55:
+                    change = np.floor(target[pos] * rng.uniform(0.1, 0.5) / (price * fx[pos, day]))
+                    if change <= 0:
+                        continue
+                    cost = (q * cost + change * price) / (q + change)
+                    costs.append((day, cost))
+                else:
+                    change = -q if rng.random() < 0.15 else -np.floor(q * rng.uniform(0.1, 0.5))
+                    if change == 0:
+                        continue
+                q += change
+                deltas[day] += change
+                trades.append((pos, int(day), float(change), float(price)))
+            quantity[pos] = opening + np.cumsum(deltas)
+            for day, value in costs:
+                avg_cost[pos, day:] = value
+
+        local_value = quantity * prices
+        cad_value = local_value * fx
+
+        # Cash effects in CAD and per-position flows
+        cash_delta = np.zeros(n_days)
+        position_in = np.zeros((n_positions, n_days))
+        position_out = np.zeros((n_positions, n_days))
+        position_in_local = np.zeros((n_positions, n_days))
+        position_out_local = np.zeros((n_positions, n_days))
+        transactions = []  # (security_code, type, day, quantity, unit price, settlement amount, currency)
+
+        for pos, day, change, price in trades:
+            local = abs(change) * price
+            cad = local * fx[pos, day]
+            security = held[pos]
+            currency = self.currencies[self.sec_currency_idx[security]]
+            if change > 0:
+                cash_delta[day] -= cad
+                position_in[pos, day] += cad
+                position_in_local[pos, day] += local
+                transactions.append((self.sec_code[security], "JBY", day, change, price, -local, currency))
+            else:
+                cash_delta[day] += cad
+                position_out[pos, day] += cad
+                position_out_local[pos, day] += local
+                transactions.append((self.sec_code[security], "JSL", day, change, price, local, currency))
+
+        for pos, security in enumerate(held):
+            payments = self.sec_payments[security]
+            for day in self.pay_days[(payments, int(self.sec_pay_offset[security]) % (12 // payments))]:
+                if day == 0 or quantity[pos, day - 1] <= 0:
+                    continue
+                local = quantity[pos, day - 1] * prices[pos, day] * self.sec_yield[security] / payments
+                currency = self.currencies[self.sec_currency_idx[security]]
+                income_type = self.sec_income_type[security]
+                if income_type == "DVI" and currency == "CAD":
+                    income_type = "CDV"
+                cash_delta[day] += local * fx[pos, day]
+                transactions.append((self.sec_code[security], income_type, int(day), None, None, round(local, 2), currency))
+
+        for day in self.month_end_days:
+            fee = cad_value[:, day].sum() * MANAGEMENT_FEE_RATE / 12
+            if fee > 0:
+                cash_delta[day] -= fee
+                transactions.append((self.cash_code["CAD"], "MFE", int(day), None, None, -round(fee, 2), "CAD"))
+
+        deposits = np.zeros(n_days)
+        withdrawals = np.zeros(n_days)
+        n_flows = min(int(rng.poisson(EXTERNAL_FLOWS_PER_YEAR * years)), n_days - 1)
+        for day in np.sort(rng.choice(np.arange(1, n_days), size=n_flows, replace=False)):
+            amount = round(account_value * rng.uniform(0.01, 0.08), -2)
+            if rng.random() < 0.7:
+                deposits[day] += amount
+                transactions.append((self.cash_code["CAD"], DEPOSIT_TYPES[rng.integers(2)], int(day), None, None, amount, "CAD"))
+            else:
+                withdrawals[day] += amount
+                transactions.append((self.cash_code["CAD"], WITHDRAWAL_TYPES[rng.integers(2)], int(day), None, None, amount, "CAD"))
+        cash_delta += deposits - withdrawals
+
+        # Opening cash is sized so the balance never goes negative
+        cash = np.cumsum(cash_delta)
+        cash += account_value * 0.03 + max(0.0, -cash.min())
+        total_value = cad_value.sum(axis=0) + cash
+
+        tables = {
+            "dim_accounts": self._account_rows(code, index, account_type, account_name, registered, rng),
+            "fact_holdings_all": self._holding_rows(
+                code, account_name, held, quantity, avg_cost, prices, fx, local_value, cad_value, cash
+            ),
+            "fact_transactions": self._transaction_rows(code, index, transactions),
+            "fact_daily_aggregate_values": self._daily_aggregate_rows(code, total_value, deposits, withdrawals),
+            "fact_daily_aggregate_values_slp": self._slp_rows(
+                code, held, quantity, local_value, cad_value, position_in, position_out,
+                position_in_local, position_out_local, cash, deposits, withdrawals,
+            ),
+            "fact_holdings_all_rollup": build_rows(
+                self.schema["fact_holdings_all_rollup"],
+                n_days,
+                {
+                    "AsOfDate": self.day_str.tolist(),
+                    "AccountCode": code,
+                    "AccountCurrencyCode": "CAD",
+                    "LocalMarketAccrued": _money(total_value),
+                    "MarketValueAccrued": _money(total_value),
+                },
+            ),
+            "fact_account_ror": self._ror_rows(code, total_value, deposits - withdrawals),
+        }
+        return tables
+
+    def _account_rows(self, code, index, account_type, account_name, registered, rng) -> List[tuple]:
+        custodian_code, custodian_name = CUSTODIANS[index % len(CUSTODIANS)]
+        open_date = self.days[0] - timedelta(days=int(rng.integers(30, 3650)))
+        return build_rows(
+            self.schema["dim_accounts"],
+            1,
+            {
+                "AccountCode": [code],
+                "AccountType": account_type,
+                "AccountVisualizationID": f"V{index:06d}",
+                "AccountName": account_name,
+                "CustodianAccountCode": f"{custodian_code}-{index:08d}",
+                "CustodianCode": custodian_code,
+                "CustodianName": custodian_name,
+                "OpenDate": open_date.isoformat(),
+                "Country": "CA",
+                "ContactAddressLine1": f"{100 + index % 900} Bay Street",
+                "Status": "Active",
+                "AccountCurrencyCode": "CAD",
+                "IsRegisteredAccount": registered,
+                "ProcessedDate": self.processed_date[-1],
+                "ProcessedTimestampEST": self.processed_ts[-1],
+                "rawFile": RAW_FILE,
+            },
+        )
+
+    def _holding_rows(self, code, account_name, held, quantity, avg_cost, prices, fx, local_value, cad_value, cash):
+        pos_idx, day_idx = np.nonzero(quantity > 0)
+        security = held[pos_idx]
+        q = quantity[pos_idx, day_idx]
+        price = prices[pos_idx, day_idx]
+        rate = fx[pos_idx, day_idx]
+        local = local_value[pos_idx, day_idx]
+        value = cad_value[pos_idx, day_idx]
+        cost_local = avg_cost[pos_idx, day_idx]
+        book_local = q * cost_local
+        book = book_local * fx[pos_idx, 0]
+        price_gain = q * (price - cost_local) * rate
+        yields = self.sec_yield[security]
+
+        n_days = len(self.days)
+        all_days = np.arange(n_days)
+        cash_code = self.cash_code["CAD"]
+
+        def with_cash(securities_part, cash_part):
+            return list(securities_part) + list(cash_part)
+
+        n_rows = len(q) + n_days
+        return build_rows(
+            self.schema["fact_holdings_all"],
+            n_rows,
+            {
+                "AsofDate": with_cash(self.day_str[day_idx], self.day_str),
+                "AccountCode": code,
+                "SecurityCode": with_cash((self.sec_code[s] for s in security), repeat(cash_code, n_days)),
+                "SecurityType": with_cash(self.sec_type[security].tolist(), repeat("CASH", n_days)),
+                "CurrencyCode": "CAD",
+                "MarketValueAccrued": with_cash(_money(value), _money(cash)),
+                "MarketValue": with_cash(_money(value), _money(cash)),
+                "AverageCost": with_cash(_amount(cost_local * fx[pos_idx, 0]), repeat(1.0, n_days)),
+                "BookValue": with_cash(_money(book), _money(cash)),
+                "LocalMarketAccrued": with_cash(_money(local), _money(cash)),
+                "LocalMarketValue": with_cash(_money(local), _money(cash)),
+                "LocalAverageCost": with_cash(_amount(cost_local), repeat(1.0, n_days)),
+                "LocalBookValue": with_cash(_money(book_local), _money(cash)),
+                "SecurityFXRate": with_cash(_amount(rate), repeat(1.0, n_days)),
+                "InvertedSecurityFXRate": with_cash(_amount(1.0 / rate), repeat(1.0, n_days)),
+                "Quantity": with_cash(_amount(q), _money(cash)),
+                "MarketPrice": with_cash(_amount(price), repeat(1.0, n_days)),
+                "CurrentYield": with_cash(np.round(yields * 100, 4).tolist(), repeat(0.0, n_days)),
+                "TotalUnrealizedGL": with_cash(_money(value - book), repeat(0.0, n_days)),
+                "AnnualIncome": with_cash(_money(value * yields), repeat(0.0, n_days)),
+                "ValueIsInSecurityCurrency": False,
+                "ProcessedDate": with_cash(self.processed_date[day_idx], self.processed_date[all_days]),
+                "ProcessedTimestampEST": with_cash(self.processed_ts[day_idx], self.processed_ts[all_days]),
+                "rawFile": RAW_FILE,
+                "AccountName": account_name,
+                "PriceUnrealizedGL": with_cash(_money(price_gain), repeat(0.0, n_days)),
+                "FXUnrealizedGL": with_cash(_money(value - book - price_gain), repeat(0.0, n_days)),
+            },
+        )
+
+    def _transaction_rows(self, code, index, transactions) -> List[tuple]:
+        transactions.sort(key=lambda t: (t[2], t[0], t[1]))
+        days = [t[2] for t in transactions]
+        settle = [(self.days[d] + timedelta(days=2)).isoformat() for d in days]
+        return build_rows(
+            self.schema["fact_transactions"],
+            len(transactions),
+            {
+                "AccountCode": code,
+                "SecurityCode": [t[0] for t in transactions],
+                # Unique across accounts and stable for a given seed
+                "ExternalTransactionCode": [index * 1_000_000 + n for n in range(len(transactions))],
+                "TransactionTypeCode": [t[1] for t in transactions],
+                "TradeDate": [self.day_str[d] for d in days],
+                "SettleDate": settle,
+                "Quantity": [None if t[3] is None else round(abs(t[3]), 6) for t in transactions],
+                "UnitPrice": [None if t[4] is None else round(t[4], 6) for t in transactions],
+                "BookValue": [None if t[4] is None else round(abs(t[5]), 2) for t in transactions],
+                "SettlementAmount": [round(t[5], 2) for t in transactions],
+                "SettlementCurrency": [t[6] for t in transactions],
+                "ExchangeCurrency": "CAD",
+                "EffectiveDate": [self.day_str[d] for d in days],
+                "Cancel": "N",
+                "ProcessedDate": [self.processed_date[d] for d in days],
+                "ProcessedTimestampEST": [self.processed_ts[d] for d in days],
+                "rawFile": RAW_FILE,
+            },
+        )
+
+    def _daily_aggregate_rows(self, code, total_value, deposits, withdrawals) -> List[tuple]:
+        previous = np.r_[total_value[0], total_value[:-1]]
+        net = deposits - withdrawals
+        cumulative = np.cumsum(net)
+        return build_rows(
+            self.schema["fact_daily_aggregate_values"],
+            len(self.days),
+            {
+                "account_code": code,
+                "as_of_date": self.day_str.tolist(),
+                "deposit_local": _money(deposits),
+                "withdrawal_local": _money(withdrawals),
+                "net_cashflow_local": _money(net),
+                "deposit_converted": _money(deposits),
+                "withdrawal_converted": _money(withdrawals),
+                "net_cashflow_converted": _money(net),
+                "market_value_accrued_local": _money(total_value),
+                "market_value_accrued_converted": _money(total_value),
+                "market_value_accrued_previous_local": _money(previous),
+                "market_value_accrued_previous_converted": _money(previous),
+                "cumulative_cashflow_local": _money(cumulative),
+                "cumulative_cashflow_converted": _money(cumulative),
+                "rawFile": RAW_FILE,
+            },
+        )
+
+    def _slp_rows(
+        self, code, held, quantity, local_value, cad_value, flows_in, flows_out, flows_in_local, flows_out_local,
+        cash, deposits, withdrawals,
+    ) -> List[tuple]:
+        """One row per account × security × day while the position is open (and on the day it closes)"""
+        # Cash is one more position whose flows are the external deposits and withdrawals
+        local_value = np.vstack([local_value, cash])
+        cad_value = np.vstack([cad_value, cash])
+        flows_in = np.vstack([flows_in, deposits])
+        flows_out = np.vstack([flows_out, withdrawals])
+        flows_in_local = np.vstack([flows_in_local, deposits])
+        flows_out_local = np.vstack([flows_out_local, withdrawals])
+        quantity = np.vstack([quantity, np.ones(len(self.days))])
+        codes = [self.sec_code[s] for s in held] + [self.cash_code["CAD"]]
+
+        def previous(values):
+            return np.hstack([values[:, :1], values[:, :-1]])
+
+        open_positions = (quantity > 0) | (previous(quantity) > 0)
+        pos_idx, day_idx = np.nonzero(open_positions)
+
+        def at(values):
+            return _money(values[pos_idx, day_idx])
+
+        net = flows_in - flows_out
+        net_local = flows_in_local - flows_out_local
+        return build_rows(
+            self.schema["fact_daily_aggregate_values_slp"],
+            len(pos_idx),
+            {
+                "account_code": code,
+                "security_code": [codes[p] for p in pos_idx],
+                "as_of_date": self.day_str[day_idx].tolist(),
+                "deposit": at(flows_in),
+                "deposit_local": at(flows_in_local),
+                "withdrawal": at(flows_out),
+                "withdrawal_local": at(flows_out_local),
+                "net_cashflow_converted": at(net),
+                "net_cashflow_local": at(net_local),
+                "cumulative_cashflow_converted": at(np.cumsum(net, axis=1)),
+                "cumulative_cashflow_local": at(np.cumsum(net_local, axis=1)),
+                "mva": at(cad_value),
+                "mva_local": at(local_value),
+                "mva_previous": at(previous(cad_value)),
+                "mva_local_previous": at(previous(local_value)),
+                "rawFile": RAW_FILE,
+            },
+        )
+
+    def _ror_rows(self, code, total_value, net_flows) -> List[tuple]:
+        """Trailing returns as of the last day from the daily time-weighted return series"""
+        growth = np.ones(len(total_value))
+        growth[1:] = (total_value[1:] - net_flows[1:]) / total_value[:-1]
+        wealth = np.cumprod(growth)
+        last = self.days[-1]
+
+        def since(cutoff: date, annualize_years: Optional[int] = None):
+            index = np.searchsorted(np.array(self.days, dtype="datetime64[D]"), np.datetime64(cutoff), side="right") - 1
+            if index < 0:
+                return None
+            value = wealth[-1] / wealth[index]
+            if annualize_years:
+                value = value ** (1.0 / annualize_years)
+            return round(float(value - 1.0), 6)
+
+        def between(start: date, end: date):
+            start_value = since(start)
+            end_value = since(end)
+            if start_value is None or end_value is None:
+                return None
+            return round(float((1 + start_value) / (1 + end_value) - 1.0), 6)
+
+        def quarter_cutoff(day: date) -> date:
+            """Last day before the quarter containing day"""
+            return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1) - timedelta(days=1)
+
+        # Cutoffs are the last day of the previous period
+        month_start = last.replace(day=1) - timedelta(days=1)
+        previous_month = month_start.replace(day=1) - timedelta(days=1)
+        quarter_start = quarter_cutoff(last)
+        previous_quarter = quarter_cutoff(quarter_start)
+
+        def years_back(n):
+            return last.replace(year=last.year - n, day=min(last.day, 28))
+
+        return build_rows(
+            self.schema["fact_account_ror"],
+            1,
+            {
+                "account_code": [code],
+                "as_of_date": last.isoformat(),
+                "mtd": since(month_start),
+                "lcm": between(previous_month, month_start),
+                "qtd": since(quarter_start),
+                "lcq": between(previous_quarter, quarter_start),
+                "ytd": since(date(last.year - 1, 12, 31)),
+                "l3y": since(years_back(3), 3) if self.days[0] <= years_back(3) else None,
+                "l5y": since(years_back(5), 5) if self.days[0] <= years_back(5) else None,
+                "l10y": since(years_back(10), 10) if self.days[0] <= years_back(10) else None,
+                "itd": round(float(wealth[-1] - 1.0), 6),
+            },
+        )
+
+
+def _symbol(n: int) -> str:
+    letters = ""
+    n += 26 * 26  # at least three letters
+    while n:
+        n, remainder = divmod(n, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def generate(
+    database_url: str,
+    accounts: int,
+    securities: int,
+    start_date: date,
+    end_date: date,
+    seed: int = 42,
+    batch_size: int = 25,
+    replace: bool = False,
+    model_indexes: bool = False,
+    partition_holdings: bool = False,
+) -> Dict[str, int]:
+    """Create the gold tables at database_url and load synthetic data; returns rows per table"""
+    from app.database import make_engine
+
+    schema = read_schema()
+    for problem in model_drift(schema):
+        print(f"⚠️  {problem}")
+
+    engine = make_engine(database_url)
+    loader = GoldLoader(engine, schema, partition_holdings)
+    started = time.perf_counter()
+    try:
+        loader.create_tables(replace)
+        generator = GoldDataGenerator(schema, accounts, securities, start_date, end_date, seed)
+        print(
+            f"🏗️  Generating {accounts} accounts, {securities} securities, {len(generator.days)} business days "
+            f"({start_date} to {end_date}) into {engine.dialect.name}"
+        )
+        loader.load("dim_transaction_types", generator.transaction_type_rows())
+        loader.load("dim_securitymaster", generator.security_rows())
+        loader.load("fx_rate", generator.fx_rate_rows())
+        loader.commit()
+
+        for batch_start in range(0, accounts, batch_size):
+            batch = {}
+            for index in range(batch_start, min(batch_start + batch_size, accounts)):
+                for table, rows in generator.account_tables(index).items():
+                    batch.setdefault(table, []).extend(rows)
+            for table, rows in batch.items():
+                loader.load(table, rows)
+            loader.commit()
+            done = min(batch_start + batch_size, accounts)
+            print(f"   ✅ {done}/{accounts} accounts, {sum(loader.row_counts.values()):,} rows, {time.perf_counter() - started:.1f}s")
+
+        if model_indexes:
+            loader.execute(model_index_sql(loader.dialect))
+            print("   📇 Created indexes declared in app/models.py")
+    finally:
+        loader.close()
+        engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    total = sum(loader.row_counts.values())
+    print(f"\n📊 Loaded {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+    for table, count in sorted(loader.row_counts.items()):
+        print(f"   {table:<35} {count:>12,}")
+    return loader.row_counts
+
+
+# Named dataset sizes shared by the benchmark and load-test tools; fixed dates keep results comparable
+DATASET_SIZES = {
+    "small": {"accounts": 10, "securities": 100, "start_date": date(2024, 1, 1)},
+    "medium": {"accounts": BASE_ACCOUNTS, "securities": BASE_SECURITIES, "start_date": date(2022, 1, 1)},
+    "large": {"accounts": BASE_ACCOUNTS * 10, "securities": BASE_SECURITIES * 10, "start_date": date(2022, 1, 1)},
+    "xlarge": {"accounts": BASE_ACCOUNTS * 100, "securities": BASE_SECURITIES * 20, "start_date": date(2022, 1, 1)},
+}
+DATASET_END_DATE = date(2024, 12, 31)
+
+
+def ensure_sqlite_dataset(size: str, directory: str, seed: int = 42) -> str:
+    """
+    Path-based SQLite URL for a named dataset size, generating it on first use. A small JSON
+    stamp next to the database records the parameters so a changed preset is regenerated.
+    """
+    import json
+
+    params = {**DATASET_SIZES[size], "end_date": DATASET_END_DATE, "seed": seed}
+    stamp = {key: str(value) for key, value in params.items()}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, f"gold_{size}.db"))
+    stamp_path = f"{path}.json"
+    url = f"sqlite:///{path}"
+
+    if os.path.exists(stamp_path):
+        with open(stamp_path) as f:
+            if json.load(f) == stamp:
+                return url
+    print(f"🏗️  Generating the '{size}' dataset in {path}")
+    generate(url, replace=True, **params)
+    with open(stamp_path, "w") as f:
+        json.dump(stamp, f, indent=2)
+    return url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load synthetic phw_dev_gold data into Postgres or SQLite")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Target database (default: $DATABASE_URL)")
+    parser.add_argument("--scale", type=float, default=1.0, help=f"Multiplier on {BASE_ACCOUNTS} accounts and {BASE_SECURITIES} securities")
+    parser.add_argument("--accounts", type=int, help="Number of accounts (overrides --scale)")
+    parser.add_argument("--securities", type=int, help="Number of securities (overrides --scale)")
+    parser.add_argument("--years", type=float, default=3.0, help="History length ending at --end-date")
+    parser.add_argument("--start-date", type=date.fromisoformat, help="First day (overrides --years)")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today() - timedelta(days=1))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=25, help="Accounts generated and loaded per commit")
+    parser.add_argument("--replace", action="store_true", help="Drop existing gold tables first")
+    parser.add_argument("--model-indexes", action="store_true", help="Create the indexes declared in app/models.py")
+    parser.add_argument("--partition-holdings", action="store_true", help="Partition fact_holdings_all by month (Postgres)")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    # app.database builds its default engine from DATABASE_URL at import
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    sys.path.insert(0, REPO_ROOT)
+
+    accounts = args.accounts or max(1, int(round(BASE_ACCOUNTS * args.scale)))
+    securities = args.securities or max(POSITIONS_PER_ACCOUNT[1], int(round(BASE_SECURITIES * args.scale)))
+    start_date = args.start_date or args.end_date - timedelta(days=int(round(args.years * 365.25)))
+
+    generate(
+        args.database_url,
+        accounts,
+        securities,
+        start_date,
+        args.end_date,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        replace=args.replace,
+        model_indexes=args.model_indexes,
+        partition_holdings=args.partition_holdings,
+    )
+    print(f"\n💡 Try account codes SYN000000..SYN{accounts - 1:06d} between {start_date} and {args.end_date}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Index advisor for the queries in app/queries.py.
+
+Runs every query against a database (generated data, see tools.generate_gold_data) with
+representative parameters and records its plan and timing: EXPLAIN (ANALYZE, BUFFERS) on
+Postgres, EXPLAIN QUERY PLAN plus the measured run time on SQLite. It then proposes indexes
+from the queries' predicates:
+
+- per query and table, the columns compared with = or IN, then one range column (> < BETWEEN);
+  equality columns used by more queries come first, so one index serves several queries
+- join columns of the joined table, and the column of a MIN/MAX with no filter
+- candidates that are a prefix of another are merged into it, and candidates already served by
+  an existing index (same leading columns) are dropped
+- on Postgres, the other columns the queries read go into INCLUDE (up to --max-include), so
+  the queries can be answered by index-only scans
+
+Tables with fewer than --min-rows rows get no proposals. With --apply the proposals are created
+and every query is measured again, giving a before/after report; --write-migration stores the
+proposals as the next migration (see tools.migrate) with that report next to it. --migrate
+measures the pending migrations instead of new proposals.
+
+Usage:
+    python -m tools.generate_gold_data --database-url sqlite:///advisor.db --scale 1 --replace --model-indexes
+    python -m tools.index_advisor --database-url sqlite:///advisor.db
+    python -m tools.index_advisor --database-url sqlite:///advisor.db --apply --write-migration migrations --name hot_query_indexes
+    python -m tools.index_advisor --database-url postgresql://localhost/phw --migrate --output before_after.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.sql.elements import TextClause
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLD_SCHEMA = "phw_dev_gold"
+
+TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+phw_dev_gold\.(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+# alias."Column" op value, where the value is a bind parameter, a literal or a list
+PREDICATE = re.compile(r"(?:(\w+)\.)?\"?(\w+)\"?\s*(<>|>=|<=|=|>|<|\bIN\b|\bBETWEEN\b)\s*(?=[:'(])")
+JOIN_CONDITION = re.compile(r"(\w+)\.\"?(\w+)\"?\s*=\s*(\w+)\.\"?(\w+)\"?")
+MIN_MAX = re.compile(r"\b(?:MIN|MAX)\(\s*(?:(\w+)\.)?\"?(\w+)\"?\s*\)", re.IGNORECASE)
+QUALIFIED_COLUMN = re.compile(r"\b(\w+)\.\"?(\w+)\"?")
+SQL_KEYWORDS = {"on", "where", "left", "right", "inner", "join", "group", "order", "limit"}
+
+
+def hot_queries() -> Dict[str, TextClause]:
+    """
+    Every read of the gold tables in app/queries.py; builders are called with the arguments the
+    API uses most. Rollup maintenance and reads are left out: the rollup tables are keyed by
+    their own migration and may not exist yet.
+    """
+    from app import http_cache, queries, rollups, schemas
+
+    found = {
+        name: query
+        for name, query in vars(queries).items()
+        if name.isupper()
+        and isinstance(query, TextClause)
+        and query.text.lstrip().upper().startswith("SELECT")
+        and "FROM" in query.text.upper()
+        and not any(table in query.text for table in rollups.ROLLUP_TABLES)
+    }
+    found["get_holdings_query"] = queries.get_holdings_query()
+    found["get_aggregated_holdings_query"] = queries.get_aggregated_holdings_query(["AccountType"], ["asset_class"])
+    default_levels = schemas.SankeyRequest(as_of_date=date.today(), account_codes=[]).sankey_levels
+    found["get_sankey_holdings_query"] = queries.get_sankey_holdings_query(default_levels)
+    found["get_available_dates_query"] = queries.get_available_dates_query()
+    for table in sorted(set(http_cache.HOLDINGS_TABLES + http_cache.ATTRIBUTION_TABLES)):
+        found[f"get_data_version_query[{table}]"] = queries.get_data_version_query(table)
+    return found
+
+
+def sample_parameters(engine, accounts: int = 5) -> dict:
+    """Parameters like an API request: a few accounts over the last year of data"""
+    with engine.connect() as conn:
+        codes = conn.execute(
+            text(f'SELECT "AccountCode" FROM {GOLD_SCHEMA}.dim_accounts ORDER BY "AccountCode" LIMIT :n'), {"n": accounts}
+        ).scalars().all()
+        first, last = conn.execute(text(f'SELECT MIN("AsofDate"), MAX("AsofDate") FROM {GOLD_SCHEMA}.fact_holdings_all')).one()
+    first, last = date.fromisoformat(str(first)[:10]), date.fromisoformat(str(last)[:10])
+    return {
+        "account_codes": list(codes),
+        "account_code": codes[0],
+        "as_of_date": last,
+        "start_date": max(first, last - timedelta(days=365)),
+        "end_date": last,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Plans and timings
+# ---------------------------------------------------------------------------
+
+
+def _with_prefix(prefix: str, query: TextClause) -> TextClause:
+    """query's SQL behind prefix (EXPLAIN ...), keeping its bind parameters (expanding IN lists)"""
+    return text(prefix + query.text).bindparams(*query._bindparams.values())
+
+
+def _plan_nodes(node: dict) -> List[str]:
+    label = node["Node Type"]
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    nodes = [label]
+    for child in node.get("Plans", []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+def explain(conn, query: TextClause, params: dict) -> dict:
+    """{"plan": [step, ...], "full_scans": [table, ...]} plus execution time and buffers on Postgres"""
+    if conn.dialect.name == "postgresql":
+        output = conn.execute(_with_prefix("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ", query), params).scalar()
+        output = json.loads(output) if isinstance(output, str) else output
+        root = output[0]["Plan"]
+        plan = _plan_nodes(root)
+        return {
+            "plan": plan,
+            "full_scans": sorted({step.rsplit(" on ", 1)[1] for step in plan if step.startswith("Seq Scan on")}),
+            "execution_ms": output[0]["Execution Time"],
+            "shared_hit_blocks": root.get("Shared Hit Blocks", 0),
+            "shared_read_blocks": root.get("Shared Read Blocks", 0),
+        }
+    rows = conn.execute(_with_prefix("EXPLAIN QUERY PLAN ", query), params).fetchall()
+    plan = [row[-1] for row in rows]
+    aliases = table_aliases(query.text)
+    full_scans = set()
+    for step in plan:
+        match = re.match(r"SCAN (?:phw_dev_gold\.)?(\w+)(?: |$)", step)
+        if match and match.group(1) in aliases and "INDEX" not in step:
+            full_scans.add(aliases[match.group(1)])
+    return {"plan": plan, "full_scans": sorted(full_scans)}
+
+
+def time_query(conn, query: TextClause, params: dict, repeat: int) -> float:
+    """Median wall time in ms of running query and fetching every row, after one warm-up run"""
+    conn.execute(query, params).fetchall()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def measure(engine, queries: Dict[str, TextClause], params: dict, repeat: int = 5) -> Dict[str, dict]:
+    results = {}
+    with engine.connect() as conn:
+        for name, query in queries.items():
+            result = explain(conn, query, params)
+            result["ms"] = time_query(conn, query, params, repeat)
+            results[name] = result
+            conn.rollback()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Proposals
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class TableUse:
+    """How one query uses one table"""
+
+    equality: List[str] = field(default_factory=list)
+    ranges: List[str] = field(default_factory=list)
+    reads: List[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class IndexProposal:
+    table: str
+    columns: Tuple[str, ...]
+    include: Tuple[str, ...] = ()
+    queries: Tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return f"ix_{self.table}_{'_'.join(self.columns)}".lower()[:63]
+
+    def sql(self, dialect: str) -> str:
+        columns = ", ".join(f'"{column}"' for column in self.columns)
+        if dialect == "sqlite":
+            return f"CREATE INDEX IF NOT EXISTS {GOLD_SCHEMA}.{self.name} ON {self.table} ({columns})"
+        include = f' INCLUDE ({", ".join(chr(34) + column + chr(34) for column in self.include)})' if self.include else ""
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {GOLD_SCHEMA}.{self.table} ({columns}){include}"
+
+
+def _table_columns() -> Dict[str, List[str]]:
+    from app import models
+
+    return {table.name: list(table.columns.keys()) for table in models.Base.metadata.tables.values()}
+
+
+def table_aliases(sql: str) -> Dict[str, str]:
+    """{alias or table name: table} for the gold tables a query reads"""
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def table_uses(sql: str, columns: Dict[str, List[str]]) -> Dict[str, TableUse]:
+    """{table: TableUse} from the predicates, joins and column references of one query"""
+    aliases = table_aliases(sql)
+    tables = list(dict.fromkeys(aliases.values()))
+    uses = {table: TableUse() for table in tables}
+
+    def resolve(alias: Optional[str], column: str) -> Optional[str]:
+        if alias:
+            table = aliases.get(alias)
+            return table if table and column in columns.get(table, ()) else None
+        return next((table for table in tables if column in columns.get(table, ())), None)
+
+    def add(values: List[str], column: str):
+        if column not in values:
+            values.append(column)
+
+    for alias, column, operator in PREDICATE.findall(sql):
+        table = resolve(alias, column)
+        if table is None or operator == "<>":
+            continue
+        add(uses[table].equality if operator.upper() in ("=", "IN") else uses[table].ranges, column)
+
+    joined = {alias: table for table, alias in TABLE_REF.findall(sql) if alias}
+    for left_alias, left, right_alias, right in JOIN_CONDITION.findall(sql):
+        # The table named in JOIN is the one looked up once per outer row
+        for alias, column in ((left_alias, left), (right_alias, right)):
+            table = resolve(alias, column)
+            if table is not None and alias in joined and re.search(rf"\bJOIN\s+{GOLD_SCHEMA}\.{table}\s+{alias}\b", sql, re.IGNORECASE):
+                add(uses[table].equality, column)
+
+    for alias, column in MIN_MAX.findall(sql):
+        table = resolve(alias, column)
+        if table is not None and not uses[table].equality and not uses[table].ranges:
+            add(uses[table].ranges, column)
+
+    for alias, column in QUALIFIED_COLUMN.findall(sql):
+        table = resolve(alias, column)
+        if table is not None:
+            add(uses[table].reads, column)
+    if len(tables) == 1:
+        for column in columns.get(tables[0], ()):
+            if re.search(rf'(?<![\w.])"?{column}"?(?!\w)', sql):
+                add(uses[tables[0]].reads, column)
+    return uses
+
+
+def existing_indexes(engine) -> Dict[str, List[Tuple[str, ...]]]:
+    """{table: [indexed column tuple, ...]} including primary keys"""
+    inspector = inspect(engine)
+    indexes = defaultdict(list)
+    for table in inspector.get_table_names(schema=GOLD_SCHEMA):
+        for index in inspector.get_indexes(table, schema=GOLD_SCHEMA):
+            indexes[table].append(tuple(column for column in index["column_names"] if column))
+        primary_key = inspector.get_pk_constraint(table, schema=GOLD_SCHEMA).get("constrained_columns")
+        if primary_key:
+            indexes[table].append(tuple(primary_key))
+    return dict(indexes)
+
+
+def table_stats(engine, tables) -> Dict[str, dict]:
+    """{table: {"rows": n, "distinct": {column: n}}} for the tables the queries filter on"""
+    stats = {}
+    with engine.connect() as conn:
+        for table, columns in tables.items():
+            rows = conn.execute(text(f"SELECT COUNT(*) FROM {GOLD_SCHEMA}.{table}")).scalar()
+            distinct = {}
+            for column in columns:
+                distinct[column] = conn.execute(text(f'SELECT COUNT(DISTINCT "{column}") FROM {GOLD_SCHEMA}.{table}')).scalar()
+            stats[table] = {"rows": rows, "distinct": distinct}
+    return stats
+
+
+def propose(
+    queries: Dict[str, TextClause],
+    engine,
+    min_rows: int = 5000,
+    max_include: int = 6,
+) -> List[IndexProposal]:
+    columns = _table_columns()
+    uses = {name: table_uses(query.text, columns) for name, query in queries.items()}
+
+    filtered = defaultdict(set)
+    frequency = defaultdict(Counter)
+    for by_table in uses.values():
+        for table, use in by_table.items():
+            filtered[table].update(use.equality + use.ranges)
+            frequency[table].update(use.equality)
+    stats = table_stats(engine, filtered)
+    existing = existing_indexes(engine)
+
+    candidates = defaultdict(dict)  # {table: {key: (include columns, query names)}}
+    for name, by_table in uses.items():
+        for table, use in by_table.items():
+            if not use.equality and not use.ranges or stats[table]["rows"] < min_rows:
+                continue
+            rank = lambda column: (-frequency[table][column], -stats[table]["distinct"][column], column)
+            key = sorted(use.equality, key=rank)
+            key += sorted((column for column in use.ranges if column not in key), key=rank)[:1]
+            include, names = candidates[table].get(tuple(key), (set(), set()))
+            include.update(column for column in use.reads if column not in key)
+            names.add(name)
+            candidates[table][tuple(key)] = (include, names)
+
+    proposals = []
+    for table, by_key in sorted(candidates.items()):
+        accepted: Dict[Tuple[str, ...], Tuple[set, set]] = {}
+        for key in sorted(by_key, key=len, reverse=True):
+            include, names = by_key[key]
+            wider = next((other for other in accepted if other[: len(key)] == key), None)
+            if wider is not None:
+                accepted[wider][0].update(include)
+                accepted[wider][1].update(names)
+            else:
+                accepted[key] = (set(include), set(names))
+        for key, (include, names) in accepted.items():
+            if any(index[: len(key)] == key for index in existing.get(table, ())):
+                continue
+            include = sorted(column for column in include if column not in key)
+            proposals.append(
+                IndexProposal(table, key, tuple(include) if len(include) <= max_include else (), tuple(sorted(names)))
+            )
+    return proposals
+
+
+def analyze_sql(dialect: str, proposals: List[IndexProposal]) -> List[str]:
+    """Refresh planner statistics so the new indexes are costed (SQLite has none until ANALYZE)"""
+    if dialect == "sqlite":
+        return [f"ANALYZE {GOLD_SCHEMA}"]
+    return [f"ANALYZE {GOLD_SCHEMA}.{table}" for table in sorted({proposal.table for proposal in proposals})]
+
+
+def apply_proposals(engine, proposals: List[IndexProposal]):
+    dialect = engine.dialect.name
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in [proposal.sql(dialect) for proposal in proposals] + analyze_sql(dialect, proposals):
+            conn.execute(text(statement))
+
+
+# ---------------------------------------------------------------------------
+# Reports and migrations
+# ---------------------------------------------------------------------------
+
+
+def render_report(before: Dict[str, dict], after: Optional[Dict[str, dict]], proposals: List[IndexProposal], context: str) -> str:
+    lines = ["# Index advisor report", "", context, ""]
+    if proposals:
+        lines += ["## Indexes", ""]
+        for proposal in proposals:
+            include = f" INCLUDE ({', '.join(proposal.include)})" if proposal.include else ""
+            lines.append(f"- `{proposal.table} ({', '.join(proposal.columns)}){include}`: {', '.join(proposal.queries)}")
+        lines.append("")
+    lines += ["## Timings", ""]
+    if after is None:
+        lines += ["| query | ms | full scans |", "|---|---:|---|"]
+        for name, result in before.items():
+            lines.append(f"| {name} | {result['ms']:.2f} | {', '.join(result['full_scans']) or '-'} |")
+    else:
+        lines += ["| query | before ms | after ms | speedup | full scans before | full scans after |", "|---|---:|---:|---:|---|---|"]
+        for name, result in before.items():
+            new = after[name]
+            speedup = result["ms"] / new["ms"] if new["ms"] else float("inf")
+            lines.append(
+                f"| {name} | {result['ms']:.2f} | {new['ms']:.2f} | {speedup:.1f}× "
+                f"| {', '.join(result['full_scans']) or '-'} | {', '.join(new['full_scans']) or '-'} |"
+            )
+    lines += ["", "## Plans", ""]
+    for name, result in before.items():
+        lines.append(f"### {name}")
+        lines.append("")
+        lines.append("```")
+        lines += [f"before: {step}" if after is not None else step for step in result["plan"]]
+        if after is not None:
+            lines += [f"after:  {step}" for step in after[name]["plan"]]
+        lines.append("```")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def next_version(directory: str) -> int:
+    from tools.migrate import FILE_PATTERN
+
+    versions = [int(match.group(1)) for match in map(FILE_PATTERN.match, os.listdir(directory)) if match] if os.path.isdir(directory) else []
+    return max(versions, default=0) + 1
+
+
+def write_migration(directory: str, name: str, proposals: List[IndexProposal], report: str) -> List[str]:
+    """Write proposals as migration version N for both dialects, plus the report; returns the paths"""
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f"{next_version(directory):04d}_{name}")
+    headers = {
+        "postgresql": "-- migrate: no-transaction\n-- CONCURRENTLY keeps the tables readable and loadable while the indexes build.\n",
+        "sqlite": "",
+    }
+    paths = []
+    for dialect, header in headers.items():
+        body = "".join(f"\n-- {', '.join(p.queries)}\n{p.sql(dialect)};\n" for p in proposals)
+        body += "\n" + "".join(f"{statement};\n" for statement in analyze_sql(dialect, proposals))
+        paths.append(f"{prefix}.{dialect}.sql")
+        with open(paths[-1], "w") as f:
+            f.write(header + body)
+    paths.append(f"{prefix}.report.md")
+    with open(paths[-1], "w") as f:
+        f.write(report + "\n")
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Database with gold data (default: $DATABASE_URL)")
+    parser.add_argument("--accounts", type=int, default=5, help="Accounts per request")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query (median reported)")
+    parser.add_argument("--min-rows", type=int, default=5000, help="Skip proposals for smaller tables")
+    parser.add_argument("--max-include", type=int, default=6, help="Most INCLUDE columns per covering index (Postgres)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--apply", action="store_true", help="Create the proposed indexes and measure again")
+    group.add_argument("--migrate", action="store_true", help="Apply the pending migrations and measure again")
+    parser.add_argument("--write-migration", metavar="DIR", help="Write the proposals and report as the next migration in DIR")
+    parser.add_argument("--name", default="indexes", help="Migration name for --write-migration")
+    parser.add_argument("--output", help="Write the measurements as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    sys.path.insert(0, REPO_ROOT)
+    from app.database import make_engine
+
+    engine = make_engine(args.database_url)
+    try:
+        queries = hot_queries()
+        params = sample_parameters(engine, args.accounts)
+        context = (
+            f"{engine.dialect.name}, {len(params['account_codes'])} accounts, "
+            f"{params['start_date']} to {params['end_date']}, median of {args.repeat} runs."
+        )
+        print(f"🔎 {len(queries)} queries on {context}")
+        before = measure(engine, queries, params, args.repeat)
+        proposals = propose(queries, engine, args.min_rows, args.max_include)
+        after = None
+        if args.apply:
+            apply_proposals(engine, proposals)
+            after = measure(engine, queries, params, args.repeat)
+        elif args.migrate:
+            from tools.migrate import migrate
+
+            migrate(engine)
+            after = measure(engine, queries, params, args.repeat)
+
+        report = render_report(before, after, proposals, context)
+        print(report)
+        if args.write_migration:
+            for path in write_migration(args.write_migration, args.name, proposals, report):
+                print(f"📝 {path}")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(
+                    {
+                        "context": context,
+                        "proposals": [proposal.__dict__ for proposal in proposals],
+                        "before": before,
+                        "after": after,
+                    },
+                    f,
+                    indent=2,
+                    default=str,
+                )
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
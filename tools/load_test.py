@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test for the API with per-endpoint latency percentiles.
+
+Starts the app locally with uvicorn (tools/offline_app.py, so benchmark prices are generated
+instead of downloaded) on a generated dataset, replays a weighted mix of the app/main.py
+endpoints from --concurrency asyncio clients for --duration seconds, and reports throughput
+and p50/p95/p99 latency per endpoint. The HTTP client is a small keep-alive HTTP/1.1 client
+on asyncio streams, so nothing beyond the standard library is needed on the client side.
+
+Usage:
+    python -m tools.load_test --size medium --workers 1 --concurrency 16 --output results/w1.json
+    python -m tools.load_test --size medium --workers 4 --concurrency 16 --output results/w4.json
+    python -m tools.load_test --compare results/w1.json results/w4.json
+
+    # Against a server that is already running (no dataset generation, no uvicorn)
+    python -m tools.load_test --url http://127.0.0.1:8000 --accounts SYN000000,SYN000001 --concurrency 8
+
+Extra environment for the server (e.g. pool settings, see app/settings.py) can be passed with
+--env NAME=VALUE and is saved with the results so runs with different settings can be compared:
+
+    python -m tools.load_test --concurrency 16 --env DB_POOL_SIZE=2 --env DB_MAX_OVERFLOW=0 --output results/pool2.json
+    python -m tools.load_test --concurrency 16 --env DB_POOL_SIZE=16 --output results/pool16.json
+
+After each run the connection pool's peak use, saturated checkouts and timeouts are read from
+/metrics and saved with the results.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(REPO_ROOT, ".benchmarks")
+
+# Relative share of each endpoint in the replayed traffic
+ENDPOINT_MIX = {
+    "/holdings_agg_for_sankey/": 25,
+    "/performance_attribution_sankey/": 15,
+    "/performance_benchmark/": 15,
+    "/holdings_available_dates/": 15,
+    "/available_account_codes/": 10,
+    "/fx_rate/": 10,
+    "/holdings_available_sankey_columns/": 5,
+    "/available_performance_sankey_levels/": 5,
+}
+BENCHMARK_SYMBOLS = ["VFV.TO", "XEQT.TO", "XIC.TO", "ZAG.TO"]
+
+
+class RequestMix:
+    """Seeded generator of (path, payload) pairs following ENDPOINT_MIX"""
+
+    def __init__(self, account_codes: List[str], start_date: date, end_date: date, seed: int = 7, mix=None):
+        self.rng = random.Random(seed)
+        self.account_codes = account_codes
+        self.start_date = start_date
+        self.end_date = end_date
+        mix = mix or ENDPOINT_MIX
+        self.paths = list(mix)
+        self.weights = [mix[path] for path in self.paths]
+
+    def _accounts(self) -> List[str]:
+        return self.rng.sample(self.account_codes, self.rng.randint(1, min(5, len(self.account_codes))))
+
+    def _business_day(self, earliest: date) -> date:
+        span = (self.end_date - earliest).days
+        day = earliest + timedelta(days=self.rng.randint(0, max(span, 0)))
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        return max(day, earliest)
+
+    def _period(self) -> Tuple[str, str]:
+        end = self._business_day(self.start_date + timedelta(days=30))
+        start = max(self.start_date, end - timedelta(days=self.rng.choice([30, 90, 180, 365])))
+        while start.weekday() >= 5:
+            start += timedelta(days=1)
+        return start.isoformat(), end.isoformat()
+
+    def next(self) -> Tuple[str, dict]:
+        path = self.rng.choices(self.paths, weights=self.weights)[0]
+        if path == "/holdings_agg_for_sankey/":
+            return path, {"as_of_date": self._business_day(self.start_date).isoformat(), "account_codes": self._accounts()}
+        if path == "/performance_attribution_sankey/":
+            start, end = self._period()
+            return path, {"start_date": start, "end_date": end, "account_codes": self._accounts()}
+        if path == "/performance_benchmark/":
+            start, end = self._period()
+            return path, {
+                "account_codes": self._accounts(),
+                "benchmark_list": self.rng.sample(BENCHMARK_SYMBOLS, 2),
+                "start_date": start,
+                "end_date": end,
+            }
+        if path == "/holdings_available_dates/":
+            return path, {"account_codes": self._accounts()}
+        if path == "/fx_rate/":
+            return path, {"as_of_date": self._business_day(self.start_date).isoformat()}
+        return path, {}
+
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client connection for JSON POSTs"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def post(self, path: str, payload: dict) -> Tuple[int, int]:
+        """Send a POST and read the whole response; returns (status, body bytes)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode()
+        head = (
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+            f"Accept-Encoding: identity\r\nContent-Length: {len(body)}\r\n\r\n"
+        ).encode()
+        try:
+            self.writer.write(head + body)
+            await self.writer.drain()
+            return await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            raise
+
+    async def _read_response(self) -> Tuple[int, int]:
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            size = 0
+            while True:
+                chunk_size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await self.reader.readexactly(chunk_size + 2)
+                size += chunk_size
+                if chunk_size == 0:
+                    break
+        else:
+            size = int(headers.get("content-length", 0))
+            await self.reader.readexactly(size)
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, size
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+async def run_load(host: str, port: int, mix: RequestMix, concurrency: int, duration: float, warmup: float) -> Dict[str, dict]:
+    """Closed-loop load: each client sends its next request as soon as the previous one returns"""
+    samples: Dict[str, List[float]] = {path: [] for path in mix.paths}
+    errors: Dict[str, int] = {path: 0 for path in mix.paths}
+    bytes_received: Dict[str, int] = {path: 0 for path in mix.paths}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def client():
+        connection = HttpConnection(host, port)
+        try:
+            while time.perf_counter() < stop_at:
+                path, payload = mix.next()
+                sent = time.perf_counter()
+                try:
+                    status, size = await connection.post(path, payload)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    status, size = 0, 0
+                finished = time.perf_counter()
+                if sent < measure_from:
+                    continue
+                if 200 <= status < 400:
+                    samples[path].append(finished - sent)
+                    bytes_received[path] += size
+                else:
+                    errors[path] += 1
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = max(time.perf_counter() - measure_from, 1e-9)
+    return summarize(samples, errors, bytes_received, elapsed)
+
+
+def summarize(samples: Dict[str, List[float]], errors: Dict[str, int], bytes_received: Dict[str, int], elapsed: float) -> dict:
+    def stats(latencies: List[float], error_count: int, size: int) -> dict:
+        values = np.array(latencies) * 1000
+        p50, p95, p99 = (np.percentile(values, [50, 95, 99]) if len(values) else (np.nan,) * 3)
+        return {
+            "requests": len(values),
+            "errors": error_count,
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": _round(values.mean()) if len(values) else None,
+            "p50_ms": _round(p50),
+            "p95_ms": _round(p95),
+            "p99_ms": _round(p99),
+            "max_ms": _round(values.max()) if len(values) else None,
+            "mean_kb": round(size / len(values) / 1024, 1) if len(values) else None,
+        }
+
+    per_endpoint = {path: stats(samples[path], errors[path], bytes_received[path]) for path in samples}
+    everything = [latency for values in samples.values() for latency in values]
+    overall = stats(everything, sum(errors.values()), sum(bytes_received.values()))
+    return {"elapsed_s": round(elapsed, 2), "overall": overall, "endpoints": per_endpoint}
+
+
+def scrape_pool_metrics(host: str, port: int) -> Dict[str, float]:
+    """db_pool_* gauges and counters from /metrics (of whichever worker answers)"""
+    try:
+        with urlopen(f"http://{host}:{port}/metrics", timeout=10) as response:
+            body = response.read().decode()
+    except OSError:
+        return {}
+    pool = {}
+    for line in body.splitlines():
+        if line.startswith("db_pool_"):
+            name, _, value = line.rpartition(" ")
+            pool[name[len("db_pool_"):]] = float(value)
+    return pool
+
+
+def _round(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, 2)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, port: int, workers: int, extra_env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": database_url, **extra_env}
+    command = [
+        sys.executable, "-m", "uvicorn", "tools.offline_app:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    log = open(log_path, "w")
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+async def wait_until_ready(host: str, port: int, timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        connection = HttpConnection(host, port)
+        try:
+            status, _ = await connection.post("/available_performance_sankey_levels/", {})
+            if status == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            await connection.close()
+        await asyncio.sleep(0.25)
+    raise SystemExit(f"Server on {host}:{port} did not become ready within {timeout:.0f}s")
+
+
+def stop_server(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=15)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def print_report(results: dict):
+    config = results["config"]
+    print(
+        f"\n📈 {config['label']}: {config['workers']} worker(s), concurrency {config['concurrency']}, "
+        f"{results['elapsed_s']}s measured"
+    )
+    header = f"   {'endpoint':<40} {'req':>6} {'err':>4} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(header)
+    rows = list(results["endpoints"].items()) + [("TOTAL", results["overall"])]
+    for path, stats in rows:
+        print(
+            f"   {path:<40} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps']:>8.1f} "
+            f"{_ms(stats['p50_ms'])} {_ms(stats['p95_ms'])} {_ms(stats['p99_ms'])} {_ms(stats['max_ms'])}"
+        )
+    pool = results.get("pool")
+    if pool:
+        print(f"   Connection pool (one worker): {_pool_summary(pool)}")
+
+
+def _pool_summary(pool: dict) -> str:
+    if not pool:
+        return "-"
+    return (
+        f"peak {pool.get('peak_checked_out', 0):.0f}/{pool.get('max_connections', 0):.0f} in use, "
+        f"{pool.get('saturated_checkouts_total', 0):.0f} saturated checkouts, {pool.get('timeouts_total', 0):.0f} timeouts"
+    )
+
+
+def print_comparison(paths: List[str]):
+    runs = []
+    for path in paths:
+        with open(path) as f:
+            runs.append(json.load(f))
+    labels = [run["config"]["label"] for run in runs]
+    print("\n⚖️  Throughput (rps) / p95 (ms) per run")
+    print(f"   {'endpoint':<40} " + " ".join(f"{label[:22]:>22}" for label in labels))
+    endpoints = list(runs[0]["endpoints"]) + ["TOTAL"]
+    for endpoint in endpoints:
+        cells = []
+        for run in runs:
+            stats = run["overall"] if endpoint == "TOTAL" else run["endpoints"].get(endpoint)
+            cells.append(f"{stats['throughput_rps']:>9.1f} / {_ms(stats['p95_ms'])}" if stats else f"{'-':>22}")
+        print(f"   {endpoint:<40} " + " ".join(f"{cell:>22}" for cell in cells))
+    print("\n   Settings:")
+    for run in runs:
+        config = run["config"]
+        print(f"   {config['label']}: workers={config['workers']} concurrency={config['concurrency']} env={config['env']}")
+        print(f"      pool: {_pool_summary(run.get('pool'))}")
+
+
+def _ms(value) -> str:
+    return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+
+def main(argv=None):
+    from tools.generate_gold_data import DATASET_END_DATE, DATASET_SIZES
+
+    parser = argparse.ArgumentParser(description="Concurrent load test with per-endpoint latency percentiles")
+    parser.add_argument("--size", default="small", choices=list(DATASET_SIZES), help="Generated dataset to serve")
+    parser.add_argument("--database-url", help="Serve this database instead of a generated dataset")
+    parser.add_argument("--url", help="Target an already-running server instead of starting one")
+    parser.add_argument("--accounts", help="Comma-separated account codes (default: the generated SYN accounts)")
+    parser.add_argument("--start-date", type=date.fromisoformat, help="Earliest date used in requests")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="Latest date used in requests")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of traffic before measuring")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--env", action="append", default=[], help="NAME=VALUE passed to the server")
+    parser.add_argument("--label", help="Name of this run in reports (default: derived from settings)")
+    parser.add_argument("--output", help="Save results as JSON")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS", help="Compare saved result files and exit")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print_comparison(args.compare)
+        return 0
+
+    sys.path.insert(0, REPO_ROOT)
+    extra_env = dict(value.split("=", 1) for value in args.env)
+    preset = DATASET_SIZES[args.size]
+    account_codes = args.accounts.split(",") if args.accounts else [f"SYN{i:06d}" for i in range(preset["accounts"])]
+    end_date = args.end_date or DATASET_END_DATE
+    start_date = args.start_date or preset["start_date"]
+    mix = RequestMix(account_codes, start_date, end_date, seed=args.seed)
+    label = args.label or f"{args.size} w{args.workers} c{args.concurrency}" + "".join(f" {k}={v}" for k, v in extra_env.items())
+
+    process = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        from tools.generate_gold_data import ensure_sqlite_dataset
+
+        database_url = args.database_url or ensure_sqlite_dataset(args.size, args.data_dir)
+        host, port = "127.0.0.1", _free_port()
+        os.makedirs(args.data_dir, exist_ok=True)
+        log_path = os.path.join(args.data_dir, "load_test_server.log")
+        print(f"🚀 Starting {args.workers} uvicorn worker(s) on port {port} (log: {log_path})")
+        process = start_server(database_url, port, args.workers, extra_env, log_path)
+
+    try:
+        asyncio.run(wait_until_ready(host, port))
+        print(f"🔥 {args.concurrency} clients for {args.duration:.0f}s (+{args.warmup:.0f}s warm-up)")
+        results = asyncio.run(run_load(host, port, mix, args.concurrency, args.duration, args.warmup))
+        results["pool"] = scrape_pool_metrics(host, port)
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    results["config"] = {
+        "label": label,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "size": None if args.url or args.database_url else args.size,
+        "workers": None if args.url else args.workers,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "seed": args.seed,
+        "env": extra_env,
+        "mix": ENDPOINT_MIX,
+    }
+    print_report(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
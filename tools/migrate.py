@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the phw_dev_gold database: the indexes the API's queries need
+and the tables the API maintains itself (rollups); the gold tables come from the data loads.
+
+Migrations live in migrations/ as one SQL file per version and dialect:
+
+    migrations/0001_hot_query_indexes.postgresql.sql
+    migrations/0001_hot_query_indexes.sqlite.sql
+
+They are applied in version order, each once; applied versions are recorded in
+phw_dev_gold.schema_migrations. A file whose first line is "-- migrate: no-transaction" runs
+statement by statement in autocommit, which CREATE INDEX CONCURRENTLY requires; every other
+file runs in one transaction.
+
+Usage:
+    python -m tools.migrate --database-url postgresql://localhost/phw
+    python -m tools.migrate --database-url sqlite:///perf.db --status
+    python -m tools.migrate --database-url sqlite:///perf.db --target 1 --dry-run
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Set
+
+from sqlalchemy import text
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(REPO_ROOT, "migrations")
+NO_TRANSACTION = "-- migrate: no-transaction"
+FILE_PATTERN = re.compile(r"^(\d{4})_(\w+)\.(postgresql|sqlite)\.sql$")
+
+CREATE_VERSIONS_TABLE = text(
+    """
+    CREATE TABLE IF NOT EXISTS phw_dev_gold.schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP NOT NULL
+    )
+    """
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    def sql(self) -> str:
+        with open(self.path) as f:
+            return f.read()
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql().lstrip().startswith(NO_TRANSACTION)
+
+    def statements(self) -> List[str]:
+        return split_statements(self.sql())
+
+
+def split_statements(sql: str) -> List[str]:
+    """Statements of a migration file: comment lines dropped, split on semicolons"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def discover(dialect: str, directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = {}
+    for filename in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        match = FILE_PATTERN.match(filename)
+        if not match or match.group(3) != dialect:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Two {dialect} migrations share version {version}: {migrations[version].path}, {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def applied_versions(engine) -> Set[int]:
+    with engine.begin() as conn:
+        conn.execute(CREATE_VERSIONS_TABLE)
+        return set(conn.execute(text("SELECT version FROM phw_dev_gold.schema_migrations")).scalars())
+
+
+def pending(engine, directory: str = MIGRATIONS_DIR, target: Optional[int] = None) -> List[Migration]:
+    done = applied_versions(engine)
+    return [
+        migration
+        for migration in discover(engine.dialect.name, directory)
+        if migration.version not in done and (target is None or migration.version <= target)
+    ]
+
+
+def apply(engine, migration: Migration):
+    record = text("INSERT INTO phw_dev_gold.schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)")
+    params = {"version": migration.version, "name": migration.name, "applied_at": datetime.now()}
+    if migration.transactional:
+        with engine.begin() as conn:
+            for statement in migration.statements():
+                conn.execute(text(statement))
+            conn.execute(record, params)
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in migration.statements():
+            conn.execute(text(statement))
+        conn.execute(record, params)
+
+
+def migrate(engine, directory: str = MIGRATIONS_DIR, target: Optional[int] = None, dry_run: bool = False) -> List[Migration]:
+    """Apply the pending migrations up to target (all by default); returns them"""
+    todo = pending(engine, directory, target)
+    for migration in todo:
+        if dry_run:
+            print(f"📝 {migration.version:04d} {migration.name} (dry run)")
+            for statement in migration.statements():
+                print(f"   {statement};")
+            continue
+        started = time.perf_counter()
+        apply(engine, migration)
+        print(f"✅ {migration.version:04d} {migration.name} in {time.perf_counter() - started:.1f}s")
+    return todo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Target database (default: $DATABASE_URL)")
+    parser.add_argument("--target", type=int, help="Stop after this version")
+    parser.add_argument("--dry-run", action="store_true", help="Print the pending statements without running them")
+    parser.add_argument("--status", action="store_true", help="List applied and pending versions")
+    parser.add_argument("--directory", default=MIGRATIONS_DIR)
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    sys.path.insert(0, REPO_ROOT)
+    from app.database import make_engine
+
+    engine = make_engine(args.database_url)
+    try:
+        if args.status:
+            done = applied_versions(engine)
+            for migration in discover(engine.dialect.name, args.directory):
+                state = "applied" if migration.version in done else "pending"
+                print(f"{migration.version:04d} {migration.name:<40} {state}")
+            return 0
+        if not migrate(engine, args.directory, args.target, args.dry_run):
+            print("✅ Up to date")
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+The API with benchmark prices generated locally instead of downloaded from Yahoo Finance, so
+benchmarks and load tests measure this service rather than the network.
+
+    DATABASE_URL=sqlite:///perf.db uvicorn tools.offline_app:app --workers 4
+
+Prices are a seeded random walk per symbol over a fixed business-day calendar, so any two
+requested ranges agree on the days they share.
+"""
+
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.benchmark_service import BenchmarkService
+from app.main import app
+
+PRICE_EPOCH = date(2000, 1, 3)
+
+
+def synthetic_prices(symbol: str, start_date: str, end_date: str) -> dict:
+    """{'YYYY-MM-DD': close} on business days from start_date to end_date inclusive"""
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    if end < PRICE_EPOCH or end < start:
+        return {}
+    calendar = np.arange(np.datetime64(PRICE_EPOCH), np.datetime64(end + timedelta(days=1)))
+    calendar = calendar[np.is_busday(calendar)]
+
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    closes = 50.0 * np.exp(np.cumsum(rng.normal(0.0003, 0.01, size=len(calendar))))
+    keep = calendar >= np.datetime64(start)
+    return {str(day): round(float(close), 4) for day, close in zip(calendar[keep], closes[keep])}
+
+
+def _offline_download(self, benchmark_symbol: str, start_date: str, end_date: str):
+    return synthetic_prices(benchmark_symbol, start_date, end_date)
+
+
+BenchmarkService._download_benchmark_data = _offline_download
+
+__all__ = ["app", "synthetic_prices"]
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Monthly range partitions for phw_dev_gold.fact_holdings_all (Postgres).
+
+fact_holdings_all gains a full snapshot per account every day, and the API's reads pick days
+by AsofDate. Partitioned by month, a point-in-time read (the Sankey, attribution's start and
+end days, a rollup refresh) plans against the partitions of its days only, and old months can
+be moved to cheaper storage on their own.
+
+--convert rebuilds the table as a declarative partitioned table in one transaction: the table
+is locked against writes (reads go on), every month is copied into its partition
+(fact_holdings_all_p2024_01 holds [2024-01-01, 2024-02-01)), the table's indexes are
+recreated on the partitioned table, and the two tables swap names. The original stays as
+fact_holdings_all_unpartitioned until --drop-unpartitioned. Views over fact_holdings_all keep
+pointing at the original (Postgres binds them by table, not name) and must be recreated.
+
+There is no default partition, so a row for a month without a partition fails its load
+instead of landing somewhere no query prunes to. Partitions are created as dates load:
+tools.generate_gold_data --partition-holdings does it per batch, and loads from elsewhere can
+run --ensure (this month and --months-ahead more, e.g. from cron) or load a month into a
+table of its own and --attach it, which holds a lock on fact_holdings_all only briefly.
+
+--check-pruning lists the queries in app/queries.py that read fact_holdings_all with the
+AsofDate predicate they prune by, and on Postgres the partitions each plan reads. psycopg2
+sends parameters inline, so pruning happens at plan time and pruned partitions are absent
+from the plan.
+
+Usage:
+    python -m tools.partition_holdings --database-url postgresql://localhost/phw --convert --dry-run
+    python -m tools.partition_holdings --database-url postgresql://localhost/phw --convert
+    python -m tools.partition_holdings --database-url postgresql://localhost/phw --ensure --months-ahead 2
+    python -m tools.partition_holdings --database-url postgresql://localhost/phw --attach staging_2024_07 --month 2024-07
+    python -m tools.partition_holdings --database-url postgresql://localhost/phw --archive-before 2023-01 --tablespace cold
+    python -m tools.partition_holdings --database-url postgresql://localhost/phw --status --check-pruning
+    python -m tools.partition_holdings --check-pruning
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLD_SCHEMA = "phw_dev_gold"
+TABLE = "fact_holdings_all"
+PARTITION_KEY = "AsofDate"
+UNPARTITIONED = f"{TABLE}_unpartitioned"
+STAGING = f"{TABLE}_partitioned"
+
+
+def month_start(day) -> date:
+    day = day if isinstance(day, date) else date.fromisoformat(str(day)[:10])
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months_between(first, last) -> List[date]:
+    months, month, last = [], month_start(first), month_start(last)
+    while month <= last:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def partition_name(month: date, table: str = TABLE) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def partition_bounds(month: date) -> str:
+    return f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+
+
+def partition_ddl(days: Iterable, parent: str = TABLE) -> List[str]:
+    """CREATE TABLE ... PARTITION OF statements for the months of days (dates or 'YYYY-MM-DD')"""
+    months = sorted({month_start(day) for day in days})
+    return [
+        f"CREATE TABLE IF NOT EXISTS {GOLD_SCHEMA}.{partition_name(month)} "
+        f"PARTITION OF {GOLD_SCHEMA}.{parent} {partition_bounds(month)}"
+        for month in months
+    ]
+
+
+def _require_postgres(engine):
+    if engine.dialect.name != "postgresql":
+        raise SystemExit(f"Declarative partitioning needs Postgres, not {engine.dialect.name}")
+
+
+def is_partitioned(conn, table: str = TABLE) -> bool:
+    return conn.execute(
+        text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = :schema AND c.relname = :table"
+        ),
+        {"schema": GOLD_SCHEMA, "table": table},
+    ).first() is not None
+
+
+def partitions(conn, table: str = TABLE) -> List[dict]:
+    """[{"name", "bounds", "tablespace", "bytes"}] of table's partitions, oldest first"""
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bounds,
+                   COALESCE(t.spcname, 'pg_default') AS tablespace, pg_total_relation_size(c.oid) AS bytes
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+            LEFT JOIN pg_tablespace t ON t.oid = c.reltablespace
+            WHERE n.nspname = :schema AND p.relname = :table
+            ORDER BY c.relname
+            """
+        ),
+        {"schema": GOLD_SCHEMA, "table": table},
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+# ---------------------------------------------------------------------------
+# Conversion
+# ---------------------------------------------------------------------------
+
+
+def conversion_statements(conn) -> List[str]:
+    """The statements --convert runs, for the months and indexes the table has now"""
+    nulls, first, last = conn.execute(
+        text(f'SELECT COUNT(*) - COUNT("{PARTITION_KEY}"), MIN("{PARTITION_KEY}"), MAX("{PARTITION_KEY}") FROM {GOLD_SCHEMA}.{TABLE}')
+    ).one()
+    if nulls:
+        raise SystemExit(f"{nulls} rows of {TABLE} have no {PARTITION_KEY}; they fit no partition")
+    indexes = conn.execute(
+        text("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = :schema AND tablename = :table ORDER BY indexname"),
+        {"schema": GOLD_SCHEMA, "table": TABLE},
+    ).fetchall()
+
+    statements = [
+        f"LOCK TABLE {GOLD_SCHEMA}.{TABLE} IN SHARE MODE",
+        f"CREATE TABLE {GOLD_SCHEMA}.{STAGING} (LIKE {GOLD_SCHEMA}.{TABLE} INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS) "
+        f'PARTITION BY RANGE ("{PARTITION_KEY}")',
+    ]
+    months = months_between(first, last) if first is not None else []
+    statements += partition_ddl(months, parent=STAGING)
+    for month in months:
+        statements.append(
+            f"INSERT INTO {GOLD_SCHEMA}.{STAGING} SELECT * FROM {GOLD_SCHEMA}.{TABLE} "
+            f"WHERE \"{PARTITION_KEY}\" >= '{month.isoformat()}' AND \"{PARTITION_KEY}\" < '{next_month(month).isoformat()}'"
+        )
+    # Index names are unique per schema: the originals step aside for the new ones
+    for name, definition in indexes:
+        statements.append(f"ALTER INDEX {GOLD_SCHEMA}.{name} RENAME TO {name[:59]}_old")
+        statements.append(definition.replace(f" ON {GOLD_SCHEMA}.{TABLE} ", f" ON {GOLD_SCHEMA}.{STAGING} ", 1))
+    statements += [
+        f"ANALYZE {GOLD_SCHEMA}.{STAGING}",
+        f"ALTER TABLE {GOLD_SCHEMA}.{TABLE} RENAME TO {UNPARTITIONED}",
+        f"ALTER TABLE {GOLD_SCHEMA}.{STAGING} RENAME TO {TABLE}",
+    ]
+    return statements
+
+
+def convert(engine, dry_run: bool = False) -> List[str]:
+    _require_postgres(engine)
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            print(f"✅ {TABLE} is already partitioned")
+            return []
+        statements = conversion_statements(conn)
+        for statement in statements:
+            print(f"   {statement};")
+            if not dry_run:
+                conn.execute(text(statement))
+    return statements
+
+
+def drop_unpartitioned(engine):
+    _require_postgres(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {GOLD_SCHEMA}.{UNPARTITIONED}"))
+
+
+# ---------------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------------
+
+
+def ensure_partitions(engine, first, last) -> List[str]:
+    """Create the missing partitions for the months from first to last"""
+    _require_postgres(engine)
+    statements = partition_ddl(months_between(first, last))
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    return statements
+
+
+def attach(engine, table: str, month: date):
+    """
+    Attach a table loaded with one month of holdings as that month's partition. The CHECK
+    constraint proves the bounds up front, so ATTACH skips its own scan of the table under lock.
+    """
+    _require_postgres(engine)
+    check = f"{table[:50]}_asofdate_bounds"
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f'ALTER TABLE {GOLD_SCHEMA}.{table} ADD CONSTRAINT {check} CHECK ("{PARTITION_KEY}" IS NOT NULL '
+                f"AND \"{PARTITION_KEY}\" >= '{month.isoformat()}' AND \"{PARTITION_KEY}\" < '{next_month(month).isoformat()}')"
+            )
+        )
+        conn.execute(text(f"ALTER TABLE {GOLD_SCHEMA}.{TABLE} ATTACH PARTITION {GOLD_SCHEMA}.{table} {partition_bounds(month)}"))
+        conn.execute(text(f"ALTER TABLE {GOLD_SCHEMA}.{table} DROP CONSTRAINT {check}"))
+
+
+def archive(engine, before: date, tablespace: str) -> List[str]:
+    """
+    Move the partitions of months before `before`, with their indexes, to tablespace (e.g. one
+    on cheaper disks). Each move rewrites its partition and locks only that partition.
+    """
+    _require_postgres(engine)
+    moved = []
+    with engine.connect() as conn:
+        for partition in partitions(conn):
+            name = partition["name"]
+            month = date(int(name[-7:-3]), int(name[-2:]), 1)
+            if month >= month_start(before) or partition["tablespace"] == tablespace:
+                continue
+            indexes = conn.execute(
+                text("SELECT indexname FROM pg_indexes WHERE schemaname = :schema AND tablename = :table"),
+                {"schema": GOLD_SCHEMA, "table": name},
+            ).scalars().all()
+            conn.execute(text(f"ALTER TABLE {GOLD_SCHEMA}.{name} SET TABLESPACE {tablespace}"))
+            for index in indexes:
+                conn.execute(text(f"ALTER INDEX {GOLD_SCHEMA}.{index} SET TABLESPACE {tablespace}"))
+            # One partition per transaction, so its lock is released before the next move
+            conn.commit()
+            moved.append(name)
+    return moved
+
+
+# ---------------------------------------------------------------------------
+# Pruning
+# ---------------------------------------------------------------------------
+
+
+def holdings_queries() -> Dict[str, TextClause]:
+    """The queries of app/queries.py that read fact_holdings_all (API reads and rollup refreshes)"""
+    from app import queries
+    from tools.index_advisor import hot_queries, table_aliases
+
+    found = hot_queries()
+    found.update({name: query for name, query in vars(queries).items() if name.isupper() and isinstance(query, TextClause)})
+    return {name: query for name, query in sorted(found.items()) if TABLE in table_aliases(query.text).values()}
+
+
+def pruning_key(query: TextClause) -> Optional[str]:
+    """How a query constrains AsofDate of fact_holdings_all: "=" (= or IN), "range", or None"""
+    from tools.index_advisor import _table_columns, table_uses
+
+    use = table_uses(query.text, _table_columns())[TABLE]
+    if PARTITION_KEY in use.equality:
+        return "="
+    if PARTITION_KEY in use.ranges:
+        return "range"
+    return None
+
+
+def partitions_scanned(conn, query: TextClause, params: dict) -> List[str]:
+    """Partitions of fact_holdings_all in the plan of query, after plan-time pruning"""
+    from tools.index_advisor import _with_prefix
+
+    output = conn.execute(_with_prefix("EXPLAIN (FORMAT JSON) ", query), params).scalar()
+    output = json.loads(output) if isinstance(output, str) else output
+    scanned, pending = set(), [output[0]["Plan"]]
+    while pending:
+        node = pending.pop()
+        if node.get("Relation Name", "").startswith(f"{TABLE}_p"):
+            scanned.add(node["Relation Name"])
+        pending.extend(node.get("Plans", []))
+    return sorted(scanned)
+
+
+def check_pruning(engine=None) -> List[dict]:
+    """
+    [{"query", "key", "partitions"}] for every query reading fact_holdings_all; partitions (read
+    of total) only with a partitioned Postgres database.
+    """
+    results = [{"query": name, "key": pruning_key(query), "partitions": None} for name, query in holdings_queries().items()]
+    if engine is None or engine.dialect.name != "postgresql":
+        return results
+    from tools.index_advisor import hot_queries, sample_parameters
+
+    hot = hot_queries()
+    params = sample_parameters(engine)
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return results
+        total = len(partitions(conn))
+        for result in results:
+            query = hot.get(result["query"])
+            if query is not None:
+                result["partitions"] = f"{len(partitions_scanned(conn, query, params))}/{total}"
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Target database (default: $DATABASE_URL)")
+    parser.add_argument("--convert", action="store_true", help="Rebuild fact_holdings_all as monthly partitions")
+    parser.add_argument("--dry-run", action="store_true", help="With --convert, print the statements only")
+    parser.add_argument("--drop-unpartitioned", action="store_true", help="Drop the original table kept by --convert")
+    parser.add_argument("--ensure", action="store_true", help="Create partitions for this month and --months-ahead more")
+    parser.add_argument("--months-ahead", type=int, default=1)
+    parser.add_argument("--attach", metavar="TABLE", help="Attach a table holding one month (--month) as its partition")
+    parser.add_argument("--month", type=lambda value: date.fromisoformat(f"{value}-01"), help="YYYY-MM")
+    parser.add_argument("--archive-before", type=lambda value: date.fromisoformat(f"{value}-01"), metavar="YYYY-MM")
+    parser.add_argument("--tablespace", help="Tablespace for --archive-before")
+    parser.add_argument("--status", action="store_true", help="List the partitions")
+    parser.add_argument("--check-pruning", action="store_true", help="Show how each query prunes partitions")
+    args = parser.parse_args(argv)
+
+    if args.attach and not args.month:
+        parser.error("--attach needs --month")
+    if args.archive_before and not args.tablespace:
+        parser.error("--archive-before needs --tablespace")
+    os.environ.setdefault("DATABASE_URL", args.database_url or "sqlite://")
+    sys.path.insert(0, REPO_ROOT)
+    from app.database import make_engine
+
+    engine = make_engine(args.database_url) if args.database_url else None
+    if engine is None and not args.check_pruning:
+        parser.error("--database-url or DATABASE_URL is required")
+    try:
+        if args.convert:
+            convert(engine, args.dry_run)
+            if not args.dry_run:
+                print(f"✅ {TABLE} is partitioned by month; the original is {UNPARTITIONED}")
+        if args.drop_unpartitioned:
+            drop_unpartitioned(engine)
+            print(f"🗑️  Dropped {UNPARTITIONED}")
+        if args.ensure:
+            today = date.today()
+            last = today
+            for _ in range(args.months_ahead):
+                last = next_month(month_start(last))
+            for statement in ensure_partitions(engine, today, last):
+                print(f"   {statement}")
+        if args.attach:
+            attach(engine, args.attach, args.month)
+            print(f"✅ Attached {args.attach} as {args.month:%Y-%m}")
+        if args.archive_before:
+            for name in archive(engine, args.archive_before, args.tablespace):
+                print(f"📦 {name} -> {args.tablespace}")
+        if args.status:
+            _require_postgres(engine)
+            with engine.connect() as conn:
+                for partition in partitions(conn):
+                    print(f"{partition['name']:<32} {partition['bounds']:<60} {partition['tablespace']:<12} {partition['bytes'] / 2**20:>10.1f} MB")
+        if args.check_pruning:
+            for result in check_pruning(engine):
+                key = {"=": "AsofDate = / IN", "range": "AsofDate range", None: "every partition"}[result["key"]]
+                scanned = f"  ({result['partitions']} partitions)" if result["partitions"] else ""
+                print(f"{'✅' if result['key'] else '⚠️ '} {result['query']:<45} {key}{scanned}")
+    finally:
+        if engine is not None:
+            engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
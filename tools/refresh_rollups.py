@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Refresh the daily holdings rollups (app/rollups.py) after a load of fact_holdings_all.
+
+Only the days loaded since the last refresh are rebuilt; the first run, a reload of
+dim_securitymaster or --full rebuilds every day. The rollup tables come from
+migrations/0002_holdings_rollups (python -m tools.migrate).
+
+Usage:
+    python -m tools.refresh_rollups --database-url postgresql://localhost/phw
+    python -m tools.refresh_rollups --database-url sqlite:///perf.db --full
+    python -m tools.refresh_rollups --database-url sqlite:///perf.db --status
+"""
+
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="Target database (default: $DATABASE_URL)")
+    parser.add_argument("--full", action="store_true", help="Rebuild every day")
+    parser.add_argument("--status", action="store_true", help="Show the rolled-up and stale days without refreshing")
+    parser.add_argument("--chunk-days", type=int, default=31, help="Days rebuilt per statement")
+    args = parser.parse_args(argv)
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+    os.environ.setdefault("DATABASE_URL", args.database_url)
+    sys.path.insert(0, REPO_ROOT)
+    from app import rollups
+    from app.database import make_engine
+
+    engine = make_engine(args.database_url)
+    try:
+        with engine.connect() as connection:
+            if not rollups.has_rollup_tables(connection):
+                print("❌ Rollup tables are missing; run python -m tools.migrate first")
+                return 1
+            before = rollups.load_coverage(connection)
+        if args.status:
+            if not before.refreshed:
+                print("📭 Never refreshed")
+            else:
+                print(f"📅 {before.first} .. {before.last}, {len(before.stale)} stale day(s)")
+                if not before.asset_classes:
+                    print("⚠️  dim_securitymaster was reloaded; the next refresh rebuilds every day")
+            return 0
+        result = rollups.refresh(engine, full=args.full, chunk_days=args.chunk_days)
+        kind = "Full refresh" if result["full"] else "Refresh"
+        print(f"✅ {kind}: {result['days']} day(s) in {result['seconds']:.1f}s")
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())